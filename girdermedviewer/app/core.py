@@ -20,3 +20,7 @@ class MedViewerApp(TrameApp):
         logging.getLogger(__package__).setLevel(self._logic.app_config.log_level)
 
         self._logic.set_ui(self._ui)
+
+    async def close(self) -> None:
+        """End the session without stopping the process, e.g. when several sessions are served by one process"""
+        await self._logic.close()
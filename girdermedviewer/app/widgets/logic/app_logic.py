@@ -5,7 +5,7 @@ from pathlib import Path
 from trame_server import Server
 
 from ..ui import AppState, AppUI
-from ..utils import AppConfig, GirderConfig
+from ..utils import RENDER_WINDOW_POOL, SHARED_DATASETS, AppConfig, GirderConfig
 from .base_logic import BaseLogic
 from .girder import GirderLogic
 from .scene import SceneLogic
@@ -20,12 +20,16 @@ class AppLogic(BaseLogic[AppState]):
         super().__init__(server, AppState)
         self._load_app_config()
 
-        self._views_logic = ViewsLogic(self.server)
-        self._scene_logic = SceneLogic(self.server, self._views_logic)
-        self._tool_logic = ToolLogic(self.server, self._views_logic, self._scene_logic)
+        self._views_logic = ViewsLogic(self.server, self.app_config)
+        self._scene_logic = SceneLogic(self.server, self._views_logic, self.app_config)
+        self._tool_logic = ToolLogic(self.server, self._views_logic, self._scene_logic, self.app_config)
         self._girder_logic = GirderLogic(self.server, self._scene_logic, self.app_config)
         self.provider = self._girder_logic.connection_logic.provider
         self.render_windows = self._views_logic.render_windows
+        self._is_closed = False
+
+        self.ctrl.on_server_ready.add(self._on_server_ready)
+        self.ctrl.on_server_exited.add(self._on_server_exited)
 
     def set_ui(self, ui: AppUI) -> None:
         self._views_logic.set_ui(ui.views_ui)
@@ -33,6 +37,27 @@ class AppLogic(BaseLogic[AppState]):
         self._scene_logic.set_ui(ui.scene_ui)
         self._girder_logic.set_ui(ui)
 
+    def _on_server_ready(self, **_) -> None:
+        # Warm up rendering pipelines for the next sessions handled by this process
+        RENDER_WINDOW_POOL.max_size = max(RENDER_WINDOW_POOL.max_size, self.app_config.render_window_pool_size)
+        RENDER_WINDOW_POOL.prefill(self.app_config.render_window_pool_size)
+
+    async def close(self) -> None:
+        """
+        End the session: stop streaming its views, give their rendering pipelines back to the pool for the next
+        sessions of the process and release its datasets.
+        """
+        if self._is_closed:
+            return
+        self._is_closed = True
+        await self._views_logic.close()
+        self._scene_logic.release_objects()
+        logger.debug(f"Render window pool: {RENDER_WINDOW_POOL.stats}")
+        logger.debug(f"Shared datasets: {SHARED_DATASETS.stats}")
+
+    async def _on_server_exited(self, **_) -> None:
+        await self.close()
+
     def _load_app_config(self, config_file_path: Path | None = None) -> None:
         """
         Load the configuration file app.cfg if any and set the state variables accordingly.
@@ -53,6 +78,10 @@ class AppLogic(BaseLogic[AppState]):
         app_config.update(config_dict.get("download", {}))
         app_config.update(config_dict.get("logging", {}))
         app_config.update(config_dict.get("girder", {}))
+        app_config.update(config_dict.get("streaming", {}))
+        app_config.update(config_dict.get("rendering", {}))
+        app_config.update(config_dict.get("filters", {}))
+        app_config.update(config_dict.get("segmentation", {}))
         app_config["girder_configs"] = {
             url: GirderConfig(url=url, **config) for url, config in config_dict.items() if url.startswith("http")
         }
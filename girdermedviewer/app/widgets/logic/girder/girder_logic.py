@@ -11,6 +11,7 @@ from ..scene import SceneLogic
 from .girder_browser_logic import GirderBrowserLogic
 from .girder_connection_logic import GirderConnectionLogic
 from .girder_load_logic import GirderLoadLogic
+from .girder_save_logic import GirderSaveLogic
 
 logger = logging.getLogger(__name__)
 
@@ -35,6 +36,11 @@ class GirderLogic(BaseLogic[None]):
             temp_directory=app_config.temp_directory,
             date_format=app_config.date_format,
         )
+        self.save_logic = GirderSaveLogic(
+            server,
+            girder_config=self.config,
+            temp_directory=app_config.temp_directory,
+        )
         self.scene_logic = scene_logic
 
         self.connection_logic.girder_connected.connect(self._update_config)
@@ -49,6 +55,7 @@ class GirderLogic(BaseLogic[None]):
 
         scene_logic.object_load_canceled.connect(self.load_logic.cancel_fetch_task)
         scene_logic.object_removed.connect(self.browser_logic.unselect_item)
+        scene_logic.labelmap_save_requested.connect(self.save_logic.save_labelmap)
 
     def set_ui(self, ui: AppUI) -> None:
         self.connection_logic.set_ui(ui.girder_connection_ui)
@@ -65,11 +72,13 @@ class GirderLogic(BaseLogic[None]):
         self.config = girder_config if girder_config else GirderConfig()
         self.browser_logic.update_girder_default_location(self.config.default_location)
         self.load_logic.update_girder_config(self.config)
+        self.save_logic.update_girder_config(self.config)
         self.girder_connected(self.config.url is not None)
 
     def _update_user(self, user: dict[str, Any] | None, token: str | None) -> None:
         self.browser_logic.update_girder_user(user)
         self.load_logic.update_token(token)
+        self.save_logic.update_token(token)
 
         if user is None:
             self.scene_logic.clear_scene()
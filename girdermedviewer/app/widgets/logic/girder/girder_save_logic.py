@@ -0,0 +1,123 @@
+import asyncio
+import logging
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Any
+
+from girder_client import GirderClient, HttpError
+from trame_server import Server
+from trame_server.utils.asynchronous import create_task
+
+from ...utils import (
+    GirderConfig,
+    create_scalars_snapshot,
+    release_scalars_snapshot,
+    write_labelmap,
+)
+from ..base_logic import BaseLogic
+from ..scene import SegmentationFilterLogic
+
+logger = logging.getLogger(__name__)
+
+# Share of the save progress bar taken by the encoding, the rest is the upload
+ENCODE_PROGRESS = 50
+
+
+class GirderSaveLogic(BaseLogic[None]):
+    """
+    Save labelmaps to Girder, next to the item of the volume they segment.
+    Labelmaps are encoded to a temporary file in a worker thread then uploaded in chunks, so that saving does not
+    block the event loop.
+    """
+
+    def __init__(self, server: Server, girder_config: GirderConfig, temp_directory: str | None) -> None:
+        super().__init__(server, None)
+        self._temp_directory = temp_directory
+        self._executor = ThreadPoolExecutor(1)
+        self.update_girder_config(girder_config)
+
+        self.save_tasks = {}
+
+    def update_girder_config(self, girder_config: GirderConfig) -> None:
+        self._girder_config = girder_config
+        self.girder_client = GirderClient(apiUrl=girder_config.api_url)
+
+    def update_token(self, token) -> None:
+        self.girder_client.setToken(token)
+
+    def save_labelmap(self, seg_filter_logic: SegmentationFilterLogic) -> None:
+        task_id = seg_filter_logic.scene_object._id
+        if task_id in self.save_tasks:
+            return
+        if seg_filter_logic.source_database_id is None:
+            logger.warning(f"Cannot save {seg_filter_logic.scene_object.name}: its volume is not a Girder item")
+            return
+
+        async def _save():
+            try:
+                await self._save_labelmap(seg_filter_logic)
+            finally:
+                seg_filter_logic.scene_object_filter.is_saving = False
+                self.state.flush()
+                self.save_tasks.pop(task_id, None)
+
+        self.save_tasks[task_id] = create_task(_save())
+
+    def _set_progress(self, seg_filter_logic: SegmentationFilterLogic, progress: float) -> None:
+        seg_filter_logic.scene_object_filter.save_progress = round(progress)
+        self.state.flush()
+
+    async def _save_labelmap(self, seg_filter_logic: SegmentationFilterLogic) -> None:
+        loop = asyncio.get_running_loop()
+        filter_properties = seg_filter_logic.scene_object_filter
+        file_name = f"{seg_filter_logic.scene_object.name}{filter_properties.save_format}"
+        filter_properties.is_saving = True
+        self._set_progress(seg_filter_logic, 0)
+
+        def encode_progress(fraction: float) -> None:
+            loop.call_soon_threadsafe(self._set_progress, seg_filter_logic, fraction * ENCODE_PROGRESS)
+
+        def upload_progress(status: dict[str, Any]) -> None:
+            fraction = status["current"] / status["total"] if status["total"] else 1
+            loop.call_soon_threadsafe(
+                self._set_progress, seg_filter_logic, ENCODE_PROGRESS + fraction * (100 - ENCODE_PROGRESS)
+            )
+
+        filter_properties.save_error = ""
+        try:
+            with tempfile.TemporaryDirectory(dir=self._temp_directory) as temp_directory:
+                file_path = Path(temp_directory) / file_name
+                # The labelmap can be edited while it is encoded: the snapshot keeps its voxels at save time
+                labelmap = seg_filter_logic.object_data
+                snapshot = create_scalars_snapshot(labelmap)
+                try:
+                    await loop.run_in_executor(
+                        self._executor,
+                        write_labelmap,
+                        snapshot,
+                        file_path,
+                        seg_filter_logic.get_labelmap_segments(),
+                        encode_progress,
+                    )
+                finally:
+                    release_scalars_snapshot(snapshot, labelmap)
+
+                source_item = await loop.run_in_executor(
+                    self._executor, self.girder_client.getItem, seg_filter_logic.source_database_id
+                )
+                item = await loop.run_in_executor(
+                    self._executor,
+                    lambda: self.girder_client.createItem(source_item["folderId"], file_name, reuseExisting=True),
+                )
+                await loop.run_in_executor(
+                    self._executor,
+                    lambda: self.girder_client.uploadFileToItem(
+                        item["_id"], str(file_path), progressCallback=upload_progress
+                    ),
+                )
+                logger.info(f"Saved {file_name} to Girder item {item['_id']}")
+        # Connection errors of the Girder client are OSError too
+        except (HttpError, OSError) as e:
+            logger.exception(f"Error saving {file_name}")
+            filter_properties.save_error = f"Error saving {file_name}: {e}"
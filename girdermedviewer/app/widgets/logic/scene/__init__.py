@@ -1,3 +1,4 @@
+from .filters.segmentation_filter_logic import SegmentationFilterLogic
 from .objects.scene_object_logic import (
     SceneObject,
     SceneObjectInfo,
@@ -10,4 +11,5 @@ __all__ = [
     "SceneObject",
     "SceneObjectInfo",
     "SceneObjectMetadata",
+    "SegmentationFilterLogic",
 ]
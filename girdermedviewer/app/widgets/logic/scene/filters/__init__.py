@@ -1,7 +1,11 @@
 from ....utils import FilterType
-from .gaussian_filter_logic import GaussianFilterLogic
+from . import image_filter_definitions  # noqa: F401 Registers the built-in image filters
+from .image_filter_logic import IMAGE_FILTERS, ImageFilterLogic
 from .segmentation_filter_logic import SegmentationFilterLogic
 
-FILTER_MAP = {FilterType.GAUSSIAN_BLUR: GaussianFilterLogic, FilterType.SEGMENTATION: SegmentationFilterLogic}
+FILTER_MAP = {
+    **dict.fromkeys(IMAGE_FILTERS, ImageFilterLogic),
+    FilterType.SEGMENTATION: SegmentationFilterLogic,
+}
 
-__all__ = ["FILTER_MAP"]
+__all__ = ["FILTER_MAP", "IMAGE_FILTERS"]
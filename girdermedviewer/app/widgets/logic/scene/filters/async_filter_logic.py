@@ -0,0 +1,308 @@
+import asyncio
+import logging
+from abc import abstractmethod
+from collections.abc import Callable
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any
+
+from trame_dataclass.v2 import StateDataModel, Sync
+from trame_server.utils.asynchronous import create_task
+from vtk import vtkAlgorithm, vtkImageData
+
+from ....utils import (
+    SHARED_FILTER_RESULTS,
+    FilterPipeline,
+    SceneObjectSubtype,
+    VectorFieldGrids,
+    VolumeHistogram,
+    get_preview_shrink_factor,
+    hash_filter_output,
+    hash_image,
+    have_same_geometry,
+)
+from ..objects.volume_object_logic import VolumeObjectLogic
+
+logger = logging.getLogger(__name__)
+
+
+class FilterMemoryBudget:
+    """
+    Memory used by the filters of a session: their outputs and the temporary data of their runs.
+    Runs that would exceed budget bytes are refused, 0 for no limit.
+    """
+
+    def __init__(self, budget: int = 0) -> None:
+        self.budget = budget
+        self._allocations: dict[str, int] = {}
+
+    @property
+    def nbytes(self) -> int:
+        return sum(self._allocations.values())
+
+    def get_available(self, owner_id: str) -> int:
+        return self.budget - self.nbytes + self._allocations.get(owner_id, 0)
+
+    def reserve(self, owner_id: str, nbytes: int) -> bool:
+        """Set the memory used by owner_id to nbytes if it fits in the budget"""
+        if self.budget > 0 and nbytes > self.get_available(owner_id):
+            return False
+        self._allocations[owner_id] = nbytes
+        return True
+
+    def release(self, owner_id: str) -> None:
+        self._allocations.pop(owner_id, None)
+
+
+class AsyncFilterProperties(StateDataModel):
+    is_running = Sync(bool, False)
+    # Why the last run was not done
+    error = Sync(str, "")
+
+
+class AsyncFilterLogic(VolumeObjectLogic):
+    """
+    Volume filter run in a worker thread when its parameters change, so that the session is not blocked.
+    Parameter changes are debounced and a new run cancels the runs it supersedes. Large volumes are first filtered
+    shrunk to preview the result, then at full resolution. The filter and its pipelines are created once and reused
+    by the runs. The scalars of each result are shared with the same output volume, which is only replaced when
+    the filter changes its geometry or type.
+    Outputs are cached under the hash of their input and parameters, so filters can be chained: a filter runs
+    again when the full resolution output of the filter it is applied to changes, or when its input is modified in
+    place, like 4D volumes showing another frame.
+    """
+
+    DEBOUNCE_DELAY = 0.1
+    # Volumes with more voxels are previewed
+    PREVIEW_MAX_VOXELS = 1 << 21
+
+    scene_object_filter: AsyncFilterProperties
+    # Whether a result on a shrunk input resampled to the input geometry previews the output
+    supports_preview = True
+
+    def __init__(
+        self,
+        original_logic: VolumeObjectLogic,
+        *args,
+        number_of_threads: int = 0,
+        memory_budget: FilterMemoryBudget | None = None,
+        **kwargs,
+    ) -> None:
+        super().__init__(*args, **kwargs)
+        self.soft_input_id = original_logic._id
+        self.original_logic = original_logic
+        self.number_of_threads = number_of_threads
+        self._memory_budget = memory_budget if memory_budget is not None else FilterMemoryBudget()
+        self._executor = ThreadPoolExecutor(1)
+        self._run_task: asyncio.Task | None = None
+        # Incremented by each run, for superseded runs to drop their result
+        self._run_generation = 0
+        self._running_filter: vtkAlgorithm | None = None
+        # Pipeline of each shrink factor, only used in the worker thread
+        self._pipelines: dict[int, FilterPipeline] = {}
+        # Key of the full resolution output, None while it is computed
+        self.output_key: str | None = None
+        # Hash of the input if it has no key, valid while the input has the hashed modification time
+        self._input_hash: str | None = None
+        self._input_hash_mtime = 0
+        # Key of the input of the last run
+        self._run_input_key: str | None = None
+
+        # Displayed until the first run is done
+        self.object_data = vtkImageData()
+        self.object_data.DeepCopy(original_logic.object_data)
+        self._memory_budget.reserve(self._id, self.object_data.GetActualMemorySize() * 1024)
+        self._init_display_properties()
+
+        original_logic.updated.connect(self._on_input_updated)
+
+    @abstractmethod
+    def _get_parameters(self) -> dict[str, Any]:
+        """Parameters of the next run"""
+
+    @abstractmethod
+    def _create_filter(self) -> vtkAlgorithm:
+        """Filter without input, reused by the runs"""
+
+    @abstractmethod
+    def _set_filter_parameters(
+        self, image_filter: vtkAlgorithm, parameters: dict[str, Any], shrink_factor: int
+    ) -> None:
+        """Set the parameters of a run on a volume shrunk shrink_factor times for previews"""
+
+    @abstractmethod
+    def _get_memory_cost(self, parameters: dict[str, Any]) -> float:
+        """Memory used by a run, output included, in multiples of the input size"""
+
+    def _get_input_key(self) -> str | None:
+        if isinstance(self.original_logic, AsyncFilterLogic):
+            return self.original_logic.output_key
+        if self.original_logic.shared_data_key is not None:
+            return self.original_logic.shared_data_key
+        input_data = self.original_logic.object_data
+        if input_data is None or input_data.GetMTime() != self._input_hash_mtime:
+            return None
+        return self._input_hash
+
+    def _on_input_updated(self) -> None:
+        input_key = self._get_input_key()
+        if input_key is None and isinstance(self.original_logic, AsyncFilterLogic):
+            # Previews of the input are not filtered
+            return
+        # Inputs without key were modified since they were hashed
+        if input_key is None or input_key != self._run_input_key:
+            self.run_filter()
+
+    def run_filter(self, delay: float = DEBOUNCE_DELAY) -> None:
+        self._cancel_run()
+        self._run_generation += 1
+        self._run_task = create_task(self._run(self._run_generation, delay))
+
+    def _cancel_run(self) -> None:
+        if self._run_task is not None:
+            self._run_task.cancel()
+            self._run_task = None
+        running_filter = self._running_filter
+        if running_filter is not None:
+            running_filter.SetAbortExecute(True)
+
+    def _execute(self, input_data: vtkImageData, parameters: dict[str, Any], shrink_factor: int) -> vtkImageData:
+        """Run in the worker thread"""
+        pipeline = self._pipelines.get(shrink_factor)
+        if pipeline is None:
+            pipeline = self._pipelines[shrink_factor] = FilterPipeline(self._create_filter(), shrink_factor)
+        self._set_filter_parameters(pipeline.image_filter, parameters, shrink_factor)
+        self._running_filter = pipeline.image_filter
+        try:
+            return pipeline.execute(input_data)
+        finally:
+            self._running_filter = None
+
+    def _set_error(self, error: str) -> None:
+        self.scene_object_filter.error = error
+        if error:
+            logger.warning(f"{self.scene_object.name}: {error}")
+
+    async def _run(self, generation: int, delay: float) -> None:
+        await asyncio.sleep(delay)
+        loop = asyncio.get_running_loop()
+        input_data = self.original_logic.object_data
+        input_key = self._get_input_key()
+        if input_data is None or (input_key is None and isinstance(self.original_logic, AsyncFilterLogic)):
+            # The filter runs again when its input is computed
+            return
+
+        def _is_superseded() -> bool:
+            return generation != self._run_generation or self.object_data is None or self._get_input_key() != input_key
+
+        self.scene_object_filter.is_running = True
+        try:
+            if input_key is None:
+                input_mtime = input_data.GetMTime()
+                input_key = await loop.run_in_executor(self._executor, hash_image, input_data)
+                self._input_hash, self._input_hash_mtime = input_key, input_mtime
+                if generation != self._run_generation:
+                    return
+            parameters = self._get_parameters()
+            self._run_input_key = input_key
+            output_key = hash_filter_output(input_key, self.scene_object.filter_type.value, parameters)
+            output = SHARED_FILTER_RESULTS.get(output_key)
+            if output is not None:
+                logger.debug(f"{self.scene_object.name} output found in cache")
+            else:
+                output = await self._compute_output(input_data, parameters, _is_superseded)
+                if output is None:
+                    return
+                SHARED_FILTER_RESULTS.add(output_key, output)
+
+            histogram = await loop.run_in_executor(self._executor, VolumeHistogram.compute, output)
+            if _is_superseded():
+                return
+            self._set_output(output, output_key, histogram)
+        finally:
+            if self.object_data is not None:
+                self._memory_budget.reserve(self._id, self._get_output_size())
+            if generation == self._run_generation:
+                self._run_task = None
+                self.scene_object_filter.is_running = False
+                self.state.flush()
+
+    async def _compute_output(
+        self, input_data: vtkImageData, parameters: dict[str, Any], is_superseded: Callable[[], bool]
+    ) -> vtkImageData | None:
+        """Full resolution output, previewed first for large inputs. None if the run is refused or superseded."""
+        input_size = input_data.GetActualMemorySize() * 1024
+        memory_cost = int(self._get_memory_cost(parameters) * input_size)
+        if not self._memory_budget.reserve(self._id, self._get_output_size() + memory_cost):
+            available = self._memory_budget.get_available(self._id) - self._get_output_size()
+            self._set_error(
+                f"Not enough memory: the filter needs {memory_cost // 2**20} MB,"
+                f" {max(available, 0) // 2**20} MB are left in the session budget"
+            )
+            return None
+        self._set_error("")
+
+        loop = asyncio.get_running_loop()
+        preview_shrink_factor = get_preview_shrink_factor(input_data, self.PREVIEW_MAX_VOXELS)
+        if self.supports_preview and preview_shrink_factor > 1:
+            preview = await loop.run_in_executor(
+                self._executor, self._execute, input_data, parameters, preview_shrink_factor
+            )
+            if is_superseded():
+                return None
+            self._set_output(preview, None, None)
+
+        output = await loop.run_in_executor(self._executor, self._execute, input_data, parameters, 1)
+        return None if is_superseded() else output
+
+    def _get_output_size(self) -> int:
+        return self.object_data.GetActualMemorySize() * 1024 if self.object_data is not None else 0
+
+    def _set_output(self, output: vtkImageData, output_key: str | None, histogram: VolumeHistogram | None) -> None:
+        """Show output, the full resolution output if output_key is given"""
+        is_replaced = not have_same_geometry(output, self.object_data) or (
+            output.GetScalarType() != self.object_data.GetScalarType()
+            or output.GetNumberOfScalarComponents() != self.object_data.GetNumberOfScalarComponents()
+        )
+        # Outputs are never modified, their scalars are shared instead of copied
+        if is_replaced:
+            self.object_data = vtkImageData()
+            self.object_data.ShallowCopy(output)
+            if self.display.vector_field is not None:
+                self.display.vector_field = VectorFieldGrids(self.object_data)
+        else:
+            self.object_data.GetPointData().ShallowCopy(output.GetPointData())
+            self.object_data.Modified()
+        logger.debug(f"{self.scene_object.name} output {'replaced' if is_replaced else 'updated'}")
+
+        self.output_key = output_key
+        if output_key is not None:
+            self._update_scalar_range(histogram)
+        if is_replaced:
+            self.object_data_replaced()
+        self.updated()
+
+    def _update_scalar_range(self, histogram: VolumeHistogram | None) -> None:
+        """Follow the scalar range of the output, the window level and rendering shift if they do not fit it"""
+        scalar_range = list(self.object_data.GetScalarRange())
+
+        def _fits(value_range: list[float] | None) -> bool:
+            return bool(value_range) and scalar_range[0] <= value_range[0] and value_range[1] <= scalar_range[1]
+
+        is_window_level_reset = not _fits(self.display.window_level)
+        self.scalar_range = scalar_range
+        self.display.scalar_range = scalar_range
+        if is_window_level_reset:
+            self.display.window_level = scalar_range
+        if self.display.threed_color is not None and not _fits(self.display.threed_color.vr_shift):
+            self.display.threed_color.vr_shift = scalar_range
+        if histogram is not None and self.scene_object.object_subtype == SceneObjectSubtype.SCALAR:
+            self.set_histogram(histogram)
+
+    def release_object_data(self) -> None:
+        self._cancel_run()
+        self._run_generation += 1
+        self._executor.shutdown(wait=False, cancel_futures=True)
+        self._pipelines = {}
+        self._memory_budget.release(self._id)
+        self.original_logic.updated.disconnect(self._on_input_updated)
+        super().release_object_data()
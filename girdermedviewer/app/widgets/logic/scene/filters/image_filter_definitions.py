@@ -0,0 +1,103 @@
+from vtk import vtkAlgorithm
+
+from ....utils import (
+    BiasFieldCorrection,
+    FilterType,
+    create_gaussian_filter,
+    create_gradient_magnitude_filter,
+    create_median_filter,
+    create_resample_filter,
+    create_threshold_mask_filter,
+    set_median_kernel_size,
+    set_resample_spacing_factor,
+)
+from .image_filter_logic import (
+    FilterParameter,
+    ImageFilterDefinition,
+    register_image_filter,
+)
+
+
+def _set_gaussian_parameters(gaussian: vtkAlgorithm, parameters: dict[str, float], shrink_factor: int) -> None:
+    # The standard deviation is in voxels
+    gaussian.SetStandardDeviation(parameters["sigma"] / shrink_factor)
+
+
+def _set_median_parameters(median: vtkAlgorithm, parameters: dict[str, float], shrink_factor: int) -> None:
+    set_median_kernel_size(median, round(parameters["kernel_size"] / shrink_factor))
+
+
+def _set_threshold_mask_parameters(threshold: vtkAlgorithm, parameters: dict[str, float], _shrink_factor: int) -> None:
+    threshold.ThresholdBetween(parameters["lower"], parameters["upper"])
+
+
+def _set_resample_parameters(resample: vtkAlgorithm, parameters: dict[str, float], _shrink_factor: int) -> None:
+    set_resample_spacing_factor(resample, parameters["spacing_factor"])
+
+
+def _set_bias_correction_parameters(
+    bias_correction: vtkAlgorithm, parameters: dict[str, float], shrink_factor: int
+) -> None:
+    bias_correction.smoothness = parameters["smoothness"] / shrink_factor
+    bias_correction.shrink_factor = max(1, BiasFieldCorrection.SHRINK_FACTOR // shrink_factor)
+
+
+register_image_filter(
+    ImageFilterDefinition(
+        FilterType.GAUSSIAN_BLUR,
+        lambda number_of_threads: create_gaussian_filter(number_of_threads=number_of_threads),
+        memory_cost=lambda _parameters: 2,
+        set_parameters=_set_gaussian_parameters,
+        parameters=(FilterParameter("sigma", "Sigma", 1, 0, 10),),
+    )
+)
+register_image_filter(
+    ImageFilterDefinition(
+        FilterType.MEDIAN,
+        lambda number_of_threads: create_median_filter(1, number_of_threads),
+        memory_cost=lambda _parameters: 2,
+        set_parameters=_set_median_parameters,
+        parameters=(FilterParameter("kernel_size", "Kernel size", 3, 1, 9, step=2),),
+    )
+)
+register_image_filter(
+    ImageFilterDefinition(
+        FilterType.GRADIENT_MAGNITUDE,
+        create_gradient_magnitude_filter,
+        memory_cost=lambda _parameters: 2,
+    )
+)
+register_image_filter(
+    ImageFilterDefinition(
+        FilterType.THRESHOLD_MASK,
+        lambda number_of_threads: create_threshold_mask_filter(0, 0, number_of_threads),
+        # Unsigned char output
+        memory_cost=lambda _parameters: 1.5,
+        set_parameters=_set_threshold_mask_parameters,
+        parameters=(
+            FilterParameter("lower", "Lower threshold (%)", 50, 0, 100, in_scalar_range=True),
+            FilterParameter("upper", "Upper threshold (%)", 100, 0, 100, in_scalar_range=True),
+        ),
+    )
+)
+register_image_filter(
+    ImageFilterDefinition(
+        FilterType.RESAMPLE,
+        lambda number_of_threads: create_resample_filter(1, number_of_threads),
+        memory_cost=lambda parameters: 1 + 1 / parameters["spacing_factor"] ** 3,
+        set_parameters=_set_resample_parameters,
+        parameters=(FilterParameter("spacing_factor", "Spacing factor", 2, 0.5, 4, step=0.5),),
+        # The output has another geometry
+        supports_preview=False,
+    )
+)
+register_image_filter(
+    ImageFilterDefinition(
+        FilterType.BIAS_CORRECTION,
+        lambda _number_of_threads: BiasFieldCorrection(),
+        # Float copies of the volume, its log, its mask and their smoothing
+        memory_cost=lambda _parameters: 8,
+        set_parameters=_set_bias_correction_parameters,
+        parameters=(FilterParameter("smoothness", "Smoothness", 20, 5, 50),),
+    )
+)
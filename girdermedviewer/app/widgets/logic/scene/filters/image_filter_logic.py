@@ -0,0 +1,93 @@
+from collections.abc import Callable
+from dataclasses import asdict, dataclass
+from typing import Any
+
+from trame_dataclass.v2 import Sync, TypeValidation
+from vtk import vtkAlgorithm
+
+from ....utils import FilterType
+from .async_filter_logic import AsyncFilterLogic, AsyncFilterProperties
+
+
+@dataclass(frozen=True)
+class FilterParameter:
+    name: str
+    label: str
+    default: float
+    minimum: float
+    maximum: float
+    step: float = 1.0
+    # The value is a percentage of the scalar range of the input volume
+    in_scalar_range: bool = False
+
+
+@dataclass(frozen=True)
+class ImageFilterDefinition:
+    """
+    Image filter that can be applied to a volume.
+    create_filter(number_of_threads) returns the filter without input, reused by the runs.
+    set_parameters(filter, parameters, shrink_factor) sets the parameters of a run, on an input shrunk shrink_factor
+    times when previewing. memory_cost(parameters) is the memory used by a run, output included, in multiples of
+    the input size.
+    """
+
+    filter_type: FilterType
+    create_filter: Callable[[int], vtkAlgorithm]
+    memory_cost: Callable[[dict[str, float]], float]
+    set_parameters: Callable[[vtkAlgorithm, dict[str, float], int], None] = lambda *_args: None
+    parameters: tuple[FilterParameter, ...] = ()
+    # Whether the filter output keeps the geometry of its input, so that it can be previewed on a shrunk input
+    supports_preview: bool = True
+
+
+IMAGE_FILTERS: dict[FilterType, ImageFilterDefinition] = {}
+
+
+def register_image_filter(definition: ImageFilterDefinition) -> None:
+    IMAGE_FILTERS[definition.filter_type] = definition
+
+
+class ImageFilterProperties(AsyncFilterProperties):
+    parameters = Sync(dict[str, float], dict, type_checking=TypeValidation.SKIP)
+    parameter_specs = Sync(list[dict[str, Any]], list)
+
+
+class ImageFilterLogic(AsyncFilterLogic):
+    """Filter of IMAGE_FILTERS run again each time its parameters change"""
+
+    def __init__(self, *args, **kwargs) -> None:
+        super().__init__(*args, **kwargs)
+        self.definition = IMAGE_FILTERS[self.scene_object.filter_type]
+        self.supports_preview = self.definition.supports_preview
+        self.scene_object_filter = ImageFilterProperties(
+            self.server,
+            parameters={parameter.name: parameter.default for parameter in self.definition.parameters},
+            parameter_specs=[asdict(parameter) for parameter in self.definition.parameters],
+        )
+        self.scene_object.filter_prop_id = self.scene_object_filter._id
+
+        self.scene_object_filter.watch(("parameters",), self._update_parameters, eager=True)
+
+    def _get_parameters(self) -> dict[str, Any]:
+        scalar_range = self.original_logic.object_data.GetScalarRange()
+        parameters = {}
+        for parameter in self.definition.parameters:
+            value = float(self.scene_object_filter.parameters.get(parameter.name, parameter.default))
+            if parameter.in_scalar_range:
+                value = scalar_range[0] + value / 100 * (scalar_range[1] - scalar_range[0])
+            parameters[parameter.name] = value
+        return parameters
+
+    def _create_filter(self) -> vtkAlgorithm:
+        return self.definition.create_filter(self.number_of_threads)
+
+    def _set_filter_parameters(
+        self, image_filter: vtkAlgorithm, parameters: dict[str, Any], shrink_factor: int
+    ) -> None:
+        self.definition.set_parameters(image_filter, parameters, shrink_factor)
+
+    def _get_memory_cost(self, parameters: dict[str, Any]) -> float:
+        return self.definition.memory_cost(parameters)
+
+    def _update_parameters(self, _parameters: dict[str, float]) -> None:
+        self.run_filter()
@@ -1,10 +1,31 @@
-from trame_dataclass.v2 import ServerOnly, StateDataModel, Sync
-from vtk import VTK_UNSIGNED_CHAR
-
-from ....utils import SceneObjectSubtype, VolumeLayer, get_random_color
+from trame_dataclass.v2 import ServerOnly, StateDataModel, Sync, TypeValidation
+from vtkmodules.util.numpy_support import get_vtk_to_numpy_typemap, numpy_to_vtk
+from vtkmodules.vtkCommonCore import VTK_UNSIGNED_CHAR, VTK_UNSIGNED_SHORT
+
+from ....utils import (
+    SHARED_DATASETS,
+    LabelMapDiff,
+    LabelMapFormat,
+    LabelMapSegment,
+    LabelMapStatistics,
+    SceneObjectSubtype,
+    SparseSegmentMasks,
+    VolumeLayer,
+    convert_color_hex_to_normalized_rgb,
+    convert_normalized_rgb_to_color_hex,
+    create_labelmap_scalars,
+    create_shared_labelmap,
+    create_shared_scalars_image,
+    get_random_color,
+    load_volume,
+    read_labelmap_segments,
+    release_shared_scalars,
+)
 from ..objects.volume_object_logic import BaseVolumeObjectLogic, VolumeObjectLogic
 
 MAX_SEGMENTS_PER_LABELMAP = 255
+# Labelmaps with more segments are stored as unsigned short
+MAX_UNSIGNED_SHORT_SEGMENTS = 65535
 
 
 class SegmentDisplay(StateDataModel):
@@ -12,9 +33,17 @@ class SegmentDisplay(StateDataModel):
     is_visible = Sync(bool, True)
 
 
+class SegmentStatistics(StateDataModel):
+    voxel_count = Sync(int, 0)
+    volume = Sync(float, 0.0, type_checking=TypeValidation.SKIP)
+    centroid = Sync(list[float] | None)
+    bounds = Sync(list[float] | None)
+
+
 class SegmentProperties(StateDataModel):
     name = Sync(str)
     display = Sync(SegmentDisplay, has_dataclass=True)
+    statistics = Sync(SegmentStatistics, has_dataclass=True)
     value = ServerOnly(int)
     is_color_dialog_visible = Sync(bool, False)
 
@@ -22,16 +51,26 @@ class SegmentProperties(StateDataModel):
 class SegmentationFilterProperties(StateDataModel):
     is_active = Sync(bool, False)
     segments = Sync(list[SegmentProperties], list, has_dataclass=True)
+    save_format = Sync(str, LabelMapFormat.SEG_NRRD.value)
+    is_saving = Sync(bool, False)
+    save_progress = Sync(int, 0)
+    save_error = Sync(str, "")
 
 
 class SegmentationFilterLogic(BaseVolumeObjectLogic):
     def __init__(
         self,
-        original_logic: VolumeObjectLogic,
+        original_logic: VolumeObjectLogic | None,
         *args,
+        max_segments: int = MAX_SEGMENTS_PER_LABELMAP,
         **kwargs,
     ) -> None:
+        """
+        original_logic: volume to segment, the labelmap starts empty with its geometry.
+        Without it, the labelmap is loaded from a label volume file with load_object_data(file_path, label_values).
+        """
         super().__init__(*args, **kwargs)
+        self.max_segments = min(max(max_segments, 1), MAX_UNSIGNED_SHORT_SEGMENTS)
         self.scene_object.object_subtype = SceneObjectSubtype.LABELMAP
         self.layer = VolumeLayer.SECONDARY
 
@@ -39,36 +78,101 @@ class SegmentationFilterLogic(BaseVolumeObjectLogic):
         self.scene_object_filter = SegmentationFilterProperties(self.server)
         self.scene_object.filter_prop_id = self.scene_object_filter._id
 
-        self.original_data = original_logic.object_data
-        self.load_object_data()
+        # Volume whose intensities are used by the threshold effects
+        self.original_data = original_logic.object_data if original_logic is not None else None
+        # Girder item next to which the labelmap is saved: the item of its volume, or its own item
+        self.source_database_id = (original_logic or self).scene_object.database_id
+        self.statistics: LabelMapStatistics | None = None
+        # Voxels hidden by overlapping segments, enabled by the first edit letting segments overlap
+        self.segment_masks: SparseSegmentMasks | None = None
+        if original_logic is not None:
+            self.load_object_data()
 
-    def load_object_data(self) -> None:
-        self.object_data = self.original_data.NewInstance()
-        self.object_data.CopyStructure(self.original_data)
-        self.object_data.AllocateScalars(VTK_UNSIGNED_CHAR, 1)
-        self.object_data.GetPointData().GetScalars().FillComponent(0, 0)
+    @property
+    def scalar_type(self) -> int:
+        return VTK_UNSIGNED_CHAR if self.max_segments <= MAX_SEGMENTS_PER_LABELMAP else VTK_UNSIGNED_SHORT
+
+    def load_object_data(self, file_path: str | None = None, label_values: list[int] | None = None) -> None:
+        if file_path is None:
+            # Copy-on-write: the empty labelmap is shared until it is first painted
+            self.object_data = create_shared_labelmap(self.original_data, self.scalar_type)
+            segments = []
+        else:
+            segments = self._load_labelmap(file_path, label_values or [])
+
+        self.statistics = LabelMapStatistics(self.object_data, self.max_segments, is_empty=file_path is None)
+        self.segment_masks = SparseSegmentMasks(tuple(reversed(self.object_data.GetDimensions())))
+        for segment in segments:
+            color = convert_normalized_rgb_to_color_hex(segment.color) if segment.color is not None else None
+            self.create_segment(segment.value, segment.name, color)
+
+    def _load_labelmap(self, file_path: str, label_values: list[int]) -> list[LabelMapSegment]:
+        """Load the labelmap of a label volume file, return a segment per label"""
+        volume = self._load_shared_data(file_path, load_volume)
+        dtype = get_vtk_to_numpy_typemap()[self.scalar_type]
+        file_segments = {segment.value: segment for segment in read_labelmap_segments(file_path)}
+
+        if volume.GetScalarType() == self.scalar_type and max(label_values, default=0) <= self.max_segments:
+            # Copy-on-write: the labels are shared with the other sessions until they are first painted
+            self.object_data = create_shared_scalars_image(volume, f"{self._shared_data_key}:labels")
+            value_map = {value: value for value in label_values}
+        else:
+            labels, value_map = create_labelmap_scalars(volume, label_values, dtype, self.max_segments)
+            self.object_data = volume.NewInstance()
+            self.object_data.CopyStructure(volume)
+            self.object_data.GetPointData().SetScalars(numpy_to_vtk(labels))
+            # The labels are copied: the volume is no longer needed
+            SHARED_DATASETS.release(self._shared_data_key)
+            self._shared_data_key = None
+
+        return [
+            LabelMapSegment(
+                value_map[value],
+                file_segments[value].name if value in file_segments else f"Segment_{value}",
+                file_segments[value].color if value in file_segments else None,
+            )
+            for value in label_values
+        ]
+
+    def release_object_data(self) -> None:
+        release_shared_scalars(self.object_data)
+        if self.segment_masks is not None:
+            self.segment_masks.disable()
+        super().release_object_data()
 
     @property
     def segments(self) -> list[SegmentProperties]:
         return self.scene_object_filter.segments
 
+    def get_labelmap_segments(self) -> list[LabelMapSegment]:
+        return [
+            LabelMapSegment(segment.value, segment.name, convert_color_hex_to_normalized_rgb(segment.display.color))
+            for segment in self.segments
+        ]
+
     def update_next_segment_id(self):
-        existing_segment_ids = [segment.value for segment in self.segments]
+        existing_segment_ids = {segment.value for segment in self.segments}
         self._next_segment_id = next(
-            (val for val in range(1, MAX_SEGMENTS_PER_LABELMAP + 1) if val not in existing_segment_ids),
+            (val for val in range(1, self.max_segments + 1) if val not in existing_segment_ids),
             None,
         )
 
-    def create_segment(self) -> SegmentProperties:
-        if self._next_segment_id is None:
-            raise ValueError(f"Labelmap cannot exceed {MAX_SEGMENTS_PER_LABELMAP} segments.")
+    def create_segment(
+        self, value: int | None = None, name: str | None = None, color: str | None = None
+    ) -> SegmentProperties:
+        """Create a segment of the given label value, the next free value by default"""
+        value = value if value is not None else self._next_segment_id
+        if value is None:
+            raise ValueError(f"Labelmap cannot exceed {self.max_segments} segments.")
 
         new_segment = SegmentProperties(
             self.server,
-            name=f"Segment_{self._next_segment_id}",
-            value=self._next_segment_id,
-            display=SegmentDisplay(self.server, color=get_random_color()),
+            name=name or f"Segment_{value}",
+            value=value,
+            display=SegmentDisplay(self.server, color=color or get_random_color()),
+            statistics=SegmentStatistics(self.server),
         )
+        self._update_segment_statistics(new_segment)
         self.scene_object_filter.segments = [*self.segments, new_segment]
         self.update_next_segment_id()
         return new_segment
@@ -76,3 +180,17 @@ class SegmentationFilterLogic(BaseVolumeObjectLogic):
     def delete_segment(self, deleted_segment_id: str) -> None:
         self.scene_object_filter.segments = [segment for segment in self.segments if segment._id != deleted_segment_id]
         self.update_next_segment_id()
+
+    def update_statistics(self, diff: LabelMapDiff) -> None:
+        """Update the statistics of the segments changed by an edit of the labelmap"""
+        self.statistics.update(diff)
+        changed_values = set(diff.values.tolist())
+        for segment in self.segments:
+            if segment.value in changed_values:
+                self._update_segment_statistics(segment)
+
+    def _update_segment_statistics(self, segment: SegmentProperties) -> None:
+        segment.statistics.voxel_count = self.statistics.get_voxel_count(segment.value)
+        segment.statistics.volume = self.statistics.get_volume(segment.value)
+        segment.statistics.centroid = self.statistics.get_centroid(segment.value)
+        segment.statistics.bounds = self.statistics.get_bounds(segment.value)
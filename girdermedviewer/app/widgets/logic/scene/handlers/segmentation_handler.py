@@ -27,7 +27,7 @@ class SegmentationDisplayHandler:
 
     def update_visibility(self, seg_logic: SegmentationFilterLogic) -> Callable:
         def _update_visibility(*_args):
-            for view in self.views_logic.slice_views:
+            for view in self.views_logic.views:
                 modified = view.volume_handler.update_volume_visibility(seg_logic._id, seg_logic.display)
                 if modified:
                     view.update()
@@ -48,7 +48,7 @@ class SegmentationDisplayHandler:
         self, seg_logic: SegmentationFilterLogic, segment_properties: SegmentProperties
     ) -> Callable:
         def _update_segment_color(*_args) -> None:
-            for view in self.views_logic.slice_views:
+            for view in self.views_logic.views:
                 modified = view.volume_handler.update_segment_color(
                     seg_logic._id, segment_properties.value, segment_properties.display
                 )
@@ -59,7 +59,7 @@ class SegmentationDisplayHandler:
 
     def update_segment_visibility(self, seg_logic: SegmentationFilterLogic, segment_properties: SegmentProperties):
         def _update_segment_visibility(*_args) -> None:
-            for view in self.views_logic.slice_views:
+            for view in self.views_logic.views:
                 modified = view.volume_handler.update_segment_visibility(
                     seg_logic._id, segment_properties.value, segment_properties.display
                 )
@@ -97,6 +97,9 @@ class SegmentationHandler(ObjectHandler):
             seg_filter_logic.layer,
             SceneObjectSubtype.LABELMAP,
         )
+        # Segments of a labelmap loaded from a file
+        for segment in seg_filter_logic.segments:
+            self._connect_segment_to_display_handler(seg_filter_logic, segment, eager=True)
 
     def remove_object_from_views(self, seg_filter_logic: SegmentationFilterLogic) -> None:
         self.unregister_object_from_views(seg_filter_logic)
@@ -112,7 +115,19 @@ class SegmentationHandler(ObjectHandler):
 
     def _connect_labelmap_to_display_handler(self, seg_filter_logic: SegmentationFilterLogic):
         seg_filter_logic.display.watch(("opacity",), self._display_handler.update_opacity(seg_filter_logic))
-        seg_filter_logic.display.watch(("is_visible",), self._display_handler.update_visibility(seg_filter_logic))
+        seg_filter_logic.display.watch(
+            ("is_visible", "is_threed_visible"), self._display_handler.update_visibility(seg_filter_logic)
+        )
+
+    def _connect_segment_to_display_handler(
+        self, seg_filter_logic: SegmentationFilterLogic, segment: SegmentProperties, eager: bool = False
+    ) -> None:
+        segment.display.watch(
+            ("color",), self._display_handler.update_segment_color(seg_filter_logic, segment), eager=eager
+        )
+        segment.display.watch(
+            ("is_visible",), self._display_handler.update_segment_visibility(seg_filter_logic, segment), eager=eager
+        )
 
     def select_segment_in_labelmap(
         self, seg_filter_logic: SegmentationFilterLogic | None, segment_id: str | None = None
@@ -134,10 +149,7 @@ class SegmentationHandler(ObjectHandler):
 
     def add_segment_to_labelmap(self, seg_filter_logic: SegmentationFilterLogic) -> None:
         new_segment = seg_filter_logic.create_segment()
-        new_segment.display.watch(("color",), self._display_handler.update_segment_color(seg_filter_logic, new_segment))
-        new_segment.display.watch(
-            ("is_visible",), self._display_handler.update_segment_visibility(seg_filter_logic, new_segment)
-        )
+        self._connect_segment_to_display_handler(seg_filter_logic, new_segment)
         self.select_segment_in_labelmap(seg_filter_logic)
 
     def delete_segment_from_labelmap(self, seg_filter_logic: SegmentationFilterLogic, deleted_segment_id: str) -> None:
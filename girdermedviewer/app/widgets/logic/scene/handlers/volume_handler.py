@@ -1,9 +1,19 @@
+import asyncio
 import logging
 from collections.abc import Callable
+from concurrent.futures import ThreadPoolExecutor
 
 from trame_server.core import Server
-
-from ....utils import VolumeLayer, debounce, supported_volume_extensions
+from trame_server.utils.asynchronous import create_task
+
+from ....utils import (
+    SHARED_HISTOGRAMS,
+    SceneObjectSubtype,
+    VolumeHistogram,
+    VolumeLayer,
+    debounce,
+    supported_volume_extensions,
+)
 from ...vtk.views_logic import ViewsLogic
 from ..objects.volume_object_logic import VolumeObjectLogic
 from .object_handler import ObjectHandler
@@ -79,6 +89,13 @@ class VolumeDisplayHandler:
 
         return _update_window_level
 
+    def update_playback(self, volume_logic: VolumeObjectLogic) -> Callable:
+        def _update_playback(is_playing: bool) -> None:
+            for view in self.views_logic.threed_views:
+                view.set_playing(volume_logic._id, is_playing)
+
+        return _update_playback
+
 
 class VolumeHandler(ObjectHandler):
     def __init__(self, server: Server, views_logic: ViewsLogic):
@@ -86,6 +103,10 @@ class VolumeHandler(ObjectHandler):
         self._display_handler = VolumeDisplayHandler(self.views_logic)
         self.views_logic.window_level_changed.connect(self._update_active_primary_window_level)
 
+        # Histograms are computed in a worker thread not to delay the display of the volumes
+        self._histogram_executor = ThreadPoolExecutor(1)
+        self.histogram_tasks = {}
+
     @property
     def active_primary_volume_id(self) -> str | None:
         return self.data.active_primary_volume_id
@@ -146,7 +167,25 @@ class VolumeHandler(ObjectHandler):
             volume_logic.display.twod_color.watch(
                 ("name", "is_inverted"), self._display_handler.update_twod_coloring(volume_logic)
             )
+        if volume_logic.display.timeline is not None:
+            volume_logic.display.timeline.watch(("is_playing",), self._display_handler.update_playback(volume_logic))
         volume_logic.updated.connect(self.views_logic.update_views)
+        volume_logic.object_data_replaced.connect(self._reload_volume_data(volume_logic))
+
+    def _reload_volume_data(self, volume_logic: VolumeObjectLogic) -> Callable:
+        def _reload() -> None:
+            if volume_logic._id not in self.object_logics:
+                return
+            self.views_logic.remove_volume(volume_logic._id)
+            self.views_logic.add_volume(
+                volume_logic._id,
+                volume_logic.object_data,
+                volume_logic.display,
+                VolumeLayer.PRIMARY if self._is_primary_volume(volume_logic._id) else VolumeLayer.SECONDARY,
+                volume_logic.scene_object.object_subtype,
+            )
+
+        return _reload
 
     def _add_volume_to_views(self, volume_logic: VolumeObjectLogic, layer: VolumeLayer) -> None:
         if layer == VolumeLayer.PRIMARY:
@@ -210,6 +249,37 @@ class VolumeHandler(ObjectHandler):
             )
 
         self._add_volume_to_views(volume_logic, layer)
+        self._compute_histogram(volume_logic)
+
+    def _compute_histogram(self, volume_logic: VolumeObjectLogic) -> None:
+        if (
+            volume_logic.histogram is not None
+            or volume_logic.object_data is None
+            or volume_logic.scene_object.object_subtype not in (SceneObjectSubtype.SCALAR, SceneObjectSubtype.TENSOR)
+            or volume_logic._id in self.histogram_tasks
+        ):
+            return
+
+        shared_data_key = volume_logic.shared_data_key
+        histogram = SHARED_HISTOGRAMS.get(shared_data_key)
+        if histogram is not None:
+            volume_logic.set_histogram(histogram)
+            return
+
+        async def _compute():
+            try:
+                histogram = await asyncio.get_running_loop().run_in_executor(
+                    self._histogram_executor, VolumeHistogram.compute, volume_logic.object_data
+                )
+            finally:
+                self.histogram_tasks.pop(volume_logic._id, None)
+            SHARED_HISTOGRAMS.add(shared_data_key, histogram)
+            # Filters set the histogram of their output when it is computed
+            if volume_logic._id in self.object_logics and volume_logic.histogram is None:
+                volume_logic.set_histogram(histogram)
+                self.state.flush()
+
+        self.histogram_tasks[volume_logic._id] = create_task(_compute())
 
     def unregister_object_from_views(self, volume_logic: VolumeObjectLogic) -> None:
         volume_logic.display.clear_watchers()
@@ -44,7 +44,7 @@ class MeshObjectLogic(SceneObjectLogic):
         self.scene_object.flush()
 
     def load_object_data(self, file_path: str) -> None:
-        self.object_data = load_mesh(file_path)
+        self.object_data = self._load_shared_data(file_path, load_mesh)
         self._populate_data_arrays()
 
     def _create_data_array(self, arr, arr_type: DataArrayType) -> DataArray:
@@ -1,5 +1,7 @@
 import logging
 from abc import ABC, abstractmethod
+from collections.abc import Callable
+from typing import Any
 
 from trame_dataclass.v2 import (
     ClientOnly,
@@ -11,7 +13,13 @@ from trame_dataclass.v2 import (
 from trame_server import Server
 from undo_stack import Signal
 
-from ....utils import ICONS_MAP, FilterType, SceneObjectSubtype, SceneObjectType
+from ....utils import (
+    ICONS_MAP,
+    SHARED_DATASETS,
+    FilterType,
+    SceneObjectSubtype,
+    SceneObjectType,
+)
 from ...base_logic import BaseLogic
 
 logger = logging.getLogger(__name__)
@@ -104,15 +112,40 @@ class SceneObjectLogic(BaseLogic[None], ABC):
         self.object_data = None
         self.input_id = None
         self.soft_input_id = None
+        self._shared_data_key: str | None = None
 
     @property
     def is_visible(self) -> bool:
         return self.display.is_visible
 
+    @property
+    def shared_data_key(self) -> str | None:
+        """Key of the data shared between sessions, None if the data is owned by the object"""
+        return self._shared_data_key
+
     @abstractmethod
     def load_object_data(self, *args, **kwargs):
         pass
 
+    def _get_shared_data_key(self, file_path: str) -> str:
+        """The same Girder item is loaded once for all the sessions, until it is updated."""
+        if self.scene_object.database_id:
+            updated = self.scene_object.info.updated if self.scene_object.info is not None else ""
+            return f"{self.scene_object.database_id}:{updated}"
+        return file_path
+
+    def _load_shared_data(self, file_path: str, loader: Callable[[str], Any]) -> Any:
+        """Load the file data from the datasets shared between sessions. The returned data must not be modified."""
+        self._shared_data_key = self._get_shared_data_key(file_path)
+        return SHARED_DATASETS.acquire(self._shared_data_key, lambda: loader(file_path))
+
+    def release_object_data(self) -> None:
+        """Called when the object is removed from the scene."""
+        if self._shared_data_key is not None:
+            SHARED_DATASETS.release(self._shared_data_key)
+            self._shared_data_key = None
+        self.object_data = None
+
     def set_loading_status(self, loading: bool) -> None:
         self.scene_object.gui.loading = loading
 
@@ -1,15 +1,30 @@
+import asyncio
 import logging
+from typing import Any
 
 from trame_dataclass.v2 import (
+    ServerOnly,
     StateDataModel,
     Sync,
     TypeValidation,
 )
+from trame_server.utils.asynchronous import create_task
+from undo_stack import Signal
+from vtk import vtkImageData
 
 from ....utils import (
+    SHARED_DATASETS,
+    FrameCache,
+    NiftiFrameStore,
+    ScalarBlockRanges,
     SceneObjectSubtype,
     SceneObjectType,
+    VectorFieldGrids,
+    VolumeHistogram,
     VolumeLayer,
+    crop_volume,
+    get_label_values,
+    is_label_file,
     load_volume,
 )
 from .scene_object_logic import (
@@ -21,6 +36,10 @@ from .scene_object_logic import (
 
 logger = logging.getLogger(__name__)
 
+# Most values of a volume loaded as a labelmap: files marked as label volumes, other integer volumes
+MAX_LABEL_VALUES = 255
+MAX_AUTO_LABEL_VALUES = 32
+
 
 class NormalColor(StateDataModel):
     show_arrows = Sync(bool, False)
@@ -29,12 +48,30 @@ class NormalColor(StateDataModel):
     arrow_width = Sync(float, 0.03, type_checking=TypeValidation.SKIP)
 
 
+class Timeline(StateDataModel):
+    frame = Sync(int, 0, type_checking=TypeValidation.SKIP)
+    number_of_frames = Sync(int, 1)
+    # Seconds between two frames, 0 if unknown
+    frame_duration = Sync(float, 0, type_checking=TypeValidation.SKIP)
+    is_playing = Sync(bool, False)
+    fps = Sync(float, 20, type_checking=TypeValidation.SKIP)
+
+
 class VolumeDisplay(SceneObjectDisplay):
     scalar_range = Sync(list[float])
     window_level = Sync(list[float])
+    # Log scaled histogram drawn behind the range sliders, empty until computed
+    histogram = Sync(list[float], list)
+    window_level_presets = Sync(list[dict[str, Any]], list)
     threed_color = Sync(ThreeDColor, has_dataclass=True)
     twod_color = Sync(TwoDColor, has_dataclass=True)
     normal_color = Sync(NormalColor, has_dataclass=True)
+    # Frames of time series volumes
+    timeline = Sync(Timeline, has_dataclass=True)
+    # Used by the 3D views to skip the empty space of the volume
+    block_ranges = ServerOnly(ScalarBlockRanges | None, None)
+    # Subsampled grids of vector fields shared by the views
+    vector_field = ServerOnly(VectorFieldGrids | None, None)
 
 
 class BaseVolumeObjectLogic(SceneObjectLogic):
@@ -50,10 +87,29 @@ class BaseVolumeObjectLogic(SceneObjectLogic):
 
 
 class VolumeObjectLogic(BaseVolumeObjectLogic):
-    def __init__(self, *args, **kwargs) -> None:
+    # object_data was replaced by a volume of another geometry or type
+    object_data_replaced = Signal()
+
+    def __init__(
+        self,
+        *args,
+        max_label_values: int = MAX_LABEL_VALUES,
+        max_auto_label_values: int = MAX_AUTO_LABEL_VALUES,
+        **kwargs,
+    ) -> None:
         super().__init__(*args, **kwargs)
         self.scene_object.object_type = SceneObjectType.VOLUME
         self.scalar_range: list[float] = []
+        # Non-zero values of the volume if it looks like a labelmap
+        self.label_values: list[int] | None = None
+        self._max_label_values = max_label_values
+        self._max_auto_label_values = max_auto_label_values
+        self.histogram: VolumeHistogram | None = None
+        # Frames of 4D volumes, read from their file on demand
+        self.frames: FrameCache | None = None
+        self._frame_index = 0
+        self._requested_frame_index = 0
+        self._playback_task: asyncio.Task | None = None
 
     def _init_display_properties(self):
         if self.object_data is not None:
@@ -62,11 +118,16 @@ class VolumeObjectLogic(BaseVolumeObjectLogic):
             self.display.threed_color = ThreeDColor(self.server, vr_shift=self.scalar_range)
 
             # Init volume type
-            if self.object_data.GetPointData().GetScalars().GetNumberOfComponents() > 1:
+            if self.frames is not None and self.frames.store.is_tensor:
+                # Fractional anisotropy, with the principal directions of the tensors as vectors
+                self.scene_object.object_subtype = SceneObjectSubtype.TENSOR
+            elif self.object_data.GetPointData().GetScalars().GetNumberOfComponents() > 1:
                 self.scene_object.object_subtype = SceneObjectSubtype.VECTOR
-                self.display.normal_color = NormalColor(self.server)
             else:
                 self.scene_object.object_subtype = SceneObjectSubtype.SCALAR
+            if self.scene_object.object_subtype != SceneObjectSubtype.SCALAR:
+                self.display.normal_color = NormalColor(self.server)
+                self.display.vector_field = VectorFieldGrids(self.object_data)
 
             # Init window level
             self.display.scalar_range = self.scalar_range
@@ -74,9 +135,120 @@ class VolumeObjectLogic(BaseVolumeObjectLogic):
             self.display.window_level = self.scalar_range
 
     def load_object_data(self, file_path: str) -> None:
-        self.object_data = load_volume(file_path)
+        frame_store = NiftiFrameStore.open(file_path) if file_path.endswith((".nii", ".nii.gz")) else None
+        if frame_store is not None:
+            self._load_frames(frame_store)
+            return
+
+        self.object_data = self._load_shared_data(file_path, load_volume)
+        # Volumes not marked as label volumes are only labelmaps with few values
+        self.label_values = get_label_values(
+            self.object_data,
+            self._max_label_values if is_label_file(file_path) else self._max_auto_label_values,
+        )
+        if ScalarBlockRanges.can_compute(self.object_data):
+            self.display.block_ranges = ScalarBlockRanges(self.object_data)
+        self._init_display_properties()
+
+    def load_cropped_object_data(
+        self, original_logic: "VolumeObjectLogic", extent: list[int], downsample_factor: float = 1
+    ) -> None:
+        """
+        Load the voxels of original_logic in extent, downsample_factor times coarser.
+        Crops of shared volumes are shared too and may share their voxels with the volume: shared data is never
+        modified in place.
+        """
+        self.soft_input_id = original_logic._id
+        original_data = original_logic.object_data
+        if original_logic.shared_data_key is None:
+            self.object_data = crop_volume(original_data, extent, downsample_factor)
+        else:
+            self._shared_data_key = f"{original_logic.shared_data_key}:crop:{extent}:{downsample_factor}"
+            self.object_data = SHARED_DATASETS.acquire(
+                self._shared_data_key, lambda: crop_volume(original_data, extent, downsample_factor, deep=False)
+            )
+        if ScalarBlockRanges.can_compute(self.object_data):
+            self.display.block_ranges = ScalarBlockRanges(self.object_data)
         self._init_display_properties()
 
+    def _load_frames(self, frame_store: NiftiFrameStore) -> None:
+        """
+        Show the first frame of a 4D volume. The volume owns its data, whose scalars are replaced by the scalars of
+        the frame shown: block ranges are not computed, they would not match the other frames.
+        """
+        self.frames = FrameCache(frame_store)
+        self.object_data = vtkImageData()
+        self.object_data.ShallowCopy(self.frames.get(0))
+        self._init_display_properties()
+        if self.frames.number_of_frames > 1:
+            self.display.timeline = Timeline(
+                self.server,
+                number_of_frames=self.frames.number_of_frames,
+                frame_duration=frame_store.frame_duration,
+            )
+            self.display.timeline.watch(("frame",), self._on_frame_changed)
+            self.display.timeline.watch(("is_playing",), self._on_playing_changed)
+            self.frames.read_ahead_from(0)
+
+    def _on_frame_changed(self, frame: int) -> None:
+        frame = int(frame)
+        if self.frames is not None and frame != self._requested_frame_index:
+            create_task(self._show_frame(frame, 1 if frame >= self._frame_index else -1))
+
+    async def _show_frame(self, index: int, step: int = 1) -> None:
+        """Show the frame index once it is read, unless another frame is requested meanwhile"""
+        self._requested_frame_index = index
+        frame = await self.frames.get_async(index)
+        if frame is None or self.frames is None or index != self._requested_frame_index:
+            return
+        self.object_data.GetPointData().ShallowCopy(frame.GetPointData())
+        self.object_data.Modified()
+        self._frame_index = index
+        self.frames.read_ahead_from(index, step)
+        self.updated()
+
+    def _on_playing_changed(self, is_playing: bool) -> None:
+        if is_playing and self._playback_task is None:
+            self._playback_task = create_task(self._play())
+
+    async def _play(self) -> None:
+        """Show the next frames at the frame rate of the timeline, looping, until playback is paused"""
+        loop = asyncio.get_running_loop()
+        timeline = self.display.timeline
+        next_time = loop.time()
+        try:
+            while self.frames is not None and timeline.is_playing:
+                index = (self._frame_index + 1) % self.frames.number_of_frames
+                await self._show_frame(index)
+                # Unless another frame was picked meanwhile
+                if self._frame_index == index:
+                    timeline.frame = index
+                    self.state.flush()
+
+                next_time += 1 / max(float(timeline.fps), 1e-3)
+                delay = next_time - loop.time()
+                if delay < 0:
+                    # Late frames are not caught up on
+                    next_time = loop.time()
+                # Let the views render the frame
+                await asyncio.sleep(max(delay, 0))
+        finally:
+            self._playback_task = None
+
+    def release_object_data(self) -> None:
+        if self.frames is not None:
+            self.frames.close()
+            self.frames = None
+        super().release_object_data()
+
+    def set_histogram(self, histogram: VolumeHistogram) -> None:
+        """Use the histogram for the window level presets, and for the default window level if left untouched"""
+        self.histogram = histogram
+        self.display.histogram = histogram.get_normalized_counts()
+        self.display.window_level_presets = histogram.get_window_level_presets()
+        if self.display.window_level == self.scalar_range:
+            self.display.window_level = histogram.get_auto_window_level()
+
     def window_level_changed_in_view(self, window_level_in_view: list[float]) -> None:
         window_level_value = [
             window_level_in_view[1] - window_level_in_view[0] / 2,
@@ -7,13 +7,22 @@ from vtk import vtkImageData
 
 from ...ui import SceneState, SceneUI
 from ...utils import (
+    ICONS_MAP,
+    SHARED_FILTER_RESULTS,
+    AppConfig,
     FilterType,
+    LabelMapDiff,
+    LabelMapFormat,
     Preset,
     PresetParser,
+    SparseSegmentMasks,
+    have_same_geometry,
+    world_bounds_to_extent,
 )
 from ..base_logic import BaseLogic
 from ..vtk.views_logic import ViewsLogic
-from .filters import FILTER_MAP
+from .filters import FILTER_MAP, IMAGE_FILTERS
+from .filters.async_filter_logic import AsyncFilterLogic, FilterMemoryBudget
 from .filters.segmentation_filter_logic import SegmentationFilterLogic
 from .handlers.mesh_handler import MeshHandler
 from .handlers.object_handler import ObjectHandler
@@ -33,6 +42,7 @@ class SceneGUI(StateDataModel):
 class Scene(StateDataModel):
     volume_presets = Sync(list[Preset], list, has_dataclass=True)
     color_presets = Sync(list[Preset], list, has_dataclass=True)
+    image_filters = Sync(list[dict[str, str]], list)
     objects = Sync(list[SceneObject], list, has_dataclass=True)
     gui = Sync(SceneGUI, has_dataclass=True)
 
@@ -43,14 +53,17 @@ class SceneLogic(BaseLogic[SceneState]):
     object_load_canceled = Signal(str)
     segment_selected = Signal(vtkImageData, int)
     segment_cleared = Signal(vtkImageData, int)
+    labelmap_save_requested = Signal(SegmentationFilterLogic)
 
-    def __init__(self, server: Server, views_logic: ViewsLogic) -> None:
+    def __init__(self, server: Server, views_logic: ViewsLogic, app_config: AppConfig) -> None:
         super().__init__(server, SceneState)
+        self._app_config = app_config
 
         self.scene = Scene(self.server, gui=SceneGUI(self.server))
         self.data.scene_id = self.scene._id
         self.object_logics: dict[str, SceneObjectLogic] = {}
         self._init_presets(views_logic)
+        self._init_image_filters()
 
         self.mesh_handler = MeshHandler(self.server, views_logic)
         self.volume_handler = VolumeHandler(self.server, views_logic)
@@ -75,6 +88,14 @@ class SceneLogic(BaseLogic[SceneState]):
         self.scene.volume_presets = self._get_presets_from_preset_parser(views_logic.volume_preset_parser)
         self.scene.color_presets = self._get_presets_from_preset_parser(views_logic.color_preset_parser)
 
+    def _init_image_filters(self) -> None:
+        self.scene.image_filters = [
+            {"title": filter_type.value.capitalize(), "value": filter_type.value, "icon": ICONS_MAP.get(filter_type)}
+            for filter_type in IMAGE_FILTERS
+        ]
+        self._filter_memory_budget = FilterMemoryBudget(self._app_config.filter_memory_budget * 1024 * 1024)
+        SHARED_FILTER_RESULTS.memory_budget = self._app_config.filter_cache_memory * 1024 * 1024
+
     def _create_file_object_logic(
         self, file_path: str, scene_object: SceneObject
     ) -> MeshObjectLogic | VolumeObjectLogic:
@@ -83,7 +104,12 @@ class SceneLogic(BaseLogic[SceneState]):
         if self.mesh_handler.supports_file(file_path):
             return self.mesh_handler.get_logic_type(file_path)(self.server, scene_object)
         if self.volume_handler.supports_file(file_path):
-            return VolumeObjectLogic(self.server, scene_object)
+            return VolumeObjectLogic(
+                self.server,
+                scene_object,
+                max_label_values=self._app_config.max_segments_per_labelmap,
+                max_auto_label_values=self._app_config.max_auto_label_values,
+            )
         raise ValueError("Unsupported file extension")
 
     def _create_filter_object_logic(
@@ -100,10 +126,55 @@ class SceneLogic(BaseLogic[SceneState]):
         )
         self.add_object(filter_object)
 
+        filter_options = {}
+        if filter_object_logic_type is SegmentationFilterLogic:
+            filter_options["max_segments"] = self._app_config.max_segments_per_labelmap
+        elif issubclass(filter_object_logic_type, AsyncFilterLogic):
+            filter_options["number_of_threads"] = self._app_config.filter_threads
+            filter_options["memory_budget"] = self._filter_memory_budget
         return filter_object_logic_type(
             original_logic=input_object_logic,
             server=self.server,
             scene_object=filter_object,
+            **filter_options,
+        )
+
+    def _is_labelmap_file(self, file_path: str, object_logic: SceneObjectLogic) -> bool:
+        """
+        Label volumes are loaded as labelmaps: files marked as label volumes with values fitting in segments,
+        or integer volumes with few values. Their values are bounded when the volume is loaded.
+        """
+        if not isinstance(object_logic, VolumeObjectLogic) or object_logic.label_values is None:
+            return False
+        return file_path.endswith(LabelMapFormat.SEG_NRRD.value) or len(object_logic.label_values) > 0
+
+    def _create_labelmap_object_logic(self, file_path: str, volume_logic: VolumeObjectLogic) -> SegmentationFilterLogic:
+        """Replace the logic of a label volume by an editable labelmap with a segment per label"""
+        scene_object = volume_logic.scene_object
+        scene_object.filter_type = FilterType.SEGMENTATION
+        seg_filter_logic = SegmentationFilterLogic(
+            original_logic=None,
+            server=self.server,
+            scene_object=scene_object,
+            max_segments=self._app_config.max_segments_per_labelmap,
+        )
+        seg_filter_logic.load_object_data(file_path, volume_logic.label_values)
+        volume_logic.release_object_data()
+        seg_filter_logic.original_data = next(
+            (
+                logic.object_data
+                for logic in self.object_logics.values()
+                if isinstance(logic, VolumeObjectLogic) and self._is_segmentation_source(logic, seg_filter_logic)
+            ),
+            None,
+        )
+        return seg_filter_logic
+
+    @staticmethod
+    def _is_segmentation_source(volume_logic: VolumeObjectLogic, seg_filter_logic: SegmentationFilterLogic) -> bool:
+        """Whether the threshold effects of a labelmap loaded from a file can use the intensities of the volume"""
+        return volume_logic.label_values is None and have_same_geometry(
+            volume_logic.object_data, seg_filter_logic.object_data
         )
 
     def _cancel_load(self, object_id: str) -> None:
@@ -124,6 +195,7 @@ class SceneLogic(BaseLogic[SceneState]):
             object_handler.unregister_object_from_views(object_logic)
         else:
             object_handler.remove_object_from_views(object_logic)
+        object_logic.release_object_data()
 
     def _remove_object(self, object_id: str) -> None:
         scene_object = get_instance(object_id)
@@ -166,12 +238,43 @@ class SceneLogic(BaseLogic[SceneState]):
             return
         self.segmentation_handler.delete_segment_from_labelmap(seg_filter_logic, deleted_segment_id)
 
+    def _save_labelmap(self, seg_filter_logic_id: str) -> None:
+        seg_filter_logic = self.object_logics.get(seg_filter_logic_id)
+        if not isinstance(seg_filter_logic, SegmentationFilterLogic):
+            return
+        self.labelmap_save_requested(seg_filter_logic)
+
     def _select_segment(self, seg_filter_logic_id: str, selected_segment_id: str) -> None:
         seg_filter_logic = self.object_logics.get(seg_filter_logic_id)
         if not isinstance(seg_filter_logic, SegmentationFilterLogic):
             return
         self.segmentation_handler.select_segment_in_labelmap(seg_filter_logic, selected_segment_id)
 
+    def _get_segmentation_logic(self, labelmap: vtkImageData | None) -> SegmentationFilterLogic | None:
+        return next(
+            (
+                logic
+                for logic in self.object_logics.values()
+                if isinstance(logic, SegmentationFilterLogic) and logic.object_data is labelmap
+            ),
+            None,
+        )
+
+    def get_segmentation_source(self, labelmap: vtkImageData | None) -> vtkImageData | None:
+        """Volume the labelmap was created from"""
+        seg_filter_logic = self._get_segmentation_logic(labelmap)
+        return seg_filter_logic.original_data if seg_filter_logic is not None else None
+
+    def get_segment_masks(self, labelmap: vtkImageData | None) -> SparseSegmentMasks | None:
+        """Masks of the overlapping segments of the labelmap"""
+        seg_filter_logic = self._get_segmentation_logic(labelmap)
+        return seg_filter_logic.segment_masks if seg_filter_logic is not None else None
+
+    def update_segment_statistics(self, labelmap: vtkImageData, diff: LabelMapDiff) -> None:
+        seg_filter_logic = self._get_segmentation_logic(labelmap)
+        if seg_filter_logic is not None:
+            seg_filter_logic.update_statistics(diff)
+
     def add_object(self, scene_object: SceneObject) -> None:
         scene_object.gui = SceneObjectGUI(self.server)
         if scene_object in self.scene.objects:
@@ -186,6 +289,17 @@ class SceneLogic(BaseLogic[SceneState]):
         if scene_object is not None:
             object_logic = self._create_file_object_logic(file_path, scene_object)
             object_logic.load_object_data(file_path)
+            if self._is_labelmap_file(file_path, object_logic):
+                object_logic = self._create_labelmap_object_logic(file_path, object_logic)
+            elif isinstance(object_logic, VolumeObjectLogic):
+                # Volume of the labelmaps loaded before it
+                for logic in self.object_logics.values():
+                    if (
+                        isinstance(logic, SegmentationFilterLogic)
+                        and logic.original_data is None
+                        and self._is_segmentation_source(object_logic, logic)
+                    ):
+                        logic.original_data = object_logic.object_data
 
             self._add_object_to_views(object_logic)
         else:
@@ -200,6 +314,23 @@ class SceneLogic(BaseLogic[SceneState]):
 
         self._add_object_to_views(filter_object_logic)
 
+    def add_cropped_volume_to_views(self, volume_id: str, bounds: tuple[float], downsample_factor: float = 1) -> None:
+        """Add the part of the volume within world bounds as a new, smaller volume"""
+        volume_logic = self.object_logics.get(volume_id)
+        if not isinstance(volume_logic, VolumeObjectLogic) or volume_logic.object_data is None:
+            return
+
+        extent = world_bounds_to_extent(volume_logic.object_data, bounds)
+        if any(extent[2 * axis] > extent[2 * axis + 1] for axis in range(3)):
+            logger.info(f"ROI does not intersect volume {volume_id}.")
+            return
+
+        cropped_object = SceneObject(self.server, name=f"{volume_logic.scene_object.name}_crop")
+        self.add_object(cropped_object)
+        cropped_logic = VolumeObjectLogic(self.server, cropped_object)
+        cropped_logic.load_cropped_object_data(volume_logic, extent, downsample_factor)
+        self._add_object_to_views(cropped_logic)
+
     def remove_object(self, object_id: str) -> None:
         self._remove_dependent_objects(object_id)
         self._remove_object_from_views(object_id)
@@ -224,6 +355,12 @@ class SceneLogic(BaseLogic[SceneState]):
         for object_id in object_ids:
             self.remove_object(object_id)
 
+    def release_objects(self) -> None:
+        """Release the data shared with the other sessions, without updating the scene."""
+        for object_logic in self.object_logics.values():
+            object_logic.release_object_data()
+        self.object_logics.clear()
+
     def set_ui(self, ui: SceneUI):
         ui.delete_clicked.connect(self.remove_object)
         ui.load_canceled.connect(self._cancel_load)
@@ -233,3 +370,4 @@ class SceneLogic(BaseLogic[SceneState]):
         ui.add_segment_clicked.connect(self._add_segment)
         ui.delete_segment_clicked.connect(self._delete_segment)
         ui.segment_clicked.connect(self._select_segment)
+        ui.save_labelmap_clicked.connect(self._save_labelmap)
@@ -2,7 +2,7 @@ import logging
 from abc import ABC, abstractmethod
 
 from trame_dataclass.v2 import get_instance
-from vtk import vtkPolyData, vtkRenderer
+from vtk import vtkPolyData, vtkRenderer, vtkResliceImageViewer
 
 from ....utils import (
     ColorPresetParser,
@@ -94,16 +94,23 @@ class MeshHandler(ObjectHandler, ABC):
 
 
 class MeshSliceHandler(MeshHandler):
-    def __init__(self, preset_parser: ColorPresetParser, renderer: vtkRenderer, orientation: int) -> None:
+    def __init__(
+        self,
+        preset_parser: ColorPresetParser,
+        renderer: vtkRenderer,
+        orientation: int,
+        reslice_image_viewer: vtkResliceImageViewer,
+    ) -> None:
         super().__init__(preset_parser, renderer)
         self.orientation = orientation
+        self.reslice_image_viewer = reslice_image_viewer
 
     def add_mesh(self, data_id: str, poly_data: vtkPolyData) -> None:
-        actor = render_mesh_in_slice(poly_data, self.orientation, self.renderer)
+        actor = render_mesh_in_slice(poly_data, self.orientation, self.renderer, self.reslice_image_viewer)
         self.register_data(data_id, actor)
 
     def add_streamline(self, data_id: str, poly_data: vtkPolyData) -> None:
-        actor = render_streamline_in_slice(poly_data, self.renderer, self.orientation)
+        actor = render_streamline_in_slice(poly_data, self.renderer, self.orientation, self.reslice_image_viewer)
         self.register_data(data_id, actor)
 
     def update_mesh_visibility(self, data_id: str, data_display: MeshDisplay) -> bool:
@@ -1,22 +1,31 @@
 import logging
 from abc import ABC, abstractmethod
+from collections import defaultdict
 from typing import Any
 
 from vtk import (
+    vtkActor,
     vtkImageData,
     vtkImageSlice,
+    vtkPlane,
     vtkRenderer,
     vtkResliceImageViewer,
+    vtkVolume,
 )
 
 from ....utils import (
     ColorPresetParser,
+    LabelMapSurface,
     PresetParser,
+    VectorFieldGlyphs,
+    VectorFieldGrids,
     VolumePresetParser,
+    VolumeRenderingSettings,
     convert_color_hex_to_normalized_rgb,
+    get_reslice_cursor,
     render_labelmap_as_overlay_in_slice,
+    render_labelmap_surface_in_3D,
     render_volume_as_overlay_in_slice,
-    render_volume_as_vector_field,
     render_volume_in_3D,
     render_volume_in_slice,
     set_actor_opacity,
@@ -26,9 +35,8 @@ from ....utils import (
     set_slice_opacity,
     set_slice_visibility,
     set_slice_window_level,
-    set_vector_field_arrow_length,
-    set_vector_field_arrow_thickness,
-    set_vector_field_sampling,
+    set_volume_cropping,
+    set_volume_interactive,
     set_volume_visibility,
 )
 from ....utils.vtk.segmentation import set_segment_color, set_segment_visibility
@@ -43,6 +51,30 @@ class VolumeHandler(ObjectHandler, ABC):
     def __init__(self, preset_parser: PresetParser, renderer: vtkRenderer):
         super().__init__(renderer)
         self.preset_parser = preset_parser
+        self._vector_fields: dict[str, VectorFieldGlyphs] = {}
+
+    def unregister_data(self, data_id: str, only_data: Any = None, remove: bool = True) -> None:
+        super().unregister_data(data_id, only_data, remove)
+        vector_field = self._vector_fields.get(data_id)
+        if vector_field is not None and vector_field.actor not in self.object_data.get(data_id, []):
+            self._vector_fields.pop(data_id).close()
+
+    def _init_glyph_actors(self, data_id: str, data_display: VolumeDisplay) -> None:
+        grids = data_display.vector_field or VectorFieldGrids(self.get_image_data(data_id))
+        vector_field = VectorFieldGlyphs(grids, self.renderer, self._get_glyph_plane())
+        self._vector_fields[data_id] = vector_field
+        self.register_data(data_id, vector_field.actor)
+
+    def _get_glyph_plane(self) -> vtkPlane | None:
+        """Plane of the view the glyphs are rendered in, None to render them all"""
+        return None
+
+    def _update_vector_field(self, data_id: str, data_display: VolumeDisplay) -> bool:
+        vector_field = self._vector_fields.get(data_id)
+        if vector_field is None:
+            return False
+        normal_color = data_display.normal_color
+        return vector_field.set_properties(normal_color.sampling, normal_color.arrow_length, normal_color.arrow_width)
 
     @abstractmethod
     def update_volume_visibility(self, data_id: str, data_display: VolumeDisplay) -> bool:
@@ -54,9 +86,16 @@ class VolumeHandler(ObjectHandler, ABC):
 
 
 class VolumeSliceHandler(VolumeHandler):
-    def __init__(self, preset_parser: ColorPresetParser, renderer: vtkRenderer, orientation: int) -> None:
+    def __init__(
+        self,
+        preset_parser: ColorPresetParser,
+        renderer: vtkRenderer,
+        orientation: int,
+        reslice_image_viewer: vtkResliceImageViewer,
+    ) -> None:
         super().__init__(preset_parser, renderer)
         self.orientation = orientation
+        self.reslice_image_viewer = reslice_image_viewer
 
     def _is_primary_volume(self, data_id: str) -> bool:
         data = self.get_data(data_id)
@@ -69,9 +108,8 @@ class VolumeSliceHandler(VolumeHandler):
     def _has_multiple_primary_volumes(self) -> bool:
         return len([data_id for data_id in self.object_data if self._is_primary_volume(data_id)]) > 1
 
-    def _init_glyph_actors(self, data_id: str) -> None:
-        glyph_actor = render_volume_as_vector_field(self.get_image_data(data_id), self.renderer, self.orientation)
-        self.register_data(data_id, glyph_actor)
+    def _get_glyph_plane(self) -> vtkPlane:
+        return get_reslice_cursor(self.reslice_image_viewer).GetPlane(self.orientation)
 
     def has_primary_volume(self) -> bool:
         return self.get_reslice_image_viewer() is not None
@@ -93,21 +131,25 @@ class VolumeSliceHandler(VolumeHandler):
 
         if data_display.normal_color is not None:
             if not self.get_glyph_actors(data_id):
-                self._init_glyph_actors(data_id)
+                self._init_glyph_actors(data_id, data_display)
             self.update_volume_normal_color(data_id, data_display)
         else:
             self.update_volume_visibility(data_id, data_display)
 
     def add_primary_volume(self, data_id: str, image_data: vtkImageData) -> None:
-        reslice_image_viewer = render_volume_in_slice(image_data, self.renderer, self.orientation)
+        reslice_image_viewer = render_volume_in_slice(
+            image_data, self.renderer, self.reslice_image_viewer, self.orientation
+        )
         self.register_data(data_id, reslice_image_viewer)
 
     def add_secondary_volume(self, data_id: str, image_data: vtkImageData):
-        actor = render_volume_as_overlay_in_slice(image_data, self.renderer, axis=self.orientation)
+        actor = render_volume_as_overlay_in_slice(
+            image_data, self.renderer, self.reslice_image_viewer, axis=self.orientation
+        )
         self.register_data(data_id, actor)
 
     def add_labelmap(self, data_id: str, image_data: vtkImageData):
-        actor = render_labelmap_as_overlay_in_slice(image_data, axis=self.orientation)
+        actor = render_labelmap_as_overlay_in_slice(image_data, self.reslice_image_viewer, axis=self.orientation)
         self.register_data(data_id, actor)
 
     def update_volume_visibility(self, data_id: str, data_display: VolumeDisplay) -> bool:
@@ -182,12 +224,7 @@ class VolumeSliceHandler(VolumeHandler):
 
         logger.debug(f"set_volume_normal_color({data_id})")
         modified = self.update_volume_visibility(data_id, data_display)
-        for glyph_actor in self.get_glyph_actors(data_id):
-            modified = set_vector_field_sampling(glyph_actor, normal_color.sampling, self.orientation) or modified
-            modified = set_vector_field_arrow_length(glyph_actor, normal_color.arrow_length) or modified
-            modified = set_vector_field_arrow_thickness(glyph_actor, normal_color.arrow_width) or modified
-
-        return modified
+        return self._update_vector_field(data_id, data_display) or modified
 
     def get_reslice_image_viewer(self, data_id=None) -> vtkResliceImageViewer | None:
         """
@@ -219,27 +256,110 @@ class VolumeSliceHandler(VolumeHandler):
 
 
 class VolumeThreeDHandler(VolumeHandler):
-    def __init__(self, preset_parser: VolumePresetParser, renderer: vtkRenderer) -> None:
+    def __init__(
+        self,
+        preset_parser: VolumePresetParser,
+        renderer: vtkRenderer,
+        rendering_settings: VolumeRenderingSettings | None = None,
+    ) -> None:
         super().__init__(preset_parser, renderer)
+        self.rendering_settings = rendering_settings or VolumeRenderingSettings()
+        # Labelmaps are rendered as one surface actor per segment
+        self._labelmap_surfaces: dict[str, LabelMapSurface] = {}
+        self._labelmap_displays: dict[str, VolumeDisplay] = {}
+        self._segment_actors: dict[str, dict[int, vtkActor]] = defaultdict(dict)
+        self._segment_displays: dict[str, dict[int, SegmentDisplay]] = defaultdict(dict)
+
+    def _is_labelmap(self, data_id: str) -> bool:
+        return data_id in self._labelmap_surfaces
+
+    def unregister_data(self, data_id: str, only_data: Any = None) -> None:
+        super().unregister_data(data_id, only_data)
+        if data_id not in self.object_data:
+            self._labelmap_surfaces.pop(data_id, None)
+            self._labelmap_displays.pop(data_id, None)
+            self._segment_actors.pop(data_id, None)
+            self._segment_displays.pop(data_id, None)
+
+    def add_labelmap(self, data_id: str, surface: LabelMapSurface, data_display: VolumeDisplay) -> None:
+        """Segment actors are created by update_labelmap_surface once their surface is generated"""
+        self._labelmap_surfaces[data_id] = surface
+        self._labelmap_displays[data_id] = data_display
+
+    def update_labelmap_surface(self, data_id: str, values: set[int]) -> None:
+        """Add the actors of the segments whose surface was just generated"""
+        surface = self._labelmap_surfaces.get(data_id)
+        if surface is None:
+            return
+        segment_actors = self._segment_actors[data_id]
+        for value in values:
+            if value in segment_actors:
+                continue
+            actor = render_labelmap_surface_in_3D(
+                surface.get_surface(value), surface.index_to_physical_matrix(), self.renderer
+            )
+            self.register_data(data_id, actor)
+            segment_actors[value] = actor
+            self._apply_segment_display(data_id, value)
+
+    def _apply_segment_display(self, data_id: str, segment_id: int) -> bool:
+        actor = self._segment_actors[data_id].get(segment_id)
+        if actor is None:
+            return False
+        labelmap_display = self._labelmap_displays[data_id]
+        segment_display = self._segment_displays[data_id].get(segment_id)
+        visible = labelmap_display.is_visible and labelmap_display.is_threed_visible
+        if segment_display is not None:
+            visible = visible and segment_display.is_visible
+        modified = set_actor_visibility(actor, visible)
+
+        if segment_display is not None and segment_display.color:
+            color = convert_color_hex_to_normalized_rgb(segment_display.color)
+            if tuple(actor.GetProperty().GetColor()) != tuple(color):
+                actor.GetProperty().SetColor(color)
+                modified = True
+        return modified
+
+    def update_segment_color(self, data_id: str, segment_id: int, segment_display: SegmentDisplay) -> bool:
+        if not self._is_labelmap(data_id):
+            return False
+        self._segment_displays[data_id][segment_id] = segment_display
+        return self._apply_segment_display(data_id, segment_id)
 
-    def _init_glyph_actors(self, data_id: str) -> None:
-        glyph_actor = render_volume_as_vector_field(self.get_image_data(data_id), self.renderer)
-        self.register_data(data_id, glyph_actor)
+    def update_segment_visibility(self, data_id: str, segment_id: int, segment_display: SegmentDisplay) -> bool:
+        return self.update_segment_color(data_id, segment_id, segment_display)
 
     def add_volume(self, data_id: str, image_data: vtkImageData) -> None:
-        volume = render_volume_in_3D(image_data, self.renderer)
+        volume = render_volume_in_3D(image_data, self.renderer, self.rendering_settings)
         self.register_data(data_id, volume)
 
+    def get_volumes(self) -> list[vtkVolume]:
+        return [obj for objs in self.object_data.values() for obj in objs if obj.IsA("vtkVolume")]
+
+    def set_interactive(self, interactive: bool) -> bool:
+        """Switch the volumes between their interactive and still rendering settings"""
+        modified = False
+        for volume in self.get_volumes():
+            modified = set_volume_interactive(volume, self.rendering_settings, interactive) or modified
+        return modified
+
     def apply_data_display(self, data_id: str, data_display: VolumeDisplay) -> None:
         if data_display.normal_color is not None:
             if not self.get_glyph_actors(data_id):
-                self._init_glyph_actors(data_id)
+                self._init_glyph_actors(data_id, data_display)
             self.update_volume_normal_color(data_id, data_display)
         else:
             self.update_volume_preset(data_id, data_display)
             self.update_volume_visibility(data_id, data_display)
 
     def update_volume_visibility(self, data_id: str, data_display: VolumeDisplay) -> bool:
+        if self._is_labelmap(data_id):
+            self._labelmap_displays[data_id] = data_display
+            modified = False
+            for segment_id in self._segment_actors[data_id]:
+                modified = self._apply_segment_display(data_id, segment_id) or modified
+            return modified
+
         volume = self.get_data(data_id)
         if volume is None:
             return False
@@ -265,7 +385,17 @@ class VolumeThreeDHandler(VolumeHandler):
         preset = self.preset_parser.get_preset_by_name(threed_color.name)
         if preset is None:
             return False
-        return self.preset_parser.apply_preset(volume.GetProperty(), preset, threed_color.vr_shift)
+        modified = self.preset_parser.apply_preset(volume.GetProperty(), preset, threed_color.vr_shift)
+        return self.update_volume_cropping(data_id, data_display) or modified
+
+    def update_volume_cropping(self, data_id: str, data_display: VolumeDisplay) -> bool:
+        """Crop the volume to the blocks its opacity function makes visible"""
+        volume = self.get_data(data_id)
+        if volume is None or not volume.IsA("vtkVolume") or data_display.block_ranges is None:
+            return False
+        extent = data_display.block_ranges.get_visible_extent(volume.GetProperty().GetScalarOpacity())
+        logger.debug(f"update_volume_cropping({data_id}): {extent}")
+        return set_volume_cropping(volume, extent)
 
     def update_volume_normal_color(self, data_id: str, data_display: VolumeDisplay) -> bool:
         normal_color = data_display.normal_color
@@ -274,9 +404,4 @@ class VolumeThreeDHandler(VolumeHandler):
 
         logger.debug(f"set_volume_normal_color({data_id})")
         modified = self.update_volume_visibility(data_id, data_display)
-        for glyph_actor in self.get_glyph_actors(data_id):
-            modified = set_vector_field_sampling(glyph_actor, normal_color.sampling) or modified
-            modified = set_vector_field_arrow_length(glyph_actor, normal_color.arrow_length) or modified
-            modified = set_vector_field_arrow_thickness(glyph_actor, normal_color.arrow_width) or modified
-
-        return modified
+        return self._update_vector_field(data_id, data_display) or modified
@@ -4,6 +4,7 @@ from trame_server import Server
 from vtk import vtkImageData
 
 from ...ui import ToolState, ToolType, ToolUI
+from ...utils import AppConfig
 from ..base_logic import BaseLogic
 from ..scene.scene_logic import SceneLogic
 from .tools.place_roi_logic import PlaceROILogic
@@ -14,7 +15,7 @@ logger = logging.getLogger(__name__)
 
 
 class ToolLogic(BaseLogic[ToolState]):
-    def __init__(self, server: Server, views_logic: ViewsLogic, scene_logic: SceneLogic) -> None:
+    def __init__(self, server: Server, views_logic: ViewsLogic, scene_logic: SceneLogic, app_config: AppConfig) -> None:
         super().__init__(server, ToolState)
         self._views_logic = views_logic
         self._views_logic.object_added.connect(self._on_object_added)
@@ -25,11 +26,13 @@ class ToolLogic(BaseLogic[ToolState]):
 
         # ROI tool
         self._roi_logic = PlaceROILogic(self.server, self._views_logic)
+        self._roi_logic.crop_requested.connect(self._crop_active_volume)
 
         # Segmentation tool
-        self._segmentation_logic = SegmentationEffectLogic(self.server, self._views_logic)
+        self._segmentation_logic = SegmentationEffectLogic(self.server, self._views_logic, self._roi_logic, app_config)
         self._scene_logic.segment_selected.connect(self._segmentation_logic.set_active_segment)
-        self._scene_logic.segment_cleared.connect(self._segmentation_logic.clear_segment)
+        self._scene_logic.segment_cleared.connect(self._on_segment_cleared)
+        self._segmentation_logic.labelmap_edited.connect(self._scene_logic.update_segment_statistics)
 
         # Watchers
         self.bind_changes({self.name.active_tool: self._on_tool_change})
@@ -48,7 +51,9 @@ class ToolLogic(BaseLogic[ToolState]):
         self._roi_logic.set_default_bounds(image_data.GetBounds())
         self._segmentation_logic.set_paint_effects(self._views_logic.slice_views)
 
-    def _on_segment_selected(self, _image_data: vtkImageData | None, value: int):
+    def _on_segment_selected(self, image_data: vtkImageData | None, value: int):
+        self._segmentation_logic.set_source_volume(self._scene_logic.get_segmentation_source(image_data))
+        self._segmentation_logic.set_segment_masks(self._scene_logic.get_segment_masks(image_data))
         if value == 0:
             self.data.is_segmentation_tool_disabled = True
             self.data.active_tool = ToolType.UNDEFINED
@@ -56,6 +61,14 @@ class ToolLogic(BaseLogic[ToolState]):
             self.data.is_segmentation_tool_disabled = False
             self.data.active_tool = ToolType.SEGMENTATION_EFFECT
 
+    def _on_segment_cleared(self, image_data: vtkImageData, value: int):
+        self._segmentation_logic.clear_segment(image_data, value, self._scene_logic.get_segment_masks(image_data))
+
+    def _crop_active_volume(self, bounds: tuple[float], downsample_factor: int) -> None:
+        volume_id = self._scene_logic.volume_handler.active_primary_volume_id
+        if volume_id is not None:
+            self._scene_logic.add_cropped_volume_to_views(volume_id, bounds, downsample_factor)
+
     def _on_viewer_status_changed(self, is_viewer_disabled: bool) -> None:
         if is_viewer_disabled:
             self._reset_tool_state()
@@ -69,3 +82,4 @@ class ToolLogic(BaseLogic[ToolState]):
         ui.reset_clicked.connect(self._views_logic.reset)
 
         self._roi_logic.set_ui(ui.place_roi_ui)
+        self._segmentation_logic.set_ui(ui.segmentation_effect_ui)
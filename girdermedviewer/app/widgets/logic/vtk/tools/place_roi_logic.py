@@ -1,6 +1,7 @@
 import logging
 
 from trame_server import Server
+from undo_stack import Signal
 from vtk import vtkBoxRepresentation, vtkBoxWidget2, vtkPolyData
 from vtkmodules.vtkRenderingCore import vtkActor
 
@@ -13,6 +14,9 @@ logger = logging.getLogger(__name__)
 
 
 class PlaceROILogic(BaseToolLogic[PlaceROIState]):
+    # Bounds of the ROI and spacing factor of the cropped volume
+    crop_requested = Signal(tuple, int)
+
     def __init__(self, server: Server, views_logic: ViewsLogic) -> None:
         super().__init__(server, views_logic, PlaceROIState)
         self._min_bounds_state = self._typed_state.get_sub_state(self.name.min_roi_bounds)
@@ -45,12 +49,14 @@ class PlaceROILogic(BaseToolLogic[PlaceROIState]):
             self.box_widget.SetCurrentRenderer(view_logic.renderer)
 
         for view_logic in self._views_logic.slice_views:
-            actor = render_mesh_in_slice(self.poly_data, view_logic.orientation.value, view_logic.renderer)
+            actor = render_mesh_in_slice(
+                self.poly_data, view_logic.orientation.value, view_logic.renderer, view_logic.reslice_image_viewer
+            )
             self.box_actors.append(actor)
 
         self.set_enabled(False)
 
-    def _get_bounds(self):
+    def get_bounds(self) -> tuple[float]:
         return (
             self.data.min_roi_bounds.pos_x,
             self.data.max_roi_bounds.pos_x,
@@ -86,7 +92,7 @@ class PlaceROILogic(BaseToolLogic[PlaceROIState]):
         if self.data.is_roi_locked or min_roi_bounds.pos_x is None or max_roi_bounds.pos_x is None:
             return
 
-        roi_bounds = self._get_bounds()
+        roi_bounds = self.get_bounds()
         if roi_bounds != self.box.GetBounds():
             self.box.PlaceWidget(roi_bounds)
         self._update_slice_rep()
@@ -127,3 +133,9 @@ class PlaceROILogic(BaseToolLogic[PlaceROIState]):
 
     def set_ui(self, ui: PlaceROIUI) -> None:
         ui.reset_clicked.connect(self._reset)
+        ui.crop_clicked.connect(self._request_crop)
+
+    def _request_crop(self) -> None:
+        if self.data.min_roi_bounds.pos_x is None or self.data.max_roi_bounds.pos_x is None:
+            return
+        self.crop_requested(self.get_bounds(), int(self.data.crop_downsample_factor))
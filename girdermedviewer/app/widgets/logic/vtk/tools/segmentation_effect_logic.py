@@ -1,21 +1,49 @@
+import asyncio
 import logging
+from collections.abc import Callable
+from concurrent.futures import ThreadPoolExecutor
 
+import numpy as np
+from numpy.typing import NDArray
 from trame_dataclass.v2 import StateDataModel, Sync
 from trame_server import Server
+from trame_server.utils.asynchronous import create_task
+from undo_stack import Signal
 from vtk import vtkImageData
 
-from ....ui import SegmentationEffectState
-from ....utils import SegmentationEffectType
+from ....ui import SegmentationEffectState, SegmentationEffectUI
+from ....utils import (
+    AppConfig,
+    LabelMapDiff,
+    SegmentationEffectType,
+    SparseSegmentMasks,
+)
 from ....utils.vtk.segmentation import (
     BrushModel,
     BrushShape,
     LabelMapEditor,
     LabelMapOperation,
+    LabelMapOverwriteMode,
+    LabelMapUndoStack,
     SegmentPaintEffect2D,
 )
+from ....utils.vtk.segmentation_effects import (
+    EffectCancelledError,
+    EffectProgress,
+    crop_array,
+    get_mask_extent,
+    get_scalars_array,
+    largest_island_mask,
+    margin_mask,
+    pad_extent,
+    region_growing_mask,
+    threshold_mask,
+    world_bounds_to_extent,
+)
 from ..views.slice_view_logic import SliceViewLogic
 from ..views_logic import ViewsLogic
 from .base_tool_logic import BaseToolLogic
+from .place_roi_logic import PlaceROILogic
 
 logger = logging.getLogger(__name__)
 
@@ -25,16 +53,54 @@ class PaintEraseEffectProperties(StateDataModel):
     use_sphere_brush = Sync(bool, True)
 
 
+class ThresholdEffectProperties(StateDataModel):
+    threshold_range = Sync(list[float], list)
+    scalar_range = Sync(list[float], list)
+
+
+class MarginEffectProperties(StateDataModel):
+    margin_size = Sync(float, 2.0)  # mm, negative to shrink
+
+
+# Mask computed by an effect, its extent in the labelmap and the operation applying it
+EffectResult = tuple[NDArray[np.bool], list[int], LabelMapOperation] | None
+
+
 class SegmentationEffectLogic(BaseToolLogic[SegmentationEffectState]):
-    def __init__(self, server: Server, views_logic: ViewsLogic) -> None:
+    labelmap_edited = Signal(vtkImageData, LabelMapDiff)
+
+    def __init__(
+        self, server: Server, views_logic: ViewsLogic, roi_logic: PlaceROILogic, app_config: AppConfig
+    ) -> None:
         super().__init__(server, views_logic, SegmentationEffectState)
         self.paint_erase_effect_prop = PaintEraseEffectProperties(self.server)
+        self.threshold_effect_prop = ThresholdEffectProperties(self.server)
+        self.margin_effect_prop = MarginEffectProperties(self.server)
+        self._roi_logic = roi_logic
+        self._source_volume: vtkImageData | None = None
+
+        # Effects computed on the whole segment or region of interest run in a worker thread
+        self._effect_executor = ThreadPoolExecutor(1)
+        self._effect_progress: EffectProgress | None = None
+
+        self._undo_stack = LabelMapUndoStack(memory_budget=app_config.undo_memory_budget * 1024 * 1024)
+        self._undo_stack.can_undo_changed.connect(self._update_can_undo)
+        self._undo_stack.can_redo_changed.connect(self._update_can_redo)
 
         self._segmentation_editor = LabelMapEditor()
+        self._segmentation_editor.undo_stack = self._undo_stack
+        self._segmentation_editor.labelmap_modified.connect(self._views_logic.update_slice_views_in_extent)
+        self._segmentation_editor.labelmap_modified.connect(self._views_logic.update_labelmap_surfaces)
+        self._segmentation_editor.diff_applied.connect(self.labelmap_edited)
         self._brush_model = BrushModel(BrushShape.Sphere)
         self._paint_effects: list[SegmentPaintEffect2D] = []
 
-        self.bind_changes({self.name.active_effect: self._update_active_effect})
+        self.bind_changes(
+            {
+                self.name.active_effect: self._update_active_effect,
+                self.name.allow_overlap: self._update_allow_overlap,
+            }
+        )
         self.paint_erase_effect_prop.watch(("brush_size",), self._update_brush_size)
         self.paint_erase_effect_prop.watch(("use_sphere_brush",), self._update_use_sphere_brush)
 
@@ -45,7 +111,7 @@ class SegmentationEffectLogic(BaseToolLogic[SegmentationEffectState]):
                 effect.disable_brush()
         elif not self._segmentation_editor.active_segment:
             self._deactivate_effects()
-        else:
+        elif active_effect in (SegmentationEffectType.PAINT, SegmentationEffectType.ERASE):
             self.data.active_effect_prop_id = self.paint_erase_effect_prop._id
 
             if active_effect == SegmentationEffectType.PAINT:
@@ -55,6 +121,20 @@ class SegmentationEffectLogic(BaseToolLogic[SegmentationEffectState]):
 
             for effect in self._paint_effects:
                 effect.enable_brush()
+        else:
+            if active_effect in (SegmentationEffectType.THRESHOLD, SegmentationEffectType.REGION_GROWING):
+                self.data.active_effect_prop_id = self.threshold_effect_prop._id
+            elif active_effect == SegmentationEffectType.MARGIN:
+                self.data.active_effect_prop_id = self.margin_effect_prop._id
+            else:
+                self.data.active_effect_prop_id = None
+            for effect in self._paint_effects:
+                effect.disable_brush()
+
+    def _update_allow_overlap(self, allow_overlap: bool) -> None:
+        self._segmentation_editor.overwrite_mode = (
+            LabelMapOverwriteMode.Never if allow_overlap else LabelMapOverwriteMode.AllSegments
+        )
 
     def _update_brush_size(self, brush_size: float) -> None:
         if self._brush_model.shape == BrushShape.Cylinder:
@@ -65,9 +145,164 @@ class SegmentationEffectLogic(BaseToolLogic[SegmentationEffectState]):
     def _update_use_sphere_brush(self, use_sphere_brush: bool) -> None:
         self._brush_model.shape = BrushShape.Sphere if use_sphere_brush else BrushShape.Cylinder
 
+    def _update_can_undo(self, can_undo: bool) -> None:
+        self.data.can_undo = can_undo
+
+    def _update_can_redo(self, can_redo: bool) -> None:
+        self.data.can_redo = can_redo
+
     def _deactivate_effects(self) -> None:
+        self.cancel_effect()
         self.data.active_effect = SegmentationEffectType.UNDEFINED
 
+    def _prepare_threshold(self) -> Callable[[EffectProgress], EffectResult] | None:
+        volume = self._source_volume
+        extent = world_bounds_to_extent(volume, self._roi_logic.get_bounds())
+        # Copy the region of interest: the worker must not read data that the session may modify
+        region = crop_array(get_scalars_array(volume), list(volume.GetExtent()), extent).copy()
+        lower, upper = self.threshold_effect_prop.threshold_range
+
+        def _compute(progress: EffectProgress) -> EffectResult:
+            return threshold_mask(region, lower, upper, progress), extent, LabelMapOperation.Set
+
+        return _compute
+
+    def _prepare_region_growing(self) -> Callable[[EffectProgress], EffectResult] | None:
+        volume = self._source_volume
+        extent = world_bounds_to_extent(volume, self._roi_logic.get_bounds())
+        seed_ijk = [0.0, 0.0, 0.0]
+        volume.TransformPhysicalPointToContinuousIndex(self._views_logic.slice_views[0].position, seed_ijk)
+        seed = tuple(round(seed_ijk[axis]) - extent[2 * axis] for axis in range(3))
+        if any(seed[axis] < 0 or seed[axis] > extent[2 * axis + 1] - extent[2 * axis] for axis in range(3)):
+            logger.warning("Region growing: the cursor position is outside of the region of interest")
+            return None
+        region = crop_array(get_scalars_array(volume), list(volume.GetExtent()), extent).copy()
+        lower, upper = self.threshold_effect_prop.threshold_range
+
+        def _compute(progress: EffectProgress) -> EffectResult:
+            return region_growing_mask(region, seed, lower, upper, progress), extent, LabelMapOperation.Set
+
+        return _compute
+
+    def _prepare_islands(self) -> Callable[[EffectProgress], EffectResult] | None:
+        labelmap_extent = list(self._segmentation_editor.labelmap.GetExtent())
+        # Including the voxels hidden by overlapping segments
+        get_segment_mask = self._segmentation_editor.prepare_segment_mask(self._segmentation_editor.active_segment)
+
+        def _compute(progress: EffectProgress) -> EffectResult:
+            labelmap_mask = get_segment_mask()
+            segment_extent = get_mask_extent(labelmap_mask, labelmap_extent)
+            if segment_extent is None:
+                return None
+            segment_mask = crop_array(labelmap_mask, labelmap_extent, segment_extent)
+            progress.update(0.1)
+            largest_island = largest_island_mask(segment_mask, progress)
+            return segment_mask & ~largest_island, segment_extent, LabelMapOperation.Erase
+
+        return _compute
+
+    def _prepare_margin(self) -> Callable[[EffectProgress], EffectResult] | None:
+        margin_size = self.margin_effect_prop.margin_size
+        spacing = self._segmentation_editor.labelmap.GetSpacing()
+        radius = tuple(round(abs(margin_size) / spacing[axis]) for axis in range(3))
+        if not any(radius):
+            return None
+        grow = margin_size > 0
+        labelmap_extent = list(self._segmentation_editor.labelmap.GetExtent())
+        get_segment_mask = self._segmentation_editor.prepare_segment_mask(self._segmentation_editor.active_segment)
+
+        def _compute(progress: EffectProgress) -> EffectResult:
+            labelmap_mask = get_segment_mask()
+            segment_extent = get_mask_extent(labelmap_mask, labelmap_extent)
+            if segment_extent is None:
+                return None
+            # Background margin around the segment for it to grow into, or to erode its border from
+            segment_extent = pad_extent(segment_extent, radius, labelmap_extent)
+            segment_mask = crop_array(labelmap_mask, labelmap_extent, segment_extent)
+            progress.update(0.1)
+            margin = margin_mask(segment_mask, radius, grow, progress)
+            if grow:
+                return margin, segment_extent, LabelMapOperation.Set
+            return segment_mask & ~margin, segment_extent, LabelMapOperation.Erase
+
+        return _compute
+
+    def _set_effect_progress(self, progress: float) -> None:
+        effect_progress = round(progress * 100)
+        if effect_progress != self.data.effect_progress:
+            self.data.effect_progress = effect_progress
+            self.state.flush()
+
+    async def _run_effect(
+        self,
+        effect: SegmentationEffectType,
+        compute: Callable[[EffectProgress], EffectResult],
+        progress: EffectProgress,
+    ) -> None:
+        labelmap = self._segmentation_editor.labelmap
+        labelmap_mtime = labelmap.GetMTime()
+        segment = self._segmentation_editor.active_segment
+        self.data.is_effect_running = True
+        self.data.effect_progress = 0
+        self.state.flush()
+
+        result = None
+        try:
+            result = await asyncio.get_running_loop().run_in_executor(self._effect_executor, compute, progress)
+        except EffectCancelledError:
+            logger.debug(f"{effect.value} cancelled")
+        finally:
+            self._effect_progress = None
+            self.data.is_effect_running = False
+
+        if result is not None and not progress.is_cancelled:
+            if (
+                labelmap is not self._segmentation_editor.labelmap
+                or segment != self._segmentation_editor.active_segment
+            ):
+                logger.debug(f"{effect.value} discarded: the active segment changed")
+            elif labelmap.GetMTime() != labelmap_mtime:
+                # The worker may have read the labelmap while it was edited
+                logger.debug(f"{effect.value} discarded: the labelmap was edited")
+            else:
+                mask, extent, operation = result
+                self._segmentation_editor.start_edit(effect.value)
+                self._segmentation_editor.apply_binary_labelmap(mask, extent, operation)
+        self.state.flush()
+
+    def apply_effect(self) -> None:
+        effect = self.data.active_effect
+        if self._effect_progress is not None or self._segmentation_editor.labelmap is None:
+            return
+
+        prepare_effect = {
+            SegmentationEffectType.THRESHOLD: self._prepare_threshold,
+            SegmentationEffectType.REGION_GROWING: self._prepare_region_growing,
+            SegmentationEffectType.ISLANDS: self._prepare_islands,
+            SegmentationEffectType.MARGIN: self._prepare_margin,
+        }.get(effect)
+        if prepare_effect is None:
+            return
+        if effect in (SegmentationEffectType.THRESHOLD, SegmentationEffectType.REGION_GROWING) and (
+            self._source_volume is None
+        ):
+            logger.warning(f"{effect.value}: no source volume for the labelmap")
+            return
+
+        compute = prepare_effect()
+        if compute is None:
+            return
+        # Progress is reported from the worker thread: hand it over to the event loop of the session
+        loop = asyncio.get_event_loop()
+        self._effect_progress = EffectProgress(
+            lambda value: loop.call_soon_threadsafe(self._set_effect_progress, value)
+        )
+        create_task(self._run_effect(effect, compute, self._effect_progress))
+
+    def cancel_effect(self) -> None:
+        if self._effect_progress is not None:
+            self._effect_progress.cancel()
+
     def set_paint_effects(self, slice_views: list[SliceViewLogic]) -> None:
         if not self._paint_effects:  # FIXME: needed to add this to not recreate SegmentPaintEffect2D
             for view in slice_views:
@@ -75,7 +310,18 @@ class SegmentationEffectLogic(BaseToolLogic[SegmentationEffectState]):
                     view.volume_handler.get_reslice_image_viewer(), self._segmentation_editor, self._brush_model
                 )
                 self._paint_effects.append(paint_effect)
-                paint_effect.update_requested.connect(self._views_logic.update_slice_views)
+                # The brush is only displayed in its view, labelmap edits update the other views
+                paint_effect.update_requested.connect(view.update)
+
+    def set_source_volume(self, image_data: vtkImageData | None) -> None:
+        """Volume the labelmap was created from, whose intensities are used by the threshold effects"""
+        self._source_volume = image_data
+        if image_data is None:
+            return
+        scalar_range = list(image_data.GetPointData().GetScalars().GetRange(0))
+        if self.threshold_effect_prop.scalar_range != scalar_range:
+            self.threshold_effect_prop.scalar_range = scalar_range
+            self.threshold_effect_prop.threshold_range = [(scalar_range[0] + scalar_range[1]) / 2, scalar_range[1]]
 
     def set_active_segment(self, object_data: vtkImageData | None, segment_value: int) -> None:
         if object_data is None:
@@ -83,9 +329,30 @@ class SegmentationEffectLogic(BaseToolLogic[SegmentationEffectState]):
         self._segmentation_editor.labelmap = object_data
         self._segmentation_editor.active_segment = segment_value
 
-    def clear_segment(self, object_data: vtkImageData, segment_value: int) -> None:
-        self._segmentation_editor.clear_segment(object_data, segment_value)
+    def set_segment_masks(self, segment_masks: SparseSegmentMasks | None) -> None:
+        """Masks of the overlapping segments of the active labelmap"""
+        self._segmentation_editor.segment_masks = segment_masks
+
+    def clear_segment(
+        self, object_data: vtkImageData, segment_value: int, segment_masks: SparseSegmentMasks | None = None
+    ) -> None:
+        self._segmentation_editor.clear_segment(object_data, segment_value, segment_masks)
+        # The segment is cleared because it is deleted: its value can be reused by a new segment,
+        # so the previous edits can no longer be replayed safely.
+        self._undo_stack.clear()
+
+    def undo(self) -> None:
+        self._undo_stack.undo()
+
+    def redo(self) -> None:
+        self._undo_stack.redo()
 
     def set_enabled(self, enabled: bool) -> None:
         if not enabled:
             self._deactivate_effects()
+
+    def set_ui(self, ui: SegmentationEffectUI) -> None:
+        ui.undo_clicked.connect(self.undo)
+        ui.redo_clicked.connect(self.redo)
+        ui.apply_clicked.connect(self.apply_effect)
+        ui.cancel_clicked.connect(self.cancel_effect)
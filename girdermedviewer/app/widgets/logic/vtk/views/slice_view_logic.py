@@ -16,6 +16,7 @@ from ....utils import (
     get_reslice_normals,
     get_reslice_window_level,
     get_slice_index_from_position,
+    is_extent_in_slice,
     reset_reslice,
     set_oblique_visibility,
     set_reslice_center,
@@ -47,9 +48,10 @@ class SliceViewLogic(ViewLogic[MeshSliceHandler, VolumeSliceHandler]):
     _debounced_flush_initialized = False
     DEBOUNCED_FLUSH = False
 
-    def __init__(self, *args, **kwargs) -> None:
+    def __init__(self, *args, reslice_image_viewer: vtkResliceImageViewer, **kwargs) -> None:
         super().__init__(*args, **kwargs)
         self.orientation = get_orientation_from_view_type(self.type)
+        self.reslice_image_viewer = reslice_image_viewer
 
         if (
             SliceViewLogic.DEBOUNCED_FLUSH and SliceViewLogic._debounced_flush_initialized is False
@@ -64,8 +66,12 @@ class SliceViewLogic(ViewLogic[MeshSliceHandler, VolumeSliceHandler]):
             }
         )
 
-        self.mesh_handler = MeshSliceHandler(self.color_preset_parser, self.renderer, self.orientation.value)
-        self.volume_handler = VolumeSliceHandler(self.color_preset_parser, self.renderer, self.orientation.value)
+        self.mesh_handler = MeshSliceHandler(
+            self.color_preset_parser, self.renderer, self.orientation.value, reslice_image_viewer
+        )
+        self.volume_handler = VolumeSliceHandler(
+            self.color_preset_parser, self.renderer, self.orientation.value, reslice_image_viewer
+        )
 
     @property
     def position(self) -> tuple[float]:
@@ -221,6 +227,9 @@ class SliceViewLogic(ViewLogic[MeshSliceHandler, VolumeSliceHandler]):
             self.position = new_position
             self.flush()
 
+    def is_extent_in_slice(self, image_data: vtkImageData, extent: list[int]) -> bool:
+        return is_extent_in_slice(self.reslice_image_viewer, self.orientation.value, image_data, extent)
+
     def on_window_level_changed(self, window_level: tuple[float], **_kwargs) -> None:
         logger.debug(f"set_window_level: {window_level}")
         modified = set_reslice_window_level(self.volume_handler.get_reslice_image_viewer(), window_level)
@@ -1,10 +1,19 @@
+import asyncio
 import logging
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any
 
-from vtk import vtkImageData, vtkPolyData
+from trame_server.utils.asynchronous import create_task
+from vtk import vtkCommand, vtkImageData, vtkPolyData
 
 from ....utils import (
+    FrameTimeMonitor,
+    LabelMapSurface,
     SceneObjectSubtype,
     VolumeLayer,
+    VolumeRenderingMode,
+    VolumeRenderingSettings,
+    is_interactive_render,
     reset_3D,
 )
 from ...scene.objects.mesh_object_logic import MeshDisplay
@@ -17,10 +26,75 @@ logger = logging.getLogger(__name__)
 
 
 class ThreeDViewLogic(ViewLogic[MeshThreedHandler, VolumeThreeDHandler]):
-    def __init__(self, *args, **kwargs) -> None:
+    def __init__(self, *args, volume_rendering_settings: VolumeRenderingSettings | None = None, **kwargs) -> None:
         super().__init__(*args, **kwargs)
+        self.volume_rendering_settings = volume_rendering_settings or VolumeRenderingSettings()
         self.mesh_handler = MeshThreedHandler(self.color_preset_parser, self.renderer)
-        self.volume_handler = VolumeThreeDHandler(self.volume_preset_parser, self.renderer)
+        self.volume_handler = VolumeThreeDHandler(
+            self.volume_preset_parser, self.renderer, self.volume_rendering_settings
+        )
+
+        self.frame_time_monitor = FrameTimeMonitor(self.render_window)
+        self._start_render_observer = None
+        # Volumes whose frames are played: the view renders them like during interactions
+        self._playing_ids: set[str] = set()
+        if self.volume_rendering_settings.mode == VolumeRenderingMode.CPU:
+            # Interactions ask for this update rate: CPU ray casting lowers its sampling to reach it
+            self.render_window.GetInteractor().SetDesiredUpdateRate(
+                self.volume_rendering_settings.interactive_frame_rate
+            )
+            self._start_render_observer = self.render_window.AddObserver(vtkCommand.StartEvent, self._on_start_render)
+
+        # Labelmap surfaces are generated in a worker thread, only in the extents modified since the last generation
+        self._labelmap_surfaces: dict[str, LabelMapSurface] = {}
+        self._dirty_surface_extents: dict[str, list[int]] = {}
+        self._surface_tasks: dict[str, asyncio.Task] = {}
+        self._surface_executor = ThreadPoolExecutor(1)
+
+    @property
+    def frame_time_stats(self) -> dict[str, dict[str, int | float]]:
+        return self.frame_time_monitor.stats
+
+    def _on_start_render(self, *_) -> None:
+        self.volume_handler.set_interactive(is_interactive_render(self.render_window))
+
+    def set_playing(self, data_id: str, is_playing: bool) -> None:
+        """
+        Render with the interactive update rate while the frames of a volume are played, so that CPU ray casting
+        keeps up with the playback, and render a still frame once no volume is played anymore.
+        """
+        was_playing = bool(self._playing_ids)
+        if is_playing:
+            self._playing_ids.add(data_id)
+        else:
+            self._playing_ids.discard(data_id)
+        if self._start_render_observer is None or was_playing == bool(self._playing_ids):
+            return
+
+        interactor = self.render_window.GetInteractor()
+        self.render_window.SetDesiredUpdateRate(
+            interactor.GetDesiredUpdateRate() if self._playing_ids else interactor.GetStillUpdateRate()
+        )
+        if not self._playing_ids:
+            self.update()
+
+    async def close(self) -> None:
+        logger.debug(f"3D view frame times: {self.frame_time_stats}")
+        self.frame_time_monitor.close()
+        if self._start_render_observer is not None:
+            self.render_window.RemoveObserver(self._start_render_observer)
+            self._start_render_observer = None
+        self._playing_ids.clear()
+        # A surface generation running in the worker completes in the background, its result is dropped
+        tasks = list(self._surface_tasks.values())
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._surface_tasks.clear()
+        self._dirty_surface_extents.clear()
+        self._labelmap_surfaces.clear()
+        self._surface_executor.shutdown(wait=False, cancel_futures=True)
+        await super().close()
 
     def add_volume(
         self,
@@ -31,10 +105,60 @@ class ThreeDViewLogic(ViewLogic[MeshThreedHandler, VolumeThreeDHandler]):
         subtype: SceneObjectSubtype,
     ) -> None:
         if subtype == SceneObjectSubtype.LABELMAP and layer == VolumeLayer.SECONDARY:
+            self._add_labelmap(data_id, image_data, data_display)
             return
         self.volume_handler.add_volume(data_id, image_data)
         self.volume_handler.apply_data_display(data_id, data_display)
 
+    def _add_labelmap(self, data_id: str, image_data: vtkImageData, data_display: VolumeDisplay) -> None:
+        surface = LabelMapSurface(image_data)
+        self._labelmap_surfaces[data_id] = surface
+        self.volume_handler.add_labelmap(data_id, surface, data_display)
+        self.update_labelmap_surface(image_data, list(image_data.GetExtent()))
+
+    def remove_volume(self, data_id: str, only_data: Any | None = None) -> None:
+        super().remove_volume(data_id, only_data)
+        if data_id not in self.volume_handler.object_data:
+            self.set_playing(data_id, False)
+            self._labelmap_surfaces.pop(data_id, None)
+            self._dirty_surface_extents.pop(data_id, None)
+
+    def update_labelmap_surface(self, image_data: vtkImageData, extent: list[int]) -> None:
+        """Regenerate the segment surfaces of the labelmap in the modified extent"""
+        data_id = next((id for id, surface in self._labelmap_surfaces.items() if surface.labelmap is image_data), None)
+        if data_id is None:
+            return
+
+        dirty_extent = self._dirty_surface_extents.get(data_id)
+        self._dirty_surface_extents[data_id] = (
+            list(extent)
+            if dirty_extent is None
+            else [min(dirty_extent[i], extent[i]) if i % 2 == 0 else max(dirty_extent[i], extent[i]) for i in range(6)]
+        )
+        # Edits made while a generation runs are gathered into the next one
+        task = self._surface_tasks.get(data_id)
+        if task is None or task.done():
+            self._surface_tasks[data_id] = create_task(self._generate_labelmap_surface(data_id))
+
+    async def _generate_labelmap_surface(self, data_id: str) -> None:
+        loop = asyncio.get_running_loop()
+        while data_id in self._dirty_surface_extents:
+            extent = self._dirty_surface_extents.pop(data_id)
+            surface = self._labelmap_surfaces.get(data_id)
+            if surface is None:
+                return
+
+            blocks = surface.copy_blocks(surface.get_block_ids(extent))
+            block_surfaces = await loop.run_in_executor(self._surface_executor, LabelMapSurface.compute_blocks, blocks)
+            if self._labelmap_surfaces.get(data_id) is not surface:
+                return
+
+            modified_values = surface.set_blocks(block_surfaces)
+            if modified_values:
+                self.volume_handler.update_labelmap_surface(data_id, modified_values)
+                self.update()
+        self._surface_tasks.pop(data_id, None)
+
     def add_mesh(self, data_id: str, poly_data: vtkPolyData, data_display: MeshDisplay, _subtype: SceneObjectSubtype) -> None:
         self.mesh_handler.add_mesh(data_id, poly_data)
         self.mesh_handler.apply_data_display(data_id, data_display)
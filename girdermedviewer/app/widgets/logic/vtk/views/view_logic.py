@@ -14,6 +14,7 @@ from ....utils import (
     VolumeLayer,
     VolumePresetParser,
     create_rendering_pipeline,
+    release_rendering_pipeline,
 )
 from ...base_logic import BaseLogic
 from ...scene.objects.mesh_object_logic import MeshDisplay
@@ -46,10 +47,22 @@ class ViewLogic(BaseLogic[ViewState], Generic[T, U], ABC):
         self.color_preset_parser = color_preset_parser
 
         self._views_state = TypedState(self.state, ViewsState)
+        self._ui: ViewUI | None = None
 
     def set_ui(self, ui: ViewUI) -> None:
+        self._ui = ui
         self.update = ui.update
 
+    async def close(self) -> None:
+        """Stop streaming the view, remove its objects and give its rendering pipeline back to the pool."""
+        if self._ui is not None:
+            await self._ui.close()
+        for data_id in list(self.mesh_handler.object_data):
+            self.remove_mesh(data_id)
+        for data_id in list(self.volume_handler.object_data):
+            self.remove_volume(data_id)
+        release_rendering_pipeline(self.renderer, self.render_window)
+
     @abstractmethod
     def reset(self) -> None:
         pass
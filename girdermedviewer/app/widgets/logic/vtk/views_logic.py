@@ -1,3 +1,4 @@
+import asyncio
 from typing import Any
 
 from trame_server.core import Server
@@ -7,15 +8,19 @@ from vtk import vtkImageData, vtkPolyData, vtkRenderWindow
 from ...logic.base_logic import BaseLogic
 from ...ui import ViewsState, ViewsUI, ViewType
 from ...utils import (
+    AppConfig,
     SceneObjectSubtype,
     VolumeLayer,
+    VolumeRenderingMode,
+    VolumeRenderingSettings,
+    create_reslice_image_viewers,
     get_color_preset_parser,
     get_volume_preset_parser,
 )
 from ..scene.objects.volume_object_logic import VolumeDisplay
 from .handlers.mesh_handler import MeshHandler
 from .handlers.volume_handler import VolumeHandler
-from .views.slice_view_logic import SliceViewLogic
+from .views.slice_view_logic import SliceViewLogic, get_orientation_from_view_type
 from .views.threed_view_logic import ThreeDViewLogic
 from .views.view_logic import ViewLogic
 
@@ -26,22 +31,44 @@ class ViewsLogic(BaseLogic[ViewsState]):
     all_objects_removed = Signal()
     primary_volume_added = Signal(vtkImageData)
 
-    def __init__(self, server: Server) -> None:
+    def __init__(self, server: Server, app_config: AppConfig) -> None:
         super().__init__(server, ViewsState)
         self.view_logics: dict[ViewType, ViewLogic[VolumeHandler]] = {}
 
         self.volume_preset_parser = get_volume_preset_parser()
         self.color_preset_parser = get_color_preset_parser()
+        # The reslice image viewers (and their shared reslice cursor) belong to this session only
+        self.reslice_image_viewers = create_reslice_image_viewers()
+        self.volume_rendering_settings = VolumeRenderingSettings(
+            mode=VolumeRenderingMode(app_config.volume_rendering_mode),
+            sample_distance=app_config.sample_distance,
+            interactive_sample_distance=app_config.interactive_sample_distance,
+            image_sample_distance=app_config.image_sample_distance,
+            interactive_image_sample_distance=app_config.interactive_image_sample_distance,
+            auto_adjust_sample_distances=app_config.auto_adjust_sample_distances,
+            interactive_frame_rate=app_config.interactive_frame_rate,
+            number_of_threads=app_config.ray_cast_threads,
+        )
 
         for view_type in ViewType:
-            view_logic_type = ThreeDViewLogic if view_type == ViewType.THREED else SliceViewLogic
-            self.view_logics[view_type] = view_logic_type(
-                server=self.server,
-                view_type=view_type,
-                volume_preset_parser=self.volume_preset_parser,
-                color_preset_parser=self.color_preset_parser,
-            )
-            self.view_logics[view_type].window_level_changed.connect(self.window_level_changed)
+            if view_type == ViewType.THREED:
+                view_logic = ThreeDViewLogic(
+                    server=self.server,
+                    view_type=view_type,
+                    volume_preset_parser=self.volume_preset_parser,
+                    color_preset_parser=self.color_preset_parser,
+                    volume_rendering_settings=self.volume_rendering_settings,
+                )
+            else:
+                view_logic = SliceViewLogic(
+                    server=self.server,
+                    view_type=view_type,
+                    volume_preset_parser=self.volume_preset_parser,
+                    color_preset_parser=self.color_preset_parser,
+                    reslice_image_viewer=self.reslice_image_viewers[get_orientation_from_view_type(view_type).value],
+                )
+            self.view_logics[view_type] = view_logic
+            view_logic.window_level_changed.connect(self.window_level_changed)
 
     @property
     def render_windows(self) -> dict[ViewType, vtkRenderWindow]:
@@ -99,6 +126,17 @@ class ViewsLogic(BaseLogic[ViewsState]):
             if self._is_view_shown(view):
                 view.update()
 
+    def update_slice_views_in_extent(self, image_data: vtkImageData, extent: list[int]) -> None:
+        """Update the slice views whose slice crosses the modified extent of image_data"""
+        for view in self.slice_views:
+            if self._is_view_shown(view) and view.is_extent_in_slice(image_data, extent):
+                view.update()
+
+    def update_labelmap_surfaces(self, image_data: vtkImageData, extent: list[int]) -> None:
+        """Regenerate the 3D surfaces of the labelmap in the modified extent"""
+        for view in self.threed_views:
+            view.update_labelmap_surface(image_data, extent)
+
     def set_ui(self, ui: ViewsUI):
         # Connect view logics to UI
         for view_type, view_ui in ui.view_uis.items():
@@ -111,6 +149,9 @@ class ViewsLogic(BaseLogic[ViewsState]):
             view_logic.reset()
         self.update_views()
 
+    async def close(self) -> None:
+        await asyncio.gather(*(view_logic.close() for view_logic in self.views))
+
     def add_mesh(
         self, data_id: str, poly_data: vtkPolyData, display_properties: VolumeDisplay, subtype: SceneObjectSubtype
     ):
@@ -81,7 +81,7 @@ class AppUI:
                 self.tool_ui = ToolUI()
 
             with self.layout.viewer:
-                self.views_ui = ViewsUI(render_windows)
+                self.views_ui = ViewsUI(render_windows, app_config)
 
             with self.layout.drawer:
                 self.scene_ui = SceneUI()
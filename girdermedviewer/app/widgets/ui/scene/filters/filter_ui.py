@@ -1,9 +1,10 @@
 from trame.widgets import html
+from trame.widgets import vuetify3 as v3
 from trame_dataclass.v2 import Provider
 from undo_stack import Signal
 
 from ....utils import ICONS_MAP, Button, FilterType, SceneObjectType
-from .gaussian_filter_ui import GaussianFilterUI
+from .image_filter_ui import ImageFilterUI
 from .segmentation_filter_ui import SegmentationFilterUI
 from .streamline_filter_ui import StreamlineFilterUI
 
@@ -11,18 +12,40 @@ from .streamline_filter_ui import StreamlineFilterUI
 class FilterToolbarUI(html.Div):
     filter_clicked = Signal(str, FilterType)
 
-    def __init__(self, obj_id: str, obj_type: str, **kwargs) -> None:
+    def __init__(self, obj_id: str, obj_type: str, image_filters: str, **kwargs) -> None:
         super().__init__(**kwargs)
         self._obj_id = obj_id
         self._obj_type = obj_type
+        self._image_filters = image_filters
 
         self._build_ui()
 
     def _build_ui(self):
         with self:
-            self._build_filter_button(FilterType.GAUSSIAN_BLUR, SceneObjectType.VOLUME)
+            self._build_image_filter_menu()
             self._build_filter_button(FilterType.SEGMENTATION, SceneObjectType.VOLUME)
 
+    def _build_image_filter_menu(self):
+        def _filter_clicked(obj_id, filter_type):
+            self.filter_clicked(obj_id, FilterType(filter_type))
+
+        with (
+            Button(
+                v_if=(self._is_obj_type(SceneObjectType.VOLUME)),
+                icon="mdi-image-filter-center-focus",
+                tooltip="Image filters",
+            ),
+            v3.VMenu(activator="parent"),
+            v3.VList(density="compact"),
+        ):
+            v3.VListItem(
+                v_for=(f"image_filter in {self._image_filters}",),
+                key="image_filter.value",
+                title=("image_filter.title",),
+                prepend_icon=("image_filter.icon",),
+                click=(_filter_clicked, f"[{self._obj_id}, image_filter.value]"),
+            )
+
     def _build_filter_button(self, filter_type: FilterType, scene_object_type: SceneObjectType):
         def _filter_clicked(obj_id):
             self.filter_clicked(obj_id, filter_type)
@@ -44,8 +67,8 @@ class FilterUI(html.Div):
         self._filter_type = f"{obj}.filter_type"
 
         with self, Provider(name="filter_prop", instance=(f"{obj}.filter_prop_id",)):
-            self.gaussian_filter = GaussianFilterUI(
-                v_if=(self._is_filter_active(FilterType.GAUSSIAN_BLUR),),
+            self.image_filter = ImageFilterUI(
+                v_if=("filter_prop?.parameter_specs",),
                 obj_filter_prop="filter_prop",
             )
             self.segmentation_filter = SegmentationFilterUI(
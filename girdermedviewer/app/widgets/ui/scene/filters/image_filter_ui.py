@@ -0,0 +1,37 @@
+from trame.widgets import html
+from trame.widgets import vuetify3 as v3
+
+from ....utils import Slider, Text
+
+
+class ImageFilterUI(html.Div):
+    """Slider for each parameter of an image filter, described by its parameter specs"""
+
+    def __init__(self, obj_filter_prop: str, **kwargs):
+        super().__init__(**kwargs)
+        self._filter_prop = obj_filter_prop
+        self._build_ui()
+
+    def _build_ui(self):
+        with self:
+            with html.Div(v_for=(f"spec in {self._filter_prop}.parameter_specs",), key="spec.name"):
+                Text("{{ spec.label }}", classes="text-header")
+                Slider(
+                    model_value=(f"{self._filter_prop}.parameters[spec.name]",),
+                    update_modelValue=(
+                        f"{self._filter_prop}.parameters = {{...{self._filter_prop}.parameters, [spec.name]: $event}}"
+                    ),
+                    min=("spec.minimum",),
+                    max=("spec.maximum",),
+                    step=("spec.step",),
+                )
+            v3.VProgressLinear(
+                v_if=(f"{self._filter_prop}.is_running",),
+                indeterminate=True,
+                color="primary",
+            )
+            Text(
+                "{{ " + self._filter_prop + ".error }}",
+                v_if=(f"{self._filter_prop}.error",),
+                classes="text-caption text-error",
+            )
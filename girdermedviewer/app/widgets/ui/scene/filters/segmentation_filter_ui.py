@@ -3,7 +3,7 @@ from trame.widgets import vuetify3 as v3
 from trame_server.utils.typed_state import TypedState
 from undo_stack import Signal
 
-from ....utils import Button, ColorPicker, Text, TextField
+from ....utils import Button, ColorPicker, LabelMapFormat, Selector, Text, TextField
 from ..scene_state import SceneState
 
 
@@ -27,6 +27,11 @@ class SegmentList(v3.VList):
     List view for the current active segments.
     """
 
+    _centroid_tooltip = (
+        "segment.statistics.centroid ? "
+        "`Centroid: ${segment.statistics.centroid.map((x) => x.toFixed(1)).join(', ')}` : ''"
+    )
+
     delete_segment_clicked = Signal(str, str)
     segment_clicked = Signal(str, str)
 
@@ -65,6 +70,12 @@ class SegmentList(v3.VList):
                     v_model=("segment.name",),
                     disabled=(f"segment._id !== {self._active_segment_id}",),
                 )
+                Text(
+                    "{{ segment.statistics.volume.toFixed(1) }} mm³ · {{ segment.statistics.voxel_count }} voxels",
+                    v_if=("segment.statistics",),
+                    classes="text-caption text-medium-emphasis",
+                    title=(self._centroid_tooltip,),
+                )
 
             with v3.Template(v_slot_append=True):
                 Button(
@@ -83,6 +94,7 @@ class SegmentationFilterUI(html.Div):
     add_segment_clicked = Signal(str)
     delete_segment_clicked = Signal(str, str)
     segment_clicked = Signal(str, str)
+    save_clicked = Signal(str)
 
     def __init__(self, obj_id: str, obj_filter_prop: str, **kwargs):
         super().__init__(**kwargs)
@@ -112,6 +124,7 @@ class SegmentationFilterUI(html.Div):
                         icon="mdi-plus",
                         click=(self.add_segment_clicked, f"[{self._obj_id}]"),
                     )
+                self._build_save_row()
 
             with html.Div(v_else=True, classes="d-flex justify-center"):
                 Button(
@@ -129,3 +142,29 @@ class SegmentationFilterUI(html.Div):
         )
         self.segment_list.delete_segment_clicked.connect(self.delete_segment_clicked)
         self.segment_list.segment_clicked.connect(self.segment_clicked)
+
+    def _build_save_row(self):
+        with html.Div(classes="d-flex align-center mt-2", style="gap: 8px;"):
+            Selector(
+                v_model=(f"{self._filter_prop}.save_format",),
+                items=([labelmap_format.value for labelmap_format in LabelMapFormat],),
+                disabled=(f"{self._filter_prop}.is_saving",),
+            )
+            v3.VProgressLinear(
+                v_if=(f"{self._filter_prop}.is_saving",),
+                model_value=(f"{self._filter_prop}.save_progress",),
+                color="primary",
+                rounded=True,
+                height=6,
+            )
+            Button(
+                v_else=True,
+                icon="mdi-content-save",
+                tooltip="Save labelmap to Girder",
+                click=(self.save_clicked, f"[{self._obj_id}]"),
+            )
+        Text(
+            "{{ " + self._filter_prop + ".save_error }}",
+            v_if=(f"{self._filter_prop}.save_error",),
+            classes="text-caption text-error",
+        )
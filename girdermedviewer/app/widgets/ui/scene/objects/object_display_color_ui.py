@@ -5,6 +5,7 @@ from trame_dataclass.v2 import Provider
 from ....utils import (
     Button,
     ColorPicker,
+    HistogramRangeSlider,
     MeshColoringMode,
     NumberInput,
     RangeSlider,
@@ -152,7 +153,8 @@ class VolumeRenderingShiftUI(html.Div):
     def _build_ui(self) -> None:
         with self:
             Text("Rendering Shift", classes="text-subtitle")
-            RangeSlider(
+            HistogramRangeSlider(
+                histogram=f"{self.display}.histogram",
                 v_model=(f"{self.display}.threed_color.vr_shift",),
                 min=(f"{self.display}.scalar_range[0]",),
                 max=(f"{self.display}.scalar_range[1]",),
@@ -172,21 +174,42 @@ class VolumeWindowLevelUI(html.Div):
     def _build_ui(self) -> None:
         with self:
             Text("Window / level", classes="text-subtitle")
-            with (
-                RangeSlider(
-                    v_model=f"{self.display}.window_level",
-                    min=(f"{self.display}.scalar_range[0]",),
-                    max=(f"{self.display}.scalar_range[1]",),
-                    disabled=(self.disabled,),
+            HistogramRangeSlider(
+                histogram=f"{self.display}.histogram",
+                v_model=f"{self.display}.window_level",
+                min=(f"{self.display}.scalar_range[0]",),
+                max=(f"{self.display}.scalar_range[1]",),
+                disabled=(self.disabled,),
+            )
+            Button(
+                tooltip="Auto Window/Level",
+                icon="mdi-refresh-auto",
+                # The first preset is the percentile based window level
+                click=(
+                    f"{self.display}.window_level = {self.display}.window_level_presets.length"
+                    f" ? {self.display}.window_level_presets[0].value : {self.display}.scalar_range"
                 ),
-                v3.Template(v_slot_append=True),
-            ):
-                Button(
-                    tooltip="Auto Window/Level",
-                    icon="mdi-refresh-auto",
-                    click=f"{self.display}.window_level = {self.display}.scalar_range",
-                    disabled=(self.disabled,),
-                )
+                disabled=(self.disabled,),
+            )
+
+
+class VolumeWindowLevelPresetsUI(html.Div):
+    def __init__(self, obj_display: str, **kwargs):
+        super().__init__(
+            v_if=(f"{obj_display}.window_level_presets.length",),
+            classes="display-property-setting",
+            **kwargs,
+        )
+        self.display = obj_display
+        self._build_ui()
+
+    def _build_ui(self) -> None:
+        with self:
+            Text("Window / level preset", classes="text-subtitle")
+            Selector(
+                items=(f"{self.display}.window_level_presets",),
+                v_model=(f"{self.display}.window_level",),
+            )
 
 
 class VolumeTwoDPresetsUI(html.Div):
@@ -281,3 +304,4 @@ class VolumeDisplayScalarColorUI(html.Div):
             VolumeRenderingShiftUI(obj_display)
             VolumeTwoDPresetsUI(obj_display, twod_presets)
             VolumeWindowLevelUI(obj_display)
+            VolumeWindowLevelPresetsUI(obj_display)
@@ -0,0 +1,42 @@
+from trame.widgets import html
+
+from ....utils import Button, NumberInput, Slider, Text
+
+
+class VolumeTimelineUI(html.Div):
+    def __init__(self, obj_timeline: str, **kwargs):
+        super().__init__(
+            classes="display-property",
+            **kwargs,
+        )
+        self.timeline = obj_timeline
+        self._build_ui()
+
+    def _build_ui(self):
+        with self:
+            Text("Timeline", classes="text-header")
+            with html.Div(classes="display-property-setting"):
+                Button(
+                    icon=(f"{self.timeline}.is_playing ? 'mdi-pause' : 'mdi-play'",),
+                    tooltip=(f"{self.timeline}.is_playing ? 'Pause' : 'Play'",),
+                    click=f"{self.timeline}.is_playing = !{self.timeline}.is_playing",
+                )
+                Slider(
+                    v_model=(f"{self.timeline}.frame",),
+                    min=0,
+                    max=(f"{self.timeline}.number_of_frames - 1",),
+                    step=1,
+                )
+                Text(f"{{{{ {self.timeline}.frame + 1 }}}} / {{{{ {self.timeline}.number_of_frames }}}}")
+            with html.Div(classes="display-property-setting"):
+                NumberInput(
+                    v_model=(f"{self.timeline}.fps",),
+                    label="Frames per second",
+                    min=1,
+                    max=60,
+                    step=(1.0,),
+                )
+                Text(
+                    f"{{{{ ({self.timeline}.frame * {self.timeline}.frame_duration).toFixed(2) }}}} s",
+                    v_if=(f"{self.timeline}.frame_duration",),
+                )
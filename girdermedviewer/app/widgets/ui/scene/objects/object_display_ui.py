@@ -8,6 +8,7 @@ from .object_display_color_ui import (
     VolumeDisplayVectorColorUI,
 )
 from .object_display_opacity_ui import ObjectDisplayOpacityUI
+from .object_display_timeline_ui import VolumeTimelineUI
 
 
 class VolumeDisplayUI(html.Div):
@@ -40,12 +41,23 @@ class VolumeDisplayUI(html.Div):
                     threed_presets=self.threed_presets,
                 )
 
-            with html.Div(v_if=(self._is_volume_subtype(SceneObjectSubtype.VECTOR),)):
+            with html.Div(
+                v_if=(
+                    " || ".join(
+                        self._is_volume_subtype(subtype)
+                        for subtype in (SceneObjectSubtype.VECTOR, SceneObjectSubtype.TENSOR)
+                    ),
+                )
+            ):
                 VolumeDisplayVectorColorUI(
                     v_if=(f"{self.display}.normal_color",),
                     obj_display=self.display,
                 )
 
+            with html.Div(v_if=(f"{self.display}.timeline",)):
+                v3.VDivider(classes="display-property-divider")
+                VolumeTimelineUI(obj_timeline=f"{self.display}.timeline")
+
             with html.Div(
                 v_if=(f"!{self.is_primary}",),
             ):
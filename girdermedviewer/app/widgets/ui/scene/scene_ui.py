@@ -175,6 +175,7 @@ class SceneObjectUI(v3.VExpansionPanel):
                         v_if=(f"!{self._is_labelmap()}",),
                         obj_id=f"{self._obj}._id",
                         obj_type=f"{self._obj}.object_type",
+                        image_filters=f"{self._scene}.image_filters",
                     )
                     v3.VSpacer()
                     with html.Div(classes="d-flex"):
@@ -199,6 +200,7 @@ class SceneUI(html.Div):
     add_segment_clicked = Signal(str)
     delete_segment_clicked = Signal(str, str)
     segment_clicked = Signal(str, str)
+    save_labelmap_clicked = Signal(str)
     visibility_clicked = Signal(str)
     overlay_clicked = Signal(str)
 
@@ -216,6 +218,7 @@ class SceneUI(html.Div):
         self.object_ui.filter_ui.segmentation_filter.add_segment_clicked.connect(self.add_segment_clicked)
         self.object_ui.filter_ui.segmentation_filter.delete_segment_clicked.connect(self.delete_segment_clicked)
         self.object_ui.filter_ui.segmentation_filter.segment_clicked.connect(self.segment_clicked)
+        self.object_ui.filter_ui.segmentation_filter.save_clicked.connect(self.save_labelmap_clicked)
 
     def _build_ui(self):
         with self, self._scene.provide_as("scene"):
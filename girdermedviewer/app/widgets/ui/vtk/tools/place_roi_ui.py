@@ -5,7 +5,7 @@ from trame.widgets import vuetify3 as v3
 from trame_server.utils.typed_state import TypedState
 from undo_stack import Signal
 
-from ....utils import Button
+from ....utils import Button, Selector
 from ...point_selector_ui import PointSelectorUI, PointState
 
 logger = logging.getLogger(__name__)
@@ -16,10 +16,13 @@ class PlaceROIState:
     is_roi_locked: bool = False
     min_roi_bounds: PointState = field(default_factory=PointState)
     max_roi_bounds: PointState = field(default_factory=PointState)
+    # Spacing of the cropped volume in multiples of the spacing of the volume
+    crop_downsample_factor: int = 1
 
 
 class PlaceROIUI(v3.VCard):
     reset_clicked = Signal()
+    crop_clicked = Signal()
 
     def __init__(self, **kwargs) -> None:
         super().__init__(classes="tool-card", title="Place ROI", variant="flat", **kwargs)
@@ -52,6 +55,24 @@ class PlaceROIUI(v3.VCard):
                     icon="mdi-autorenew",
                     tooltip="Reset",
                 )
+            with v3.VRow(dense=True, align="center", classes="mt-2"):
+                with v3.VCol():
+                    Selector(
+                        v_model=(self._typed_state.name.crop_downsample_factor,),
+                        items=(
+                            [
+                                {"title": "Native spacing", "value": 1},
+                                {"title": "Downsample x2", "value": 2},
+                                {"title": "Downsample x4", "value": 4},
+                            ],
+                        ),
+                    )
+                with v3.VCol(cols="auto"):
+                    Button(
+                        click=self.crop_clicked,
+                        icon="mdi-crop",
+                        tooltip="Crop volume to ROI",
+                    )
 
     def _toggle_roi_interaction(self) -> None:
         self._typed_state.data.is_roi_locked = not self._typed_state.data.is_roi_locked
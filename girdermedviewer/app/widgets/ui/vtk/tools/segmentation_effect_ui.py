@@ -4,8 +4,9 @@ from trame.widgets import html
 from trame.widgets import vuetify3 as v3
 from trame_dataclass.v2 import Provider
 from trame_server.utils.typed_state import TypedState
+from undo_stack import Signal
 
-from ....utils import Button, SegmentationEffectType, Slider, Text
+from ....utils import Button, RangeSlider, SegmentationEffectType, Slider, Text
 from ...scene.scene_state import SceneState
 
 
@@ -13,6 +14,11 @@ from ...scene.scene_state import SceneState
 class SegmentationEffectState:
     active_effect: SegmentationEffectType = SegmentationEffectType.UNDEFINED
     active_effect_prop_id: str | None = None
+    can_undo: bool = False
+    can_redo: bool = False
+    is_effect_running: bool = False
+    effect_progress: int = 0
+    allow_overlap: bool = False
 
 
 class PaintEraseEffectUI(html.Div):
@@ -35,7 +41,45 @@ class PaintEraseEffectUI(html.Div):
                 )
 
 
+class ThresholdEffectUI(html.Div):
+    def __init__(self, threshold_prop: str, **kwargs):
+        super().__init__(**kwargs)
+        self._threshold_prop = threshold_prop
+
+        with self:
+            Text("Intensity range", subtitle=True)
+            RangeSlider(
+                v_model=(f"{self._threshold_prop}.threshold_range",),
+                min=(f"{self._threshold_prop}.scalar_range[0]",),
+                max=(f"{self._threshold_prop}.scalar_range[1]",),
+                thumb_label="hover",
+            )
+
+
+class MarginEffectUI(html.Div):
+    def __init__(self, margin_prop: str, **kwargs):
+        super().__init__(**kwargs)
+        self._margin_prop = margin_prop
+
+        with self:
+            Text("Margin size (mm)", subtitle=True)
+            Slider(v_model=(f"{self._margin_prop}.margin_size",), min=-20, max=20, step=(0.5,))
+            Text("Negative margins shrink the segment", classes="text-caption")
+
+
 class SegmentationEffectUI(v3.VCard):
+    undo_clicked = Signal()
+    redo_clicked = Signal()
+    apply_clicked = Signal()
+    cancel_clicked = Signal()
+
+    COMPUTED_EFFECTS = (
+        SegmentationEffectType.THRESHOLD,
+        SegmentationEffectType.REGION_GROWING,
+        SegmentationEffectType.ISLANDS,
+        SegmentationEffectType.MARGIN,
+    )
+
     def __init__(self, **kwargs):
         super().__init__(classes="tool-card", variant="flat", **kwargs)
 
@@ -78,7 +122,11 @@ class SegmentationEffectUI(v3.VCard):
             with v3.VCardText(
                 classes=(f"{self.active_segment_id} == null ? 'disabled' : ''",),
             ):
-                with html.Div(classes="d-flex justify-space-between"):
+                with html.Div(
+                    classes=(
+                        f"{self._typed_state.name.is_effect_running} ? 'd-flex justify-space-between disabled' : 'd-flex justify-space-between'",
+                    )
+                ):
                     self._build_effect_button(
                         icon="mdi-cursor-default",
                         effect_type=SegmentationEffectType.UNDEFINED,
@@ -91,6 +139,41 @@ class SegmentationEffectUI(v3.VCard):
                         icon="mdi-eraser",
                         effect_type=SegmentationEffectType.ERASE,
                     )
+                    self._build_effect_button(
+                        icon="mdi-contrast-box",
+                        effect_type=SegmentationEffectType.THRESHOLD,
+                    )
+                    self._build_effect_button(
+                        icon="mdi-format-color-fill",
+                        effect_type=SegmentationEffectType.REGION_GROWING,
+                    )
+                    self._build_effect_button(
+                        icon="mdi-island",
+                        effect_type=SegmentationEffectType.ISLANDS,
+                    )
+                    self._build_effect_button(
+                        icon="mdi-arrow-expand-all",
+                        effect_type=SegmentationEffectType.MARGIN,
+                    )
+                    v3.VDivider(vertical=True)
+                    Button(
+                        icon="mdi-layers-triple",
+                        tooltip="Allow overlapping segments",
+                        click=f"{self._typed_state.name.allow_overlap} = !{self._typed_state.name.allow_overlap}",
+                        active=(self._typed_state.name.allow_overlap,),
+                    )
+                    Button(
+                        icon="mdi-undo",
+                        tooltip="Undo",
+                        click=self.undo_clicked,
+                        disabled=(f"!{self._typed_state.name.can_undo}",),
+                    )
+                    Button(
+                        icon="mdi-redo",
+                        tooltip="Redo",
+                        click=self.redo_clicked,
+                        disabled=(f"!{self._typed_state.name.can_redo}",),
+                    )
                 v3.VDivider(v_if=(f"!{self._is_active_effect(SegmentationEffectType.UNDEFINED)}",), classes="my-2")
                 with Provider(name="active_effect_prop", instance=(self.active_effect_prop_id,)):
                     PaintEraseEffectUI(
@@ -99,6 +182,54 @@ class SegmentationEffectUI(v3.VCard):
                         ),
                         paint_erase_prop="active_effect_prop",
                     )
+                    ThresholdEffectUI(
+                        v_if=(
+                            f"{self._is_active_effect(SegmentationEffectType.THRESHOLD)} || {self._is_active_effect(SegmentationEffectType.REGION_GROWING)}",
+                        ),
+                        threshold_prop="active_effect_prop",
+                    )
+                    MarginEffectUI(
+                        v_if=(self._is_active_effect(SegmentationEffectType.MARGIN),),
+                        margin_prop="active_effect_prop",
+                    )
+                Text(
+                    v_if=(self._is_active_effect(SegmentationEffectType.THRESHOLD),),
+                    text="Voxels in the region of interest",
+                    classes="text-caption",
+                )
+                Text(
+                    v_if=(self._is_active_effect(SegmentationEffectType.REGION_GROWING),),
+                    text="Grows from the cursor position within the region of interest",
+                    classes="text-caption",
+                )
+                Text(
+                    v_if=(self._is_active_effect(SegmentationEffectType.ISLANDS),),
+                    text="Removes the parts of the segment that are not connected to its largest part",
+                    classes="text-caption",
+                )
+                self._build_apply_row()
+
+    def _build_apply_row(self):
+        with html.Div(
+            v_if=(" || ".join(self._is_active_effect(effect_type) for effect_type in self.COMPUTED_EFFECTS),),
+            classes="d-flex align-center mt-2",
+            style="gap: 8px;",
+        ):
+            with html.Div(v_if=(self._typed_state.name.is_effect_running,), classes="d-flex align-center flex-grow-1"):
+                v3.VProgressLinear(
+                    model_value=(self._typed_state.name.effect_progress,),
+                    color="primary",
+                    rounded=True,
+                    height=6,
+                )
+                Button(icon="mdi-close", tooltip="Cancel", click=self.cancel_clicked, size="small")
+            Button(
+                v_else=True,
+                text="Apply",
+                color="primary",
+                block=True,
+                click=self.apply_clicked,
+            )
 
     def _build_effect_button(self, effect_type: SegmentationEffectType, **kwargs):
         Button(
@@ -2,13 +2,23 @@ import logging
 from dataclasses import dataclass, field
 from enum import Enum
 
-from trame.widgets import html, rca
+from trame.widgets import client, html, rca
 from trame.widgets import vuetify3 as v3
 from trame_server.utils.typed_state import TypedState
 from undo_stack import Signal
 from vtk import vtkRenderWindow
 
-from ...utils import Button
+from ...utils import (
+    AdaptiveViewAdapter,
+    AppConfig,
+    BandwidthBudget,
+    Button,
+    StreamingMode,
+    VideoCodec,
+    create_view_handler,
+    get_video_codec_string,
+    is_video_codec_available,
+)
 from ..point_selector_ui import PointState
 
 logger = logging.getLogger(__name__)
@@ -36,6 +46,7 @@ class ViewsState:
     are_sliders_visible: bool = False
     are_obliques_visible: bool = False
     fullscreen: ViewType | None = None
+    is_video_decoder_supported: bool = False
 
 
 @dataclass
@@ -62,27 +73,53 @@ class ViewSliderUI(v3.VSlider):
 
 
 class ViewUI(html.Div):
-    def __init__(self, view_type: ViewType, render_window: vtkRenderWindow, **kwargs) -> None:
+    def __init__(
+        self,
+        view_type: ViewType,
+        render_window: vtkRenderWindow,
+        app_config: AppConfig,
+        bandwidth_budget: BandwidthBudget,
+        **kwargs,
+    ) -> None:
         super().__init__(**kwargs)
 
         self.render_window = render_window
         self.type = view_type
+        self._app_config = app_config
+        self._bandwidth_budget = bandwidth_budget
+        # Only the 3D view benefits from inter-frame compression (continuous rotations of volume renderings)
+        self._video_codec = VideoCodec(app_config.video_codec) if view_type == ViewType.THREED else VideoCodec.NONE
+        self._has_video = is_video_codec_available(self._video_codec)
         self._views_state = TypedState(self.state, ViewsState)
         self._typed_state = TypedState(self.state, ViewState, namespace=view_type.value)
 
         self._build_ui()
+        if self._has_video:
+            self._views_state.bind_changes(
+                {self._views_state.name.is_video_decoder_supported: self._on_video_decoder_support_changed}
+            )
 
     def update(self) -> None:
         self.view_handler.update()
 
+    async def close(self) -> None:
+        await self.view_handler.close()
+
     def _build_ui(self) -> None:
         with self:
+            display = "image"
+            if self._has_video:
+                display = (f"{self._views_state.name.is_video_decoder_supported} ? 'video-decoder' : 'image'",)
             my_rca = rca.RemoteControlledArea(
-                v_if=(f"!{self._views_state.name.is_viewer_disabled}",), display="image", send_mouse_move=True
+                v_if=(f"!{self._views_state.name.is_viewer_disabled}",),
+                display=display,
+                send_mouse_move=True,
+                # Client statistics are only needed to adapt the streaming
+                monitor=10 if StreamingMode(self._app_config.streaming_mode) == StreamingMode.ADAPTIVE else 0,
+                stats=(self._on_stats, "[$event]"),
             )
-            self.view_handler = my_rca.create_view_handler(
-                self.render_window,
-                encoder="turbo-jpeg",
+            self.view_handler = create_view_handler(
+                my_rca, self.render_window, self._app_config, self._bandwidth_budget, self._video_codec
             )
             with html.Div(classes="view-gutter"), html.Div(classes="view-gutter-content"):
                 Button(
@@ -102,26 +139,48 @@ class ViewUI(html.Div):
                         disabled=(self._views_state.name.is_viewer_disabled,),
                     )
 
+    def _on_video_decoder_support_changed(self, is_supported: bool) -> None:
+        self.view_handler.is_video_enabled = is_supported
+
+    def _on_stats(self, stats: dict) -> None:
+        if isinstance(self.view_handler, AdaptiveViewAdapter):
+            self.view_handler.on_stats(stats)
+
     def toggle_fullscreen(self) -> None:
         self._views_state.data.fullscreen = None if self._views_state.data.fullscreen else self.type
 
 
 class ViewsUI(v3.VContainer):
-    def __init__(self, render_windows: dict[ViewType, vtkRenderWindow], **kwargs) -> None:
+    def __init__(self, render_windows: dict[ViewType, vtkRenderWindow], app_config: AppConfig, **kwargs) -> None:
         super().__init__(classes="fill-height pa-0", fluid=True, **kwargs)
         self._typed_state = TypedState(self.state, ViewsState)
         self.view_uis: dict[ViewType, ViewUI] = {}
+        self._bandwidth_budget = BandwidthBudget(app_config.bandwidth_budget * 1000)
 
-        self._build_quad_view(render_windows)
+        self._build_quad_view(render_windows, app_config)
 
-    def _build_quad_view(self, render_windows: dict[ViewType, vtkRenderWindow]) -> None:
+    def _build_quad_view(self, render_windows: dict[ViewType, vtkRenderWindow], app_config: AppConfig) -> None:
         with self, html.Div(classes="quad-view"):
+            video_codec = VideoCodec(app_config.video_codec)
+            if is_video_codec_available(video_codec):
+                # Let the server know whether the browser can decode the video streams (WebCodecs)
+                is_supported = self._typed_state.name.is_video_decoder_supported
+                client.ClientTriggers(
+                    mounted=(
+                        f"window.VideoDecoder && window.VideoDecoder"
+                        f".isConfigSupported({{ codec: '{get_video_codec_string(video_codec)}' }})"
+                        f".then((support) => {{ {is_supported} = support.supported }})"
+                        f".catch(() => {{ {is_supported} = false }})"
+                    )
+                )
             for view_type in [ViewType.SAGITTAL, ViewType.THREED, ViewType.CORONAL, ViewType.AXIAL]:
                 self.view_uis[view_type] = ViewUI(
                     v_if=(self._has_view(view_type),),
                     classes=(f"{self._has_fullscreen_view(view_type)} ? 'fullscreen-view' : 'view'",),
                     view_type=view_type,
                     render_window=render_windows.get(view_type),
+                    app_config=app_config,
+                    bandwidth_budget=self._bandwidth_budget,
                 )
 
     def _has_fullscreen_view(self, view_type: ViewType) -> str:
@@ -1,6 +1,7 @@
 from .app_utils import (
     AppConfig,
     convert_color_hex_to_normalized_rgb,
+    convert_normalized_rgb_to_color_hex,
     debounce,
     is_valid_url,
 )
@@ -8,6 +9,7 @@ from .components_utils import (
     Button,
     ColorPicker,
     GlobalStyle,
+    HistogramRangeSlider,
     LayerButton,
     LoadingButton,
     NumberInput,
@@ -26,6 +28,16 @@ from .girder_utils import (
     are_same_paths,
     format_date,
 )
+from .rca_utils import (
+    AdaptiveViewAdapter,
+    BandwidthBudget,
+    StreamingMode,
+    VideoCodec,
+    ViewAdapter,
+    create_view_handler,
+    get_video_codec_string,
+    is_video_codec_available,
+)
 from .scene_utils import (
     ICONS_MAP,
     FilterType,
@@ -34,6 +46,49 @@ from .scene_utils import (
     SegmentationEffectType,
     VolumeLayer,
 )
+from .vtk.dataset_cache import (
+    SHARED_DATASETS,
+    DatasetCache,
+    create_scalars_snapshot,
+    create_shared_labelmap,
+    create_shared_scalars_image,
+    detach_shared_scalars,
+    release_scalars_snapshot,
+    release_shared_scalars,
+)
+from .vtk.histogram import (
+    CT_WINDOW_LEVEL_PRESETS,
+    SHARED_HISTOGRAMS,
+    HistogramCache,
+    VolumeHistogram,
+)
+from .vtk.image_filters import (
+    SHARED_FILTER_RESULTS,
+    BiasFieldCorrection,
+    FilterPipeline,
+    FilterResultCache,
+    create_gradient_magnitude_filter,
+    create_median_filter,
+    create_resample_filter,
+    create_threshold_mask_filter,
+    crop_volume,
+    get_preview_shrink_factor,
+    hash_filter_output,
+    hash_image,
+    set_median_kernel_size,
+    set_number_of_threads,
+    set_resample_spacing_factor,
+)
+from .vtk.labelmap_io import (
+    LabelMapFormat,
+    LabelMapSegment,
+    create_labelmap_scalars,
+    get_label_values,
+    is_label_file,
+    read_labelmap_segments,
+    write_labelmap,
+)
+from .vtk.labelmap_surface import LabelMapSurface
 from .vtk.preset_utils import (
     ColorPresetParser,
     DataArray,
@@ -45,29 +100,52 @@ from .vtk.preset_utils import (
     get_color_preset_parser,
     get_volume_preset_parser,
 )
+from .vtk.render_window_pool import RENDER_WINDOW_POOL, RenderWindowPool
+from .vtk.segment_masks import SparseSegmentMasks
+from .vtk.segment_statistics import LabelMapStatistics
+from .vtk.segmentation import LabelMapDiff
+from .vtk.segmentation_effects import world_bounds_to_extent
+from .vtk.vector_field import VectorFieldGlyphs, VectorFieldGrids, get_sampling_stride
+from .vtk.volume_frames import FrameCache, NiftiFrameStore, compute_tensor_maps
+from .vtk.volume_rendering import (
+    FrameTimeMonitor,
+    ScalarBlockRanges,
+    VolumeRenderingMode,
+    VolumeRenderingSettings,
+    create_volume_mapper,
+    get_visible_scalar_intervals,
+    is_interactive_render,
+    set_volume_cropping,
+    set_volume_interactive,
+)
 from .vtk.vtk_utils import (
     create_gaussian_filter,
     create_rendering_pipeline,
+    create_reslice_image_viewers,
     create_streamline_filter,
     get_image_data,
     get_number_of_slices,
     get_position_from_slice_index,
     get_random_color,
     get_reslice_center,
+    get_reslice_cursor,
     get_reslice_normals,
     get_reslice_window_level,
     get_slice_index_from_position,
+    have_same_geometry,
+    is_extent_in_slice,
     is_streamline_file,
     load_mesh,
     load_volume,
     preload_mesh,
+    release_rendering_pipeline,
     remove_prop,
     render_labelmap_as_overlay_in_slice,
+    render_labelmap_surface_in_3D,
     render_mesh_in_3D,
     render_mesh_in_slice,
     render_streamline_in_slice,
     render_volume_as_overlay_in_slice,
-    render_volume_as_vector_field,
     render_volume_in_3D,
     render_volume_in_slice,
     reset_3D,
@@ -86,87 +164,151 @@ from .vtk.vtk_utils import (
     set_slice_opacity,
     set_slice_visibility,
     set_slice_window_level,
-    set_vector_field_arrow_length,
-    set_vector_field_arrow_thickness,
-    set_vector_field_sampling,
     set_volume_visibility,
     supported_mesh_extensions,
     supported_volume_extensions,
 )
 
 __all__ = [
+    "CT_WINDOW_LEVEL_PRESETS",
     "ICONS_MAP",
+    "RENDER_WINDOW_POOL",
+    "SHARED_DATASETS",
+    "SHARED_FILTER_RESULTS",
+    "SHARED_HISTOGRAMS",
+    "AdaptiveViewAdapter",
     "AppConfig",
     "AppLayout",
     "AppState",
+    "BandwidthBudget",
+    "BiasFieldCorrection",
     "Button",
     "CacheMode",
     "ColorPicker",
     "ColorPresetParser",
     "DataArray",
     "DataArrayType",
+    "DatasetCache",
     "FileFetchError",
     "FileFetcher",
+    "FilterPipeline",
+    "FilterResultCache",
     "FilterType",
+    "FrameCache",
+    "FrameTimeMonitor",
     "GirderConfig",
     "GirderItem",
     "GlobalStyle",
+    "HistogramCache",
+    "HistogramRangeSlider",
+    "LabelMapDiff",
+    "LabelMapFormat",
+    "LabelMapSegment",
+    "LabelMapStatistics",
+    "LabelMapSurface",
     "LayerButton",
     "LoadingButton",
     "MeshColoringMode",
+    "NiftiFrameStore",
     "NumberInput",
     "Preset",
     "PresetParser",
     "RangeSlider",
+    "RenderWindowPool",
+    "ScalarBlockRanges",
     "SceneObjectSubtype",
     "SceneObjectType",
     "SegmentationEffectType",
     "Selector",
     "Slider",
+    "SparseSegmentMasks",
+    "StreamingMode",
     "Text",
     "TextField",
+    "VectorFieldGlyphs",
+    "VectorFieldGrids",
+    "VideoCodec",
+    "ViewAdapter",
     "VolumeColoringMode",
+    "VolumeHistogram",
     "VolumeLayer",
     "VolumePresetParser",
+    "VolumeRenderingMode",
+    "VolumeRenderingSettings",
     "are_same_paths",
+    "compute_tensor_maps",
     "convert_color_hex_to_normalized_rgb",
+    "convert_normalized_rgb_to_color_hex",
     "create_gaussian_filter",
+    "create_gradient_magnitude_filter",
+    "create_labelmap_scalars",
+    "create_median_filter",
     "create_rendering_pipeline",
+    "create_resample_filter",
+    "create_reslice_image_viewers",
+    "create_scalars_snapshot",
+    "create_shared_labelmap",
+    "create_shared_scalars_image",
     "create_streamline_filter",
+    "create_threshold_mask_filter",
+    "create_view_handler",
+    "create_volume_mapper",
+    "crop_volume",
     "debounce",
+    "detach_shared_scalars",
     "format_date",
     "get_color_preset_parser",
     "get_image_data",
+    "get_label_values",
     "get_number_of_slices",
     "get_position_from_slice_index",
+    "get_preview_shrink_factor",
     "get_random_color",
     "get_reslice_center",
+    "get_reslice_cursor",
     "get_reslice_normals",
     "get_reslice_window_level",
+    "get_sampling_stride",
     "get_slice_index_from_position",
+    "get_video_codec_string",
+    "get_visible_scalar_intervals",
     "get_volume_preset_parser",
+    "hash_filter_output",
+    "hash_image",
+    "have_same_geometry",
+    "is_extent_in_slice",
+    "is_interactive_render",
+    "is_label_file",
     "is_streamline_file",
     "is_valid_url",
+    "is_video_codec_available",
     "load_mesh",
     "load_volume",
     "preload_mesh",
+    "read_labelmap_segments",
+    "release_rendering_pipeline",
+    "release_scalars_snapshot",
+    "release_shared_scalars",
     "remove_prop",
     "render_labelmap_as_overlay_in_slice",
+    "render_labelmap_surface_in_3D",
     "render_mesh_in_3D",
     "render_mesh_in_slice",
     "render_streamline_in_slice",
     "render_volume_as_overlay_in_slice",
-    "render_volume_as_vector_field",
     "render_volume_in_3D",
     "render_volume_in_slice",
     "reset_3D",
     "reset_reslice",
     "set_actor_opacity",
     "set_actor_visibility",
+    "set_median_kernel_size",
     "set_mesh_opacity",
     "set_mesh_solid_color",
     "set_mesh_visibility",
+    "set_number_of_threads",
     "set_oblique_visibility",
+    "set_resample_spacing_factor",
     "set_reslice_center",
     "set_reslice_normal",
     "set_reslice_opacity",
@@ -175,10 +317,11 @@ __all__ = [
     "set_slice_opacity",
     "set_slice_visibility",
     "set_slice_window_level",
-    "set_vector_field_arrow_length",
-    "set_vector_field_arrow_thickness",
-    "set_vector_field_sampling",
+    "set_volume_cropping",
+    "set_volume_interactive",
     "set_volume_visibility",
     "supported_mesh_extensions",
     "supported_volume_extensions",
+    "world_bounds_to_extent",
+    "write_labelmap",
 ]
@@ -1,6 +1,7 @@
 import asyncio
 import logging
 import sys
+from configparser import ConfigParser
 from dataclasses import dataclass
 from dataclasses import field as dc_field
 from functools import wraps
@@ -23,6 +24,54 @@ class AppConfig:
     cache_mode: str | None = None
     girder_configs: dict[str, GirderConfig] = dc_field(default_factory=dict)
     default_url: str | None = None
+    streaming_mode: str = "fixed"
+    target_fps: float = 30
+    interactive_quality: int = 60
+    still_quality: int = 90
+    min_interactive_quality: int = 20
+    min_interactive_scale: float = 0.5
+    target_latency: int = 250
+    video_codec: str = "none"
+    bandwidth_budget: int = 0
+    render_window_pool_size: int = 0
+    volume_rendering_mode: str = "auto"
+    sample_distance: float = 1.0
+    interactive_sample_distance: float = 2.0
+    image_sample_distance: float = 1.0
+    interactive_image_sample_distance: float = 2.0
+    auto_adjust_sample_distances: bool = True
+    interactive_frame_rate: float = 10
+    ray_cast_threads: int = 0
+    filter_threads: int = 0
+    filter_memory_budget: int = 2048
+    filter_cache_memory: int = 512
+    undo_memory_budget: int = 256
+    max_segments_per_labelmap: int = 255
+    max_auto_label_values: int = 32
+
+    def __post_init__(self) -> None:
+        # Values read from app.cfg are strings
+        self.target_fps = float(self.target_fps)
+        self.interactive_quality = int(self.interactive_quality)
+        self.still_quality = int(self.still_quality)
+        self.min_interactive_quality = int(self.min_interactive_quality)
+        self.min_interactive_scale = float(self.min_interactive_scale)
+        self.target_latency = int(self.target_latency)
+        self.bandwidth_budget = int(self.bandwidth_budget)
+        self.render_window_pool_size = int(self.render_window_pool_size)
+        self.sample_distance = float(self.sample_distance)
+        self.interactive_sample_distance = float(self.interactive_sample_distance)
+        self.image_sample_distance = float(self.image_sample_distance)
+        self.interactive_image_sample_distance = float(self.interactive_image_sample_distance)
+        self.auto_adjust_sample_distances = ConfigParser.BOOLEAN_STATES[str(self.auto_adjust_sample_distances).lower()]
+        self.interactive_frame_rate = float(self.interactive_frame_rate)
+        self.ray_cast_threads = int(self.ray_cast_threads)
+        self.filter_threads = int(self.filter_threads)
+        self.filter_memory_budget = int(self.filter_memory_budget)
+        self.filter_cache_memory = int(self.filter_cache_memory)
+        self.undo_memory_budget = int(self.undo_memory_budget)
+        self.max_segments_per_labelmap = int(self.max_segments_per_labelmap)
+        self.max_auto_label_values = int(self.max_auto_label_values)
 
 
 def is_valid_url(url):
@@ -94,3 +143,7 @@ def debounce(wait, disabled=False):
 def convert_color_hex_to_normalized_rgb(hex_color) -> tuple[float]:
     hex = hex_color.lstrip("#")
     return tuple(round(int(hex[i : i + 2], 16) / 255.0, 3) for i in (0, 2, 4))
+
+
+def convert_normalized_rgb_to_color_hex(rgb) -> str:
+    return "#{:02x}{:02x}{:02x}".format(*(round(min(max(component, 0.0), 1.0) * 255) for component in rgb))
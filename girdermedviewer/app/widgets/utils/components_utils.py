@@ -12,6 +12,7 @@ from trame.widgets.vuetify3 import (
     VRangeSlider,
     VSelect,
     VSlider,
+    VSparkline,
     VTextField,
     VTooltip,
 )
@@ -174,6 +175,25 @@ class RangeSlider(VRangeSlider):
         )
 
 
+class HistogramRangeSlider(Div):
+    """Range slider drawn over the histogram of the values it selects, given as counts normalized to [0, 1]"""
+
+    def __init__(self, histogram: str, **kwargs):
+        super().__init__(classes="histogram-range-slider")
+        with self:
+            VSparkline(
+                v_if=(f"{histogram}?.length",),
+                model_value=(histogram,),
+                type="bar",
+                auto_line_width=True,
+                padding=0,
+                height=32,
+                color="grey",
+                classes="histogram",
+            )
+            RangeSlider(**kwargs)
+
+
 class Selector(VSelect):
     def __init__(self, **kwargs):
         super().__init__(flat=True, hide_details=True, variant="solo-filled", density="compact", **kwargs)
@@ -190,6 +210,8 @@ class GlobalStyle(Style):
             ".drawer .v-navigation-drawer__content { display: flex; flex-direction: column; justify-content: space-between;} "
             ".fullscreen-view { position: relative; width: 100% !important; height: 100% !important; }"
             ".girder-browser { width: 100%; } "
+            ".histogram-range-slider { position: relative; flex-grow: 1; } "
+            ".histogram-range-slider .histogram { position: absolute; left: 8px; right: 8px; bottom: 50%; opacity: 0.3; pointer-events: none; } "
             "html { overflow-y: hidden; } "
             ".item-card-title { gap: 16px; padding: 12px; height: 64px; } "
             ".item-card .v-expansion-panel-text__wrapper { padding: 0 !important; }"
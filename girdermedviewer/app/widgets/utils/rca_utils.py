@@ -0,0 +1,530 @@
+import asyncio
+import logging
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from enum import Enum
+from fractions import Fraction
+from typing import Any
+
+from numpy.typing import NDArray
+from trame.app import asynchronous
+from trame.widgets import rca
+from trame_rca.utils import RcaRenderScheduler, RcaViewAdapter, time_now_ms
+from vtk import vtkRenderWindow
+
+from .app_utils import AppConfig
+
+try:
+    import av
+except ImportError:
+    av = None
+
+logger = logging.getLogger(__name__)
+
+STILL_RENDER_REQUEST = "still"
+
+
+class StreamingMode(Enum):
+    FIXED = "fixed"
+    ADAPTIVE = "adaptive"
+
+
+class VideoCodec(Enum):
+    NONE = "none"
+    VP9 = "vp9"
+    H264 = "h264"
+
+
+# PyAV encoder name, WebCodecs codec string and encoder options tuned for low latency
+VIDEO_CODEC_SETTINGS = {
+    VideoCodec.VP9: (
+        "libvpx-vp9",
+        "vp09.00.10.08",
+        {"deadline": "realtime", "cpu-used": "8", "lag-in-frames": "0", "row-mt": "1"},
+    ),
+    VideoCodec.H264: (
+        "libx264",
+        "avc1.42E034",
+        {"preset": "ultrafast", "tune": "zerolatency", "profile": "baseline"},
+    ),
+}
+
+
+def is_video_codec_available(codec: VideoCodec) -> bool:
+    if av is None or codec == VideoCodec.NONE:
+        return False
+    try:
+        av.codec.Codec(VIDEO_CODEC_SETTINGS[codec][0], "w")
+    except Exception:  # noqa: BLE001
+        return False
+    return True
+
+
+def get_video_codec_string(codec: VideoCodec) -> str | None:
+    """WebCodecs codec string of the streams encoded with codec"""
+    return VIDEO_CODEC_SETTINGS[codec][1] if codec in VIDEO_CODEC_SETTINGS else None
+
+
+class BandwidthBudget:
+    """
+    Bandwidth (in bytes per second) shared by all the views of a session.
+    A budget of 0 means unlimited.
+    """
+
+    WINDOW_MS = 1000
+
+    def __init__(self, budget: int = 0) -> None:
+        self.budget = budget
+        self._pushes: deque[tuple[int, int, Any]] = deque()
+        self._views: set[Any] = set()
+
+    def _expire(self) -> None:
+        now = time_now_ms()
+        while self._pushes and now - self._pushes[0][0] > self.WINDOW_MS:
+            self._pushes.popleft()
+
+    def add_view(self, view: Any) -> None:
+        self._views.add(view)
+
+    def remove_view(self, view: Any) -> None:
+        self._views.discard(view)
+
+    def record(self, size: int, view: Any = None) -> None:
+        self._pushes.append((time_now_ms(), size, view))
+
+    @property
+    def usage(self) -> int:
+        """Bytes sent during the last second"""
+        self._expire()
+        return sum(size for _, size, _ in self._pushes)
+
+    def get_view_usage(self, view: Any) -> int:
+        """Bytes sent for view during the last second"""
+        self._expire()
+        return sum(size for _, size, pushed_view in self._pushes if pushed_view is view)
+
+    def get_view_share(self, view: Any) -> int:
+        """
+        Bytes per second available to view, 0 if unlimited: an even share of the budget between the views,
+        or what the other views left unused during the last second if it is more.
+        """
+        if self.budget <= 0:
+            return 0
+        even_share = self.budget // max(len(self._views), 1)
+        return max(even_share, self.budget - (self.usage - self.get_view_usage(view)))
+
+    def is_exceeded(self) -> bool:
+        return self.budget > 0 and self.usage >= self.budget
+
+
+class VideoEncoder:
+    """
+    Encode consecutive frames of a view into a VP9 or H.264 stream decoded by the client with WebCodecs.
+    The encoder is stateful: frames must be encoded sequentially.
+    """
+
+    DEFAULT_BIT_RATE = 2_000_000
+    # Relative change of the bit rate that restarts the stream, with a key frame
+    BIT_RATE_TOLERANCE = 0.25
+
+    def __init__(self, codec: VideoCodec, target_fps: float, bit_rate: int = DEFAULT_BIT_RATE) -> None:
+        self._encoder_name, self._codec_string, self._options = VIDEO_CODEC_SETTINGS[codec]
+        self._target_fps = target_fps
+        self._bit_rate = bit_rate
+        self._context = None
+        self._size: tuple[int, int] | None = None
+
+    @property
+    def bit_rate(self) -> int:
+        return self._bit_rate
+
+    def set_bit_rate(self, bit_rate: int) -> None:
+        """Bit rate of the next frames, applied when it differs enough from the bit rate of the stream"""
+        self._bit_rate = bit_rate
+
+    def _is_bit_rate_outdated(self) -> bool:
+        stream_bit_rate = self._context.bit_rate
+        return abs(self._bit_rate - stream_bit_rate) > self.BIT_RATE_TOLERANCE * stream_bit_rate
+
+    def reset(self) -> None:
+        """Drop the current stream so that the next frame is a key frame."""
+        self._context = None
+
+    def _create_context(self, width: int, height: int):
+        context = av.CodecContext.create(self._encoder_name, "w")
+        context.width = width
+        context.height = height
+        context.pix_fmt = "yuv420p"
+        context.bit_rate = self._bit_rate
+        context.time_base = Fraction(1, 1000)
+        context.framerate = Fraction(round(self._target_fps), 1)
+        context.gop_size = max(1, round(self._target_fps * 2))
+        context.options = self._options
+        context.open()
+        return context
+
+    def encode(self, np_image: NDArray, _cols: int, _rows: int, quality: int) -> tuple[bytes, dict, int]:
+        now_ms = time_now_ms()
+        # yuv420p requires even dimensions
+        height, width = np_image.shape[0] & ~1, np_image.shape[1] & ~1
+        if self._context is None or self._size != (width, height) or self._is_bit_rate_outdated():
+            self._context = self._create_context(width, height)
+            self._size = (width, height)
+
+        frame = av.VideoFrame.from_ndarray(np_image[:height, :width, :3], format="rgb24")
+        frame.pts = now_ms
+        packets = self._context.encode(frame.reformat(format="yuv420p"))
+        meta = {
+            "type": "application/octet-stream",
+            "codec": self._codec_string,
+            "w": width,
+            "h": height,
+            "st": now_ms,
+            "key": "key" if any(packet.is_keyframe for packet in packets) else "delta",
+            "quality": quality,
+        }
+        return b"".join(bytes(packet) for packet in packets), meta, now_ms
+
+
+class ViewRenderScheduler(RcaRenderScheduler):
+    """
+    Render scheduler that can be asked for an immediate still (high quality) frame,
+    e.g. when an interaction ends, instead of waiting for the still render timeout.
+    Renders are delayed and merged while the session bandwidth budget is exceeded.
+    Frames are encoded with the video encoder, if any, while video is enabled, at the bit rate of the share of the
+    budget of the view.
+    """
+
+    def __init__(
+        self,
+        window: vtkRenderWindow,
+        *,
+        bandwidth_budget: BandwidthBudget | None = None,
+        video_encoder: VideoEncoder | None = None,
+        **kwargs,
+    ) -> None:
+        self._bandwidth_budget = bandwidth_budget
+        self._video_encoder = video_encoder
+        self._video_pool = ThreadPoolExecutor(1) if video_encoder is not None else None
+        self._is_video_enabled = False
+        # Renders delayed by the bandwidth budget since the last call to pop_delayed_renders
+        self._delayed_renders = 0
+        if bandwidth_budget is not None:
+            bandwidth_budget.add_view(self)
+        super().__init__(window, **kwargs)
+
+    @property
+    def is_video_enabled(self) -> bool:
+        return self._is_video_enabled
+
+    @is_video_enabled.setter
+    def is_video_enabled(self, enabled: bool) -> None:
+        enabled = enabled and self._video_encoder is not None
+        if enabled == self._is_video_enabled:
+            return
+        self._is_video_enabled = enabled
+        if enabled:
+            self._video_encoder.reset()
+        self.schedule_still_render()
+
+    def schedule_still_render(self) -> None:
+        asynchronous.create_task(self._request_render_queue.put(STILL_RENDER_REQUEST))
+
+    def record_push(self, size: int) -> None:
+        if self._bandwidth_budget is not None:
+            self._bandwidth_budget.record(size, self)
+
+    @property
+    def bandwidth_share(self) -> int:
+        """Bytes per second available to the view, 0 if unlimited"""
+        return 0 if self._bandwidth_budget is None else self._bandwidth_budget.get_view_share(self)
+
+    def pop_delayed_renders(self) -> int:
+        delayed_renders = self._delayed_renders
+        self._delayed_renders = 0
+        return delayed_renders
+
+    def _get_video_bit_rate(self) -> int:
+        bandwidth_share = self.bandwidth_share
+        return 8 * bandwidth_share if bandwidth_share > 0 else VideoEncoder.DEFAULT_BIT_RATE
+
+    async def _render_quality(self):
+        while not self._is_closing:
+            request = await self._request_render_queue.get()
+            if request == STILL_RENDER_REQUEST:
+                await self._render_quality_queue.put(self._still_quality)
+                continue
+            await self._render_quality_queue.put(self._interactive_quality)
+            await self._schedule_still_render()
+
+    async def _next_quality(self) -> int:
+        quality = await self._render_quality_queue.get()
+        if self._bandwidth_budget is None:
+            return quality
+        if self._bandwidth_budget.is_exceeded():
+            self._delayed_renders += 1
+        while self._bandwidth_budget.is_exceeded():
+            await asyncio.sleep(self._target_period_s)
+        # Merge the renders requested while waiting, keeping the best requested quality
+        while not self._render_quality_queue.empty():
+            quality = max(quality, self._render_quality_queue.get_nowait())
+        return quality
+
+    async def _render(self):
+        while not self._is_closing:
+            quality = await self._next_quality()
+            np_img, cols, rows = self._window.img_cols_rows
+            if self._is_video_enabled:
+                self._video_encoder.set_bit_rate(self._get_video_bit_rate())
+                future = self._video_pool.submit(self._video_encoder.encode, np_img, cols, rows, quality)
+            else:
+                future = self._encode_pool.submit(self._rca_encoder.encode, np_img, cols, rows, quality)
+            await self._push_queue.put(asyncio.wrap_future(future))
+
+    async def close(self):
+        if self._is_closing:
+            return
+        # The base scheduler waits for a last render, which is never rendered if it is merged into a pending still
+        # render: stop the tasks instead
+        self._is_closing = True
+        tasks = [self._render_task, self._render_quality_task, self._push_task]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        if self._bandwidth_budget is not None:
+            self._bandwidth_budget.remove_view(self)
+        if self._video_pool is not None:
+            self._video_pool.shutdown(wait=False)
+
+
+class ViewAdapter(RcaViewAdapter):
+    """View adapter accounting the pushed frames in the session bandwidth budget."""
+
+    def push(self, content, meta: dict) -> None:
+        # Video encoders may not output a packet for every frame
+        if not content:
+            return
+        self._scheduler.record_push(len(content))
+        super().push(content, meta)
+
+    @property
+    def is_video_enabled(self) -> bool:
+        return self._scheduler.is_video_enabled
+
+    @is_video_enabled.setter
+    def is_video_enabled(self, enabled: bool) -> None:
+        self._scheduler.is_video_enabled = enabled
+
+
+class AdaptiveViewAdapter(ViewAdapter):
+    """
+    View adapter that lowers the JPEG quality and the render resolution while the user interacts
+    and sends a single high quality frame when the interaction ends.
+    The interactive quality and resolution follow the bandwidth and frame latency reported by the client.
+    The client does not report them while it decodes video: the resolution then follows the share of the bandwidth
+    budget of the view, and the renders delayed by the budget.
+    """
+
+    SMOOTHING = 0.3
+    QUALITY_STEP = 10
+    SCALE_STEP = 0.1
+    ADAPT_PERIOD_MS = 500
+
+    def __init__(
+        self,
+        window: vtkRenderWindow,
+        name: str,
+        scheduler: ViewRenderScheduler,
+        interactive_quality: int,
+        still_quality: int,
+        min_interactive_quality: int,
+        min_interactive_scale: float,
+        target_latency: int,
+        **kwargs,
+    ) -> None:
+        super().__init__(window, name, scheduler=scheduler, **kwargs)
+        self._max_interactive_quality = interactive_quality
+        self._min_interactive_quality = min(min_interactive_quality, interactive_quality)
+        self._min_interactive_scale = min_interactive_scale
+        self._still_quality = still_quality
+        self._target_latency = target_latency
+
+        self._interactive_quality = interactive_quality
+        self._interactive_scale = 1.0
+        self._is_interacting = False
+        self._last_adapt_time_ms = 0
+
+        # Exponential moving averages of the client measurements
+        self.bandwidth: float | None = None
+        self.latency: float | None = None
+        self.frame_size: float | None = None
+
+    @staticmethod
+    def _smooth(average: float | None, value: float) -> float:
+        if average is None:
+            return value
+        return average + AdaptiveViewAdapter.SMOOTHING * (value - average)
+
+    @property
+    def interactive_quality(self) -> int:
+        return self._interactive_quality
+
+    @property
+    def interactive_scale(self) -> float:
+        return self._interactive_scale
+
+    def _set_scale(self, scale: float) -> None:
+        """Resize the render window without scheduling a render."""
+        if self._scale == scale:
+            return
+        self._scale = scale
+        if self._current_size is not None:
+            self._window.process_resize_event(*self.image_size)
+
+    def _is_link_saturated(self) -> bool:
+        if self.latency is not None and self.latency > self._target_latency:
+            return True
+        if self.is_video_enabled and self._scheduler.pop_delayed_renders() > 0:
+            return True
+        return (
+            self.bandwidth is not None
+            and self.frame_size is not None
+            and self.frame_size * self.target_fps > self.bandwidth
+        )
+
+    def _is_link_idle(self) -> bool:
+        return self.latency is None or self.latency < self._target_latency / 2
+
+    def _degrade(self) -> None:
+        # Video encoders ignore the JPEG quality
+        if self._interactive_quality > self._min_interactive_quality and not self.is_video_enabled:
+            self._interactive_quality = max(
+                self._min_interactive_quality, self._interactive_quality - self.QUALITY_STEP
+            )
+        else:
+            self._interactive_scale = max(
+                self._min_interactive_scale, round(self._interactive_scale - self.SCALE_STEP, 2)
+            )
+
+    def _improve(self) -> None:
+        if self._interactive_scale < 1.0:
+            self._interactive_scale = min(1.0, round(self._interactive_scale + self.SCALE_STEP, 2))
+        else:
+            self._interactive_quality = min(
+                self._max_interactive_quality, self._interactive_quality + self.QUALITY_STEP
+            )
+
+    def _adapt(self) -> None:
+        if self._is_link_saturated():
+            self._degrade()
+        elif self._is_link_idle():
+            self._improve()
+        else:
+            return
+
+        logger.debug(
+            f"{self.area_name}: interactive quality {self._interactive_quality}, scale {self._interactive_scale} "
+            f"(latency: {self.latency} ms, bandwidth: {self.bandwidth} B/s)"
+        )
+        self.update_quality(interactive=self._interactive_quality, still=self._still_quality)
+        if self._is_interacting:
+            self._set_scale(self._interactive_scale)
+
+    def on_stats(self, stats: dict[str, Any]) -> None:
+        """Handle the statistics periodically emitted by the client when its monitor is enabled."""
+        if stats.get("st") is not None:
+            self.latency = self._smooth(self.latency, max(0, time_now_ms() - stats["st"]))
+        if stats.get("bps"):
+            self.bandwidth = self._smooth(self.bandwidth, stats["bps"])
+        if time_now_ms() - self._last_adapt_time_ms < self.ADAPT_PERIOD_MS:
+            return
+        self._last_adapt_time_ms = time_now_ms()
+        self._adapt()
+
+    def _adapt_to_bandwidth_share(self) -> None:
+        """Adapt without client statistics, to the bandwidth available to the view on the server side"""
+        if time_now_ms() - self._last_adapt_time_ms < self.ADAPT_PERIOD_MS:
+            return
+        self._last_adapt_time_ms = time_now_ms()
+        self.bandwidth = self._scheduler.bandwidth_share or None
+        self._adapt()
+
+    def push(self, content, meta: dict) -> None:
+        if content:
+            self.frame_size = self._smooth(self.frame_size, len(content))
+        super().push(content, meta)
+        if self.is_video_enabled:
+            self._adapt_to_bandwidth_share()
+
+    @property
+    def is_video_enabled(self) -> bool:
+        return self._scheduler.is_video_enabled
+
+    @is_video_enabled.setter
+    def is_video_enabled(self, enabled: bool) -> None:
+        if enabled == self._scheduler.is_video_enabled:
+            return
+        self._scheduler.is_video_enabled = enabled
+        # Measurements of the other encoding are outdated
+        self.bandwidth = None
+        self.latency = None
+        self.frame_size = None
+        self._scheduler.pop_delayed_renders()
+
+    def on_interaction(self, origin, event) -> None:
+        event_type = event.get("type")
+        if event_type == "StartInteractionEvent":
+            self._is_interacting = True
+            self._set_scale(self._interactive_scale)
+        elif event_type == "EndInteractionEvent":
+            self._is_interacting = False
+            self._set_scale(1.0)
+            self._window.process_interaction_event(event)
+            # Rendering on interaction would queue an interactive frame after the still one
+            self._scheduler.schedule_still_render()
+            return
+        super().on_interaction(origin, event)
+
+
+def create_view_handler(
+    area: rca.RemoteControlledArea,
+    render_window: vtkRenderWindow,
+    app_config: AppConfig,
+    bandwidth_budget: BandwidthBudget | None = None,
+    video_codec: VideoCodec = VideoCodec.NONE,
+) -> ViewAdapter:
+    """
+    Create the view handler streaming render_window to the remote controlled area
+    according to the streaming configuration of the application.
+    If video_codec is available, the handler can switch to video encoding with `is_video_enabled`.
+    """
+    video_encoder = None
+    if is_video_codec_available(video_codec):
+        video_encoder = VideoEncoder(video_codec, target_fps=app_config.target_fps)
+    elif video_codec != VideoCodec.NONE:
+        logger.warning(f"Video codec {video_codec.value} is not available, falling back to JPEG streaming")
+
+    scheduler = ViewRenderScheduler(
+        render_window,
+        target_fps=app_config.target_fps,
+        interactive_quality=app_config.interactive_quality,
+        still_quality=app_config.still_quality,
+        rca_encoder="turbo-jpeg",
+        bandwidth_budget=bandwidth_budget,
+        video_encoder=video_encoder,
+    )
+    if StreamingMode(app_config.streaming_mode) == StreamingMode.FIXED:
+        view_handler = ViewAdapter(render_window, area.name, scheduler=scheduler)
+    else:
+        view_handler = AdaptiveViewAdapter(
+            render_window,
+            area.name,
+            scheduler=scheduler,
+            interactive_quality=app_config.interactive_quality,
+            still_quality=app_config.still_quality,
+            min_interactive_quality=app_config.min_interactive_quality,
+            min_interactive_scale=app_config.min_interactive_scale,
+            target_latency=app_config.target_latency,
+        )
+    area.add_view_handler(view_handler)
+    return view_handler
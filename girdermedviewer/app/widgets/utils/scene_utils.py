@@ -15,12 +15,21 @@ class DataclassEnum(Enum):
 class SegmentationEffectType(DataclassEnum):
     PAINT = "Paint"
     ERASE = "Erase"
+    THRESHOLD = "Threshold"
+    REGION_GROWING = "Region growing"
+    ISLANDS = "Keep largest island"
+    MARGIN = "Margin"
     UNDEFINED = "No tool"
 
 
 class FilterType(DataclassEnum):
     SEGMENTATION = "segmentation"
     GAUSSIAN_BLUR = "gaussian blur"
+    MEDIAN = "median"
+    GRADIENT_MAGNITUDE = "gradient magnitude"
+    THRESHOLD_MASK = "threshold mask"
+    RESAMPLE = "resample"
+    BIAS_CORRECTION = "bias correction"
     STREAMLINE = "streamline"
     UNDEFINED = None
 
@@ -40,6 +49,7 @@ class VolumeLayer(DataclassEnum):
 class SceneObjectSubtype(DataclassEnum):
     SCALAR = "scalar_volume"
     VECTOR = "vector_volume"
+    TENSOR = "tensor_volume"
     LABELMAP = "labelmap_volume"
     STREAMLINE = "streamline_mesh"
     UNDEFINED = None
@@ -48,6 +58,11 @@ class SceneObjectSubtype(DataclassEnum):
 ICONS_MAP = {
     FilterType.SEGMENTATION: "mdi-shape",
     FilterType.GAUSSIAN_BLUR: "mdi-blur",
+    FilterType.MEDIAN: "mdi-blur-linear",
+    FilterType.GRADIENT_MAGNITUDE: "mdi-gradient-horizontal",
+    FilterType.THRESHOLD_MASK: "mdi-contrast-box",
+    FilterType.RESAMPLE: "mdi-resize",
+    FilterType.BIAS_CORRECTION: "mdi-brightness-6",
     FilterType.STREAMLINE: "mdi-asterisk",
     SceneObjectType.MESH: "mdi-vector-polyline",
     SceneObjectType.VOLUME: "mdi-grid",
@@ -0,0 +1,168 @@
+import logging
+from collections.abc import Callable
+from dataclasses import dataclass
+
+from vtkmodules.vtkCommonCore import VTK_UNSIGNED_CHAR, vtkAbstractArray, vtkDataArray
+from vtkmodules.vtkCommonDataModel import vtkDataObject, vtkImageData
+
+logger = logging.getLogger(__name__)
+
+SharedData = vtkDataObject | vtkAbstractArray
+
+
+@dataclass
+class _SharedEntry:
+    data: SharedData
+    ref_count: int = 0
+
+
+class DatasetCache:
+    """
+    Read-only datasets shared by all the sessions of the process.
+    Each session acquires the dataset it displays and releases it when the object is removed from its scene;
+    a dataset is evicted as soon as no session references it anymore.
+    Shared datasets must never be modified in place: copy them before editing.
+    """
+
+    def __init__(self) -> None:
+        self._entries: dict[str, _SharedEntry] = {}
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def stats(self) -> dict[str, int | float]:
+        requests = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / requests if requests else 0.0,
+            "datasets": len(self._entries),
+            "references": sum(entry.ref_count for entry in self._entries.values()),
+            "memory_kb": sum(entry.data.GetActualMemorySize() for entry in self._entries.values()),
+        }
+
+    def acquire(self, key: str, loader: Callable[[], SharedData]) -> SharedData:
+        """Return the dataset stored under key, loading it on first use, and add a reference to it."""
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            entry = self._entries[key] = _SharedEntry(loader())
+        else:
+            self.hits += 1
+        entry.ref_count += 1
+        logger.debug(f"Acquired shared dataset {key} ({entry.ref_count} references)")
+        return entry.data
+
+    def release(self, key: str) -> None:
+        entry = self._entries.get(key)
+        if entry is None:
+            logger.debug(f"Shared dataset {key} is not cached")
+            return
+        entry.ref_count -= 1
+        if entry.ref_count <= 0:
+            self._entries.pop(key)
+            logger.debug(f"Evicted shared dataset {key}: {self.stats}")
+
+    def get_ref_count(self, key: str) -> int:
+        entry = self._entries.get(key)
+        return entry.ref_count if entry is not None else 0
+
+    def get_key(self, data: SharedData | None) -> str | None:
+        """Return the key of a shared dataset, None if data is not shared."""
+        if data is None:
+            return None
+        return next((key for key, entry in self._entries.items() if entry.data is data), None)
+
+
+SHARED_DATASETS = DatasetCache()
+
+
+def _create_empty_labelmap_scalars(number_of_points: int, scalar_type: int) -> vtkDataArray:
+    scalars = vtkDataArray.CreateDataArray(scalar_type)
+    scalars.SetName("ImageScalars")
+    scalars.SetNumberOfComponents(1)
+    scalars.SetNumberOfTuples(number_of_points)
+    scalars.FillComponent(0, 0)
+    return scalars
+
+
+def create_shared_labelmap(reference: vtkImageData, scalar_type: int = VTK_UNSIGNED_CHAR) -> vtkImageData:
+    """
+    Create an empty labelmap with the geometry of reference and scalars of scalar_type.
+    Its scalars are shared with all the empty labelmaps of the same size until it is first edited,
+    see detach_shared_scalars.
+    """
+    labelmap = reference.NewInstance()
+    labelmap.CopyStructure(reference)
+    number_of_points = labelmap.GetNumberOfPoints()
+    scalars = SHARED_DATASETS.acquire(
+        f"empty-labelmap:{scalar_type}:{number_of_points}",
+        lambda: _create_empty_labelmap_scalars(number_of_points, scalar_type),
+    )
+    labelmap.GetPointData().SetScalars(scalars)
+    return labelmap
+
+
+def create_shared_scalars_image(image_data: vtkImageData, key: str) -> vtkImageData:
+    """
+    Create an image with the geometry of image_data whose scalars are shared under key until it is first edited,
+    see detach_shared_scalars.
+    """
+    shared_image = image_data.NewInstance()
+    shared_image.CopyStructure(image_data)
+    shared_image.GetPointData().SetScalars(SHARED_DATASETS.acquire(key, image_data.GetPointData().GetScalars))
+    return shared_image
+
+
+def detach_shared_scalars(image_data: vtkImageData) -> bool:
+    """
+    Give image_data its own copy of its scalars if they are shared (copy-on-write).
+    Must be called before modifying the scalars in place. Return True if a copy was made.
+    """
+    scalars = image_data.GetPointData().GetScalars()
+    key = SHARED_DATASETS.get_key(scalars)
+    if key is None:
+        return False
+
+    own_scalars = scalars.NewInstance()
+    own_scalars.DeepCopy(scalars)
+    image_data.GetPointData().SetScalars(own_scalars)
+    SHARED_DATASETS.release(key)
+    return True
+
+
+def release_shared_scalars(image_data: vtkImageData | None) -> None:
+    """Drop the reference image_data holds on its scalars if they are still shared."""
+    if image_data is None:
+        return
+    key = SHARED_DATASETS.get_key(image_data.GetPointData().GetScalars())
+    if key is not None:
+        SHARED_DATASETS.release(key)
+
+
+def create_scalars_snapshot(image_data: vtkImageData) -> vtkImageData:
+    """
+    Read-only copy of image_data sharing its scalars, for another thread to read them while image_data is edited:
+    image_data gets its own copy of its scalars on its next edit only (copy-on-write, see detach_shared_scalars).
+    Release the snapshot with release_scalars_snapshot.
+    """
+    scalars = image_data.GetPointData().GetScalars()
+    key = SHARED_DATASETS.get_key(scalars)
+    if key is None:
+        # Reference held by image_data until it is edited
+        key = f"snapshot:{id(scalars)}"
+        SHARED_DATASETS.acquire(key, lambda: scalars)
+    SHARED_DATASETS.acquire(key, lambda: scalars)
+
+    snapshot = image_data.NewInstance()
+    snapshot.CopyStructure(image_data)
+    snapshot.GetPointData().SetScalars(scalars)
+    return snapshot
+
+
+def release_scalars_snapshot(snapshot: vtkImageData, image_data: vtkImageData) -> None:
+    """Release a snapshot of image_data; if image_data was not edited meanwhile, it owns its scalars again."""
+    release_shared_scalars(snapshot)
+    key = SHARED_DATASETS.get_key(image_data.GetPointData().GetScalars())
+    if key is not None and key.startswith("snapshot:") and SHARED_DATASETS.get_ref_count(key) == 1:
+        SHARED_DATASETS.release(key)
@@ -0,0 +1,130 @@
+import logging
+from collections import OrderedDict
+
+import numpy as np
+from numpy.typing import NDArray
+from vtk import vtkImageData
+from vtkmodules.util.numpy_support import vtk_to_numpy
+
+logger = logging.getLogger(__name__)
+
+# Window / level presets of CT volumes in Hounsfield units, as (window, level)
+CT_WINDOW_LEVEL_PRESETS = {
+    "CT Brain": (80, 40),
+    "CT Soft tissue": (400, 40),
+    "CT Lung": (1500, -600),
+    "CT Bone": (1800, 400),
+}
+# CT volumes have air around -1000 HU and padding values down to -3024 HU
+CT_MINIMUM_RANGE = (-3100, -900)
+
+
+class VolumeHistogram:
+    """
+    Histogram of the scalars of a single component volume over its scalar range.
+    Large volumes are subsampled with a strided view so that at most max_samples voxels are counted: percentiles
+    only need the shape of the distribution.
+    """
+
+    NUMBER_OF_BINS = 256
+    MAX_SAMPLES = 1 << 22
+
+    def __init__(self, counts: NDArray[np.int64], bin_edges: NDArray[np.float64]) -> None:
+        self.counts = counts
+        self.bin_edges = bin_edges
+        self._cumulative_counts = np.cumsum(counts)
+
+    @classmethod
+    def compute(
+        cls, image_data: vtkImageData, number_of_bins: int = NUMBER_OF_BINS, max_samples: int = MAX_SAMPLES
+    ) -> "VolumeHistogram":
+        dimensions = image_data.GetDimensions()
+        array = vtk_to_numpy(image_data.GetPointData().GetScalars()).reshape(dimensions[::-1])
+        # Same stride along each axis to keep samples evenly spread
+        stride = max(int(np.ceil((array.size / max_samples) ** (1 / 3))), 1)
+        samples = array[::stride, ::stride, ::stride]
+        scalar_range = image_data.GetScalarRange()
+        if scalar_range[0] >= scalar_range[1]:
+            scalar_range = (scalar_range[0], scalar_range[0] + 1)
+        counts, bin_edges = np.histogram(samples, bins=number_of_bins, range=scalar_range)
+        return cls(counts, bin_edges)
+
+    @property
+    def scalar_range(self) -> list[float]:
+        return [float(self.bin_edges[0]), float(self.bin_edges[-1])]
+
+    def get_percentile(self, percent: float) -> float:
+        """Scalar below which percent of the samples are, interpolated inside its bin"""
+        total = self._cumulative_counts[-1]
+        if total == 0:
+            return self.scalar_range[0]
+        count = total * percent / 100
+        index = min(int(np.searchsorted(self._cumulative_counts, count)), len(self.counts) - 1)
+        previous_count = self._cumulative_counts[index - 1] if index > 0 else 0
+        fraction = (count - previous_count) / self.counts[index] if self.counts[index] else 0
+        return float(self.bin_edges[index] + fraction * (self.bin_edges[index + 1] - self.bin_edges[index]))
+
+    def get_auto_window_level(self, lower_percent: float = 1, upper_percent: float = 99) -> list[float]:
+        """Range of the scalars between the two percentiles, which leaves out outliers such as metal or padding"""
+        window_level = [self.get_percentile(lower_percent), self.get_percentile(upper_percent)]
+        if window_level[0] >= window_level[1]:
+            return self.scalar_range
+        return window_level
+
+    def is_ct(self) -> bool:
+        """Whether the scalars look like Hounsfield units, as no modality is read from the volume files"""
+        return CT_MINIMUM_RANGE[0] <= self.scalar_range[0] <= CT_MINIMUM_RANGE[1]
+
+    def get_window_level_presets(self) -> list[dict[str, str | list[float]]]:
+        """Window level presets as select items, CT windows included for CT volumes"""
+        presets = [
+            {"title": "Auto", "value": self.get_auto_window_level()},
+            {"title": "Full range", "value": self.scalar_range},
+        ]
+        if self.is_ct():
+            presets += [
+                {"title": name, "value": [level - window / 2, level + window / 2]}
+                for name, (window, level) in CT_WINDOW_LEVEL_PRESETS.items()
+            ]
+        return presets
+
+    def get_normalized_counts(self, number_of_bins: int = 64) -> list[float]:
+        """Counts resampled to number_of_bins in a log scale normalized to [0, 1], to draw the histogram"""
+        counts = self.counts
+        if len(counts) % number_of_bins == 0:
+            counts = counts.reshape(number_of_bins, -1).sum(axis=1)
+        counts = np.log1p(counts)
+        maximum = counts.max()
+        if maximum == 0:
+            return [0.0] * len(counts)
+        return np.round(counts / maximum, 3).tolist()
+
+
+class HistogramCache:
+    """
+    Histograms of the volumes shared between sessions, stored under the key of their shared dataset.
+    Shared datasets are never modified in place, so their histogram only needs to be computed once.
+    """
+
+    MAX_SIZE = 64
+
+    def __init__(self, max_size: int = MAX_SIZE) -> None:
+        self._histograms: OrderedDict[str, VolumeHistogram] = OrderedDict()
+        self._max_size = max_size
+
+    def get(self, key: str | None) -> VolumeHistogram | None:
+        histogram = self._histograms.get(key)
+        if histogram is not None:
+            self._histograms.move_to_end(key)
+        return histogram
+
+    def add(self, key: str | None, histogram: VolumeHistogram) -> None:
+        if key is None:
+            return
+        self._histograms[key] = histogram
+        self._histograms.move_to_end(key)
+        while len(self._histograms) > self._max_size:
+            self._histograms.popitem(last=False)
+
+
+SHARED_HISTOGRAMS = HistogramCache()
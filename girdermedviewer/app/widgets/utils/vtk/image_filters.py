@@ -0,0 +1,294 @@
+import hashlib
+import logging
+import math
+from collections import OrderedDict
+from typing import Any
+
+import numpy as np
+from vtk import (
+    VTK_UNSIGNED_CHAR,
+    vtkImageAlgorithm,
+    vtkImageData,
+    vtkImageGaussianSmooth,
+    vtkImageGradientMagnitude,
+    vtkImageMedian3D,
+    vtkImageResample,
+    vtkImageReslice,
+    vtkImageShrink3D,
+    vtkImageThreshold,
+    vtkSMPTools,
+    vtkThreadedImageAlgorithm,
+)
+from vtkmodules.util.numpy_support import numpy_to_vtk, vtk_to_numpy
+from vtkmodules.util.vtkAlgorithm import VTKPythonAlgorithmBase
+
+logger = logging.getLogger(__name__)
+
+
+def set_number_of_threads(image_filter: vtkThreadedImageAlgorithm, number_of_threads: int) -> None:
+    """
+    Split the filter execution with the SMP tools if VTK was built with a parallel backend, otherwise run it on
+    number_of_threads threads, 0 for one per core.
+    """
+    if vtkSMPTools.GetBackend() != "Sequential":
+        image_filter.EnableSMPOn()
+    if number_of_threads > 0:
+        image_filter.SetNumberOfThreads(number_of_threads)
+
+
+def get_preview_shrink_factor(image_data: vtkImageData, max_voxels: int) -> int:
+    """Factor to shrink each dimension of image_data by for it to have at most max_voxels, 1 if it already has"""
+    number_of_voxels = image_data.GetNumberOfPoints()
+    if number_of_voxels <= max_voxels:
+        return 1
+    return math.ceil((number_of_voxels / max_voxels) ** (1 / 3))
+
+
+class FilterPipeline:
+    """
+    Pipeline running an image filter, built once and reused by all its runs. The outputs of its algorithms are kept
+    between runs, the next run writes into them when they are no longer referenced elsewhere.
+    With a shrink_factor, the filter runs on its input shrunk shrink_factor times in each dimension, and its output
+    is resampled back to the geometry of the input to preview the full resolution output.
+    """
+
+    def __init__(self, image_filter: vtkImageAlgorithm, shrink_factor: int = 1) -> None:
+        self.image_filter = image_filter
+        self._shrink: vtkImageShrink3D | None = None
+        self._reslice: vtkImageReslice | None = None
+        if shrink_factor > 1:
+            self._shrink = vtkImageShrink3D()
+            self._shrink.SetShrinkFactors(shrink_factor, shrink_factor, shrink_factor)
+            self._shrink.AveragingOn()
+            image_filter.SetInputConnection(self._shrink.GetOutputPort())
+
+            self._reslice = vtkImageReslice()
+            self._reslice.SetInputConnection(image_filter.GetOutputPort())
+            self._reslice.SetInterpolationModeToLinear()
+            # The shrunk volume does not reach the last voxels of the input
+            self._reslice.SetBorderThickness(shrink_factor)
+
+    def execute(self, image_data: vtkImageData) -> vtkImageData:
+        """
+        Filter image_data. The output shares the arrays of the pipeline output: the next run leaves them untouched
+        and allocates its own while they are referenced.
+        """
+        if self._shrink is None:
+            self.image_filter.SetInputDataObject(image_data)
+        else:
+            self._shrink.SetInputData(image_data)
+            self._reslice.SetInformationInput(image_data)
+        # Parameters of Python filters are not tracked by the pipeline, and an aborted run leaves a partial output
+        self.image_filter.SetAbortExecute(False)
+        self.image_filter.Modified()
+        output_filter = self._reslice if self._reslice is not None else self.image_filter
+        output_filter.Update()
+        output = vtkImageData()
+        output.ShallowCopy(output_filter.GetOutputDataObject(0))
+        return output
+
+
+def set_median_kernel_size(median: vtkImageMedian3D, kernel_size: float) -> None:
+    """kernel_size is rounded up to an odd size"""
+    kernel_size = max(int(kernel_size), 1) | 1
+    median.SetKernelSize(kernel_size, kernel_size, kernel_size)
+
+
+def set_resample_spacing_factor(resample: vtkImageResample, spacing_factor: float) -> None:
+    for axis in range(3):
+        resample.SetAxisMagnificationFactor(axis, 1 / spacing_factor)
+
+
+def create_median_filter(kernel_size: int, number_of_threads: int = 0) -> vtkImageMedian3D:
+    """Median of the kernel_size³ neighborhood of each voxel, kernel_size is rounded up to an odd size"""
+    median = vtkImageMedian3D()
+    set_median_kernel_size(median, kernel_size)
+    set_number_of_threads(median, number_of_threads)
+    return median
+
+
+def create_gradient_magnitude_filter(number_of_threads: int = 0) -> vtkImageGradientMagnitude:
+    gradient_magnitude = vtkImageGradientMagnitude()
+    gradient_magnitude.SetDimensionality(3)
+    gradient_magnitude.HandleBoundariesOn()
+    set_number_of_threads(gradient_magnitude, number_of_threads)
+    return gradient_magnitude
+
+
+def create_threshold_mask_filter(lower: float, upper: float, number_of_threads: int = 0) -> vtkImageThreshold:
+    """Mask of 1 for the voxels in [lower, upper], 0 elsewhere"""
+    threshold = vtkImageThreshold()
+    threshold.ThresholdBetween(lower, upper)
+    threshold.SetInValue(1)
+    threshold.SetOutValue(0)
+    threshold.SetOutputScalarType(VTK_UNSIGNED_CHAR)
+    set_number_of_threads(threshold, number_of_threads)
+    return threshold
+
+
+def create_resample_filter(spacing_factor: float, number_of_threads: int = 0) -> vtkImageResample:
+    """Resample to spacing_factor times the spacing of the input, with a linear interpolation"""
+    resample = vtkImageResample()
+    set_resample_spacing_factor(resample, spacing_factor)
+    resample.SetInterpolationModeToLinear()
+    set_number_of_threads(resample, number_of_threads)
+    return resample
+
+
+def crop_volume(
+    image_data: vtkImageData, extent: list[int], downsample_factor: float = 1, deep: bool = True
+) -> vtkImageData:
+    """
+    Voxels of image_data in extent, as a volume whose extent starts at 0, resampled downsample_factor times coarser.
+    At native spacing the voxels are not resampled: the scalars are a numpy sub-view of the scalars of image_data,
+    shared with image_data when the crop keeps whole slices, unless deep is set.
+    """
+    image_extent = image_data.GetExtent()
+    start = [extent[2 * axis] - image_extent[2 * axis] for axis in range(3)]
+    stop = [extent[2 * axis + 1] - image_extent[2 * axis] + 1 for axis in range(3)]
+    scalars = image_data.GetPointData().GetScalars()
+    array = vtk_to_numpy(scalars).reshape(*image_data.GetDimensions()[::-1], scalars.GetNumberOfComponents())
+    sub_array = array[start[2] : stop[2], start[1] : stop[1], start[0] : stop[0]]
+    sub_array = sub_array.copy() if deep else np.ascontiguousarray(sub_array)
+
+    cropped = vtkImageData()
+    cropped.SetDimensions([stop[axis] - start[axis] for axis in range(3)])
+    cropped.SetSpacing(image_data.GetSpacing())
+    cropped.SetDirectionMatrix(image_data.GetDirectionMatrix())
+    origin = [0.0, 0.0, 0.0]
+    image_data.TransformIndexToPhysicalPoint(extent[::2], origin)
+    cropped.SetOrigin(origin)
+    cropped_scalars = numpy_to_vtk(
+        sub_array.reshape(-1, scalars.GetNumberOfComponents()), array_type=scalars.GetDataType()
+    )
+    cropped_scalars.SetName(scalars.GetName())
+    cropped.GetPointData().SetScalars(cropped_scalars)
+    if downsample_factor == 1:
+        return cropped
+
+    resample = create_resample_filter(downsample_factor)
+    resample.SetInputData(cropped)
+    resample.Update()
+    return resample.GetOutput()
+
+
+def hash_image(image_data: vtkImageData) -> str:
+    """Hash of the geometry and the scalars of image_data"""
+    scalars = vtk_to_numpy(image_data.GetPointData().GetScalars())
+    image_hash = hashlib.blake2b(digest_size=16)
+    image_hash.update(repr((image_data.GetDimensions(), image_data.GetOrigin(), image_data.GetSpacing())).encode())
+    image_hash.update(scalars.dtype.str.encode())
+    image_hash.update(np.ascontiguousarray(scalars).data)
+    return image_hash.hexdigest()
+
+
+def hash_filter_output(input_key: str, filter_name: str, parameters: dict[str, Any]) -> str:
+    """Key of the output of a filter, the same for the same input and parameters"""
+    return hashlib.blake2b(
+        repr((input_key, filter_name, sorted(parameters.items()))).encode(), digest_size=16
+    ).hexdigest()
+
+
+class FilterResultCache:
+    """
+    Filter outputs shared by all the sessions of the process, stored under the hash of their input and parameters
+    so that running a filter again with the same parameters on the same input is free.
+    The least recently used outputs are evicted above memory_budget bytes. Cached outputs must never be modified.
+    """
+
+    MEMORY_BUDGET = 512 * 1024 * 1024
+
+    def __init__(self, memory_budget: int = MEMORY_BUDGET) -> None:
+        self._results: OrderedDict[str, vtkImageData] = OrderedDict()
+        self.memory_budget = memory_budget
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def nbytes(self) -> int:
+        return sum(result.GetActualMemorySize() * 1024 for result in self._results.values())
+
+    def get(self, key: str) -> vtkImageData | None:
+        result = self._results.get(key)
+        if result is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self._results.move_to_end(key)
+        return result
+
+    def add(self, key: str, result: vtkImageData) -> None:
+        if result.GetActualMemorySize() * 1024 > self.memory_budget:
+            return
+        self._results[key] = result
+        self._results.move_to_end(key)
+        while self.nbytes > self.memory_budget:
+            evicted_key, _ = self._results.popitem(last=False)
+            logger.debug(f"Evicted filter result {evicted_key}")
+
+
+SHARED_FILTER_RESULTS = FilterResultCache()
+
+
+def _create_image(array: np.ndarray, reference: vtkImageData) -> vtkImageData:
+    image_data = vtkImageData()
+    image_data.CopyStructure(reference)
+    image_data.GetPointData().SetScalars(numpy_to_vtk(array.ravel(), deep=True))
+    return image_data
+
+
+class BiasFieldCorrection(VTKPythonAlgorithmBase):
+    """
+    Divide a volume by an estimate of its smooth multiplicative bias field, like N4 but without its iterations nor
+    its B-spline fit: the field is the Gaussian smoothing of the log intensities of the foreground voxels, normalized
+    by the smoothing of the foreground mask, computed on the volume shrunk shrink_factor times.
+    """
+
+    SHRINK_FACTOR = 4
+
+    def __init__(self) -> None:
+        super().__init__(nInputPorts=1, inputType="vtkImageData", nOutputPorts=1, outputType="vtkImageData")
+        # Standard deviation of the field in voxels of the input volume
+        self.smoothness = 20.0
+        self.shrink_factor = self.SHRINK_FACTOR
+
+    def _smooth(self, array: np.ndarray, reference: vtkImageData) -> np.ndarray:
+        shrink = vtkImageShrink3D()
+        shrink.SetInputData(_create_image(array, reference))
+        shrink.SetShrinkFactors(self.shrink_factor, self.shrink_factor, self.shrink_factor)
+        shrink.AveragingOn()
+        gaussian = vtkImageGaussianSmooth()
+        gaussian.SetInputConnection(shrink.GetOutputPort())
+        gaussian.SetStandardDeviation(self.smoothness / self.shrink_factor)
+        gaussian.SetRadiusFactor(2)
+        reslice = vtkImageReslice()
+        reslice.SetInputConnection(gaussian.GetOutputPort())
+        reslice.SetInformationInput(reference)
+        reslice.SetInterpolationModeToLinear()
+        reslice.SetBorderThickness(self.shrink_factor)
+        reslice.Update()
+        return vtk_to_numpy(reslice.GetOutput().GetPointData().GetScalars())
+
+    def RequestData(self, _request, in_info, out_info) -> int:
+        image_data = vtkImageData.GetData(in_info[0])
+        output = vtkImageData.GetData(out_info)
+        scalars = vtk_to_numpy(image_data.GetPointData().GetScalars())
+        array = scalars.astype(np.float32)
+
+        # Background voxels are dark, and intensities must be positive for their log
+        foreground = array > max(0.1 * float(array.mean()), 0)
+        mask = foreground.astype(np.float32)
+        log_array = np.where(foreground, np.log(np.maximum(array, np.finfo(np.float32).tiny)), 0).astype(np.float32)
+        field = self._smooth(log_array, image_data) / np.maximum(self._smooth(mask, image_data), 1e-3)
+        if foreground.any():
+            field -= field[foreground].mean()
+        corrected = np.where(foreground, array / np.exp(field), array)
+
+        if np.issubdtype(scalars.dtype, np.integer):
+            type_info = np.iinfo(scalars.dtype)
+            corrected = np.clip(np.rint(corrected), type_info.min, type_info.max)
+        output.CopyStructure(image_data)
+        corrected_scalars = numpy_to_vtk(corrected.astype(scalars.dtype), deep=True)
+        corrected_scalars.SetName(image_data.GetPointData().GetScalars().GetName())
+        output.GetPointData().SetScalars(corrected_scalars)
+        return 1
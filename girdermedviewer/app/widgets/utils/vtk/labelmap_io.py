@@ -0,0 +1,414 @@
+import gzip
+import os
+import re
+import struct
+from collections.abc import Callable
+from dataclasses import dataclass
+from enum import Enum
+from pathlib import Path
+from typing import BinaryIO
+
+import numpy as np
+from vtkmodules.util.numpy_support import numpy_to_vtk, vtk_to_numpy
+from vtkmodules.vtkCommonDataModel import vtkImageData
+from vtkmodules.vtkCommonTransforms import vtkTransform
+from vtkmodules.vtkImagingCore import vtkImageReslice
+from vtkmodules.vtkIOImage import vtkNIFTIImageReader
+
+try:
+    from zlib_ng import gzip_ng_threaded
+except ImportError:
+    gzip_ng_threaded = None
+
+# Labelmaps are mostly runs of a same value: the fastest level compresses them almost as well as the best one
+GZIP_COMPRESS_LEVEL = 1
+
+NIFTI_HEADER_SIZE = 348
+# Header and an empty extension flag
+NIFTI_VOX_OFFSET = NIFTI_HEADER_SIZE + 4
+NIFTI_DATATYPES = {np.dtype(np.uint8): 2, np.dtype(np.uint16): 512}
+NIFTI_XFORM_ALIGNED_ANAT = 2
+NIFTI_UNITS_MM = 2
+NIFTI_INTENT_LABEL = 1002
+
+NRRD_TYPES = {np.dtype(np.uint8): "uchar", np.dtype(np.uint16): "ushort"}
+NRRD_READ_TYPES = {
+    **dict.fromkeys(("signed char", "int8", "int8_t"), np.int8),
+    **dict.fromkeys(("uchar", "unsigned char", "uint8", "uint8_t"), np.uint8),
+    **dict.fromkeys(("short", "short int", "signed short", "signed short int", "int16", "int16_t"), np.int16),
+    **dict.fromkeys(("ushort", "unsigned short", "unsigned short int", "uint16", "uint16_t"), np.uint16),
+    **dict.fromkeys(("int", "signed int", "int32", "int32_t"), np.int32),
+    **dict.fromkeys(("uint", "unsigned int", "uint32", "uint32_t"), np.uint32),
+}
+# Slicer writes segmentations in LPS, the viewer displays RAS
+NRRD_LPS_SPACES = ("left-posterior-superior", "LPS")
+
+# Largest label value of the labelmaps, stored as unsigned short
+MAX_LABEL_VALUE = 65535
+# Words of the file names of label volumes
+LABEL_FILE_NAME_HINTS = frozenset(("label", "labels", "labelmap", "seg", "segmentation", "mask"))
+# Voxels counted at once when looking for the values of a label volume, to bound the memory of the counts
+LABEL_COUNT_CHUNK_SIZE = 1 << 18
+
+
+class LabelMapFormat(Enum):
+    NIFTI = ".nii.gz"
+    SEG_NRRD = ".seg.nrrd"
+
+
+@dataclass
+class LabelMapSegment:
+    value: int
+    name: str
+    # Normalized RGB, None if unknown
+    color: tuple[float, float, float] | None = None
+
+
+def open_gzip(file: BinaryIO) -> BinaryIO:
+    """Gzip stream writing to file, compressed by all the cores if zlib-ng is installed"""
+    if gzip_ng_threaded is not None:
+        return gzip_ng_threaded.open(file, "wb", compresslevel=GZIP_COMPRESS_LEVEL, threads=os.cpu_count() or 1)
+    return gzip.GzipFile(fileobj=file, mode="wb", compresslevel=GZIP_COMPRESS_LEVEL)
+
+
+def _get_array(image_data: vtkImageData) -> np.ndarray:
+    """(k, j, i) numpy view of the scalars of image_data"""
+    return vtk_to_numpy(image_data.GetPointData().GetScalars()).reshape(tuple(reversed(image_data.GetDimensions())))
+
+
+def has_label_scalars(image_data: vtkImageData) -> bool:
+    """Whether the scalars of image_data can be labels: one integer component within [0, MAX_LABEL_VALUE]"""
+    scalars = image_data.GetPointData().GetScalars()
+    if scalars is None or scalars.GetNumberOfComponents() != 1:
+        return False
+    if not np.issubdtype(vtk_to_numpy(scalars).dtype, np.integer):
+        return False
+    low, high = scalars.GetRange(0)
+    return low >= 0 and high <= MAX_LABEL_VALUE
+
+
+def is_label_file(file_path: str) -> bool:
+    """Whether the file is marked as a label volume: a Slicer segmentation, a NIfTI label volume or a file named so"""
+    if file_path.endswith(LabelMapFormat.SEG_NRRD.value):
+        return True
+    if LABEL_FILE_NAME_HINTS.intersection(re.split(r"[^a-z0-9]+", Path(file_path).name.lower())):
+        return True
+    if file_path.endswith((".nii", ".nii.gz")):
+        reader = vtkNIFTIImageReader()
+        reader.SetFileName(file_path)
+        reader.UpdateInformation()
+        return reader.GetNIFTIHeader().GetIntentCode() == NIFTI_INTENT_LABEL
+    return False
+
+
+def get_label_values(image_data: vtkImageData, max_labels: int = MAX_LABEL_VALUE) -> list[int] | None:
+    """
+    Non-zero values of a label volume, None if image_data does not look like one: its scalars are not labels
+    or it has more than max_labels distinct values.
+    Values are counted with np.bincount, a single pass without sorting, a chunk of voxels at a time. Counting stops
+    at the first chunk exceeding max_labels values, so that volumes with many values are rejected early.
+    """
+    if not has_label_scalars(image_data):
+        return None
+    scalars = image_data.GetPointData().GetScalars()
+    array = vtk_to_numpy(scalars).reshape(-1)
+    counts = np.zeros(int(scalars.GetRange(0)[1]) + 1, dtype=np.int64)
+    # np.bincount only takes types that safely cast to intp, not uint64
+    is_cast_needed = not np.can_cast(array.dtype, np.intp)
+    for start in range(0, array.size, LABEL_COUNT_CHUNK_SIZE):
+        chunk = array[start : start + LABEL_COUNT_CHUNK_SIZE]
+        if not chunk.any():
+            # Background only, frequent in labelmaps
+            counts[0] += chunk.size
+            continue
+        counts += np.bincount(chunk.astype(np.intp) if is_cast_needed else chunk, minlength=counts.size)
+        if np.count_nonzero(counts[1:]) > max_labels:
+            return None
+    values = np.flatnonzero(counts[1:]) + 1
+    return values.tolist()
+
+
+def create_labelmap_scalars(
+    image_data: vtkImageData, label_values: list[int], dtype: np.dtype, max_value: int
+) -> tuple[np.ndarray, dict[int, int]]:
+    """
+    Copy of the labels of image_data as dtype, with the value of each label in the labelmap.
+    Labels keep their value if they all fit in max_value, otherwise they are renumbered from 1.
+    """
+    if not label_values or max(label_values) <= max_value:
+        value_map = {value: value for value in label_values}
+    else:
+        value_map = {value: index + 1 for index, value in enumerate(label_values)}
+    lookup = np.zeros(max(label_values, default=0) + 1, dtype=dtype)
+    lookup[list(value_map)] = list(value_map.values())
+
+    array = vtk_to_numpy(image_data.GetPointData().GetScalars()).reshape(-1)
+    labels = np.empty(array.size, dtype=dtype)
+    for start in range(0, array.size, LABEL_COUNT_CHUNK_SIZE):
+        labels[start : start + LABEL_COUNT_CHUNK_SIZE] = lookup[array[start : start + LABEL_COUNT_CHUNK_SIZE]]
+    return labels, value_map
+
+
+def _get_index_to_world(labelmap: vtkImageData) -> np.ndarray:
+    """4x4 matrix from the (i, j, k) indices of the voxels, starting at 0, to world coordinates"""
+    matrix = labelmap.GetIndexToPhysicalMatrix()
+    index_to_world = np.array([[matrix.GetElement(row, col) for col in range(4)] for row in range(4)])
+    extent = labelmap.GetExtent()
+    index_to_world[:3, 3] = index_to_world[:3, :3] @ np.array(extent[::2]) + index_to_world[:3, 3]
+    return index_to_world
+
+
+def _get_nifti_header(labelmap: vtkImageData, dtype: np.dtype) -> bytes:
+    index_to_world = _get_index_to_world(labelmap)
+    dimensions = labelmap.GetDimensions()
+    return struct.pack(
+        "<i10s18sihcb8h3f4h8f3fhbb2f2f2i80s24s2h6f4f4f4f16s4s",
+        NIFTI_HEADER_SIZE,
+        b"",  # data_type
+        b"",  # db_name
+        0,  # extents
+        0,  # session_error
+        b"r",  # regular
+        0,  # dim_info
+        *(3, *dimensions, 1, 1, 1, 1),  # dim
+        0.0,  # intent_p1
+        0.0,  # intent_p2
+        0.0,  # intent_p3
+        NIFTI_INTENT_LABEL,  # intent_code
+        NIFTI_DATATYPES[dtype],
+        dtype.itemsize * 8,  # bitpix
+        0,  # slice_start
+        *(1.0, *labelmap.GetSpacing(), 0.0, 0.0, 0.0, 0.0),  # pixdim, qfac first
+        float(NIFTI_VOX_OFFSET),
+        1.0,  # scl_slope
+        0.0,  # scl_inter
+        0,  # slice_end
+        0,  # slice_code
+        NIFTI_UNITS_MM,  # xyzt_units
+        0.0,  # cal_max
+        0.0,  # cal_min
+        0.0,  # slice_duration
+        0.0,  # toffset
+        0,  # glmax
+        0,  # glmin
+        b"Labelmap",  # descrip
+        b"",  # aux_file
+        0,  # qform_code: the orientation is given by the sform
+        NIFTI_XFORM_ALIGNED_ANAT,  # sform_code
+        *(0.0,) * 6,  # quatern_b, quatern_c, quatern_d, qoffset_x, qoffset_y, qoffset_z
+        *index_to_world[0],  # srow_x
+        *index_to_world[1],  # srow_y
+        *index_to_world[2],  # srow_z
+        b"",  # intent_name
+        b"n+1\0",  # magic
+    ) + bytes(NIFTI_VOX_OFFSET - NIFTI_HEADER_SIZE)
+
+
+def _format_vector(vector) -> str:
+    return "(" + ",".join(f"{float(component):.17g}" for component in vector) + ")"
+
+
+def _get_nrrd_header(labelmap: vtkImageData, dtype: np.dtype, segments: list[LabelMapSegment]) -> bytes:
+    """NRRD header, with the segment fields of 3D Slicer segmentation files (.seg.nrrd)"""
+    index_to_world = _get_index_to_world(labelmap)
+    lines = [
+        "NRRD0004",
+        f"type: {NRRD_TYPES[dtype]}",
+        "dimension: 3",
+        # The world coordinates of the viewer, which are RAS for NIfTI volumes
+        "space: right-anterior-superior",
+        "sizes: " + " ".join(str(size) for size in labelmap.GetDimensions()),
+        "space directions: " + " ".join(_format_vector(index_to_world[:3, axis]) for axis in range(3)),
+        "kinds: domain domain domain",
+        "endian: little",
+        "encoding: gzip",
+        f"space origin: {_format_vector(index_to_world[:3, 3])}",
+    ]
+    for index, segment in enumerate(segments):
+        lines += [
+            f"Segment{index}_ID:=Segment_{segment.value}",
+            f"Segment{index}_Name:={segment.name}",
+            f"Segment{index}_Color:=" + " ".join(f"{component:.6g}" for component in segment.color or (0.5,) * 3),
+            f"Segment{index}_LabelValue:={segment.value}",
+            f"Segment{index}_Layer:=0",
+        ]
+    return ("\n".join(lines) + "\n\n").encode()
+
+
+def write_labelmap(
+    labelmap: vtkImageData,
+    file_path: Path,
+    segments: list[LabelMapSegment],
+    progress: Callable[[float], None] | None = None,
+) -> None:
+    """
+    Write labelmap to a .nii.gz or .seg.nrrd file, depending on the extension of file_path.
+    Voxels are compressed one slice at a time, so that writing does not copy the labelmap. Compression releases
+    the GIL: the labelmap can be written from a worker thread, as long as it is not modified meanwhile.
+    """
+    array = _get_array(labelmap)
+    dtype = array.dtype.newbyteorder("<")
+    with file_path.open("wb") as file:
+        if file_path.name.endswith(LabelMapFormat.NIFTI.value):
+            # The whole NIfTI file is compressed
+            stream = open_gzip(file)
+            stream.write(_get_nifti_header(labelmap, array.dtype))
+        elif file_path.name.endswith(LabelMapFormat.SEG_NRRD.value):
+            # NRRD files have a plain text header followed by the compressed data
+            file.write(_get_nrrd_header(labelmap, array.dtype, segments))
+            stream = open_gzip(file)
+        else:
+            raise ValueError(f"Unsupported labelmap file extension: {file_path.name}")
+
+        with stream:
+            for k, labelmap_slice in enumerate(array):
+                stream.write(labelmap_slice.astype(dtype, copy=False).tobytes())
+                if progress is not None:
+                    progress((k + 1) / len(array))
+
+
+def _read_nrrd_header(file: BinaryIO) -> tuple[dict[str, str], dict[str, str]]:
+    """Fields and key/value pairs of the header of a NRRD file, leaving file at the start of the data"""
+    if not file.readline().startswith(b"NRRD"):
+        raise ValueError("Not a NRRD file")
+    fields, key_values = {}, {}
+    for raw_line in iter(file.readline, b""):
+        line = raw_line.decode("utf-8").rstrip("\r\n")
+        if not line:
+            break
+        if line.startswith("#"):
+            continue
+        if ":=" in line:
+            key, value = line.split(":=", 1)
+            key_values[key] = value
+        else:
+            field, value = line.split(":", 1)
+            fields[field.strip().lower()] = value.strip()
+    return fields, key_values
+
+
+def _parse_vectors(value: str) -> list[list[float]]:
+    return [[float(component) for component in vector.split(",")] for vector in re.findall(r"\(([^)]*)\)", value)]
+
+
+def _get_segments(key_values: dict[str, str], number_of_layers: int) -> list[LabelMapSegment]:
+    segments = []
+    index = 0
+    while f"Segment{index}_ID" in key_values:
+        prefix = f"Segment{index}_"
+        color = key_values.get(f"{prefix}Color", "0.5 0.5 0.5").split()
+        segments.append(
+            LabelMapSegment(
+                # Segments of all the layers are flattened in one labelmap, where each needs its own value
+                value=int(key_values.get(f"{prefix}LabelValue", index + 1)) if number_of_layers == 1 else index + 1,
+                name=key_values.get(f"{prefix}Name", key_values[f"{prefix}ID"]),
+                color=tuple(float(component) for component in color[:3]),
+            )
+        )
+        index += 1
+    return segments
+
+
+def read_labelmap_segments(file_path: str) -> list[LabelMapSegment]:
+    """Segments described in the header of a 3D Slicer segmentation file (.seg.nrrd), none for other files"""
+    if not file_path.endswith(LabelMapFormat.SEG_NRRD.value):
+        return []
+    with Path(file_path).open("rb") as file:
+        fields, key_values = _read_nrrd_header(file)
+    return _get_segments(key_values, _get_number_of_layers(fields))
+
+
+def _get_number_of_layers(fields: dict[str, str]) -> int:
+    sizes = [int(size) for size in fields["sizes"].split()]
+    return sizes[0] if len(sizes) == 4 else 1
+
+
+def _read_nrrd_data(file: BinaryIO, fields: dict[str, str], shape: tuple[int, ...]) -> np.ndarray:
+    dtype = np.dtype(NRRD_READ_TYPES[fields["type"]])
+    if dtype.itemsize > 1:
+        dtype = dtype.newbyteorder(">" if fields.get("endian") == "big" else "<")
+    encoding = fields.get("encoding", "raw")
+    if encoding in ("gzip", "gz"):
+        stream = gzip.GzipFile(fileobj=file, mode="rb")
+    elif encoding == "raw":
+        stream = file
+    else:
+        raise ValueError(f"Unsupported NRRD encoding: {encoding}")
+
+    # Decompress in place, without an intermediate copy of the data
+    array = np.empty(shape, dtype=dtype)
+    buffer = memoryview(array.reshape(-1)).cast("B")
+    offset = 0
+    while offset < len(buffer):
+        size = stream.readinto(buffer[offset:])
+        if not size:
+            raise ValueError("NRRD data is truncated")
+        offset += size
+    return array.astype(dtype.newbyteorder("="), copy=False)
+
+
+def _flatten_layers(array: np.ndarray, segments: list[LabelMapSegment], key_values: dict[str, str]) -> np.ndarray:
+    """Labelmap of the segments of all the layers, the segments of the last layers on top"""
+    labelmap = np.zeros(array.shape[:3], dtype=np.uint16 if len(segments) > np.iinfo(np.uint8).max else np.uint8)
+    for index, segment in enumerate(segments):
+        layer = int(key_values.get(f"Segment{index}_Layer", 0))
+        label_value = int(key_values.get(f"Segment{index}_LabelValue", index + 1))
+        labelmap[array[..., layer] == label_value] = segment.value
+    return labelmap
+
+
+def read_seg_nrrd(file_path: str) -> vtkImageData:
+    """
+    Read a labelmap from a NRRD file, including 3D Slicer segmentation files (.seg.nrrd) whose segments may be
+    split into several layers. Unlike vtkNrrdReader, gzip encoded data is supported.
+    """
+    with Path(file_path).open("rb") as file:
+        fields, key_values = _read_nrrd_header(file)
+        sizes = [int(size) for size in fields["sizes"].split()]
+        if len(sizes) not in (3, 4):
+            raise ValueError(f"Unsupported NRRD dimension: {len(sizes)}")
+        if "data file" in fields or "datafile" in fields:
+            raise ValueError("Detached NRRD data files are not supported")
+        array = _read_nrrd_data(file, fields, tuple(reversed(sizes)))
+
+    if len(sizes) == 4:
+        array = _flatten_layers(array, _get_segments(key_values, _get_number_of_layers(fields)), key_values)
+
+    directions = np.array(_parse_vectors(fields.get("space directions", "(1,0,0) (0,1,0) (0,0,1)"))[-3:]).T
+    origin = np.array(_parse_vectors(fields.get("space origin", "(0,0,0)"))[0])
+    if fields.get("space") in NRRD_LPS_SPACES:
+        directions[:2] *= -1
+        origin[:2] *= -1
+
+    # Axes pointing backward are flipped, so that the labelmap is stored with positive spacings
+    for axis in range(3):
+        if directions[axis, axis] < 0:
+            origin = origin + directions[:, axis] * (array.shape[2 - axis] - 1)
+            directions[:, axis] *= -1
+            array = np.flip(array, axis=2 - axis)
+
+    spacing = np.linalg.norm(directions, axis=0)
+    image_data = vtkImageData()
+    image_data.SetDimensions(array.shape[::-1])
+    image_data.SetSpacing(spacing)
+    # The VTK array keeps a reference to the numpy array it wraps
+    image_data.GetPointData().SetScalars(numpy_to_vtk(np.ascontiguousarray(array).reshape(-1)))
+    if np.allclose(directions, np.diag(spacing)):
+        image_data.SetOrigin(origin)
+        return image_data
+
+    # Oblique labelmaps are resampled on the axes, without interpolating labels
+    matrix = np.eye(4)
+    matrix[:3, :3] = directions / spacing
+    matrix[:3, 3] = origin
+    transform = vtkTransform()
+    transform.SetMatrix(matrix.ravel())
+    transform.Inverse()
+    reslice = vtkImageReslice()
+    reslice.SetInputData(image_data)
+    reslice.SetResliceTransform(transform)
+    reslice.SetInterpolationModeToNearestNeighbor()
+    reslice.AutoCropOutputOn()
+    reslice.TransformInputSamplingOff()
+    reslice.Update()
+    return reslice.GetOutput()
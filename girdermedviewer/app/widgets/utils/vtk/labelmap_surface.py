@@ -0,0 +1,154 @@
+import math
+from itertools import product
+
+import numpy as np
+import vtkmodules.util.numpy_support as vtknp
+from vtkmodules.vtkCommonDataModel import (
+    vtkImageData,
+    vtkMultiBlockDataSet,
+    vtkPolyData,
+)
+from vtkmodules.vtkCommonMath import vtkMatrix4x4
+from vtkmodules.vtkFiltersGeneral import vtkDiscreteFlyingEdges3D
+
+from .segmentation import _vtk_image_to_np
+from .segmentation_effects import EffectProgress
+
+# Flat id of a block, its point extent in the labelmap and a copy of its voxels
+LabelMapBlock = tuple[int, list[int], np.ndarray]
+
+
+class LabelMapSurface:
+    """
+    Surfaces of the segments of a labelmap, in index coordinates (see index_to_physical_matrix).
+    The labelmap is divided into blocks of block_size³ voxel cells that are contoured independently: each segment
+    surface is a vtkMultiBlockDataSet with one block per labelmap block, so that an edit only regenerates and
+    replaces the blocks of its extent.
+    Contouring (compute_blocks) works on a copy of the voxels (copy_blocks) so that it can run in a worker thread;
+    its result is merged back with set_blocks.
+    """
+
+    BLOCK_SIZE = 32
+
+    def __init__(self, labelmap: vtkImageData, block_size: int = BLOCK_SIZE) -> None:
+        self._labelmap = labelmap
+        self._block_size = block_size
+        dimensions = labelmap.GetDimensions()
+        # Blocks split the cells between voxels, i.e. dimensions - 1 per axis
+        self._block_counts = tuple(max(math.ceil((dimensions[axis] - 1) / block_size), 1) for axis in range(3))
+        self._surfaces: dict[int, vtkMultiBlockDataSet] = {}
+        self._block_values: dict[int, set[int]] = {}
+
+    @property
+    def labelmap(self) -> vtkImageData:
+        return self._labelmap
+
+    @property
+    def values(self) -> list[int]:
+        return list(self._surfaces)
+
+    @property
+    def number_of_blocks(self) -> int:
+        return int(np.prod(self._block_counts))
+
+    def index_to_physical_matrix(self) -> vtkMatrix4x4:
+        return self._labelmap.GetIndexToPhysicalMatrix()
+
+    def get_surface(self, value: int) -> vtkMultiBlockDataSet | None:
+        return self._surfaces.get(value)
+
+    def _get_block_extent(self, block_id: int) -> list[int]:
+        block_index = np.unravel_index(block_id, self._block_counts, order="F")
+        extent = list(self._labelmap.GetExtent())
+        block_extent = []
+        for axis in range(3):
+            start = extent[2 * axis] + int(block_index[axis]) * self._block_size
+            block_extent += [start, min(start + self._block_size, extent[2 * axis + 1])]
+        return block_extent
+
+    def get_block_ids(self, extent: list[int] | None = None) -> list[int]:
+        """Ids of the blocks with cells touching the voxels of extent, all the blocks if extent is None"""
+        if extent is None:
+            return list(range(self.number_of_blocks))
+        labelmap_extent = self._labelmap.GetExtent()
+        ranges = []
+        for axis in range(3):
+            # A voxel is a corner of the cells on both of its sides
+            first = (extent[2 * axis] - 1 - labelmap_extent[2 * axis]) // self._block_size
+            last = (extent[2 * axis + 1] - labelmap_extent[2 * axis]) // self._block_size
+            ranges.append(range(max(first, 0), min(last, self._block_counts[axis] - 1) + 1))
+        return [
+            int(np.ravel_multi_index((i, j, k), self._block_counts, order="F"))
+            for k, j, i in product(ranges[2], ranges[1], ranges[0])
+        ]
+
+    def copy_blocks(self, block_ids: list[int]) -> list[LabelMapBlock]:
+        """Copy the voxels of the blocks, to be contoured in another thread"""
+        labelmap_array = _vtk_image_to_np(self._labelmap)
+        labelmap_extent = self._labelmap.GetExtent()
+        blocks = []
+        for block_id in block_ids:
+            block_extent = self._get_block_extent(block_id)
+            region = tuple(
+                slice(
+                    block_extent[2 * axis] - labelmap_extent[2 * axis],
+                    block_extent[2 * axis + 1] - labelmap_extent[2 * axis] + 1,
+                )
+                for axis in (2, 1, 0)
+            )
+            blocks.append((block_id, block_extent, labelmap_array[region].copy()))
+        return blocks
+
+    @staticmethod
+    def compute_blocks(
+        blocks: list[LabelMapBlock], progress: EffectProgress | None = None
+    ) -> dict[int, dict[int, vtkPolyData]]:
+        """Surface of each value of each block"""
+        surfaces = {}
+        for index, (block_id, block_extent, block_array) in enumerate(blocks):
+            surfaces[block_id] = {}
+            values = np.unique(block_array) if block_array.any() else []
+            for value in values:
+                if value == 0:
+                    continue
+                surfaces[block_id][int(value)] = LabelMapSurface._contour(block_array, block_extent, value)
+            if progress is not None:
+                progress.update((index + 1) / len(blocks))
+        return surfaces
+
+    @staticmethod
+    def _contour(block_array: np.ndarray, block_extent: list[int], value: int) -> vtkPolyData:
+        image_data = vtkImageData()
+        image_data.SetExtent(block_extent)
+        image_data.GetPointData().SetScalars(vtknp.numpy_to_vtk(block_array.reshape(-1), deep=True))
+
+        contour = vtkDiscreteFlyingEdges3D()
+        contour.SetInputData(image_data)
+        contour.SetValue(0, value)
+        contour.ComputeNormalsOn()
+        contour.ComputeScalarsOff()
+        contour.Update()
+
+        surface = vtkPolyData()
+        surface.ShallowCopy(contour.GetOutput())
+        return surface
+
+    def set_blocks(self, surfaces: dict[int, dict[int, vtkPolyData]]) -> set[int]:
+        """Replace the blocks of the segment surfaces, return the values of the modified surfaces"""
+        modified_values = set()
+        for block_id, block_surfaces in surfaces.items():
+            previous_values = self._block_values.get(block_id, set())
+            for value in previous_values - block_surfaces.keys():
+                self._surfaces[value].SetBlock(block_id, None)
+                modified_values.add(value)
+            for value, surface in block_surfaces.items():
+                if value not in self._surfaces:
+                    self._surfaces[value] = vtkMultiBlockDataSet()
+                    self._surfaces[value].SetNumberOfBlocks(self.number_of_blocks)
+                self._surfaces[value].SetBlock(block_id, surface)
+                modified_values.add(value)
+            self._block_values[block_id] = set(block_surfaces)
+
+        for value in modified_values:
+            self._surfaces[value].Modified()
+        return modified_values
@@ -2,11 +2,13 @@ import json
 import logging
 import xml.etree.ElementTree as ET
 from abc import ABC, abstractmethod
+from collections import OrderedDict
 from dataclasses import dataclass
 from enum import Enum
 from pathlib import Path
 from typing import Any, TypeVar
 
+import numpy as np
 from trame.assets.local import LocalFileManager
 from trame_dataclass.v2 import FieldEncoder, ServerOnly, StateDataModel, Sync
 from vtk import (
@@ -18,7 +20,8 @@ from vtk import (
     vtkResliceImageViewer,
     vtkVolumeProperty,
 )
-from vtkmodules.vtkCommonCore import vtkLookupTable
+from vtkmodules.util.numpy_support import numpy_to_vtk, vtk_to_numpy
+from vtkmodules.vtkCommonCore import VTK_UNSIGNED_CHAR, vtkLookupTable
 
 from .resources import resources_path
 
@@ -91,6 +94,10 @@ class Preset(StateDataModel):
 
 PresetColorPoints = list[tuple[float, float, float, float]]
 PresetOpacityPoints = list[tuple[float, float]]
+# Preset name and the scalar range its points are mapped to
+CompiledPresetKey = tuple[str, tuple[float, ...] | None]
+# Preset name, whether it is inverted and number of table values
+LookupTableKey = tuple[str, bool, int]
 T = TypeVar("T")
 
 
@@ -107,6 +114,18 @@ class PresetInfo:
     interpolation: int | None = None
 
 
+@dataclass
+class CompiledPreset:
+    """
+    Transfer functions of a volume preset mapped to a scalar range, built once and shared by the volume properties
+    it is applied to. They must not be modified.
+    """
+
+    key: CompiledPresetKey
+    color_function: vtkColorTransferFunction
+    opacity_function: vtkPiecewiseFunction
+
+
 class PresetParser(ABC):
     def __init__(self, presets_file: Path, icons_folder: Path | None):
         self.presets: list[PresetInfo] = self.parse_slicer_presets(presets_file)
@@ -139,8 +158,11 @@ class PresetParser(ABC):
 
 
 class ColorPresetParser(PresetParser):
+    LOOKUP_TABLE_SIZE = 256
+
     def __init__(self, presets_file: Path, icons_folder: Path):
         super().__init__(presets_file, icons_folder)
+        self._lookup_tables: dict[LookupTableKey, vtkLookupTable] = {}
 
     def _array_to_function(self, klass: type[T], add_method: str, xrgbs: PresetColorPoints, is_inverted: bool) -> T:
         transfer_function = klass()
@@ -155,12 +177,30 @@ class ColorPresetParser(PresetParser):
             getattr(transfer_function, add_method)(scalar, r, g, b)
         return transfer_function
 
-    def _populate_lut_from_transfer_function(self, transfer_function: vtkColorTransferFunction, lut: vtkLookupTable):
-        number_of_values = lut.GetNumberOfTableValues()
-        for i in range(number_of_values):
-            t = i / (number_of_values - 1)
-            r, g, b = transfer_function.GetColor(t)
-            lut.SetTableValue(i, r, g, b, 1.0)
+    def get_lookup_table(self, preset: PresetInfo, is_inverted: bool, size: int = LOOKUP_TABLE_SIZE) -> vtkLookupTable:
+        """
+        Opaque lookup table sampling the preset colors over [0, 1], built on first use and shared by the slices it
+        is applied to. It must not be modified.
+        """
+        key = (preset.name, is_inverted, size)
+        lut = self._lookup_tables.get(key)
+        if lut is not None:
+            return lut
+
+        color_transfer_function = self._array_to_function(
+            vtkColorTransferFunction, "AddRGBPoint", preset.points, is_inverted
+        )
+        colors = np.empty(3 * size)
+        color_transfer_function.GetTable(0, 1, size, colors)
+        table = np.full((size, 4), 255, dtype=np.uint8)
+        # Same rounding as vtkLookupTable.SetTableValue
+        table[:, :3] = (np.clip(colors.reshape(size, 3), 0, 1) * 255 + 0.5).astype(np.uint8)
+
+        lut = vtkLookupTable()
+        # Setting the table also prevents it from being built again
+        lut.SetTable(numpy_to_vtk(table, deep=True, array_type=VTK_UNSIGNED_CHAR))
+        self._lookup_tables[key] = lut
+        return lut
 
     def parse_slicer_presets(self, presets_file_path: Path) -> list[PresetInfo]:
         with presets_file_path.open("r") as f:
@@ -171,22 +211,22 @@ class ColorPresetParser(PresetParser):
         if slice.GetMapper().GetInput().GetPointData().GetNumberOfComponents() > 1:
             return False
 
-        color_transfer_function = self._array_to_function(
-            vtkColorTransferFunction, "AddRGBPoint", preset.points, is_inverted
-        )
-        lut = vtkLookupTable()
-        lut.SetNumberOfTableValues(256)
-        lut.Build()
-        self._populate_lut_from_transfer_function(color_transfer_function, lut)
+        lut = self.get_lookup_table(preset, is_inverted)
+        if slice.GetProperty().GetLookupTable() is lut:
+            return False
         slice.GetProperty().SetLookupTable(lut)
         return True
 
     def apply_preset_to_reslice(self, reslice: vtkResliceImageViewer, preset: PresetInfo, is_inverted: bool) -> bool:
-        color_transfer_function = self._array_to_function(
-            vtkColorTransferFunction, "AddRGBPoint", preset.points, is_inverted
-        )
-        lut = reslice.GetLookupTable()
-        self._populate_lut_from_transfer_function(color_transfer_function, lut)
+        # The viewer owns its table: only its colors are replaced, its alpha holds the volume visibility
+        reslice_lut = reslice.GetLookupTable()
+        table = vtk_to_numpy(reslice_lut.GetTable())
+        colors = vtk_to_numpy(self.get_lookup_table(preset, is_inverted, len(table)).GetTable())
+        if np.array_equal(table[:, :3], colors[:, :3]):
+            return False
+        table[:, :3] = colors[:, :3]
+        reslice_lut.GetTable().Modified()
+        reslice_lut.Modified()
         return True
 
     def apply_preset_to_mesh(
@@ -221,8 +261,12 @@ class ColorPresetParser(PresetParser):
 
 
 class VolumePresetParser(PresetParser):
+    # Compiled presets kept for the presets and ranges used last, e.g. while dragging the range slider
+    COMPILED_PRESETS_CACHE_SIZE = 64
+
     def __init__(self, presets_file: Path, icons_folder: Path):
         super().__init__(presets_file, icons_folder)
+        self._compiled_presets: OrderedDict[CompiledPresetKey, CompiledPreset] = OrderedDict()
 
     def _array_to_function(
         self,
@@ -244,26 +288,6 @@ class VolumePresetParser(PresetParser):
             getattr(transfer_function, add_method)(*node)
         return transfer_function
 
-    def _same_arrays(
-        self,
-        array_1: PresetColorPoints | PresetOpacityPoints,
-        array_2: PresetColorPoints | PresetOpacityPoints,
-        number_of_components: int,
-    ):
-        array_1_size = array_1[0]
-        array_2_size = array_2[0]
-        if array_1_size != array_2_size:
-            return False
-        chunks1 = [
-            lst[1:number_of_components] for lst in zip(*[iter(array_1[1:])] * number_of_components, strict=False)
-        ]
-        chunks2 = [
-            lst[1:number_of_components] for lst in zip(*[iter(array_2[1:])] * number_of_components, strict=False)
-        ]
-
-        # Compare corresponding chunks
-        return [c1 == c2 for c1, c2 in zip(chunks1, chunks2, strict=False)]
-
     def _string_to_array(self, string_of_numbers: str) -> PresetColorPoints | PresetOpacityPoints:
         point_array = list(map(float, string_of_numbers.split()))
         number_of_expected_values = point_array.pop(0)
@@ -276,42 +300,33 @@ class VolumePresetParser(PresetParser):
     def _array_to_opacity_function(self, opacity_points: PresetOpacityPoints, array_range: list[float, float]):
         return self._array_to_function(vtkPiecewiseFunction, "AddPoint", opacity_points, array_range, 2)
 
-    def _opacity_function_to_array(self, opacity_function) -> PresetOpacityPoints:
-        """
-        :see-also array_to_opacity_function
-        """
-        size = opacity_function.GetSize()
-        node = [0, 0, 0, 0]
-        xrgbs = [2 * size]
-        for i in range(size):
-            opacity_function.GetNodeValue(i, node)
-            xrgbs += node[0:2]
-        return xrgbs
-
-    def _color_transfer_function_to_array(self, color_transfer_function) -> PresetColorPoints:
-        """
-        :see-also array_to_color_transfer_function
-        """
-        size = color_transfer_function.GetSize()
-        node = [0, 0, 0, 0, 0, 0]
-        xrgbs = [4 * size]
-        for i in range(size):
-            color_transfer_function.GetNodeValue(i, node)
-            xrgbs += node[0:4]
-        return xrgbs
-
-    def _has_preset(self, preset: PresetInfo, volume_property, range: list[float]):
+    def get_compiled_preset(self, preset: PresetInfo, array_range: list[float] | None) -> CompiledPreset:
+        """Transfer functions of the preset mapped to array_range, built on first use"""
+        key = (preset.name, tuple(array_range) if array_range else None)
+        compiled_preset = self._compiled_presets.get(key)
+        if compiled_preset is not None:
+            self._compiled_presets.move_to_end(key)
+            return compiled_preset
+
+        compiled_preset = CompiledPreset(
+            key,
+            self._array_to_color_transfer_function(preset.points, array_range or None),
+            self._array_to_opacity_function(preset.opacity_points, array_range or None),
+        )
+        self._compiled_presets[key] = compiled_preset
+        if len(self._compiled_presets) > self.COMPILED_PRESETS_CACHE_SIZE:
+            self._compiled_presets.popitem(last=False)
+        return compiled_preset
+
+    @staticmethod
+    def _has_preset(compiled_preset: CompiledPreset, volume_property: vtkVolumeProperty) -> bool:
         """
         Returns true if the volume_property already has the preset applied.
         """
-        if range is not None and volume_property.GetRGBTransferFunction().GetRange() != range:
-            return False
-        colors = self._color_transfer_function_to_array(volume_property.GetRGBTransferFunction())
-        if not self._same_arrays(colors, preset.points, 4):
-            return False
-
-        opacities = self._opacity_function_to_array(volume_property.GetScalarOpacity())
-        return self._same_arrays(opacities, preset.opacity_points, 2)
+        return (
+            volume_property.GetRGBTransferFunction() is compiled_preset.color_function
+            and volume_property.GetScalarOpacity() is compiled_preset.opacity_function
+        )
 
     def parse_slicer_presets(self, presets_file_path: Path) -> list[PresetInfo]:
         tree = ET.parse(presets_file_path)
@@ -340,10 +355,11 @@ class VolumePresetParser(PresetParser):
         ]
 
     def apply_preset(self, volume_property: vtkVolumeProperty, preset: PresetInfo, array_range: list[float, float]):
-        if self._has_preset(preset, volume_property, array_range):
+        compiled_preset = self.get_compiled_preset(preset, array_range)
+        if self._has_preset(compiled_preset, volume_property):
             return False
-        volume_property.SetColor(self._array_to_color_transfer_function(preset.points, array_range))
-        volume_property.SetScalarOpacity(self._array_to_opacity_function(preset.opacity_points, array_range))
+        volume_property.SetColor(compiled_preset.color_function)
+        volume_property.SetScalarOpacity(compiled_preset.opacity_function)
         if preset.ambient is not None:
             volume_property.SetAmbient(preset.ambient)
         if preset.diffuse is not None:
@@ -0,0 +1,106 @@
+import logging
+
+from vtkmodules.all import (
+    vtkCamera,
+    vtkInteractorStyleSwitch,
+    vtkRenderer,
+    vtkRenderWindow,
+    vtkRenderWindowInteractor,
+)
+
+logger = logging.getLogger(__name__)
+
+
+class RenderWindowPool:
+    """
+    Pool of headless rendering pipelines (renderer, render window and interactor) shared by all
+    the sessions of the process.
+    Creating a render window and its graphic context is expensive, so released pipelines are reset
+    and handed over to the next session instead of being destroyed.
+    """
+
+    def __init__(self, max_size: int = 8) -> None:
+        self.max_size = max_size
+        self._idle: list[tuple[vtkRenderer, vtkRenderWindow]] = []
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def stats(self) -> dict[str, int | float]:
+        requests = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / requests if requests else 0.0,
+            "idle": len(self._idle),
+        }
+
+    @staticmethod
+    def _create_pipeline() -> tuple[vtkRenderer, vtkRenderWindow]:
+        renderer = vtkRenderer()
+        render_window = vtkRenderWindow()
+        render_window.ShowWindowOff()
+        interactor = vtkRenderWindowInteractor()
+
+        render_window.AddRenderer(renderer)
+        interactor.SetRenderWindow(render_window)
+        interactor.GetInteractorStyle().SetCurrentStyleToTrackballCamera()
+
+        renderer.ResetCamera()
+
+        return renderer, render_window
+
+    @staticmethod
+    def _reset_pipeline(renderer: vtkRenderer, render_window: vtkRenderWindow) -> None:
+        """Bring a used pipeline back to the state of a newly created one."""
+        for layer_renderer in list(render_window.GetRenderers()):
+            if layer_renderer != renderer:
+                layer_renderer.RemoveAllViewProps()
+                render_window.RemoveRenderer(layer_renderer)
+        render_window.SetNumberOfLayers(1)
+
+        renderer.RemoveAllViewProps()
+        renderer.SetActiveCamera(vtkCamera())
+        renderer.ResetCamera()
+
+        # Drop the observers of the widgets, viewers and monitors of the previous session
+        render_window.RemoveAllObservers()
+        interactor = render_window.GetInteractor()
+        interactor.RemoveAllObservers()
+        interactor_style = vtkInteractorStyleSwitch()
+        interactor.SetInteractorStyle(interactor_style)
+        interactor_style.SetCurrentStyleToTrackballCamera()
+
+        # Interactive rendering (e.g. CPU ray casting) changes the update rates
+        default_interactor = vtkRenderWindowInteractor()
+        interactor.SetDesiredUpdateRate(default_interactor.GetDesiredUpdateRate())
+        interactor.SetStillUpdateRate(default_interactor.GetStillUpdateRate())
+        render_window.SetDesiredUpdateRate(default_interactor.GetStillUpdateRate())
+
+    def prefill(self, count: int) -> None:
+        """Create and initialize pipelines until count of them are idle."""
+        while len(self._idle) < min(count, self.max_size):
+            renderer, render_window = self._create_pipeline()
+            # The first render creates the graphic context
+            render_window.Render()
+            self._idle.append((renderer, render_window))
+
+    def acquire(self) -> tuple[vtkRenderer, vtkRenderWindow]:
+        if self._idle:
+            self.hits += 1
+            pipeline = self._idle.pop()
+        else:
+            self.misses += 1
+            pipeline = self._create_pipeline()
+        logger.debug(f"Render window pool: {self.stats}")
+        return pipeline
+
+    def release(self, renderer: vtkRenderer, render_window: vtkRenderWindow) -> None:
+        if len(self._idle) >= self.max_size:
+            render_window.Finalize()
+            return
+        self._reset_pipeline(renderer, render_window)
+        self._idle.append((renderer, render_window))
+
+
+RENDER_WINDOW_POOL = RenderWindowPool()
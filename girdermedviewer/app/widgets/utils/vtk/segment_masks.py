@@ -0,0 +1,212 @@
+from collections.abc import Iterator
+from itertools import product
+
+import numpy as np
+from numpy.typing import NDArray
+
+# (k, j, i) index of a block
+BlockKey = tuple[int, int, int]
+# Segment value and block index
+MaskBlockKey = tuple[int, BlockKey]
+# NumPy slices of a (k, j, i) array
+Region = tuple[slice, slice, slice]
+
+
+class SegmentMasksChanges:
+    """
+    Blocks of segment masks changed by an edit: their packed bits before and after the edit, None for empty blocks.
+    Packed blocks are never modified in place, so the changes only hold references to them.
+    """
+
+    def __init__(
+        self,
+        masks: "SparseSegmentMasks",
+        blocks: dict[MaskBlockKey, tuple[NDArray[np.uint8] | None, NDArray[np.uint8] | None]] | None = None,
+    ) -> None:
+        self._masks = masks
+        self._blocks = blocks if blocks is not None else {}
+
+    def __bool__(self) -> bool:
+        return bool(self._blocks)
+
+    @property
+    def masks(self) -> "SparseSegmentMasks":
+        return self._masks
+
+    @property
+    def segments(self) -> set[int]:
+        return {segment for segment, _ in self._blocks}
+
+    @property
+    def nbytes(self) -> int:
+        return sum(block.nbytes for blocks in self._blocks.values() for block in blocks if block is not None)
+
+    def update(self, changes: "SegmentMasksChanges") -> None:
+        """Add the changes of a following edit"""
+        for key, (old_block, new_block) in changes._blocks.items():
+            self._blocks[key] = (self._blocks[key][0] if key in self._blocks else old_block, new_block)
+
+    def merge(self, changes: "SegmentMasksChanges") -> "SegmentMasksChanges | None":
+        """Changes of this edit followed by the given one, None if the second edit reverts the first one"""
+        merged = SegmentMasksChanges(self._masks, dict(self._blocks))
+        merged.update(changes)
+        merged._blocks = {
+            key: (old_block, new_block)
+            for key, (old_block, new_block) in merged._blocks.items()
+            if not _same_blocks(old_block, new_block)
+        }
+        return merged if merged else None
+
+    def inverted(self) -> "SegmentMasksChanges":
+        """Changes reverting this edit"""
+        return SegmentMasksChanges(
+            self._masks, {key: (new_block, old_block) for key, (old_block, new_block) in self._blocks.items()}
+        )
+
+    def apply(self) -> None:
+        """Write the new blocks in the masks, used to undo and redo edits"""
+        for (segment, block_key), (_, new_block) in self._blocks.items():
+            self._masks._set_block(segment, block_key, new_block)
+
+
+def _same_blocks(block: NDArray[np.uint8] | None, other_block: NDArray[np.uint8] | None) -> bool:
+    if block is None or other_block is None:
+        return block is other_block
+    return block is other_block or np.array_equal(block, other_block)
+
+
+class SparseSegmentMasks:
+    """
+    Binary mask of each segment of a labelmap, for segments to overlap.
+    The dense labelmap only holds one value per voxel, the highest of the segments overlapping it: the masks keep
+    the voxels of each segment that are hidden by another segment. They are split into blocks of block_size³ voxels
+    stored bit-packed (1 bit per voxel) and only the blocks containing voxels of a segment are allocated.
+    The masks come in addition to the dense labelmap, which the views display: a sparse segmentation adds a fraction
+    of the memory of its labelmap, a dense one can add up to an eighth of it per segment.
+    The masks are empty until enabled from the labelmap they complement.
+    """
+
+    BLOCK_SIZE = 16
+
+    def __init__(self, shape: tuple[int, int, int], block_size: int = BLOCK_SIZE) -> None:
+        """shape: (k, j, i) shape of the labelmap array"""
+        self._shape = tuple(shape)
+        self._block_size = block_size
+        self._blocks: dict[int, dict[BlockKey, NDArray[np.uint8]]] = {}
+        self._is_enabled = False
+
+    @property
+    def is_enabled(self) -> bool:
+        return self._is_enabled
+
+    @property
+    def segments(self) -> list[int]:
+        return sorted(self._blocks)
+
+    @property
+    def nbytes(self) -> int:
+        return sum(block.nbytes for blocks in self._blocks.values() for block in blocks.values())
+
+    def enable(self, labelmap_array: np.ndarray) -> None:
+        """Initialize the masks from the (k, j, i) labelmap array"""
+        self._blocks = {}
+        full_region = tuple(slice(0, size) for size in self._shape)
+        for block_key, array_region, block_region, _ in self._iter_blocks(full_region):
+            labelmap_block = labelmap_array[array_region]
+            if not labelmap_block.any():
+                continue
+            for value in np.unique(labelmap_block):
+                if value == 0:
+                    continue
+                block = np.zeros((self._block_size,) * 3, dtype=bool)
+                block[block_region] = labelmap_block == value
+                self._set_block(int(value), block_key, np.packbits(block))
+        self._is_enabled = True
+
+    def disable(self) -> None:
+        self._blocks = {}
+        self._is_enabled = False
+
+    def _iter_blocks(self, region: Region) -> Iterator[tuple[BlockKey, Region, Region, Region]]:
+        """Blocks intersecting region, with their intersection in the array, in the block and in the region"""
+        block_ranges = [
+            range(region[axis].start // self._block_size, (region[axis].stop - 1) // self._block_size + 1)
+            for axis in range(3)
+        ]
+        for block_key in product(*block_ranges):
+            array_region, block_region, local_region = [], [], []
+            for axis in range(3):
+                block_start = block_key[axis] * self._block_size
+                start = max(region[axis].start, block_start)
+                stop = min(region[axis].stop, block_start + self._block_size)
+                array_region.append(slice(start, stop))
+                block_region.append(slice(start - block_start, stop - block_start))
+                local_region.append(slice(start - region[axis].start, stop - region[axis].start))
+            yield block_key, tuple(array_region), tuple(block_region), tuple(local_region)
+
+    def _unpack(self, packed_block: NDArray[np.uint8]) -> NDArray[np.bool]:
+        return np.unpackbits(packed_block, count=self._block_size**3).reshape((self._block_size,) * 3).astype(bool)
+
+    def _set_block(self, segment: int, block_key: BlockKey, packed_block: NDArray[np.uint8] | None) -> None:
+        segment_blocks = self._blocks.setdefault(segment, {})
+        if packed_block is not None:
+            segment_blocks[block_key] = packed_block
+            return
+        segment_blocks.pop(block_key, None)
+        if not segment_blocks:
+            del self._blocks[segment]
+
+    def get(self, segment: int, region: Region) -> NDArray[np.bool]:
+        """Mask of the voxels of segment in region"""
+        mask = np.zeros(tuple(s.stop - s.start for s in region), dtype=bool)
+        segment_blocks = self._blocks.get(segment, {})
+        for block_key, _, block_region, local_region in self._iter_blocks(region):
+            if block_key in segment_blocks:
+                mask[local_region] = self._unpack(segment_blocks[block_key])[block_region]
+        return mask
+
+    def get_segment_snapshot(self, segment: int) -> "SparseSegmentMasks":
+        """Masks holding the current blocks of segment, unaffected by the following edits"""
+        snapshot = SparseSegmentMasks(self._shape, self._block_size)
+        if segment in self._blocks:
+            snapshot._blocks[segment] = dict(self._blocks[segment])
+        snapshot._is_enabled = self._is_enabled
+        return snapshot
+
+    def get_segments(self, region: Region) -> list[int]:
+        """Segments with voxels in the blocks of region"""
+        block_keys = [block_key for block_key, *_ in self._iter_blocks(region)]
+        return [
+            segment for segment in self.segments if any(block_key in self._blocks[segment] for block_key in block_keys)
+        ]
+
+    def get_top_values(self, region: Region, dtype: np.dtype) -> np.ndarray:
+        """Highest segment of each voxel of region, 0 for voxels without segment"""
+        values = np.zeros(tuple(s.stop - s.start for s in region), dtype=dtype)
+        for segment in self.get_segments(region):
+            values[self.get(segment, region)] = segment
+        return values
+
+    def set(self, segment: int, region: Region, mask: NDArray[np.bool], value: bool) -> SegmentMasksChanges:
+        """Add (value=True) or remove (value=False) the voxels of mask in region to the segment"""
+        changes = SegmentMasksChanges(self)
+        segment_blocks = self._blocks.get(segment, {})
+        for block_key, _, block_region, local_region in self._iter_blocks(region):
+            block_mask = mask[local_region]
+            old_block = segment_blocks.get(block_key)
+            if not block_mask.any() or (old_block is None and not value):
+                continue
+            block = self._unpack(old_block) if old_block is not None else np.zeros((self._block_size,) * 3, dtype=bool)
+            block[block_region][block_mask] = value
+            new_block = np.packbits(block) if block.any() else None
+            if _same_blocks(old_block, new_block):
+                continue
+            self._set_block(segment, block_key, new_block)
+            changes._blocks[(segment, block_key)] = (old_block, new_block)
+            segment_blocks = self._blocks.get(segment, {})
+        return changes
+
+    def remove_segment(self, segment: int) -> SegmentMasksChanges:
+        return SegmentMasksChanges(
+            self, {(segment, block_key): (block, None) for block_key, block in self._blocks.pop(segment, {}).items()}
+        )
@@ -0,0 +1,161 @@
+import numpy as np
+from vtkmodules.vtkCommonDataModel import vtkImageData
+
+from .segmentation import LabelMapDiff, _vtk_image_to_np
+
+
+class LabelMapStatistics:
+    """
+    Voxel count, volume, bounding box and centroid of every value of a labelmap.
+    Counts and coordinate sums are updated from the diff of each edit. A bounding box can only shrink when voxels
+    on its border are removed: it is then recomputed, within its previous extent, the next time it is requested.
+    """
+
+    def __init__(self, labelmap: vtkImageData, max_value: int = 255, is_empty: bool = False) -> None:
+        self._labelmap = labelmap
+        self._size = max_value + 1
+        self._counts = np.zeros(self._size, dtype=np.int64)
+        self._coordinate_sums = np.zeros((self._size, 3), dtype=np.float64)
+        self._bbox_min = np.full((self._size, 3), np.iinfo(np.int64).max, dtype=np.int64)
+        self._bbox_max = np.full((self._size, 3), -1, dtype=np.int64)
+        self._is_bbox_stale = np.zeros(self._size, dtype=bool)
+
+        if is_empty:
+            # All the voxels are background: no need to scan them
+            dimensions = np.array(labelmap.GetDimensions())
+            self._counts[0] = labelmap.GetNumberOfPoints()
+            self._coordinate_sums[0] = self._counts[0] * (dimensions - 1) / 2
+            self._bbox_min[0] = 0
+            self._bbox_max[0] = dimensions - 1
+        else:
+            self.compute()
+
+    def compute(self) -> None:
+        """Full pass over the labelmap, one slice at a time to bound memory"""
+        np_labelmap = _vtk_image_to_np(self._labelmap)
+        self._counts[:] = 0
+        self._coordinate_sums[:] = 0
+        self._bbox_min[:] = np.iinfo(np.int64).max
+        self._bbox_max[:] = -1
+        self._is_bbox_stale[:] = False
+        j_coordinates, i_coordinates = (coordinates.reshape(-1) for coordinates in np.indices(np_labelmap.shape[1:]))
+        for k, labelmap_slice in enumerate(np_labelmap):
+            self._add_slice(k, labelmap_slice.reshape(-1).astype(np.intp), i_coordinates, j_coordinates)
+
+    def _add_slice(self, k: int, values: np.ndarray, i_coordinates: np.ndarray, j_coordinates: np.ndarray) -> None:
+        """
+        Add the voxels of the slice k. Unlike _add_voxels, the bounding boxes are updated from the rows and columns
+        where each value is present, which avoids the slow unbuffered np.minimum.at over all the voxels.
+        """
+        counts = np.bincount(values, minlength=self._size)[: self._size]
+        present = np.flatnonzero(counts)
+        self._counts += counts
+        self._coordinate_sums[:, 2] += counts * k
+        self._bbox_min[present, 2] = np.minimum(self._bbox_min[present, 2], k)
+        self._bbox_max[present, 2] = np.maximum(self._bbox_max[present, 2], k)
+        ni, nj = i_coordinates[-1] + 1, j_coordinates[-1] + 1
+
+        if len(present) == 1:
+            # Uniform slice, typically background only
+            self._coordinate_sums[present, 0] += nj * ni * (ni - 1) / 2
+            self._coordinate_sums[present, 1] += ni * nj * (nj - 1) / 2
+            self._bbox_min[present, :2] = np.minimum(self._bbox_min[present, :2], 0)
+            self._bbox_max[present, :2] = np.maximum(self._bbox_max[present, :2], [ni - 1, nj - 1])
+            return
+
+        self._coordinate_sums[:, 0] += np.bincount(values, weights=i_coordinates, minlength=self._size)[: self._size]
+        self._coordinate_sums[:, 1] += np.bincount(values, weights=j_coordinates, minlength=self._size)[: self._size]
+
+        compact_values = np.zeros(self._size, dtype=np.intp)
+        compact_values[present] = np.arange(len(present))
+        compact_values = compact_values[values]
+        for axis, coordinates, size in ((0, i_coordinates, ni), (1, j_coordinates, nj)):
+            is_present = (
+                np.bincount(compact_values * size + coordinates, minlength=len(present) * size).reshape(-1, size) > 0
+            )
+            first = is_present.argmax(axis=1)
+            last = size - 1 - is_present[:, ::-1].argmax(axis=1)
+            self._bbox_min[present, axis] = np.minimum(self._bbox_min[present, axis], first)
+            self._bbox_max[present, axis] = np.maximum(self._bbox_max[present, axis], last)
+
+    def _get_coordinates(self, indices: np.ndarray) -> np.ndarray:
+        """(i, j, k) array coordinates of flat indices"""
+        k, j, i = np.unravel_index(indices, tuple(reversed(self._labelmap.GetDimensions())))
+        return np.stack([i, j, k], axis=1)
+
+    def _add_voxels(self, indices: np.ndarray, values: np.ndarray) -> None:
+        coordinates = self._get_coordinates(indices)
+        self._counts += np.bincount(values, minlength=self._size)[: self._size]
+        for axis in range(3):
+            coordinate_sums = np.bincount(values, weights=coordinates[:, axis], minlength=self._size)
+            self._coordinate_sums[:, axis] += coordinate_sums[: self._size]
+        np.minimum.at(self._bbox_min, values, coordinates)
+        np.maximum.at(self._bbox_max, values, coordinates)
+
+    def _remove_voxels(self, indices: np.ndarray, values: np.ndarray) -> None:
+        coordinates = self._get_coordinates(indices)
+        self._counts -= np.bincount(values, minlength=self._size)[: self._size]
+        for axis in range(3):
+            coordinate_sums = np.bincount(values, weights=coordinates[:, axis], minlength=self._size)
+            self._coordinate_sums[:, axis] -= coordinate_sums[: self._size]
+        on_bbox_border = (coordinates == self._bbox_min[values]).any(axis=1) | (
+            coordinates == self._bbox_max[values]
+        ).any(axis=1)
+        self._is_bbox_stale[values[on_bbox_border]] = True
+
+    def update(self, diff: LabelMapDiff) -> None:
+        indices = diff.indices
+        self._remove_voxels(indices, diff.old_values.astype(np.int64))
+        self._add_voxels(indices, diff.new_values.astype(np.int64))
+
+    def _update_bbox(self, value: int) -> None:
+        self._is_bbox_stale[value] = False
+        if self._counts[value] == 0:
+            self._bbox_min[value] = np.iinfo(np.int64).max
+            self._bbox_max[value] = -1
+            return
+
+        bbox_min, bbox_max = self._bbox_min[value].copy(), self._bbox_max[value].copy()
+        region = tuple(slice(bbox_min[axis], bbox_max[axis] + 1) for axis in (2, 1, 0))
+        mask = _vtk_image_to_np(self._labelmap)[region] == value
+        for axis, other_axes in ((0, (0, 1)), (1, (0, 2)), (2, (1, 2))):
+            present = np.flatnonzero(mask.any(axis=other_axes))
+            self._bbox_max[value, axis] = bbox_min[axis] + present[-1]
+            self._bbox_min[value, axis] = bbox_min[axis] + present[0]
+
+    def _to_physical(self, ijk: np.ndarray) -> list[float]:
+        extent = self._labelmap.GetExtent()
+        point = [0.0, 0.0, 0.0]
+        self._labelmap.TransformContinuousIndexToPhysicalPoint(
+            [ijk[0] + extent[0], ijk[1] + extent[2], ijk[2] + extent[4]], point
+        )
+        return point
+
+    def get_voxel_count(self, value: int) -> int:
+        return int(self._counts[value])
+
+    def get_volume(self, value: int) -> float:
+        """Volume in mm³"""
+        return float(self._counts[value] * np.prod(self._labelmap.GetSpacing()))
+
+    def get_centroid(self, value: int) -> list[float] | None:
+        """Centroid in world coordinates"""
+        if self._counts[value] == 0:
+            return None
+        return self._to_physical(self._coordinate_sums[value] / self._counts[value])
+
+    def get_bounds(self, value: int) -> list[float] | None:
+        """Bounds in world coordinates of the voxels of the value"""
+        if self._is_bbox_stale[value]:
+            self._update_bbox(value)
+        if self._counts[value] == 0:
+            return None
+        corners = np.array(
+            [
+                self._to_physical(np.array([i, j, k]))
+                for i in (self._bbox_min[value, 0], self._bbox_max[value, 0])
+                for j in (self._bbox_min[value, 1], self._bbox_max[value, 1])
+                for k in (self._bbox_min[value, 2], self._bbox_max[value, 2])
+            ]
+        )
+        return [float(bound) for axis in range(3) for bound in (corners[:, axis].min(), corners[:, axis].max())]
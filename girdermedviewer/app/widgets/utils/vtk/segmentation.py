@@ -1,14 +1,21 @@
 import math
+import time
+from collections.abc import Callable
+from copy import copy
 from enum import IntEnum
 
 import numpy as np
 import vtkmodules.util.numpy_support as vtknp
 from numpy.typing import NDArray
-from undo_stack import Signal
-from vtkmodules.vtkCommonCore import VTK_UNSIGNED_CHAR, vtkCommand, vtkPoints
+from undo_stack import Signal, UndoCommand, UndoStack
+from vtkmodules.vtkCommonCore import (
+    VTK_UNSIGNED_CHAR,
+    vtkCommand,
+    vtkLookupTable,
+    vtkPoints,
+)
 from vtkmodules.vtkCommonDataModel import (
     vtkImageData,
-    vtkPiecewiseFunction,
     vtkPlane,
     vtkPolyData,
 )
@@ -27,7 +34,6 @@ from vtkmodules.vtkInteractionImage import vtkResliceImageViewer
 from vtkmodules.vtkInteractionWidgets import vtkResliceCursor, vtkResliceCursorWidget
 from vtkmodules.vtkRenderingCore import (
     vtkActor,
-    vtkDiscretizableColorTransferFunction,
     vtkImageSlice,
     vtkPolyDataMapper,
     vtkProp,
@@ -37,6 +43,8 @@ from vtkmodules.vtkRenderingCore import (
     vtkRenderWindowInteractor,
 )
 
+from .dataset_cache import detach_shared_scalars
+from .segment_masks import SegmentMasksChanges, SparseSegmentMasks
 from .vtk_utils import realign_axes
 
 
@@ -79,30 +87,82 @@ def _subextent_to_slices(extent: list[int], subextent: list[int]) -> tuple[slice
     )
 
 
+def _run_length_encode(values: np.ndarray) -> tuple[np.ndarray, NDArray[np.uint32]]:
+    """Values of each run of equal consecutive values, and the lengths of the runs"""
+    starts = np.concatenate([[0], np.flatnonzero(values[1:] != values[:-1]) + 1])
+    lengths = np.diff(np.concatenate([starts, [len(values)]])).astype(np.uint32)
+    return values[starts], lengths
+
+
+def _run_length_decode(run_values: np.ndarray, run_lengths: NDArray[np.uint32]) -> np.ndarray:
+    return np.repeat(run_values, run_lengths)
+
+
+def _densify_stroke(points: NDArray[np.float64], step: float) -> NDArray[np.float64]:
+    """Resample the polyline so that consecutive points are at most step apart"""
+    if len(points) < 2:
+        return points
+    lengths = np.linalg.norm(np.diff(points, axis=0), axis=1)
+    counts = np.maximum(np.ceil(lengths / step).astype(int), 1)
+    segment_ids = np.repeat(np.arange(len(lengths)), counts)
+    ratios = (np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)) / np.repeat(counts, counts)
+    resampled = points[segment_ids] + (points[segment_ids + 1] - points[segment_ids]) * ratios[:, np.newaxis]
+    return np.vstack([resampled, points[-1:]])
+
+
+def _union_of_shifted_masks(
+    mask: NDArray[np.bool], mask_extent: list[int], offsets: NDArray[np.int_]
+) -> tuple[NDArray[np.bool], list[int]]:
+    """Union of the mask translated by each (i, j, k) offset, and the extent of that union.
+    Loops over whichever is smaller: the offsets or the voxels of the mask (i.e. dilates the offsets by the mask).
+    """
+    min_offset = offsets.min(axis=0)
+    max_offset = offsets.max(axis=0)
+    extent = [
+        mask_extent[0] + int(min_offset[0]),
+        mask_extent[1] + int(max_offset[0]),
+        mask_extent[2] + int(min_offset[1]),
+        mask_extent[3] + int(max_offset[1]),
+        mask_extent[4] + int(min_offset[2]),
+        mask_extent[5] + int(max_offset[2]),
+    ]
+    # numpy arrays are indexed (k, j, i)
+    shifts = (offsets - min_offset)[:, ::-1]
+    shift_shape = tuple((max_offset - min_offset)[::-1] + 1)
+    union = np.zeros(tuple(np.add(mask.shape, shift_shape) - 1), dtype=bool)
+
+    mask_voxels = np.argwhere(mask)
+    if len(shifts) <= len(mask_voxels):
+        for k, j, i in shifts:
+            union[k : k + mask.shape[0], j : j + mask.shape[1], i : i + mask.shape[2]] |= mask
+    else:
+        shifted_points = np.zeros(shift_shape, dtype=bool)
+        shifted_points[tuple(shifts.T)] = True
+        for k, j, i in mask_voxels:
+            union[k : k + shift_shape[0], j : j + shift_shape[1], i : i + shift_shape[2]] |= shifted_points
+    return union, extent
+
+
 def set_segment_color(image_slice: vtkImageSlice, segment_id: int, color: tuple[float]) -> bool:
-    lut: vtkDiscretizableColorTransferFunction = image_slice.GetProperty().GetLookupTable()
-    value = [0.0] * 6
-    lut.GetNodeValue(segment_id, value)
+    lut: vtkLookupTable = image_slice.GetProperty().GetLookupTable()
+    value = list(lut.GetTableValue(segment_id))
 
-    if color == value[1:4]:
+    # The table stores 8-bit colors
+    if [round(component * 255) for component in color] == [round(component * 255) for component in value[:3]]:
         return False
 
-    value[1:4] = color
-    lut.SetNodeValue(segment_id, value)
+    lut.SetTableValue(segment_id, *color, value[3])
     return True
 
 
 def set_segment_visibility(image_slice: vtkImageSlice, segment_id: int, visible: bool) -> bool:
-    lut: vtkDiscretizableColorTransferFunction = image_slice.GetProperty().GetLookupTable()
-    of: vtkPiecewiseFunction = lut.GetScalarOpacityFunction()
-    value = [0.0, 0.0, 0.0, 0.0]
-    of.GetNodeValue(segment_id, value)
+    lut: vtkLookupTable = image_slice.GetProperty().GetLookupTable()
+    value = list(lut.GetTableValue(segment_id))
 
-    if value[1] == float(visible):
+    if value[3] == float(visible):
         return False
 
-    value[1] = float(visible)
-    of.SetNodeValue(segment_id, value)
+    lut.SetTableValue(segment_id, *value[:3], float(visible))
     return True
 
 
@@ -115,14 +175,224 @@ class LabelMapOverwriteMode(IntEnum):
     # Areas added to selected segment will be removed from all other segments. (no overlap)
     AllSegments = 0
     # Areas added to selected segment will not be removed from any segments. (overlap with all other segments)
+    # With segment masks, the labelmap shows the highest of the overlapping segments and the masks keep the hidden
+    # voxels. Without them, painted voxels are only added to the background.
     Never = 1
 
 
+class LabelMapDiff:
+    """
+    Voxels changed by a labelmap edit: runs of consecutive flat indices and the values before and after the edit.
+    Edits change rows of neighbouring voxels, mostly from and to a same value, so indices and values are
+    stored run-length encoded.
+    """
+
+    def __init__(
+        self,
+        indices: NDArray[np.int64],
+        old_values: np.ndarray,
+        new_values: np.ndarray,
+        shape: tuple[int, int, int],
+        origin_extent: list[int],
+    ) -> None:
+        """indices: sorted flat indices in the (k, j, i) labelmap array of the given shape"""
+        breaks = np.flatnonzero(np.diff(indices) != 1) + 1
+        starts = np.concatenate([[0], breaks])
+        index_dtype = np.uint32 if indices[-1] <= np.iinfo(np.uint32).max else np.int64
+        self._run_starts = indices[starts].astype(index_dtype)
+        self._run_lengths = np.diff(np.concatenate([starts, [len(indices)]])).astype(np.uint32)
+        self._old_values = _run_length_encode(old_values)
+        self._new_values = _run_length_encode(new_values)
+        self._shape = shape
+        self._origin_extent = origin_extent
+
+        k, j, i = np.unravel_index(indices, shape)
+        self.extent = [
+            origin_extent[0] + int(i.min()),
+            origin_extent[0] + int(i.max()),
+            origin_extent[2] + int(j.min()),
+            origin_extent[2] + int(j.max()),
+            origin_extent[4] + int(k.min()),
+            origin_extent[4] + int(k.max()),
+        ]
+
+    @classmethod
+    def from_region(
+        cls, labelmap: vtkImageData, region: tuple[slice, slice, slice], before: np.ndarray, after: np.ndarray
+    ) -> "LabelMapDiff | None":
+        """Diff of a region of the labelmap (NumPy slices of its array), None if no voxel changed"""
+        changed = before != after
+        if not changed.any():
+            return None
+        shape = tuple(reversed(labelmap.GetDimensions()))
+        local_indices = np.nonzero(changed)
+        indices = np.ravel_multi_index(
+            tuple(local + region_slice.start for local, region_slice in zip(local_indices, region, strict=True)),
+            shape,
+        )
+        return cls(indices, before[changed], after[changed], shape, list(labelmap.GetExtent()))
+
+    def inverted(self) -> "LabelMapDiff":
+        """Diff reverting this edit"""
+        inverted = copy(self)
+        inverted._old_values, inverted._new_values = self._new_values, self._old_values
+        return inverted
+
+    @property
+    def indices(self) -> NDArray[np.int64]:
+        ends = np.cumsum(self._run_lengths, dtype=np.int64)
+        offsets = np.arange(ends[-1], dtype=np.int64) - np.repeat(ends - self._run_lengths, self._run_lengths)
+        return np.repeat(self._run_starts.astype(np.int64), self._run_lengths) + offsets
+
+    @property
+    def old_values(self) -> np.ndarray:
+        return _run_length_decode(*self._old_values)
+
+    @property
+    def new_values(self) -> np.ndarray:
+        return _run_length_decode(*self._new_values)
+
+    @property
+    def values(self) -> np.ndarray:
+        """Labelmap values changed by the edit, before or after it"""
+        return np.union1d(self._old_values[0], self._new_values[0])
+
+    @property
+    def nbytes(self) -> int:
+        return sum(
+            array.nbytes for array in (self._run_starts, self._run_lengths, *self._old_values, *self._new_values)
+        )
+
+    def merge(self, diff: "LabelMapDiff") -> "LabelMapDiff | None":
+        """Diff of this edit followed by the given one, None if the second edit reverts the first one"""
+        indices = np.concatenate([self.indices, diff.indices])
+        unique_indices, first = np.unique(indices, return_index=True)
+        _, last_reversed = np.unique(indices[::-1], return_index=True)
+        old_values = np.concatenate([self.old_values, diff.old_values])[first]
+        new_values = np.concatenate([self.new_values, diff.new_values])[len(indices) - 1 - last_reversed]
+        changed = old_values != new_values
+        if not changed.any():
+            return None
+        return LabelMapDiff(
+            unique_indices[changed], old_values[changed], new_values[changed], self._shape, self._origin_extent
+        )
+
+
+class LabelMapEditCommand(UndoCommand):
+    """
+    Undoable labelmap edit. Successive edits of a same brush stroke are merged into one command.
+    Edits of overlapping segments may only change the segment masks, hidden voxels leaving the labelmap unchanged.
+    """
+
+    def __init__(
+        self,
+        editor: "LabelMapEditor",
+        labelmap: vtkImageData,
+        diff: LabelMapDiff | None,
+        edit_id: int,
+        text: str,
+        masks_changes: SegmentMasksChanges | None = None,
+    ):
+        super().__init__()
+        self._id = edit_id
+        self._text = text
+        self._editor = editor
+        self._labelmap = labelmap
+        self._diff = diff
+        self._masks_changes = masks_changes
+
+    @property
+    def nbytes(self) -> int:
+        return sum(changes.nbytes for changes in (self._diff, self._masks_changes) if changes is not None)
+
+    def undo(self) -> None:
+        self._editor.apply_diff(
+            self._labelmap,
+            self._diff.inverted() if self._diff is not None else None,
+            self._masks_changes.inverted() if self._masks_changes is not None else None,
+        )
+
+    def redo(self) -> None:
+        self._editor.apply_diff(self._labelmap, self._diff, self._masks_changes)
+
+    def merge_with(self, command: "LabelMapEditCommand") -> bool:
+        if command._labelmap is not self._labelmap:
+            return False
+        if self._diff is None or command._diff is None:
+            self._diff = self._diff or command._diff
+        else:
+            self._diff = self._diff.merge(command._diff)
+        if self._masks_changes is None or command._masks_changes is None:
+            self._masks_changes = self._masks_changes or command._masks_changes
+        else:
+            self._masks_changes = self._masks_changes.merge(command._masks_changes)
+        self._is_obsolete = self._diff is None and self._masks_changes is None
+        return True
+
+
+class LabelMapUndoStack(UndoStack):
+    """
+    Undo stack dropping its oldest commands when their diffs exceed memory_budget bytes.
+    The memory budget replaces the undo limit, which is only set while the oldest commands are dropped.
+    """
+
+    def __init__(self, memory_budget: int = 0, **kwargs) -> None:
+        super().__init__(**kwargs)
+        self.memory_budget = memory_budget
+        # Commands of the stack, oldest first, followed through the public API of UndoStack
+        self._commands: list[LabelMapEditCommand] = []
+
+    @property
+    def nbytes(self) -> int:
+        return sum(command.nbytes for command in self._commands)
+
+    def push(self, command: LabelMapEditCommand) -> None:
+        index = self.index()
+        super().push(command)
+        # Pushing drops the undone commands, then appends the command unless it is merged into the current one,
+        # which is removed if the merge makes it obsolete
+        commands = self._commands[:index]
+        if self.n_commands() > index:
+            commands.append(command)
+        self._commands = commands[: self.n_commands()]
+        self._drop_commands_over_budget()
+
+    def clear(self) -> None:
+        super().clear()
+        self._commands = []
+
+    def _drop_commands_over_budget(self) -> None:
+        if self.memory_budget <= 0:
+            return
+
+        # The last pushed command is always kept
+        kept_count = len(self._commands)
+        nbytes = self.nbytes
+        while nbytes > self.memory_budget and kept_count > 1:
+            nbytes -= self._commands[-kept_count].nbytes
+            kept_count -= 1
+        if kept_count == len(self._commands):
+            return
+
+        self.set_undo_limit(kept_count)
+        self.set_undo_limit(0)
+        self._commands = self._commands[-kept_count:]
+
+
 class LabelMapEditor:
     """
     Edits a labelmap
+    The extent of every edit is emitted with labelmap_modified and accumulated in dirty_extent, so that consumers
+    only refresh the region that changed. The changed voxels are emitted with diff_applied.
+    When segment masks are set, they are enabled by the first edit letting segments overlap (overwrite mode Never)
+    and kept up to date by all the following edits of the labelmap.
     """
 
+    labelmap_modified = Signal(vtkImageData, list)
+    diff_applied = Signal(vtkImageData, LabelMapDiff)
+
+    MAX_CACHED_BRUSH_MASKS = 16
+
     def __init__(
         self,
     ) -> None:
@@ -130,6 +400,13 @@ class LabelMapEditor:
         self._active_segment = None
         self._operation = LabelMapOperation.Set
         self._overwrite_mode = LabelMapOverwriteMode.AllSegments
+        self._segment_masks: SparseSegmentMasks | None = None
+        self._brush_masks: dict[tuple, tuple[NDArray[np.bool], list[int]]] = {}
+        self._dirty_extent: list[int] | None = None
+        self._undo_stack: LabelMapUndoStack | None = None
+        self._history_labelmap = None
+        self._edit_id = 0
+        self._edit_text = ""
 
     @property
     def labelmap(self) -> vtkImageData:
@@ -137,8 +414,86 @@ class LabelMapEditor:
 
     @labelmap.setter
     def labelmap(self, image_data: vtkImageData) -> None:
+        # The history only applies to the last edited labelmap
+        if image_data is not None and image_data is not self._history_labelmap:
+            self._history_labelmap = image_data
+            if self._undo_stack is not None:
+                self._undo_stack.clear()
         self._labelmap = image_data
 
+    @property
+    def segment_masks(self) -> SparseSegmentMasks | None:
+        """Masks of the segments of the labelmap"""
+        return self._segment_masks
+
+    @segment_masks.setter
+    def segment_masks(self, segment_masks: SparseSegmentMasks | None) -> None:
+        self._segment_masks = segment_masks
+
+    @property
+    def undo_stack(self) -> LabelMapUndoStack | None:
+        return self._undo_stack
+
+    @undo_stack.setter
+    def undo_stack(self, undo_stack: LabelMapUndoStack | None) -> None:
+        self._undo_stack = undo_stack
+
+    def start_edit(self, text: str | None = None) -> None:
+        """Start a new undoable edit; following changes are merged into it until the next call"""
+        self._edit_id += 1
+        if text is None:
+            text = "Paint" if self._operation == LabelMapOperation.Set else "Erase"
+        self._edit_text = text
+
+    @property
+    def dirty_extent(self) -> list[int] | None:
+        """Union of the extents edited since the last call to pop_dirty_extent, None if nothing was edited"""
+        return self._dirty_extent
+
+    def pop_dirty_extent(self) -> list[int] | None:
+        dirty_extent = self._dirty_extent
+        self._dirty_extent = None
+        return dirty_extent
+
+    def _record_edit(
+        self, labelmap: vtkImageData, diff: LabelMapDiff | None, masks_changes: SegmentMasksChanges | None = None
+    ) -> None:
+        if not masks_changes:
+            masks_changes = None
+        if diff is None and masks_changes is None:
+            return
+        if diff is not None:
+            self._mark_modified(labelmap, diff.extent)
+            self.diff_applied(labelmap, diff)
+        if self._undo_stack is not None:
+            self._undo_stack.push(
+                LabelMapEditCommand(self, labelmap, diff, self._edit_id, self._edit_text, masks_changes)
+            )
+
+    def apply_diff(
+        self, labelmap: vtkImageData, diff: LabelMapDiff | None, masks_changes: SegmentMasksChanges | None = None
+    ) -> None:
+        """Write the new values of diff in labelmap and the changes of the segment masks, used to undo and redo edits"""
+        if masks_changes is not None:
+            masks_changes.apply()
+        if diff is None:
+            return
+        detach_shared_scalars(labelmap)
+        _vtk_image_to_np(labelmap).reshape(-1)[diff.indices] = diff.new_values
+        self._mark_modified(labelmap, diff.extent)
+        self.diff_applied(labelmap, diff)
+
+    def _mark_modified(self, labelmap: vtkImageData, extent: list[int]) -> None:
+        labelmap.Modified()
+        if self._dirty_extent is None:
+            self._dirty_extent = list(extent)
+        else:
+            self._dirty_extent = [
+                min(self._dirty_extent[i], extent[i]) if i % 2 == 0 else max(self._dirty_extent[i], extent[i])
+                for i in range(6)
+            ]
+        self.labelmap_modified(labelmap, list(extent))
+
     @property
     def active_segment(self) -> int:
         return self._active_segment
@@ -174,11 +529,19 @@ class LabelMapEditor:
     def _get_world_to_ijk(self):
         return self._labelmap.GetPhysicalToIndexMatrix()
 
-    def apply_glyph(self, poly: vtkPolyData, world_locations: vtkPoints) -> None:
-        """Apply poly at every world locations
-        poly: in world origin coordinates
-        world locations: each location where glyph will be applieds at
-        """
+    def _get_brush_mask_key(self, brush_key: tuple) -> tuple:
+        world_to_ijk = self._get_world_to_ijk_no_origin()
+        return (
+            brush_key,
+            tuple(round(world_to_ijk.GetElement(row, col), 6) for row in range(3) for col in range(3)),
+        )
+
+    def _get_brush_mask(self, poly: vtkPolyData, brush_key: tuple | None) -> tuple[NDArray[np.bool], list[int]]:
+        """Voxelize the brush in ijk coordinates, reusing the previous result for the same brush and labelmap geometry"""
+        mask_key = self._get_brush_mask_key(brush_key) if brush_key is not None else None
+        if mask_key in self._brush_masks:
+            return self._brush_masks[mask_key]
+
         # Rotate poly to later be translated in ijk coordinates for each world_locations
         world_to_ijk_transform_matrix = self._get_world_to_ijk_no_origin()
         world_origin_to_modifier_labelmap_ijk_transform = vtkTransform()
@@ -192,25 +555,39 @@ class LabelMapEditor:
         brush_model: vtkPolyData = world_origin_to_modifier_labelmap_ijk_transformer.GetOutput()
 
         modifier_labelmap = self._poly_to_modifier_labelmap(brush_model)
-        original_extent = modifier_labelmap.GetExtent()
-        np_modifier_labelmap = _vtk_image_to_np(modifier_labelmap) != 0
-
-        points_ijk = self._world_points_to_ijk(world_locations)
-        for i in range(points_ijk.GetNumberOfPoints()):
-            position = points_ijk.GetPoint(i)
-            # translate the modifier labelmap in IJK coords
-            extent = [
-                original_extent[0] + int(position[0]),
-                original_extent[1] + int(position[0]),
-                original_extent[2] + int(position[1]),
-                original_extent[3] + int(position[1]),
-                original_extent[4] + int(position[2]),
-                original_extent[5] + int(position[2]),
-            ]
-            self.apply_binary_labelmap(np_modifier_labelmap, extent)
+        brush_mask = (_vtk_image_to_np(modifier_labelmap) != 0, list(modifier_labelmap.GetExtent()))
+
+        if mask_key is not None:
+            if len(self._brush_masks) >= self.MAX_CACHED_BRUSH_MASKS:
+                self._brush_masks.pop(next(iter(self._brush_masks)))
+            self._brush_masks[mask_key] = brush_mask
+        return brush_mask
+
+    def apply_glyph(self, poly: vtkPolyData, world_locations: vtkPoints, brush_key: tuple | None = None) -> None:
+        """Apply poly at every world locations
+        poly: in world origin coordinates
+        world locations: each location where glyph will be applieds at
+        brush_key: identifies the brush shape, size and orientation, used to cache its voxelization
+        """
+        if world_locations.GetNumberOfPoints() == 0:
+            return
 
-    def apply_binary_labelmap(self, modifier_labelmap: NDArray[np.bool], base_modifier_extent: list[int]):
+        np_modifier_labelmap, original_extent = self._get_brush_mask(poly, brush_key)
+
+        points_ijk = vtknp.vtk_to_numpy(self._world_points_to_ijk(world_locations).GetData())
+        # translate the modifier labelmap in IJK coords, once per distinct voxel of the stroke
+        offsets = np.unique(points_ijk.astype(int), axis=0)
+        stroke_labelmap, stroke_extent = _union_of_shifted_masks(np_modifier_labelmap, original_extent, offsets)
+        self.apply_binary_labelmap(stroke_labelmap, stroke_extent)
+
+    def apply_binary_labelmap(
+        self,
+        modifier_labelmap: NDArray[np.bool],
+        base_modifier_extent: list[int],
+        operation: LabelMapOperation | None = None,
+    ):
         # modifier_labelmap: in source ijk coordinates
+        # operation: overrides the operation of the editor
         common_extent = list(self._labelmap.GetExtent())
         # clamp modifier extent to common extent so we don't draw outside the segmentation!
         modifier_extent = _clamp_extent(base_modifier_extent, common_extent)
@@ -225,32 +602,144 @@ class LabelMapEditor:
             # nothing to do, affected labelmap area is empty or out of labelmap range
             return
 
-        label_value = self._active_segment if self._operation == LabelMapOperation.Set else 0
+        if detach_shared_scalars(self._labelmap):
+            np_labelmap = _vtk_image_to_np(self._labelmap)
+
+        operation = self._operation if operation is None else operation
+        label_value = self._active_segment if operation == LabelMapOperation.Set else 0
         active_label_value = self._active_segment
 
         ## Apply effect
-        self._apply_modifier_labelmap_to_labelmap(
-            np_labelmap[labelmap_slices],
-            modifier_labelmap[modifier_labelmap_slices],
-            label_value,
-            active_label_value,
-            self._overwrite_mode,
+        labelmap_region = np_labelmap[labelmap_slices]
+        region_before = labelmap_region.copy()
+        segment_masks = self._get_segment_masks()
+        masks_changes = None
+        if segment_masks is None:
+            self._apply_modifier_labelmap_to_labelmap(
+                labelmap_region,
+                modifier_labelmap[modifier_labelmap_slices],
+                label_value,
+                active_label_value,
+                self._overwrite_mode,
+            )
+        else:
+            masks_changes = self._apply_modifier_labelmap_to_segment_masks(
+                segment_masks,
+                labelmap_slices,
+                labelmap_region,
+                modifier_labelmap[modifier_labelmap_slices],
+                label_value,
+                active_label_value,
+                self._overwrite_mode,
+            )
+
+        self._record_edit(
+            self._labelmap,
+            LabelMapDiff.from_region(self._labelmap, labelmap_slices, region_before, labelmap_region),
+            masks_changes,
         )
 
-        self._labelmap.Modified()
-
-    def clear_segment(self, labelmap: vtkImageData, id: int):
-        """Set to 0 all values equal to current segment id"""
+    def clear_segment(self, labelmap: vtkImageData, id: int, segment_masks: SparseSegmentMasks | None = None):
+        """
+        Set to 0 all values equal to current segment id.
+        With enabled segment_masks, the voxels of the segments it overlapped are shown instead.
+        """
+        masks_changes = None
+        if segment_masks is not None and segment_masks.is_enabled:
+            masks_changes = segment_masks.remove_segment(id)
+        detach_shared_scalars(labelmap)
         labelmap_array = _vtk_image_to_np(labelmap)
-        modifier_labelmap = labelmap_array == id
-        self._apply_modifier_labelmap_to_labelmap(
-            labelmap_array,
-            modifier_labelmap,
-            0,
-            id,
-            LabelMapOverwriteMode.AllSegments,  # AllSegment is faster and fine in this case
+        indices = np.flatnonzero(labelmap_array == id)
+        if len(indices) == 0 and not masks_changes:
+            return
+
+        diff = None
+        if len(indices) > 0:
+            new_values = np.zeros(len(indices), dtype=labelmap_array.dtype)
+            if masks_changes:
+                coordinates = np.unravel_index(indices, labelmap_array.shape)
+                region = tuple(slice(int(axis.min()), int(axis.max()) + 1) for axis in coordinates)
+                top_values = segment_masks.get_top_values(region, labelmap_array.dtype)
+                new_values = top_values[
+                    tuple(axis - region_slice.start for axis, region_slice in zip(coordinates, region, strict=True))
+                ]
+            labelmap_array.reshape(-1)[indices] = new_values
+            diff = LabelMapDiff(
+                indices,
+                np.full(len(indices), id, dtype=labelmap_array.dtype),
+                new_values,
+                labelmap_array.shape,
+                list(labelmap.GetExtent()),
+            )
+
+        self.start_edit("Clear segment")
+        self._record_edit(labelmap, diff, masks_changes)
+
+    def get_segment_mask(self, segment: int) -> NDArray[np.bool]:
+        """(k, j, i) mask of the voxels of segment in the labelmap, including the voxels hidden by other segments"""
+        return self.prepare_segment_mask(segment)()
+
+    def prepare_segment_mask(self, segment: int) -> Callable[[], NDArray[np.bool]]:
+        """
+        Function computing the mask of get_segment_mask, that can be called from a worker thread.
+        The segment masks are snapshotted, the labelmap array is read when called: the caller discards the mask
+        if the labelmap is modified in between.
+        """
+        labelmap_array = _vtk_image_to_np(self._labelmap)
+        segment_masks = self._segment_masks
+        if segment_masks is None or not segment_masks.is_enabled:
+            return lambda: labelmap_array == segment
+        segment_masks = segment_masks.get_segment_snapshot(segment)
+        full_region = tuple(slice(0, size) for size in labelmap_array.shape)
+        return lambda: segment_masks.get(segment, full_region)
+
+    def _get_segment_masks(self) -> SparseSegmentMasks | None:
+        """Segment masks to update, enabled by the first edit letting segments overlap"""
+        segment_masks = self._segment_masks
+        if segment_masks is None:
+            return None
+        if not segment_masks.is_enabled:
+            if self._overwrite_mode != LabelMapOverwriteMode.Never:
+                return None
+            segment_masks.enable(_vtk_image_to_np(self._labelmap))
+        return segment_masks
+
+    def _apply_modifier_labelmap_to_segment_masks(
+        self,
+        segment_masks: SparseSegmentMasks,
+        region: tuple[slice, slice, slice],
+        labelmap: np.ndarray,
+        modifier: NDArray[np.bool],
+        label_value: int,
+        active_label_value: int,
+        rule: LabelMapOverwriteMode,
+    ) -> SegmentMasksChanges:
+        """
+        Apply the modifier to the segment masks, then to the region of the labelmap.
+        Voxels shared by several segments show the highest one, whether they are painted or revealed by an erase.
+        """
+        masks_changes = SegmentMasksChanges(segment_masks)
+        if label_value != 0:
+            masks_changes.update(segment_masks.set(active_label_value, region, modifier, True))
+            if rule == LabelMapOverwriteMode.AllSegments:
+                for segment in segment_masks.get_segments(region):
+                    if segment != active_label_value:
+                        masks_changes.update(segment_masks.set(segment, region, modifier, False))
+                self._apply_modifier_labelmap_to_labelmap(labelmap, modifier, label_value, active_label_value, rule)
+            else:
+                labelmap[modifier & (labelmap < label_value)] = label_value
+            return masks_changes
+
+        # When erasing with overlap, only the current segment is affected
+        erased_segments = (
+            [active_label_value] if rule == LabelMapOverwriteMode.Never else segment_masks.get_segments(region)
         )
-        labelmap.Modified()
+        for segment in erased_segments:
+            masks_changes.update(segment_masks.set(segment, region, modifier, False))
+        revealed = modifier & np.isin(labelmap, erased_segments)
+        if revealed.any():
+            labelmap[revealed] = segment_masks.get_top_values(region, labelmap.dtype)[revealed]
+        return masks_changes
 
     def _apply_modifier_labelmap_to_labelmap(
         self,
@@ -374,6 +863,20 @@ class BrushModel:
         self._cylinder_source.SetHeight(height)
         self._cylinder_source.SetRadius(radius)
 
+    @property
+    def key(self) -> tuple:
+        """Identifies the untransformed brush geometry"""
+        if self._shape == BrushShape.Sphere:
+            source = self._sphere_source
+            return (
+                self._shape,
+                source.GetRadius(),
+                source.GetPhiResolution(),
+                source.GetThetaResolution(),
+            )
+        source = self._cylinder_source
+        return (self._shape, source.GetRadius(), source.GetResolution(), source.GetHeight())
+
     def get_output_port(self) -> vtkAlgorithmOutput:
         """Return output port of transformed brush model"""
         return self._world_origin_to_world_transformer.GetOutputPort()
@@ -440,11 +943,23 @@ class Brush2D:
 
 
 class SegmentPaintEffect2D:
-    """Setup a segmentation effect in a vtkResliceImageViewer"""
+    """Setup a segmentation effect in a vtkResliceImageViewer
+    With live painting, the stroke is applied to the labelmap while the mouse moves, at most once per LIVE_PAINT_PERIOD_S,
+    instead of once when the button is released.
+    """
+
+    LIVE_PAINT_PERIOD_S = 1 / 30
 
     update_requested = Signal()
 
-    def __init__(self, viewer: vtkResliceImageViewer, editor: LabelMapEditor, brush_model: BrushModel, layer=2):
+    def __init__(
+        self,
+        viewer: vtkResliceImageViewer,
+        editor: LabelMapEditor,
+        brush_model: BrushModel,
+        layer=2,
+        live_painting: bool = True,
+    ):
         self._viewer = viewer
         self._editor = editor
         self._widget: vtkResliceCursorWidget = self._viewer.GetResliceCursorWidget()
@@ -481,6 +996,9 @@ class SegmentPaintEffect2D:
         self._brush_enabled = False
         self._paint_coordinates_world = vtkPoints()
         self._painting = False
+        self._live_painting = live_painting
+        self._last_commit_time = 0.0
+        self._last_committed_point: tuple[float, float, float] | None = None
 
         feedback_points_poly_data.SetPoints(self.paint_coordinates_world)
 
@@ -506,6 +1024,14 @@ class SegmentPaintEffect2D:
     def paint_coordinates_world(self) -> vtkPoints:
         return self._paint_coordinates_world
 
+    @property
+    def live_painting(self) -> bool:
+        return self._live_painting
+
+    @live_painting.setter
+    def live_painting(self, live_painting: bool) -> None:
+        self._live_painting = live_painting
+
     def add_point_to_selection(self, position: tuple[float, float, float]) -> None:
         self._paint_coordinates_world.InsertNextPoint(position)
         self._paint_coordinates_world.Modified()
@@ -536,12 +1062,15 @@ class SegmentPaintEffect2D:
     def start_painting(self) -> None:
         self._brush_feedback.set_visibility(True)
         self._painting = True
+        self._editor.start_edit()
+        self._last_committed_point = None
 
     def stop_painting(self) -> None:
         self._brush_feedback.set_visibility(False)
         self._painting = False
         if self._paint_coordinates_world.GetNumberOfPoints() > 0:
             self.commit()
+        self._last_committed_point = None
 
     def is_painting(self) -> bool:
         return self._painting
@@ -550,11 +1079,38 @@ class SegmentPaintEffect2D:
         try:
             algo: vtkPolyDataAlgorithm = self._brush_model.get_untransformed_output_port().GetProducer()
             algo.Update()
-            self._editor.apply_glyph(algo.GetOutput(), self._paint_coordinates_world)
+            self._editor.apply_glyph(algo.GetOutput(), self._get_stroke_points(), self._get_brush_key())
+            self._last_committed_point = self._paint_coordinates_world.GetPoint(
+                self._paint_coordinates_world.GetNumberOfPoints() - 1
+            )
+            self._last_commit_time = time.monotonic()
         except:
             raise
         finally:  # ensure points are always cleared
             self._paint_coordinates_world.SetNumberOfPoints(0)  # clear points
+            self._paint_coordinates_world.Modified()
+
+    def _get_stroke_points(self) -> vtkPoints:
+        """Points to paint: the recorded ones, joined to the previously committed stroke segment without gaps"""
+        points = vtknp.vtk_to_numpy(self._paint_coordinates_world.GetData()).astype(np.float64)
+        if self._last_committed_point is not None:
+            points = np.vstack([self._last_committed_point, points])
+        step = min(self._editor.labelmap.GetSpacing())
+        stroke_points = vtkPoints()
+        stroke_points.SetData(vtknp.numpy_to_vtk(_densify_stroke(points, step), deep=True))
+        return stroke_points
+
+    def _commit_if_due(self) -> None:
+        if time.monotonic() - self._last_commit_time >= self.LIVE_PAINT_PERIOD_S:
+            self.commit()
+
+    def _get_brush_key(self) -> tuple:
+        """The brush voxelization depends on its geometry and on the slice orientation it is rotated to"""
+        slice_to_world = self._get_slice_to_world()
+        return (
+            self._brush_model.key,
+            tuple(round(slice_to_world.GetElement(row, col), 6) for row in range(3) for col in range(3)),
+        )
 
     def _get_slice_to_world(self) -> vtkMatrix4x4:
         return self._widget.GetResliceCursorRepresentation().GetResliceAxes()
@@ -615,6 +1171,8 @@ class SegmentPaintEffect2D:
             self._brush_feedback.update_slice_position(slice_to_world)
             if self.is_painting():
                 self.add_point_to_selection(world_pos)
+                if self._live_painting:
+                    self._commit_if_due()
 
     def _viewport_to_world(self, display_x, display_y) -> tuple[float, float, float]:
         match self._viewer.GetSliceOrientation():
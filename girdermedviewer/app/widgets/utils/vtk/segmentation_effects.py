@@ -0,0 +1,180 @@
+import math
+import threading
+from collections.abc import Callable
+from itertools import product
+
+import numpy as np
+import vtkmodules.util.numpy_support as vtknp
+from numpy.typing import NDArray
+from vtkmodules.vtkCommonCore import vtkPoints
+from vtkmodules.vtkCommonDataModel import vtkImageData
+from vtkmodules.vtkCommonExecutionModel import vtkAlgorithm
+from vtkmodules.vtkImagingMorphological import (
+    vtkImageConnectivityFilter,
+    vtkImageDilateErode3D,
+    vtkImageThresholdConnectivity,
+)
+
+from .segmentation import _clamp_extent, _subextent_to_slices
+
+
+class EffectCancelledError(Exception):
+    pass
+
+
+class EffectProgress:
+    """
+    Progress and cancellation of an effect computed in a worker thread.
+    The callback is called from the worker thread with a progress between 0 and 1.
+    """
+
+    def __init__(self, callback: Callable[[float], None] | None = None) -> None:
+        self._callback = callback
+        self._cancelled = threading.Event()
+
+    def cancel(self) -> None:
+        self._cancelled.set()
+
+    @property
+    def is_cancelled(self) -> bool:
+        return self._cancelled.is_set()
+
+    def update(self, progress: float) -> None:
+        """Report progress, raise EffectCancelledError if the effect was cancelled"""
+        if self.is_cancelled:
+            raise EffectCancelledError
+        if self._callback is not None:
+            self._callback(min(max(progress, 0.0), 1.0))
+
+    def run(self, algorithm: vtkAlgorithm, start: float = 0.0, end: float = 1.0) -> None:
+        """Update algorithm, forwarding its progress within [start, end] and aborting it on cancel"""
+
+        def _on_progress(caller: vtkAlgorithm, _event) -> None:
+            if self.is_cancelled:
+                caller.AbortExecuteOn()
+            elif self._callback is not None:
+                self._callback(start + (end - start) * caller.GetProgress())
+
+        observer = algorithm.AddObserver("ProgressEvent", _on_progress)
+        try:
+            algorithm.Update()
+        finally:
+            algorithm.RemoveObserver(observer)
+        self.update(end)
+
+
+def get_scalars_array(image_data: vtkImageData) -> np.ndarray:
+    """(k, j, i) numpy view of the first component of the scalars of image_data"""
+    array = vtknp.vtk_to_numpy(image_data.GetPointData().GetScalars())
+    if array.ndim > 1:
+        array = array[:, 0]
+    return array.reshape(tuple(reversed(image_data.GetDimensions())))
+
+
+def world_bounds_to_extent(image_data: vtkImageData, bounds: tuple[float]) -> list[int]:
+    """Extent of the voxels of image_data within world bounds, clamped to the extent of image_data"""
+    corners = []
+    for point in product(bounds[0:2], bounds[2:4], bounds[4:6]):
+        ijk = [0.0, 0.0, 0.0]
+        image_data.TransformPhysicalPointToContinuousIndex(point, ijk)
+        corners.append(ijk)
+    corners = np.array(corners)
+    extent = [
+        math.ceil(corners[:, axis].min() - 1e-6) if bound == 0 else math.floor(corners[:, axis].max() + 1e-6)
+        for axis in range(3)
+        for bound in range(2)
+    ]
+    return _clamp_extent(extent, list(image_data.GetExtent()))
+
+
+def get_mask_extent(mask: NDArray[np.bool], mask_extent: list[int]) -> list[int] | None:
+    """Extent of the True voxels of a (k, j, i) mask, None if the mask is empty"""
+    extent = []
+    for axis, other_axes in ((0, (0, 1)), (1, (0, 2)), (2, (1, 2))):
+        present = np.flatnonzero(mask.any(axis=other_axes))
+        if len(present) == 0:
+            return None
+        extent += [mask_extent[2 * axis] + int(present[0]), mask_extent[2 * axis] + int(present[-1])]
+    return extent
+
+
+def pad_extent(extent: list[int], padding: tuple[int, int, int], limits: list[int]) -> list[int]:
+    return _clamp_extent(
+        [extent[index] + (padding[index // 2] if index % 2 else -padding[index // 2]) for index in range(6)],
+        limits,
+    )
+
+
+def crop_array(array: np.ndarray, array_extent: list[int], extent: list[int]) -> np.ndarray:
+    return array[_subextent_to_slices(array_extent, extent)]
+
+
+def _np_to_vtk_image(array: np.ndarray) -> vtkImageData:
+    """vtkImageData in (i, j, k) coordinates with unit spacing, sharing the memory of the (k, j, i) array"""
+    array = np.ascontiguousarray(array)
+    image_data = vtkImageData()
+    image_data.SetDimensions(tuple(reversed(array.shape)))
+    scalars = vtknp.numpy_to_vtk(array.reshape(-1), deep=False)
+    image_data.GetPointData().SetScalars(scalars)
+    return image_data
+
+
+def _vtk_image_to_mask(image_data: vtkImageData) -> NDArray[np.bool]:
+    return get_scalars_array(image_data) != 0
+
+
+def threshold_mask(
+    volume: np.ndarray, lower: float, upper: float, progress: EffectProgress | None = None
+) -> NDArray[np.bool]:
+    """Voxels of volume within [lower, upper], one slice at a time to report progress"""
+    mask = np.empty(volume.shape, dtype=bool)
+    for k, volume_slice in enumerate(volume):
+        np.logical_and(volume_slice >= lower, volume_slice <= upper, out=mask[k])
+        if progress is not None:
+            progress.update((k + 1) / len(volume))
+    return mask
+
+
+def region_growing_mask(
+    volume: np.ndarray,
+    seed: tuple[int, int, int],
+    lower: float,
+    upper: float,
+    progress: EffectProgress | None = None,
+) -> NDArray[np.bool]:
+    """Voxels of volume within [lower, upper] that are connected to the (i, j, k) seed"""
+    flood_fill = vtkImageThresholdConnectivity()
+    flood_fill.SetInputData(_np_to_vtk_image(volume))
+    seeds = vtkPoints()
+    seeds.InsertNextPoint(seed)
+    flood_fill.SetSeedPoints(seeds)
+    flood_fill.ThresholdBetween(lower, upper)
+    flood_fill.ReplaceInOn()
+    flood_fill.SetInValue(1)
+    flood_fill.ReplaceOutOn()
+    flood_fill.SetOutValue(0)
+    (progress or EffectProgress()).run(flood_fill)
+    return _vtk_image_to_mask(flood_fill.GetOutput())
+
+
+def largest_island_mask(mask: NDArray[np.bool], progress: EffectProgress | None = None) -> NDArray[np.bool]:
+    """Largest face-connected component of mask"""
+    connectivity = vtkImageConnectivityFilter()
+    connectivity.SetInputData(_np_to_vtk_image(mask.astype(np.uint8)))
+    connectivity.SetScalarRange(1, 1)
+    connectivity.SetExtractionModeToLargestRegion()
+    (progress or EffectProgress()).run(connectivity)
+    return _vtk_image_to_mask(connectivity.GetOutput())
+
+
+def margin_mask(
+    mask: NDArray[np.bool], radius: tuple[int, int, int], grow: bool, progress: EffectProgress | None = None
+) -> NDArray[np.bool]:
+    """Dilate (grow) or erode (shrink) mask with an ellipsoid of (i, j, k) radius in voxels"""
+    dilate_erode = vtkImageDilateErode3D()
+    dilate_erode.SetInputData(_np_to_vtk_image(mask.astype(np.uint8)))
+    dilate_erode.SetKernelSize(*(2 * r + 1 for r in radius))
+    dilate_erode.SetDilateValue(1 if grow else 0)
+    dilate_erode.SetErodeValue(0 if grow else 1)
+    (progress or EffectProgress()).run(dilate_erode)
+    return _vtk_image_to_mask(dilate_erode.GetOutput())
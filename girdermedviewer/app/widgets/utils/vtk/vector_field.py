@@ -0,0 +1,222 @@
+import logging
+from collections import OrderedDict
+
+import numpy as np
+from vtk import (
+    vtkActor,
+    vtkArrowSource,
+    vtkCommand,
+    vtkCutter,
+    vtkExtractVOI,
+    vtkGlyph3DMapper,
+    vtkImageData,
+    vtkPlane,
+    vtkRenderer,
+)
+from vtkmodules.util.numpy_support import numpy_to_vtk, vtk_to_numpy
+
+logger = logging.getLogger(__name__)
+
+
+def get_sampling_stride(sampling: float) -> int:
+    """Stride between the glyphs along an axis for a sampling in percent of the voxels"""
+    return max(1, round(100 / max(sampling, 1e-3)))
+
+
+def _get_stride_offset(stride: int) -> int:
+    # Glyphs at the center of the voxels they sample
+    return (stride - 1) // 2
+
+
+def _get_sampled_slice(dimension: int, stride: int) -> slice:
+    """Indices of the glyphs along an axis of dimension voxels, one per stride voxels"""
+    # Axes thinner than the offset get one glyph, on their last voxel
+    offset = min(_get_stride_offset(stride), dimension - 1)
+    number_of_glyphs = (dimension - 1 - offset) // stride + 1
+    return slice(offset, offset + (number_of_glyphs - 1) * stride + 1, stride)
+
+
+class VectorFieldGrids:
+    """
+    Subsampled grids of a vector field, one per sampling stride, built with numpy striding and shared by the views.
+    The arrow source of the glyphs is shared by the views too.
+    Grids are built again when the vector field is modified.
+    """
+
+    MAX_GRIDS = 4
+
+    def __init__(self, image_data: vtkImageData, max_grids: int = MAX_GRIDS) -> None:
+        self.image_data = image_data
+        self._grids: OrderedDict[int, vtkImageData] = OrderedDict()
+        self._max_grids = max_grids
+        self._image_mtime = image_data.GetMTime()
+
+        self.arrow = vtkArrowSource()
+        self.arrow.SetArrowOriginToCenter()
+        self.arrow.SetTipRadius(0.1)
+
+    @property
+    def vectors_name(self) -> str | None:
+        point_data = self.image_data.GetPointData()
+        vectors = point_data.GetVectors() or point_data.GetScalars()
+        return vectors.GetName() if vectors is not None else None
+
+    def get_grid(self, stride: int) -> vtkImageData:
+        """Vector field sampled every stride voxels along each axis"""
+        if self.image_data.GetMTime() != self._image_mtime:
+            self._grids.clear()
+            self._image_mtime = self.image_data.GetMTime()
+        grid = self._grids.get(stride)
+        if grid is None:
+            grid = self._grids[stride] = self._create_grid(stride)
+            while len(self._grids) > self._max_grids:
+                self._grids.popitem(last=False)
+        self._grids.move_to_end(stride)
+        return grid
+
+    def _create_grid(self, stride: int) -> vtkImageData:
+        image_data = self.image_data
+        point_data = image_data.GetPointData()
+        vectors = point_data.GetVectors() or point_data.GetScalars()
+        number_of_components = vectors.GetNumberOfComponents()
+        array = vtk_to_numpy(vectors).reshape(*image_data.GetDimensions()[::-1], number_of_components)
+        sampled_slices = [_get_sampled_slice(dimension, stride) for dimension in image_data.GetDimensions()]
+        sampled = np.ascontiguousarray(array[tuple(sampled_slices[::-1])])
+
+        grid = vtkImageData()
+        grid.SetDimensions(sampled.shape[2::-1])
+        grid.SetSpacing([spacing * stride for spacing in image_data.GetSpacing()])
+        grid.SetDirectionMatrix(image_data.GetDirectionMatrix())
+        origin = [0.0, 0.0, 0.0]
+        image_data.TransformIndexToPhysicalPoint(
+            [image_data.GetExtent()[2 * axis] + sampled_slices[axis].start for axis in range(3)], origin
+        )
+        grid.SetOrigin(origin)
+        grid_vectors = numpy_to_vtk(sampled.reshape(-1, number_of_components), array_type=vectors.GetDataType())
+        grid_vectors.SetName(vectors.GetName())
+        grid.GetPointData().SetScalars(grid_vectors)
+        logger.debug(f"Vector field grid of stride {stride}: {grid.GetDimensions()}")
+        return grid
+
+
+class VectorFieldGlyphs:
+    """
+    Arrow glyphs of a vector field in a view: the whole field subsampled in 3D views, the field in the view plane
+    in slice views.
+    Planes aligned with the axes of the volume are extracted directly from the vector field at the sampling stride,
+    again only when the plane moves to another slice. Oblique planes cut the subsampled grid.
+    """
+
+    def __init__(self, grids: VectorFieldGrids, renderer: vtkRenderer, plane: vtkPlane | None = None) -> None:
+        self.grids = grids
+        self.stride = get_sampling_stride(10)
+        self._plane = plane
+        # Normal axis and index of the extracted slice, None for oblique planes
+        self._slice: tuple[int, int] | None = None
+
+        self._glyph_mapper = vtkGlyph3DMapper()
+        self._glyph_mapper.SetSourceConnection(grids.arrow.GetOutputPort())
+        if grids.vectors_name is not None:
+            self._glyph_mapper.SetOrientationArray(grids.vectors_name)
+        self._glyph_mapper.OrientOn()
+
+        self.actor = vtkActor()
+        self.actor.GetProperty().SetLighting(False)
+        self.actor.SetMapper(self._glyph_mapper)
+
+        self._observers = [(grids.image_data, grids.image_data.AddObserver(vtkCommand.ModifiedEvent, self._update))]
+        if plane is not None:
+            self._extract_voi = vtkExtractVOI()
+            self._extract_voi.SetInputData(grids.image_data)
+            self._cutter = vtkCutter()
+            self._cutter.SetCutFunction(plane)
+            self._observers.append((plane, plane.AddObserver(vtkCommand.ModifiedEvent, self._update_slice)))
+        self._update()
+
+        renderer.AddActor(self.actor)
+
+    def close(self) -> None:
+        for observed, observer in self._observers:
+            observed.RemoveObserver(observer)
+        self._observers = []
+
+    def _get_aligned_slice(self) -> tuple[int, int] | None:
+        """Normal axis and index of the slice of the plane if it is aligned with the axes of the volume"""
+        image_data = self.grids.image_data
+        direction = np.array(
+            [[image_data.GetDirectionMatrix().GetElement(row, column) for column in range(3)] for row in range(3)]
+        )
+        alignments = np.abs(direction.T @ np.array(self._plane.GetNormal()))
+        axis = int(np.argmax(alignments))
+        if alignments[axis] < 1 - 1e-6:
+            return None
+        index = [0.0, 0.0, 0.0]
+        image_data.TransformPhysicalPointToContinuousIndex(self._plane.GetOrigin(), index)
+        return axis, round(index[axis])
+
+    def _update_slice(self, *_args) -> None:
+        aligned_slice = self._get_aligned_slice()
+        if aligned_slice is not None and aligned_slice == self._slice:
+            return
+        self._slice = aligned_slice
+        self._update()
+
+    def _update(self, *_args) -> None:
+        if self._plane is None:
+            self._glyph_mapper.SetInputData(self.grids.get_grid(self.stride))
+            return
+
+        if self._slice is None:
+            self._slice = self._get_aligned_slice()
+        if self._slice is None:
+            # The cutter follows the plane by itself
+            self._cutter.SetInputData(self.grids.get_grid(self.stride))
+            self._glyph_mapper.SetInputConnection(self._cutter.GetOutputPort())
+            return
+
+        axis, index = self._slice
+        extent = self.grids.image_data.GetExtent()
+        if not extent[2 * axis] <= index <= extent[2 * axis + 1]:
+            # The plane does not cut the volume
+            self._glyph_mapper.SetInputData(vtkImageData())
+            return
+        dimensions = self.grids.image_data.GetDimensions()
+        voi = []
+        for voi_axis in range(3):
+            if voi_axis == axis:
+                voi += [index, index]
+            else:
+                sampled_slice = _get_sampled_slice(dimensions[voi_axis], self.stride)
+                voi += [extent[2 * voi_axis] + sampled_slice.start, extent[2 * voi_axis] + sampled_slice.stop - 1]
+        self._extract_voi.SetVOI(voi)
+        self._extract_voi.SetSampleRate([1 if voi_axis == axis else self.stride for voi_axis in range(3)])
+        self._glyph_mapper.SetInputConnection(self._extract_voi.GetOutputPort())
+
+    def set_sampling(self, sampling: float) -> bool:
+        stride = get_sampling_stride(sampling)
+        if stride == self.stride:
+            return False
+        self.stride = stride
+        self._update()
+        return True
+
+    def set_arrow_length(self, length: float) -> bool:
+        if self._glyph_mapper.GetScaleFactor() == length:
+            return False
+        self._glyph_mapper.SetScaleFactor(length)
+        return True
+
+    def set_arrow_thickness(self, thickness: float) -> bool:
+        arrow = self.grids.arrow
+        if arrow.GetShaftRadius() != thickness:
+            arrow.SetShaftRadius(thickness)
+        elif arrow.GetMTime() <= self._glyph_mapper.GetMTime():
+            return False
+        # The arrow is shared by the views: mark the glyphs of this view as up to date with it
+        self._glyph_mapper.Modified()
+        return True
+
+    def set_properties(self, sampling: float, arrow_length: float, arrow_thickness: float) -> bool:
+        modified = self.set_sampling(sampling)
+        modified = self.set_arrow_length(arrow_length) or modified
+        return self.set_arrow_thickness(arrow_thickness) or modified
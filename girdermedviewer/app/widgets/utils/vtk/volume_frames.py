@@ -0,0 +1,256 @@
+import asyncio
+import gzip
+import logging
+import shutil
+import struct
+import tempfile
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+
+import numpy as np
+from vtk import vtkDataObject, vtkImageData, vtkNIFTIImageReader
+from vtkmodules.util.numpy_support import numpy_to_vtk, vtk_to_numpy
+
+from .labelmap_io import NIFTI_HEADER_SIZE, has_label_scalars
+from .vtk_utils import create_sform_reslice
+
+logger = logging.getLogger(__name__)
+
+NIFTI2_HEADER_SIZE = 540
+NIFTI_READ_TYPES = {
+    2: np.uint8,
+    4: np.int16,
+    8: np.int32,
+    16: np.float32,
+    64: np.float64,
+    256: np.int8,
+    512: np.uint16,
+    768: np.uint32,
+    1024: np.int64,
+    1280: np.uint64,
+}
+# Lower triangle of a symmetric matrix in the 5th dimension
+NIFTI_INTENT_SYMMATRIX = 1005
+# Seconds per unit of the time dimension, from the time bits of xyzt_units
+NIFTI_TIME_UNITS = {8: 1.0, 16: 1e-3, 24: 1e-6}
+NIFTI_TIME_UNITS_MASK = 0x38
+
+TENSOR_COMPONENTS = 6
+# Tensors decomposed at once, to bound the memory of their 3x3 matrices
+TENSOR_CHUNK_SIZE = 1 << 18
+FRACTIONAL_ANISOTROPY_NAME = "FractionalAnisotropy"
+PRINCIPAL_DIRECTION_NAME = "PrincipalDirection"
+
+
+def compute_tensor_maps(tensors: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Fractional anisotropy of (n, 6) diffusion tensors stored as the lower triangle of their matrix
+    (xx, yx, yy, zx, zy, zz), and their principal eigenvector scaled by their fractional anisotropy.
+    """
+    number_of_tensors = len(tensors)
+    fractional_anisotropy = np.empty(number_of_tensors, dtype=np.float32)
+    principal_direction = np.empty((number_of_tensors, 3), dtype=np.float32)
+    rows, columns = np.tril_indices(3)
+    for start in range(0, number_of_tensors, TENSOR_CHUNK_SIZE):
+        chunk = np.nan_to_num(tensors[start : start + TENSOR_CHUNK_SIZE].astype(np.float32))
+        matrices = np.empty((len(chunk), 3, 3), dtype=np.float32)
+        matrices[:, rows, columns] = chunk
+        matrices[:, columns, rows] = chunk
+        # Ascending eigenvalues
+        eigenvalues, eigenvectors = np.linalg.eigh(matrices)
+        deviations = eigenvalues - eigenvalues.mean(axis=1, keepdims=True)
+        norms = np.maximum((eigenvalues**2).sum(axis=1), np.finfo(np.float32).tiny)
+        anisotropy = np.clip(np.sqrt(1.5 * (deviations**2).sum(axis=1) / norms), 0, 1)
+        fractional_anisotropy[start : start + len(chunk)] = anisotropy
+        principal_direction[start : start + len(chunk)] = eigenvectors[:, :, 2] * anisotropy[:, np.newaxis]
+    return fractional_anisotropy, principal_direction
+
+
+def _get_byte_order(file_path: str) -> str:
+    with (gzip.open if file_path.endswith(".gz") else open)(file_path, "rb") as file:
+        header_size = file.read(4)
+    return "<" if struct.unpack("<i", header_size)[0] in (NIFTI_HEADER_SIZE, NIFTI2_HEADER_SIZE) else ">"
+
+
+class NiftiFrameStore:
+    """
+    Frames of a 4D NIfTI volume: the volumes of a time series (cine, fMRI), or the 6 component diffusion tensors
+    of a DTI volume. Voxels are read from a memory map of the file, so that only the frames that are materialized
+    as vtkImageData are read; compressed files are decompressed once to an anonymous temporary file.
+    Frames have the geometry load_volume gives the file. Tensor frames are their fractional anisotropy, with their
+    principal direction as vectors.
+    """
+
+    def __init__(self, file_path: str, reader: vtkNIFTIImageReader) -> None:
+        header = reader.GetNIFTIHeader()
+        # dim[0] is the number of dimensions, the next ones may be left unset
+        sizes = [max(header.GetDim(axis), 1) if axis <= header.GetDim(0) else 1 for axis in range(1, 6)]
+        self.dimensions = sizes[:3]
+        self.number_of_frames = sizes[3]
+        self.number_of_components = sizes[4]
+        self.is_tensor = (
+            header.GetIntentCode() == NIFTI_INTENT_SYMMATRIX and self.number_of_components == TENSOR_COMPONENTS
+        )
+        time_unit = NIFTI_TIME_UNITS.get(header.GetXYZTUnits() & NIFTI_TIME_UNITS_MASK, 1.0)
+        # Seconds between two frames, 0 if unknown
+        self.frame_duration = max(header.GetPixDim(4), 0.0) * time_unit
+
+        output_information = reader.GetOutputInformation(0)
+        self._spacing = output_information.Get(vtkDataObject.SPACING())
+        self._origin = output_information.Get(vtkDataObject.ORIGIN())
+        # The reader reverses the slices of the volumes with a negative qfac
+        self._is_flipped = reader.GetQFac() < 0
+        self._sform_matrix = reader.GetSFormMatrix()
+        self._reslice = None
+
+        dtype = np.dtype(NIFTI_READ_TYPES[header.GetDataType()]).newbyteorder(_get_byte_order(file_path))
+        self._temporary_file = None
+        data_file = file_path
+        if file_path.endswith(".gz"):
+            # Closed with the store
+            self._temporary_file = data_file = tempfile.TemporaryFile()  # noqa: SIM115
+            with gzip.open(file_path, "rb") as stream:
+                shutil.copyfileobj(stream, self._temporary_file, 1 << 24)
+        # NIfTI voxels are stored x first, then y, z, time and components
+        self._array = np.memmap(
+            data_file,
+            dtype=dtype,
+            mode="r",
+            offset=int(header.GetVoxOffset()),
+            shape=(self.number_of_components, self.number_of_frames, *reversed(self.dimensions)),
+        )
+
+    @classmethod
+    def open(cls, file_path: str) -> "NiftiFrameStore | None":
+        """Frames of a NIfTI file if it is a time series or a DTI volume, None for other volumes"""
+        reader = vtkNIFTIImageReader()
+        reader.SetFileName(file_path)
+        reader.UpdateInformation()
+        header = reader.GetNIFTIHeader()
+        number_of_dimensions = header.GetDim(0)
+        number_of_frames = header.GetDim(4) if number_of_dimensions >= 4 else 1
+        is_tensor = (
+            header.GetIntentCode() == NIFTI_INTENT_SYMMATRIX
+            and number_of_dimensions >= 5
+            and header.GetDim(5) == TENSOR_COMPONENTS
+        )
+        if number_of_frames <= 1 and not is_tensor:
+            return None
+        if header.GetDataType() not in NIFTI_READ_TYPES:
+            logger.warning(f"Unsupported NIfTI data type {header.GetDataType()}: only the first frame is loaded")
+            return None
+        return cls(file_path, reader)
+
+    @property
+    def frame_nbytes(self) -> int:
+        """Estimated memory of a materialized frame"""
+        voxel_nbytes = 16 if self.is_tensor else self.number_of_components * self._array.dtype.itemsize
+        return int(np.prod(self.dimensions)) * voxel_nbytes
+
+    def get_frame(self, index: int) -> vtkImageData:
+        """Read the frame index from the file. Not thread safe: frames must be read by a single thread."""
+        components = self._array[:, index]
+        if self._is_flipped:
+            components = components[:, ::-1]
+        # Copy, so that the frame does not read the file when rendered
+        array = np.array(np.moveaxis(components, 0, -1), dtype=components.dtype.newbyteorder("="), order="C")
+
+        frame = vtkImageData()
+        frame.SetDimensions(self.dimensions)
+        frame.SetSpacing(self._spacing)
+        frame.SetOrigin(self._origin)
+        scalars = numpy_to_vtk(array.reshape(-1, self.number_of_components))
+        scalars.SetName("NIFTI")
+        frame.GetPointData().SetScalars(scalars)
+
+        if self._sform_matrix is not None:
+            if self._reslice is None:
+                self._reslice = create_sform_reslice(self._sform_matrix, has_label_scalars(frame))
+            self._reslice.SetInputData(frame)
+            self._reslice.Update()
+            frame = vtkImageData()
+            frame.ShallowCopy(self._reslice.GetOutput())
+
+        if self.is_tensor:
+            self._set_tensor_maps(frame)
+        return frame
+
+    @staticmethod
+    def _set_tensor_maps(frame: vtkImageData) -> None:
+        point_data = frame.GetPointData()
+        fractional_anisotropy, principal_direction = compute_tensor_maps(vtk_to_numpy(point_data.GetScalars()))
+        scalars = numpy_to_vtk(fractional_anisotropy)
+        scalars.SetName(FRACTIONAL_ANISOTROPY_NAME)
+        vectors = numpy_to_vtk(principal_direction)
+        vectors.SetName(PRINCIPAL_DIRECTION_NAME)
+        point_data.Initialize()
+        point_data.SetScalars(scalars)
+        point_data.SetVectors(vectors)
+
+    def close(self) -> None:
+        # The memory map closes its file when it is garbage collected
+        self._array = None
+        if self._temporary_file is not None:
+            self._temporary_file.close()
+            self._temporary_file = None
+
+
+class FrameCache:
+    """
+    Frames of a NiftiFrameStore materialized by a worker thread: the frame shown and the next read_ahead frames in
+    the playback direction, read while the shown frame is rendered so that playback does not wait for the disk.
+    The read ahead is bounded by memory_budget bytes. Frames must not be modified.
+    """
+
+    READ_AHEAD = 4
+    MEMORY_BUDGET = 256 * 1024 * 1024
+
+    def __init__(
+        self, store: NiftiFrameStore, read_ahead: int = READ_AHEAD, memory_budget: int = MEMORY_BUDGET
+    ) -> None:
+        self.store = store
+        self.read_ahead = max(1, min(read_ahead, memory_budget // max(store.frame_nbytes, 1) - 1))
+        self._executor = ThreadPoolExecutor(1)
+        self._frames: OrderedDict[int, Future] = OrderedDict()
+
+    @property
+    def number_of_frames(self) -> int:
+        return self.store.number_of_frames
+
+    def request(self, index: int) -> Future:
+        """Frame index, read in the worker thread unless it is cached. The least recently requested are evicted."""
+        future = self._frames.get(index)
+        if future is None or future.cancelled():
+            future = self._frames[index] = self._executor.submit(self.store.get_frame, index)
+        self._frames.move_to_end(index)
+        while len(self._frames) > self.read_ahead + 1:
+            _, evicted = self._frames.popitem(last=False)
+            # Frames that are not read yet are not needed anymore
+            evicted.cancel()
+        return future
+
+    def get(self, index: int) -> vtkImageData:
+        return self.request(index).result()
+
+    async def get_async(self, index: int) -> vtkImageData | None:
+        """Frame index, None if it is evicted before it is read"""
+        future = self.request(index)
+        try:
+            return await asyncio.wrap_future(future)
+        except asyncio.CancelledError:
+            if not future.cancelled():
+                raise
+            return None
+
+    def read_ahead_from(self, index: int, step: int = 1) -> None:
+        """Read the frames following index in the step direction, looping over the frames"""
+        for offset in range(1, self.read_ahead + 1):
+            self.request((index + offset * step) % self.number_of_frames)
+
+    def close(self) -> None:
+        for future in self._frames.values():
+            future.cancel()
+        self._frames.clear()
+        # Wait for the frame being read, which reads the memory map
+        self._executor.shutdown(wait=True, cancel_futures=True)
+        self.store.close()
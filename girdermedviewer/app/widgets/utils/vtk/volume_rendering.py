@@ -0,0 +1,258 @@
+import logging
+import time
+from collections import deque
+from dataclasses import dataclass
+from enum import Enum
+from itertools import pairwise
+
+import numpy as np
+from vtk import (
+    vtkCommand,
+    vtkFixedPointVolumeRayCastMapper,
+    vtkImageData,
+    vtkPiecewiseFunction,
+    vtkRenderWindow,
+    vtkSmartVolumeMapper,
+    vtkVolume,
+    vtkVolumeMapper,
+)
+from vtkmodules.util.numpy_support import vtk_to_numpy
+
+logger = logging.getLogger(__name__)
+
+
+class VolumeRenderingMode(Enum):
+    # vtkSmartVolumeMapper with its defaults: GPU ray casting if available
+    AUTO = "auto"
+    # Multi-threaded vtkFixedPointVolumeRayCastMapper tuned for servers without GPU
+    CPU = "cpu"
+
+
+@dataclass
+class VolumeRenderingSettings:
+    """
+    Settings of the 3D volume rendering, only used in CPU mode.
+    Sample distances along the rays are in multiples of the smallest voxel spacing, image sample distances are in
+    pixels (2 casts one ray every 2 pixels in each direction).
+    With auto adjustment, the image sample distance of interactive renders varies between image_sample_distance and
+    interactive_image_sample_distance to render interactive_frame_rate frames per second.
+    """
+
+    mode: VolumeRenderingMode = VolumeRenderingMode.AUTO
+    sample_distance: float = 1.0
+    interactive_sample_distance: float = 2.0
+    image_sample_distance: float = 1.0
+    interactive_image_sample_distance: float = 2.0
+    auto_adjust_sample_distances: bool = True
+    interactive_frame_rate: float = 10
+    # 0 to use all the cores
+    number_of_threads: int = 0
+
+
+def create_volume_mapper(image_data: vtkImageData, settings: VolumeRenderingSettings) -> vtkVolumeMapper:
+    if settings.mode != VolumeRenderingMode.CPU:
+        volume_mapper = vtkSmartVolumeMapper()
+        volume_mapper.SetInputData(image_data)
+        return volume_mapper
+
+    volume_mapper = vtkFixedPointVolumeRayCastMapper()
+    volume_mapper.SetInputData(image_data)
+    spacing = min(image_data.GetSpacing())
+    volume_mapper.SetSampleDistance(settings.sample_distance * spacing)
+    volume_mapper.SetInteractiveSampleDistance(settings.interactive_sample_distance * spacing)
+    volume_mapper.SetImageSampleDistance(settings.image_sample_distance)
+    volume_mapper.SetMinimumImageSampleDistance(settings.image_sample_distance)
+    volume_mapper.SetMaximumImageSampleDistance(settings.interactive_image_sample_distance)
+    volume_mapper.SetAutoAdjustSampleDistances(settings.auto_adjust_sample_distances)
+    if settings.number_of_threads > 0:
+        volume_mapper.SetNumberOfThreads(settings.number_of_threads)
+    return volume_mapper
+
+
+def set_volume_interactive(volume: vtkVolume, settings: VolumeRenderingSettings, interactive: bool) -> bool:
+    """
+    Switch the CPU ray casting of volume between its interactive and still sample distances.
+    Mappers auto adjusting their sample distances switch by themselves.
+    """
+    volume_mapper = volume.GetMapper()
+    if not volume_mapper.IsA("vtkFixedPointVolumeRayCastMapper") or volume_mapper.GetAutoAdjustSampleDistances():
+        return False
+
+    spacing = min(volume_mapper.GetInput().GetSpacing())
+    if interactive:
+        sample_distance = settings.interactive_sample_distance * spacing
+        image_sample_distance = settings.interactive_image_sample_distance
+    else:
+        sample_distance = settings.sample_distance * spacing
+        image_sample_distance = settings.image_sample_distance
+    if (
+        volume_mapper.GetSampleDistance() == sample_distance
+        and volume_mapper.GetImageSampleDistance() == image_sample_distance
+    ):
+        return False
+    volume_mapper.SetSampleDistance(sample_distance)
+    volume_mapper.SetImageSampleDistance(image_sample_distance)
+    return True
+
+
+def is_interactive_render(render_window: vtkRenderWindow) -> bool:
+    """Whether the interactor of render_window is interacting, i.e. asked for its interactive update rate"""
+    interactor = render_window.GetInteractor()
+    return interactor is not None and render_window.GetDesiredUpdateRate() >= interactor.GetDesiredUpdateRate()
+
+
+class FrameTimeMonitor:
+    """
+    Measure the time taken by the renders of a render window, separately for interactive and still renders,
+    over the last history_size renders of each kind.
+    """
+
+    HISTORY_SIZE = 100
+
+    def __init__(self, render_window: vtkRenderWindow, history_size: int = HISTORY_SIZE) -> None:
+        self._render_window = render_window
+        self._frame_times: dict[bool, deque[float]] = {
+            True: deque(maxlen=history_size),
+            False: deque(maxlen=history_size),
+        }
+        self._frame_counts = {True: 0, False: 0}
+        self._start_time: float | None = None
+        self._is_interactive = False
+        self._observers = [
+            render_window.AddObserver(vtkCommand.StartEvent, self._on_start_render),
+            render_window.AddObserver(vtkCommand.EndEvent, self._on_end_render),
+        ]
+
+    def close(self) -> None:
+        for observer in self._observers:
+            self._render_window.RemoveObserver(observer)
+        self._observers = []
+
+    def _on_start_render(self, *_) -> None:
+        self._is_interactive = is_interactive_render(self._render_window)
+        self._start_time = time.perf_counter()
+
+    def _on_end_render(self, *_) -> None:
+        if self._start_time is None:
+            return
+        self._frame_times[self._is_interactive].append(time.perf_counter() - self._start_time)
+        self._frame_counts[self._is_interactive] += 1
+        self._start_time = None
+
+    @staticmethod
+    def _get_stats(frame_times: deque[float], frame_count: int) -> dict[str, int | float]:
+        if not frame_times:
+            return {"frames": frame_count, "mean_ms": 0.0, "max_ms": 0.0, "fps": 0.0}
+        mean_time = sum(frame_times) / len(frame_times)
+        return {
+            "frames": frame_count,
+            "mean_ms": round(mean_time * 1000, 1),
+            "max_ms": round(max(frame_times) * 1000, 1),
+            "fps": round(1 / mean_time, 1) if mean_time else 0.0,
+        }
+
+    @property
+    def stats(self) -> dict[str, dict[str, int | float]]:
+        return {
+            "interactive": self._get_stats(self._frame_times[True], self._frame_counts[True]),
+            "still": self._get_stats(self._frame_times[False], self._frame_counts[False]),
+        }
+
+
+def get_visible_scalar_intervals(opacity_function: vtkPiecewiseFunction) -> list[tuple[float, float]]:
+    """Scalar intervals outside of which opacity_function is null"""
+    nodes = []
+    for index in range(opacity_function.GetSize()):
+        node = [0.0] * 4
+        opacity_function.GetNodeValue(index, node)
+        nodes.append(node[:2])
+
+    intervals = []
+    if not nodes:
+        return intervals
+    clamping = opacity_function.GetClamping()
+    if clamping and nodes[0][1] > 0:
+        intervals.append((-np.inf, nodes[0][0]))
+    for (x, opacity), (next_x, next_opacity) in pairwise(nodes):
+        if opacity > 0 or next_opacity > 0:
+            intervals.append((x, next_x))
+    if clamping and nodes[-1][1] > 0:
+        intervals.append((nodes[-1][0], np.inf))
+    return intervals
+
+
+class ScalarBlockRanges:
+    """
+    Minimum and maximum scalar of each block of block_size³ voxels of a volume.
+    They give the blocks an opacity function makes visible without going through the voxels again, i.e. the
+    empty space that volume rendering can skip.
+    """
+
+    BLOCK_SIZE = 16
+
+    def __init__(self, image_data: vtkImageData, block_size: int = BLOCK_SIZE) -> None:
+        self._extent = list(image_data.GetExtent())
+        self._block_size = block_size
+        dimensions = image_data.GetDimensions()
+        array = vtk_to_numpy(image_data.GetPointData().GetScalars()).reshape(dimensions[::-1])
+        minimums = maximums = array
+        # One axis at a time: each reduction shrinks the array block_size times
+        for axis in range(3):
+            block_starts = np.arange(0, array.shape[axis], block_size)
+            # fmin and fmax ignore NaN values
+            minimums = np.fmin.reduceat(minimums, block_starts, axis=axis)
+            maximums = np.fmax.reduceat(maximums, block_starts, axis=axis)
+        # (k, j, i) blocks
+        self._minimums = minimums
+        self._maximums = maximums
+
+    @staticmethod
+    def can_compute(image_data: vtkImageData) -> bool:
+        scalars = image_data.GetPointData().GetScalars()
+        return scalars is not None and scalars.GetNumberOfComponents() == 1
+
+    def get_visible_extent(self, opacity_function: vtkPiecewiseFunction) -> list[int] | None:
+        """Extent of the blocks with visible voxels, None if no voxel is visible"""
+        visible = np.zeros(self._minimums.shape, dtype=bool)
+        for low, high in get_visible_scalar_intervals(opacity_function):
+            visible |= (self._maximums >= low) & (self._minimums <= high)
+
+        extent = []
+        for axis, other_axes in ((2, (0, 1)), (1, (0, 2)), (0, (1, 2))):
+            visible_blocks = np.flatnonzero(visible.any(axis=other_axes))
+            if len(visible_blocks) == 0:
+                return None
+            start = self._extent[2 * (2 - axis)]
+            stop = self._extent[2 * (2 - axis) + 1]
+            # One more voxel on each side for the interpolation of the samples at the border of the blocks
+            extent += [
+                max(start + int(visible_blocks[0]) * self._block_size - 1, start),
+                min(start + (int(visible_blocks[-1]) + 1) * self._block_size, stop),
+            ]
+        return extent
+
+
+def set_volume_cropping(volume: vtkVolume, extent: list[int] | None) -> bool:
+    """Only render the voxels of volume in extent, all of them if extent is None"""
+    volume_mapper = volume.GetMapper()
+    image_data = volume_mapper.GetInput()
+    # Cropping planes are axis aligned
+    if (
+        extent is None
+        or list(extent) == list(image_data.GetExtent())
+        or not image_data.GetDirectionMatrix().IsIdentity()
+    ):
+        if not volume_mapper.GetCropping():
+            return False
+        volume_mapper.CroppingOff()
+        return True
+
+    origin = image_data.GetOrigin()
+    spacing = image_data.GetSpacing()
+    planes = [origin[index // 2] + spacing[index // 2] * extent[index] for index in range(6)]
+    if volume_mapper.GetCropping() and list(volume_mapper.GetCroppingRegionPlanes()) == planes:
+        return False
+    volume_mapper.SetCroppingRegionPlanes(planes)
+    volume_mapper.SetCroppingRegionFlagsToSubVolume()
+    volume_mapper.CroppingOn()
+    return True
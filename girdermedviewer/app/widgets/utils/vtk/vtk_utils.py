@@ -1,32 +1,32 @@
 import logging
 import math
 import os
+from itertools import product
 from tempfile import TemporaryDirectory
 from zipfile import ZipFile
 
 from vtk import reference as vtk_reference
 from vtk import (
     vtkActor,
-    vtkArrowSource,
     vtkBoundingBox,
     vtkBox,
     vtkClipPolyData,
     vtkColorSeries,
+    vtkCompositePolyDataMapper,
     vtkCutter,
-    vtkDiscretizableColorTransferFunction,
     vtkExtractGeometry,
-    vtkGlyph3DMapper,
     vtkImageData,
     vtkImageGaussianSmooth,
     vtkImageReslice,
     vtkImageResliceMapper,
     vtkImageSlice,
+    vtkLookupTable,
     vtkMath,
     vtkMatrix4x4,
     vtkMetaImageReader,
+    vtkMultiBlockDataSet,
     vtkNIFTIImageReader,
     vtkNrrdReader,
-    vtkPiecewiseFunction,
     vtkPlane,
     vtkPolyData,
     vtkPolyDataMapper,
@@ -34,7 +34,6 @@ from vtk import (
     vtkResliceCursorLineRepresentation,
     vtkResliceCursorRepresentation,
     vtkResliceCursorWidget,
-    vtkSmartVolumeMapper,
     vtkSTLReader,
     vtkTransform,
     vtkTransformFilter,
@@ -47,18 +46,18 @@ from vtkmodules.all import (
     vtkCommand,
     vtkRenderer,
     vtkRenderWindow,
-    vtkRenderWindowInteractor,
     vtkResliceImageViewer,
     vtkWidgetEvent,
 )
+from vtkmodules.util.numpy_support import vtk_to_numpy
 from vtkmodules.vtkRenderingCore import vtkProp
 
-logger = logging.getLogger(__name__)
-
+from .image_filters import set_number_of_threads
+from .labelmap_io import LabelMapFormat, has_label_scalars, read_seg_nrrd
+from .render_window_pool import RENDER_WINDOW_POOL
+from .volume_rendering import VolumeRenderingSettings, create_volume_mapper
 
-# FIXME do not use global variable
-# dict[axis:vtkResliceImageViewer]
-viewers = {}
+logger = logging.getLogger(__name__)
 
 
 def set_oblique_visibility(reslice_image_viewer, visible):
@@ -165,14 +164,14 @@ def get_reslice_window_level(reslice_image_viewer):
 
 
 def set_reslice_visibility(reslice_image_viewer: vtkResliceImageViewer, visible: bool) -> bool:
-    opacity = float(visible)
     lut = reslice_image_viewer.GetLookupTable()
-    n = lut.GetNumberOfTableValues()
-    for i in range(n):
-        r, g, b, old_opacity = lut.GetTableValue(i)
-        if old_opacity == opacity:
-            return False
-        lut.SetTableValue(i, r, g, b, opacity)
+    alpha = vtk_to_numpy(lut.GetTable())[:, 3]
+    opacity = 255 if visible else 0
+    if (alpha == opacity).all():
+        return False
+    alpha[:] = opacity
+    lut.GetTable().Modified()
+    lut.Modified()
     return True
 
 
@@ -223,6 +222,36 @@ def get_reslice_normal(reslice_image_viewer, axis):
     return get_reslice_normals(reslice_image_viewer)[axis]
 
 
+def is_extent_in_slice(reslice_object, axis, image_data, extent) -> bool:
+    """
+    Return True if the slice plane of the given axis crosses the voxels of the image_data extent.
+    """
+    plane = get_reslice_cursor(reslice_object).GetPlane(axis)
+    distances = []
+    for corner in product(
+        (extent[0] - 0.5, extent[1] + 0.5), (extent[2] - 0.5, extent[3] + 0.5), (extent[4] - 0.5, extent[5] + 0.5)
+    ):
+        point = [0.0, 0.0, 0.0]
+        image_data.TransformContinuousIndexToPhysicalPoint(corner, point)
+        distances.append(plane.EvaluateFunction(point))
+    return min(distances) <= 0 <= max(distances)
+
+
+def have_same_geometry(image_data, other_image_data, tolerance=1e-4) -> bool:
+    """
+    Return True if both images have the same voxels in world coordinates.
+    """
+    if image_data.GetExtent() != other_image_data.GetExtent():
+        return False
+    matrix = image_data.GetIndexToPhysicalMatrix()
+    other_matrix = other_image_data.GetIndexToPhysicalMatrix()
+    return all(
+        math.isclose(matrix.GetElement(row, col), other_matrix.GetElement(row, col), abs_tol=tolerance)
+        for row in range(3)
+        for col in range(4)
+    )
+
+
 def get_reslice_range(reslice_image_viewer, axis, center=None):
     if reslice_image_viewer is None:
         return None
@@ -289,32 +318,21 @@ def get_position_from_slice_index(index, reslice_image_viewer, axis):
     )
 
 
-def get_reslice_image_viewer(axis=-1) -> vtkResliceImageViewer:
+def create_reslice_image_viewers(axes=(0, 1, 2)) -> dict[int, vtkResliceImageViewer]:
     """
-    Returns a matching reslice image viewer or create it if it does not exist.
-    If axis is -1, it returns the firstly added reslice image viewer
-    or create an axial (2) reslice image viewer if none exist.
+    Create one reslice image viewer per axis.
+    (Oblique): All the viewers share the same reslice cursor.
     """
-    if axis == -1:
-        try:
-            return next(iter(viewers.values()))
-        except StopIteration:
-            # no Reslice Image Viewer has been created for data_id
-            axis = 2
-    if axis in viewers:
-        return viewers[axis]
-
-    reslice_image_viewer = vtkResliceImageViewer()
+    reslice_image_viewers = {}
+    for axis in axes:
+        reslice_image_viewer = vtkResliceImageViewer()
+        if reslice_image_viewers:
+            reslice_image_viewer.SetResliceCursor(next(iter(reslice_image_viewers.values())).GetResliceCursor())
+        reslice_image_viewers[axis] = reslice_image_viewer
+    return reslice_image_viewers
 
-    viewers[axis] = reslice_image_viewer
 
-    # (Oblique): Make all vtkResliceImageViewer instance share the same
-    reslice_image_viewer.SetResliceCursor(get_reslice_image_viewer(-1).GetResliceCursor())
-
-    return reslice_image_viewer
-
-
-def render_volume_in_slice(image_data, renderer, axis=2, obliques=True):
+def render_volume_in_slice(image_data, renderer, reslice_image_viewer, axis=2, obliques=True):
     """
     Render the volume in a slice defined by axis.
     Only the first component of RGB images are supported.
@@ -323,15 +341,13 @@ def render_volume_in_slice(image_data, renderer, axis=2, obliques=True):
     render_window = renderer.GetRenderWindow()
     interactor = render_window.GetInteractor()
 
-    reslice_image_viewer = get_reslice_image_viewer(axis)
-
     reslice_image_viewer.SetRenderer(renderer)
     reslice_image_viewer.SetRenderWindow(render_window)
     reslice_image_viewer.SetupInteractor(interactor)
     reslice_image_viewer.SetInputData(image_data)
 
     # Set the reslice mode and axis
-    # viewers[axis].SetResliceModeToOblique()
+    # reslice_image_viewer.SetResliceModeToOblique()
     reslice_image_viewer.SetSliceOrientation(axis)  # 0=X, 1=Y, 2=Z
     reslice_image_viewer.SetThickMode(0)
 
@@ -365,8 +381,7 @@ def render_volume_in_slice(image_data, renderer, axis=2, obliques=True):
     return reslice_image_viewer
 
 
-def render_labelmap_as_overlay_in_slice(image_data, axis=2, layer=1, opacity=0.8):
-    reslice_image_viewer = get_reslice_image_viewer(axis)
+def render_labelmap_as_overlay_in_slice(image_data, reslice_image_viewer, axis=2, layer=1, opacity=0.8):
     reslice_cursor = get_reslice_cursor(reslice_image_viewer)
 
     window: vtkRenderWindow = reslice_image_viewer.GetRenderWindow()
@@ -385,31 +400,24 @@ def render_labelmap_as_overlay_in_slice(image_data, axis=2, layer=1, opacity=0.8
     image_slice = vtkImageSlice()
     image_slice.SetMapper(image_mapper)
 
-    # This enable coloring the segments in the slice views
-    ctf = vtkDiscretizableColorTransferFunction()
-    ctf.AddRGBPoint(0.0, 0.0, 0.0, 0.0)  # assign 0(empty) to black
-    of = vtkPiecewiseFunction()
-    of.AddPoint(0.0, 0.0)  # 0 (empty) is fully transparent
-    for i in range(1, 256):
-        # anything >=1 will be white and opaque by default
-        ctf.AddRGBPoint(float(i), 1.0, 1.0, 1.0)
-        of.AddPoint(float(i), 1.0)
-    ctf.SetScalarOpacityFunction(of)
-    ctf.EnableOpacityMappingOn()
+    # This enable coloring the segments in the slice views: one entry per possible value of the labelmap
+    # (256 for unsigned char, 65536 for unsigned short labelmaps)
+    number_of_values = int(image_data.GetScalarTypeMax()) + 1
+    lut = vtkLookupTable()
+    lut.SetNumberOfTableValues(number_of_values)
+    lut.SetTableRange(0, number_of_values - 1)
+    lut.Build()
+    vtk_to_numpy(lut.GetTable())[:] = 255  # anything >=1 will be white and opaque by default
+    # 0 (empty) is fully transparent. Setting a value also prevents the table from being built again.
+    lut.SetTableValue(0, 0.0, 0.0, 0.0, 0.0)
 
     slice_property = image_slice.GetProperty()
-    slice_property.SetLookupTable(ctf)
+    slice_property.SetLookupTable(lut)
+    slice_property.UseLookupTableScalarRangeOn()
     slice_property.SetInterpolationTypeToNearest()
 
     set_slice_opacity(image_slice, opacity)
 
-    # vtkResliceImageViewer computes the default color window/level.
-    # here we need to do it manually
-    scalar_range = image_data.GetScalarRange()
-    set_slice_window_level(
-        image_slice, [(scalar_range[1] - scalar_range[0]) / 2.0, (scalar_range[0] + scalar_range[1]) / 2.0]
-    )
-
     renderer: vtkRenderer = window.GetRenderers().GetItemAsObject(layer)
     renderer.AddActor(image_slice)
     # Fit volume to viewport
@@ -418,8 +426,7 @@ def render_labelmap_as_overlay_in_slice(image_data, axis=2, layer=1, opacity=0.8
     return image_slice
 
 
-def render_volume_as_overlay_in_slice(image_data, renderer, axis=2, opacity=0.8):
-    reslice_image_viewer = get_reslice_image_viewer(axis)
+def render_volume_as_overlay_in_slice(image_data, renderer, reslice_image_viewer, axis=2, opacity=0.8):
     reslice_cursor = get_reslice_cursor(reslice_image_viewer)
 
     imageMapper = vtkImageResliceMapper()
@@ -457,118 +464,6 @@ def set_slice_visibility(image_slice: vtkImageSlice, visible: bool) -> bool:
     return True
 
 
-def render_volume_as_vector_field(image_data: vtkImageData, renderer: vtkRenderer, axis: int | None = None):
-    """
-    Render the volume as a vector field in the slice defined by axis.
-    :param axis: the normal axis of the slice, if None, the vector field
-    is rendered in the 3D view
-    :type axis: int or None
-    :see set_vector_field_sampling, set_vector_field_arrow_length, set_vector_field_arrow_thickness
-    """
-    shrinker = vtkImageReslice()
-    shrinker.SetInputData(image_data)
-
-    glyph_mapper = vtkGlyph3DMapper()
-    if axis is not None:
-        cutter = vtkCutter()
-        cutter.SetInputConnection(shrinker.GetOutputPort())
-
-        reslice_image_viewer = get_reslice_image_viewer(axis)
-        reslice_cursor = get_reslice_cursor(reslice_image_viewer)
-        cutter.SetCutFunction(reslice_cursor.GetPlane(axis))
-
-        glyph_mapper.SetInputConnection(cutter.GetOutputPort())
-    else:
-        glyph_mapper.SetInputConnection(shrinker.GetOutputPort())
-
-    point_data = image_data.GetPointData()
-
-    arrow = vtkArrowSource()
-    arrow.SetArrowOriginToCenter()
-    arrow.SetTipRadius(0.1)
-    glyph_mapper.SetSourceConnection(arrow.GetOutputPort())
-
-    if point_data.GetVectors():
-        glyph_mapper.SetOrientationArray(point_data.GetVectors().GetName())
-    elif point_data.GetScalars():
-        glyph_mapper.SetOrientationArray(point_data.GetScalars().GetName())
-    glyph_mapper.OrientOn()
-
-    glyph_actor = vtkActor()
-    glyph_actor.GetProperty().SetLighting(False)
-    glyph_actor.SetMapper(glyph_mapper)
-
-    renderer.AddActor(glyph_actor)
-    return glyph_actor
-
-
-def get_vector_field_shrinker(glyph_actor: vtkActor | None) -> vtkImageReslice | None:
-    if glyph_actor is None:
-        return None
-    algo = glyph_actor.GetMapper()
-    while algo is not None and not isinstance(algo, vtkImageReslice):
-        algo = algo.GetInputConnection(0, 0).GetProducer()
-    return algo
-
-
-# FIXME: to merge in a unique set_vector_field_properties function
-def set_vector_field_sampling(glyph_actor: vtkActor | None, sampling: int, axis: int | None = None) -> bool:
-    if glyph_actor is None:
-        return False
-    shrinker = get_vector_field_shrinker(glyph_actor)
-    new_sampling = (
-        (sampling, sampling, sampling) if axis is None else [sampling if i != axis else 100 for i in range(3)]
-    )
-    input_image = shrinker.GetInput()
-
-    spacing = input_image.GetSpacing()
-    origin = input_image.GetOrigin()
-    extent = input_image.GetExtent()
-    dimensions = input_image.GetDimensions()
-    world_dimensions = [spacing[i] * (dimensions[i] - 1) for i in range(3)]
-
-    desired_new_spacing = tuple(spacing[i] * 100 / new_sampling[i] for i in range(3))
-    new_dimensions = [int(world_dimensions[i] // desired_new_spacing[i]) for i in range(3)]
-    new_spacing = [world_dimensions[i] / new_dimensions[i] for i in range(3)]
-
-    new_origin = list(origin)
-    new_origin[0] += (new_spacing[0] - spacing[0]) / 2.0
-    new_origin[1] += (new_spacing[1] - spacing[1]) / 2.0
-    new_origin[2] += (new_spacing[2] - spacing[2]) / 2.0
-
-    new_extent = [extent[0], 0, extent[2], 0, extent[4], 0]
-    new_extent[1] = new_extent[0] + new_dimensions[0] - 1
-    new_extent[3] = new_extent[2] + new_dimensions[1] - 1
-    new_extent[5] = new_extent[4] + new_dimensions[2] - 1
-
-    shrinker.SetOutputSpacing(new_spacing)
-    shrinker.SetOutputOrigin(new_origin)
-    shrinker.SetOutputExtent(new_extent)
-    shrinker.SetInterpolationModeToNearestNeighbor()
-
-    return True
-
-
-def set_vector_field_arrow_length(glyph_actor: vtkActor | None, length: float) -> bool:
-    if glyph_actor is None:
-        return False
-    glyph_mapper = glyph_actor.GetMapper()
-    if glyph_mapper.GetScaleFactor() == length:
-        return False
-    glyph_mapper.SetScaleFactor(length)
-    return True
-
-
-def set_vector_field_arrow_thickness(glyph_actor: vtkActor | None, thickness: float) -> bool:
-    if glyph_actor is None:
-        return False
-    arrow = glyph_actor.GetMapper().GetInputConnection(1, 0).GetProducer()
-    if arrow.GetShaftRadius() == thickness:
-        return False
-    arrow.SetShaftRadius(thickness)
-    return True
-
-
 def set_actor_visibility(image_slice_or_actor: vtkActor | vtkImageSlice | None, visibility: bool) -> bool:
     """
     Set the visibility of a vtkActor or a vtkImageSlice.
@@ -611,8 +506,9 @@ def set_slice_window_level(image_slice: vtkImageSlice | None, window_level: tupl
     return True
 
 
-def render_mesh_in_slice(poly_data: vtkPolyData, axis: int, renderer: vtkRenderer) -> vtkActor:
-    reslice_image_viewer = get_reslice_image_viewer(axis)
+def render_mesh_in_slice(
+    poly_data: vtkPolyData, axis: int, renderer: vtkRenderer, reslice_image_viewer: vtkResliceImageViewer
+) -> vtkActor:
     reslice_cursor = get_reslice_cursor(reslice_image_viewer)
 
     cutter = vtkCutter()
@@ -643,8 +539,9 @@ def compute_clipping_planes(
     back_plane.SetOrigin([origin[i] - offset * normal[i] for i in range(3)])
 
 
-def render_streamline_in_slice(poly_data: vtkPolyData, renderer: vtkRenderer, axis: int) -> vtkActor:
-    reslice_image_viewer = get_reslice_image_viewer(axis)
+def render_streamline_in_slice(
+    poly_data: vtkPolyData, renderer: vtkRenderer, axis: int, reslice_image_viewer: vtkResliceImageViewer
+) -> vtkActor:
     reslice_cursor = get_reslice_cursor(reslice_image_viewer)
 
     front_plane = vtkPlane()
@@ -708,7 +605,11 @@ def reset_3D(renderer):
     renderer.GetActiveCamera().SetFocalPoint(center)
     renderer.GetActiveCamera().SetPosition((bounds[1], bounds[2], center[2]))
     renderer.GetActiveCamera().SetViewUp(0, 0, 1)
-    renderer.ResetCameraScreenSpace(0.8)
+    if 0 in renderer.GetRenderWindow().GetSize():
+        # Fitting in screen space requires a size, it would set a NaN view angle
+        renderer.ResetCamera()
+    else:
+        renderer.ResetCameraScreenSpace(0.8)
 
 
 # FIXME: to merge with set_actor_visibility
@@ -719,9 +620,8 @@ def set_volume_visibility(volume: vtkVolume, visible: bool) -> bool:
     return True
 
 
-def render_volume_in_3D(image_data, renderer):
-    volume_mapper = vtkSmartVolumeMapper()
-    volume_mapper.SetInputData(image_data)
+def render_volume_in_3D(image_data, renderer, settings: VolumeRenderingSettings | None = None):
+    volume_mapper = create_volume_mapper(image_data, settings or VolumeRenderingSettings())
 
     # FIXME: does not work for all dataset
     volume_property = vtkVolumeProperty()
@@ -753,6 +653,23 @@ def render_mesh_in_3D(poly_data, renderer):
     return actor
 
 
+def render_labelmap_surface_in_3D(
+    surface: vtkMultiBlockDataSet, index_to_physical: vtkMatrix4x4, renderer: vtkRenderer
+) -> vtkActor:
+    """Render a segment surface generated in the index coordinates of its labelmap"""
+    mapper = vtkCompositePolyDataMapper()
+    mapper.SetInputDataObject(surface)
+    mapper.ScalarVisibilityOff()
+
+    actor = vtkActor()
+    actor.SetMapper(mapper)
+    actor.SetUserMatrix(index_to_physical)
+
+    renderer.AddActor(actor)
+
+    return actor
+
+
 def remove_prop(renderer: vtkRenderer, prop: vtkProp | vtkResliceImageViewer) -> None:
     window = renderer.GetRenderWindow()
 
@@ -760,27 +677,22 @@ def remove_prop(renderer: vtkRenderer, prop: vtkProp | vtkResliceImageViewer) ->
         for r in window.renderers:
             r.RemoveViewProp(prop)
     elif isinstance(prop, vtkResliceImageViewer):
+        # vtkImageViewer2 does not support being detached from its renderer (SetRenderer(None) crashes),
+        # so disconnect its widget, actor and input instead to release the rendered data.
         prop.SetupInteractor(None)
-        # FIXME: check for leak
-        # prop.SetRenderer(None)
-        # prop.SetRenderWindow(None)
+        renderer.RemoveViewProp(prop.GetImageActor())
+        prop.SetInputData(None)
     else:
         raise Exception(f"Can't remove prop {prop}")
 
 
 def create_rendering_pipeline() -> tuple[vtkRenderer, vtkRenderWindow]:
-    renderer = vtkRenderer()
-    render_window = vtkRenderWindow()
-    render_window.ShowWindowOff()
-    interactor = vtkRenderWindowInteractor()
-
-    render_window.AddRenderer(renderer)
-    interactor.SetRenderWindow(render_window)
-    interactor.GetInteractorStyle().SetCurrentStyleToTrackballCamera()
+    return RENDER_WINDOW_POOL.acquire()
 
-    renderer.ResetCamera()
 
-    return renderer, render_window
+def release_rendering_pipeline(renderer: vtkRenderer, render_window: vtkRenderWindow) -> None:
+    """Give a pipeline created with create_rendering_pipeline back to the pool once its props are removed."""
+    RENDER_WINDOW_POOL.release(renderer, render_window)
 
 
 def supported_volume_extensions():
@@ -813,13 +725,33 @@ def find_subfolder_with_most_files(directory):
     return folder_with_max_files
 
 
-def create_gaussian_filter(original_image):
+def create_gaussian_filter(original_image=None, number_of_threads=0):
     gaussian_smooth = vtkImageGaussianSmooth()
-    gaussian_smooth.SetInputData(original_image)
+    if original_image is not None:
+        gaussian_smooth.SetInputData(original_image)
+    set_number_of_threads(gaussian_smooth, number_of_threads)
 
     return gaussian_smooth
 
 
+def create_sform_reslice(sform_matrix: vtkMatrix4x4, is_label: bool = False) -> vtkImageReslice:
+    """Resample the output of a vtkNIFTIImageReader in the world coordinates given by its sform matrix"""
+    transform = vtkTransform()
+    transform.SetMatrix(sform_matrix)
+    transform.Inverse()
+
+    reslice = vtkImageReslice()
+    reslice.SetResliceTransform(transform)
+    if is_label:
+        # Labels must not be blended with their neighbors
+        reslice.SetInterpolationModeToNearestNeighbor()
+    else:
+        reslice.SetInterpolationModeToLinear()
+    reslice.AutoCropOutputOn()
+    reslice.TransformInputSamplingOff()
+    return reslice
+
+
 def load_volume(file_path):
     """Read a file and return a vtkImageData object"""
     logger.info(f"Loading volume {file_path}")
@@ -831,20 +763,15 @@ def load_volume(file_path):
         if reader.GetSFormMatrix() is None:
             return reader.GetOutput()
 
-        transform = vtkTransform()
-        transform.SetMatrix(reader.GetSFormMatrix())
-        transform.Inverse()
-
-        reslice = vtkImageReslice()
+        reslice = create_sform_reslice(reader.GetSFormMatrix(), has_label_scalars(reader.GetOutput()))
         reslice.SetInputConnection(reader.GetOutputPort())
-        reslice.SetResliceTransform(transform)
-        reslice.SetInterpolationModeToLinear()
-        reslice.AutoCropOutputOn()
-        reslice.TransformInputSamplingOff()
         reslice.Update()
 
         return reslice.GetOutput()
 
+    if file_path.endswith(LabelMapFormat.SEG_NRRD.value):
+        return read_seg_nrrd(file_path)
+
     if file_path.endswith(".nrrd"):
         reader = vtkNrrdReader()
         reader.SetFileName(file_path)
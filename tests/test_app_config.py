@@ -0,0 +1,33 @@
+from types import SimpleNamespace
+
+from girdermedviewer.app.widgets.logic.app_logic import AppLogic
+
+
+def _load_app_config(tmp_path, content: str):
+    config_file_path = tmp_path / "app.cfg"
+    config_file_path.write_text(content)
+    app_logic = SimpleNamespace()
+    AppLogic._load_app_config(app_logic, config_file_path)
+    return app_logic.app_config
+
+
+def test_filters_config(tmp_path):
+    app_config = _load_app_config(
+        tmp_path,
+        "[girder]\n"
+        "default_url = https://data.kitware.com\n"
+        "[filters]\n"
+        "filter_threads = 3\n"
+        "filter_memory_budget = 1024\n"
+        "filter_cache_memory = 0\n",
+    )
+    assert app_config.filter_threads == 3
+    assert app_config.filter_memory_budget == 1024
+    assert app_config.filter_cache_memory == 0
+
+
+def test_default_filters_config(tmp_path):
+    app_config = _load_app_config(tmp_path, "[girder]\ndefault_url = https://data.kitware.com\n")
+    assert app_config.filter_threads == 0
+    assert app_config.filter_memory_budget == 2048
+    assert app_config.filter_cache_memory == 512
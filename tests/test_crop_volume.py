@@ -0,0 +1,93 @@
+import numpy as np
+import pytest
+from vtkmodules.util.numpy_support import numpy_to_vtk, vtk_to_numpy
+from vtkmodules.vtkCommonDataModel import vtkImageData
+
+from girdermedviewer.app.widgets.utils import crop_volume
+
+# (k, j, i) shape of the volume
+SHAPE = (6, 5, 4)
+EXTENT = [2, 5, -1, 3, 10, 15]
+# Rotation by 90° around z
+DIRECTION = (0, -1, 0, 1, 0, 0, 0, 0, 1)
+
+
+def _create_volume(number_of_components: int = 1) -> vtkImageData:
+    """Volume whose voxels are their flat index, rotated by 90° around z and with an extent not starting at 0"""
+    array = np.arange(np.prod(SHAPE) * number_of_components, dtype=np.int16).reshape(-1, number_of_components)
+    image_data = vtkImageData()
+    image_data.SetExtent(EXTENT)
+    image_data.SetSpacing(0.5, 2.0, 3.0)
+    image_data.SetOrigin(10.0, -20.0, 5.0)
+    image_data.SetDirectionMatrix(DIRECTION)
+    scalars = numpy_to_vtk(array)
+    scalars.SetName("Scalars")
+    image_data.GetPointData().SetScalars(scalars)
+    return image_data
+
+
+def _get_array(image_data: vtkImageData) -> np.ndarray:
+    return vtk_to_numpy(image_data.GetPointData().GetScalars())
+
+
+def _get_expected_array(image_data: vtkImageData, extent: list[int]) -> np.ndarray:
+    image_extent = image_data.GetExtent()
+    array = _get_array(image_data).reshape(*SHAPE, -1)
+    slices = tuple(
+        slice(extent[2 * axis] - image_extent[2 * axis], extent[2 * axis + 1] - image_extent[2 * axis] + 1)
+        for axis in (2, 1, 0)
+    )
+    return array[slices].reshape(-1, array.shape[-1]).squeeze()
+
+
+def _to_world(image_data: vtkImageData, ijk: list[int]) -> list[float]:
+    point = [0.0, 0.0, 0.0]
+    image_data.TransformIndexToPhysicalPoint(ijk, point)
+    return point
+
+
+def test_whole_slices_are_shared():
+    image_data = _create_volume()
+    extent = [2, 5, -1, 3, 12, 14]
+    cropped = crop_volume(image_data, extent, deep=False)
+    assert np.shares_memory(_get_array(cropped), _get_array(image_data))
+    np.testing.assert_array_equal(_get_array(cropped), _get_expected_array(image_data, extent))
+
+    assert not np.shares_memory(_get_array(crop_volume(image_data, extent)), _get_array(image_data))
+
+
+@pytest.mark.parametrize("deep", [False, True])
+@pytest.mark.parametrize("number_of_components", [1, 3])
+def test_sub_slices_are_copied(deep, number_of_components):
+    image_data = _create_volume(number_of_components)
+    extent = [3, 4, 0, 2, 11, 15]
+    cropped = crop_volume(image_data, extent, deep=deep)
+    array = _get_array(cropped)
+    assert not np.shares_memory(array, _get_array(image_data))
+    assert array.flags.c_contiguous
+    np.testing.assert_array_equal(array, _get_expected_array(image_data, extent))
+    assert cropped.GetPointData().GetScalars().GetName() == "Scalars"
+    assert cropped.GetPointData().GetScalars().GetNumberOfComponents() == number_of_components
+
+
+def test_cropped_geometry():
+    image_data = _create_volume()
+    extent = [3, 4, 0, 2, 11, 15]
+    cropped = crop_volume(image_data, extent)
+    assert cropped.GetExtent() == (0, 1, 0, 2, 0, 4)
+    assert cropped.GetSpacing() == image_data.GetSpacing()
+    direction = cropped.GetDirectionMatrix()
+    assert tuple(direction.GetElement(row, column) for row in range(3) for column in range(3)) == DIRECTION
+    # The cropped voxels keep their world position
+    for ijk in ([3, 0, 11], [4, 2, 15], [3, 1, 13]):
+        cropped_ijk = [ijk[axis] - extent[2 * axis] for axis in range(3)]
+        assert _to_world(cropped, cropped_ijk) == pytest.approx(_to_world(image_data, ijk))
+    # Rotated by 90° around z: i goes along y
+    assert cropped.GetOrigin() == pytest.approx((10.0, -18.5, 38.0))
+
+
+def test_downsampled_crop():
+    image_data = _create_volume()
+    cropped = crop_volume(image_data, [2, 5, -1, 3, 10, 15], downsample_factor=2)
+    assert cropped.GetSpacing() == pytest.approx((1.0, 4.0, 6.0))
+    assert cropped.GetDimensions() == (2, 3, 3)
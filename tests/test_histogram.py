@@ -0,0 +1,68 @@
+import numpy as np
+import pytest
+from vtkmodules.util.numpy_support import numpy_to_vtk
+from vtkmodules.vtkCommonDataModel import vtkImageData
+
+from girdermedviewer.app.widgets.utils import VolumeHistogram
+
+
+def _create_volume(array: np.ndarray) -> vtkImageData:
+    image_data = vtkImageData()
+    image_data.SetDimensions(array.shape[::-1])
+    image_data.GetPointData().SetScalars(numpy_to_vtk(array.reshape(-1)))
+    return image_data
+
+
+def _create_ramp(shape: tuple[int, int, int] = (40, 50, 50)) -> vtkImageData:
+    """Volume of evenly spread scalars from 0 to 1000"""
+    return _create_volume(np.linspace(0, 1000, np.prod(shape), dtype=np.float32).reshape(shape))
+
+
+def test_percentiles():
+    histogram = VolumeHistogram.compute(_create_ramp())
+    assert histogram.scalar_range == [0, 1000]
+    assert histogram.counts.sum() == 40 * 50 * 50
+    for percent in (0, 1, 25, 50, 99, 100):
+        assert histogram.get_percentile(percent) == pytest.approx(percent * 10, abs=1)
+
+
+def test_subsampled_percentiles():
+    rng = np.random.default_rng(0)
+    array = rng.uniform(0, 1000, (60, 60, 60)).astype(np.float32)
+    histogram = VolumeHistogram.compute(_create_volume(array), max_samples=10000)
+    assert histogram.counts.sum() <= 10000
+    for percent in (1, 50, 99):
+        assert histogram.get_percentile(percent) == pytest.approx(percent * 10, abs=20)
+
+
+def test_auto_window_level_leaves_out_outliers():
+    rng = np.random.default_rng(0)
+    array = rng.normal(100, 10, (32, 32, 32)).astype(np.float32)
+    array[0, 0, :5] = [-3000, 5000, 5000, 5000, 5000]
+    window_level = VolumeHistogram.compute(_create_volume(array)).get_auto_window_level()
+    assert 60 < window_level[0] < 90
+    assert 110 < window_level[1] < 140
+
+
+def test_constant_volume():
+    histogram = VolumeHistogram.compute(_create_volume(np.full((4, 4, 4), 7, dtype=np.int16)))
+    assert histogram.scalar_range == [7, 8]
+    window_level = histogram.get_auto_window_level()
+    assert 7 <= window_level[0] < window_level[1] <= 8
+
+
+def test_window_level_presets():
+    ramp_titles = [preset["title"] for preset in VolumeHistogram.compute(_create_ramp()).get_window_level_presets()]
+    assert ramp_titles == ["Auto", "Full range"]
+
+    ct = _create_volume(np.linspace(-1024, 2000, 4096, dtype=np.float32).reshape(16, 16, 16))
+    presets = {preset["title"]: preset["value"] for preset in VolumeHistogram.compute(ct).get_window_level_presets()}
+    assert presets["CT Brain"] == [0, 80]
+    assert presets["Full range"] == [-1024, 2000]
+
+
+def test_normalized_counts():
+    counts = VolumeHistogram.compute(_create_ramp()).get_normalized_counts()
+    assert len(counts) == 64
+    assert max(counts) == 1
+    assert min(counts) > 0.9
@@ -0,0 +1,86 @@
+import numpy as np
+from vtkmodules.util.numpy_support import numpy_to_vtk, vtk_to_numpy
+from vtkmodules.vtkCommonDataModel import vtkImageData
+
+from girdermedviewer.app.widgets.utils import LabelMapDiff
+
+
+def _create_labelmap(array: np.ndarray, origin_extent: tuple[int, int, int] = (0, 0, 0)) -> vtkImageData:
+    i, j, k = origin_extent
+    labelmap = vtkImageData()
+    labelmap.SetExtent(i, i + array.shape[2] - 1, j, j + array.shape[1] - 1, k, k + array.shape[0] - 1)
+    labelmap.GetPointData().SetScalars(numpy_to_vtk(array.reshape(-1)))
+    return labelmap
+
+
+def _get_array(labelmap: vtkImageData) -> np.ndarray:
+    return vtk_to_numpy(labelmap.GetPointData().GetScalars()).reshape(tuple(reversed(labelmap.GetDimensions())))
+
+
+def _apply(labelmap: vtkImageData, diff: LabelMapDiff) -> None:
+    _get_array(labelmap).reshape(-1)[diff.indices] = diff.new_values
+
+
+def _edit(labelmap: vtkImageData, region: tuple[slice, slice, slice], value: int) -> LabelMapDiff | None:
+    array = _get_array(labelmap)
+    before = array[region].copy()
+    array[region] = value
+    return LabelMapDiff.from_region(labelmap, region, before, array[region])
+
+
+def test_undo_redo_round_trip():
+    rng = np.random.default_rng(0)
+    labelmap = _create_labelmap(rng.integers(0, 4, (6, 7, 8), dtype=np.uint8))
+    original = _get_array(labelmap).copy()
+
+    diff = _edit(labelmap, (slice(1, 4), slice(2, 6), slice(0, 5)), 7)
+    edited = _get_array(labelmap).copy()
+    assert np.count_nonzero(original != edited) == len(diff.indices)
+    np.testing.assert_array_equal(diff.values, np.union1d(np.unique(original[1:4, 2:6, 0:5]), [7]))
+
+    _apply(labelmap, diff.inverted())
+    np.testing.assert_array_equal(_get_array(labelmap), original)
+    _apply(labelmap, diff)
+    np.testing.assert_array_equal(_get_array(labelmap), edited)
+
+
+def test_extent_of_changed_voxels():
+    labelmap = _create_labelmap(np.zeros((5, 6, 7), dtype=np.uint8), origin_extent=(10, 20, 30))
+    diff = _edit(labelmap, (slice(1, 3), slice(2, 5), slice(3, 4)), 1)
+    assert diff.extent == [13, 13, 22, 24, 31, 32]
+
+
+def test_unchanged_region():
+    labelmap = _create_labelmap(np.ones((4, 4, 4), dtype=np.uint8))
+    assert _edit(labelmap, (slice(0, 2), slice(0, 2), slice(0, 2)), 1) is None
+
+
+def test_merge():
+    labelmap = _create_labelmap(np.zeros((8, 8, 8), dtype=np.uint8))
+    original = _get_array(labelmap).copy()
+    first = _edit(labelmap, (slice(0, 4), slice(0, 4), slice(0, 4)), 1)
+    second = _edit(labelmap, (slice(2, 6), slice(2, 6), slice(2, 6)), 2)
+    edited = _get_array(labelmap).copy()
+
+    merged = first.merge(second)
+    np.testing.assert_array_equal(merged.indices, np.flatnonzero(edited != original))
+    _apply(labelmap, merged.inverted())
+    np.testing.assert_array_equal(_get_array(labelmap), original)
+    _apply(labelmap, merged)
+    np.testing.assert_array_equal(_get_array(labelmap), edited)
+
+
+def test_merge_reverting_edit():
+    labelmap = _create_labelmap(np.zeros((4, 4, 4), dtype=np.uint8))
+    region = (slice(1, 3), slice(1, 3), slice(1, 3))
+    first = _edit(labelmap, region, 3)
+    second = _edit(labelmap, region, 0)
+    assert first.merge(second) is None
+
+
+def test_run_length_encoding():
+    labelmap = _create_labelmap(np.zeros((16, 16, 16), dtype=np.uint8))
+    diff = _edit(labelmap, (slice(0, 16), slice(0, 16), slice(0, 16)), 1)
+    # A single run of indices and of values
+    assert diff.nbytes < 64
+    assert len(diff.indices) == 16**3
@@ -0,0 +1,153 @@
+import gzip
+
+import numpy as np
+import pytest
+from vtkmodules.util.numpy_support import numpy_to_vtk, vtk_to_numpy
+from vtkmodules.vtkCommonDataModel import vtkImageData
+
+from girdermedviewer.app.widgets.utils import (
+    LabelMapSegment,
+    get_label_values,
+    is_label_file,
+    load_volume,
+    read_labelmap_segments,
+    write_labelmap,
+)
+from girdermedviewer.app.widgets.utils.vtk.labelmap_io import read_seg_nrrd
+
+SEGMENTS = [LabelMapSegment(1, "Liver", (0.8, 0.4, 0.2)), LabelMapSegment(3, "Tumor", (0.1, 0.9, 0.1))]
+
+
+def _create_image(array: np.ndarray) -> vtkImageData:
+    image_data = vtkImageData()
+    image_data.SetDimensions(array.shape[::-1])
+    image_data.SetSpacing(0.5, 0.75, 2.0)
+    image_data.SetOrigin(-12.0, 4.0, 30.0)
+    image_data.GetPointData().SetScalars(numpy_to_vtk(array.reshape(-1)))
+    return image_data
+
+
+def _create_labelmap(dtype: np.dtype = np.uint8) -> vtkImageData:
+    array = np.zeros((6, 7, 8), dtype=dtype)
+    array[1:4, 2:5, 3:7] = 1
+    array[4:6, 0:2, 0:3] = 3
+    return _create_image(array)
+
+
+def _assert_same_labelmap(image_data: vtkImageData, labelmap: vtkImageData) -> None:
+    assert image_data.GetDimensions() == labelmap.GetDimensions()
+    assert image_data.GetSpacing() == pytest.approx(labelmap.GetSpacing())
+    assert image_data.GetOrigin() == pytest.approx(labelmap.GetOrigin())
+    np.testing.assert_array_equal(
+        vtk_to_numpy(image_data.GetPointData().GetScalars()), vtk_to_numpy(labelmap.GetPointData().GetScalars())
+    )
+
+
+@pytest.mark.parametrize("dtype", [np.uint8, np.uint16])
+def test_write_nifti(tmp_path, dtype):
+    labelmap = _create_labelmap(dtype)
+    file_path = tmp_path / "labelmap.nii.gz"
+    progress = []
+    write_labelmap(labelmap, file_path, SEGMENTS, progress.append)
+
+    assert progress[-1] == 1
+    _assert_same_labelmap(load_volume(str(file_path)), labelmap)
+
+
+def test_write_seg_nrrd(tmp_path):
+    labelmap = _create_labelmap()
+    file_path = tmp_path / "labelmap.seg.nrrd"
+    write_labelmap(labelmap, file_path, SEGMENTS)
+
+    header, data = file_path.read_bytes().split(b"\n\n", 1)
+    lines = header.decode().splitlines()
+    assert lines[0] == "NRRD0004"
+    assert "sizes: 8 7 6" in lines
+    assert "Segment1_Name:=Tumor" in lines
+    assert "Segment1_LabelValue:=3" in lines
+    np.testing.assert_array_equal(
+        np.frombuffer(gzip.decompress(data), dtype=np.uint8), vtk_to_numpy(labelmap.GetPointData().GetScalars())
+    )
+
+
+def test_unsupported_extension(tmp_path):
+    with pytest.raises(ValueError, match="Unsupported labelmap file extension"):
+        write_labelmap(_create_labelmap(), tmp_path / "labelmap.mha", SEGMENTS)
+
+
+def test_seg_nrrd_round_trip(tmp_path):
+    labelmap = _create_labelmap()
+    file_path = tmp_path / "labelmap.seg.nrrd"
+    write_labelmap(labelmap, file_path, SEGMENTS)
+
+    _assert_same_labelmap(load_volume(str(file_path)), labelmap)
+    segments = read_labelmap_segments(str(file_path))
+    assert [segment.value for segment in segments] == [1, 3]
+    assert [segment.name for segment in segments] == ["Liver", "Tumor"]
+    assert segments[1].color == pytest.approx((0.1, 0.9, 0.1))
+
+
+def test_read_layered_lps_seg_nrrd(tmp_path):
+    # Two overlapping segments with the same label value in two layers, as written by 3D Slicer
+    layers = np.zeros((3, 4, 5, 2), dtype=np.uint8)
+    layers[0:2, 0:2, 0:3, 0] = 1
+    layers[1:3, 1:4, 2:5, 1] = 1
+    header = (
+        "NRRD0004\n"
+        "type: uchar\n"
+        "dimension: 4\n"
+        "space: left-posterior-superior\n"
+        "sizes: 2 5 4 3\n"
+        "space directions: none (1,0,0) (0,1,0) (0,0,1)\n"
+        "kinds: list domain domain domain\n"
+        "encoding: gzip\n"
+        "space origin: (0,0,0)\n"
+        "Segment0_ID:=Segment_1\n"
+        "Segment0_Name:=First\n"
+        "Segment0_Layer:=0\n"
+        "Segment0_LabelValue:=1\n"
+        "Segment1_ID:=Segment_2\n"
+        "Segment1_Name:=Second\n"
+        "Segment1_Layer:=1\n"
+        "Segment1_LabelValue:=1\n"
+    )
+    file_path = tmp_path / "layers.seg.nrrd"
+    file_path.write_bytes((header + "\n").encode() + gzip.compress(layers.tobytes()))
+
+    image_data = read_seg_nrrd(str(file_path))
+    assert image_data.GetDimensions() == (5, 4, 3)
+    # The i and j axes point backward in RAS: they are flipped
+    assert image_data.GetOrigin() == pytest.approx((-4.0, -3.0, 0.0))
+    expected = np.where(layers[..., 1] == 1, 2, layers[..., 0])[:, ::-1, ::-1]
+    np.testing.assert_array_equal(vtk_to_numpy(image_data.GetPointData().GetScalars()).reshape(3, 4, 5), expected)
+    assert [segment.value for segment in read_labelmap_segments(str(file_path))] == [1, 2]
+
+
+def test_get_label_values():
+    assert get_label_values(_create_labelmap()) == [1, 3]
+    assert get_label_values(_create_labelmap(np.uint16)) == [1, 3]
+    assert get_label_values(_create_image(np.zeros((4, 4, 4), dtype=np.int16))) == []
+    assert get_label_values(_create_labelmap(), max_labels=1) is None
+    # Not label scalars
+    assert get_label_values(_create_image(np.ones((4, 4, 4), dtype=np.float32))) is None
+    assert get_label_values(_create_image(np.full((4, 4, 4), -1, dtype=np.int16))) is None
+
+
+def test_get_label_values_of_large_volumes():
+    array = np.zeros((64, 64, 128), dtype=np.uint16)
+    array[-1, -1, -3:] = [7, 300, 65535]
+    assert get_label_values(_create_image(array)) == [7, 300, 65535]
+    array.reshape(-1)[:200] = np.arange(1, 201)
+    assert get_label_values(_create_image(array), max_labels=100) is None
+
+
+def test_is_label_file(tmp_path):
+    assert is_label_file("liver.seg.nrrd")
+    assert is_label_file("/data/brain_mask.nii.gz")
+    assert is_label_file("Liver-Segmentation.mha")
+    assert not is_label_file("/data/masked/t1.mha")
+
+    labelmap_path = tmp_path / "t1.nii.gz"
+    write_labelmap(_create_labelmap(), labelmap_path, SEGMENTS)
+    # The labelmap writer sets the label intent
+    assert is_label_file(str(labelmap_path))
@@ -0,0 +1,91 @@
+import numpy as np
+
+from girdermedviewer.app.widgets.utils import SparseSegmentMasks
+
+SHAPE = (20, 24, 28)
+FULL_REGION = tuple(slice(0, size) for size in SHAPE)
+
+
+def _create_labelmap_array() -> np.ndarray:
+    array = np.zeros(SHAPE, dtype=np.uint8)
+    array[2:10, 3:12, 4:20] = 1
+    array[12:18, 15:22, 1:6] = 2
+    return array
+
+
+def test_enable_from_labelmap():
+    array = _create_labelmap_array()
+    masks = SparseSegmentMasks(SHAPE, block_size=8)
+    assert not masks.is_enabled
+    masks.enable(array)
+
+    assert masks.is_enabled
+    assert masks.segments == [1, 2]
+    for segment in (1, 2):
+        np.testing.assert_array_equal(masks.get(segment, FULL_REGION), array == segment)
+    np.testing.assert_array_equal(masks.get_top_values(FULL_REGION, array.dtype), array)
+    # Only the blocks with voxels of the segments are allocated, bit-packed
+    assert masks.nbytes < array.size / 8
+
+
+def test_overlapping_segments():
+    array = _create_labelmap_array()
+    masks = SparseSegmentMasks(SHAPE, block_size=8)
+    masks.enable(array)
+
+    region = (slice(4, 16), slice(8, 18), slice(2, 10))
+    mask = np.ones((12, 10, 8), dtype=bool)
+    changes = masks.set(3, region, mask, True)
+    assert changes.segments == {3}
+    # Voxels of segment 1 hidden by segment 3 are kept in its mask
+    np.testing.assert_array_equal(masks.get(1, FULL_REGION), array == 1)
+    expected = array.copy()
+    expected[region] = 3
+    np.testing.assert_array_equal(masks.get_top_values(FULL_REGION, array.dtype), expected)
+
+    masks.set(3, region, mask, False)
+    assert masks.segments == [1, 2]
+    np.testing.assert_array_equal(masks.get_top_values(FULL_REGION, array.dtype), array)
+
+
+def test_changes_undo_redo():
+    masks = SparseSegmentMasks(SHAPE, block_size=8)
+    masks.enable(_create_labelmap_array())
+    before = masks.get(1, FULL_REGION)
+
+    region = (slice(0, 5), slice(0, 5), slice(0, 28))
+    changes = masks.set(1, region, np.ones((5, 5, 28), dtype=bool), True)
+    after = masks.get(1, FULL_REGION)
+    more_changes = masks.set(1, region, np.broadcast_to(np.arange(28) < 3, (5, 5, 28)), False)
+    merged = changes.merge(more_changes)
+
+    merged.inverted().apply()
+    np.testing.assert_array_equal(masks.get(1, FULL_REGION), before)
+    changes.apply()
+    np.testing.assert_array_equal(masks.get(1, FULL_REGION), after)
+    # Adding then removing the same voxels leaves nothing to undo
+    assert changes.merge(changes.inverted()) is None
+
+
+def test_remove_segment():
+    masks = SparseSegmentMasks(SHAPE, block_size=8)
+    masks.enable(_create_labelmap_array())
+    before = masks.get(2, FULL_REGION)
+
+    changes = masks.remove_segment(2)
+    assert masks.segments == [1]
+    assert not masks.get(2, FULL_REGION).any()
+    changes.inverted().apply()
+    np.testing.assert_array_equal(masks.get(2, FULL_REGION), before)
+
+
+def test_segment_snapshot():
+    masks = SparseSegmentMasks(SHAPE, block_size=8)
+    masks.enable(_create_labelmap_array())
+    snapshot = masks.get_segment_snapshot(1)
+    before = masks.get(1, FULL_REGION)
+
+    masks.set(1, FULL_REGION, np.ones(SHAPE, dtype=bool), False)
+    assert not masks.get(1, FULL_REGION).any()
+    np.testing.assert_array_equal(snapshot.get(1, FULL_REGION), before)
+    assert snapshot.segments == [1]
@@ -0,0 +1,73 @@
+import numpy as np
+import pytest
+from vtkmodules.util.numpy_support import numpy_to_vtk, vtk_to_numpy
+from vtkmodules.vtkCommonDataModel import vtkImageData
+
+from girdermedviewer.app.widgets.utils import LabelMapDiff, LabelMapStatistics
+
+MAX_VALUE = 7
+
+
+def _create_labelmap(array: np.ndarray) -> vtkImageData:
+    labelmap = vtkImageData()
+    labelmap.SetDimensions(array.shape[::-1])
+    labelmap.SetSpacing(0.5, 1.0, 2.0)
+    labelmap.SetOrigin(-10.0, 5.0, 3.0)
+    labelmap.GetPointData().SetScalars(numpy_to_vtk(array.reshape(-1)))
+    return labelmap
+
+
+def _edit(labelmap: vtkImageData, region: tuple[slice, slice, slice], mask: np.ndarray, value: int) -> LabelMapDiff:
+    array = vtk_to_numpy(labelmap.GetPointData().GetScalars()).reshape(tuple(reversed(labelmap.GetDimensions())))
+    before = array[region].copy()
+    array[region][mask] = value
+    return LabelMapDiff.from_region(labelmap, region, before, array[region])
+
+
+def _assert_same_statistics(statistics: LabelMapStatistics, expected: LabelMapStatistics) -> None:
+    for value in range(MAX_VALUE + 1):
+        assert statistics.get_voxel_count(value) == expected.get_voxel_count(value)
+        assert statistics.get_volume(value) == pytest.approx(expected.get_volume(value))
+        if expected.get_voxel_count(value) == 0:
+            assert statistics.get_centroid(value) is None
+            assert statistics.get_bounds(value) is None
+        else:
+            assert statistics.get_centroid(value) == pytest.approx(expected.get_centroid(value))
+            assert statistics.get_bounds(value) == pytest.approx(expected.get_bounds(value))
+
+
+def test_incremental_updates_match_full_computation():
+    rng = np.random.default_rng(0)
+    array = np.zeros((12, 14, 16), dtype=np.uint8)
+    array[2:6, 3:9, 4:12] = 1
+    array[7:11, 1:5, 2:6] = 2
+    labelmap = _create_labelmap(array)
+    statistics = LabelMapStatistics(labelmap, MAX_VALUE)
+
+    for _ in range(20):
+        start = rng.integers(0, array.shape)
+        stop = np.minimum(start + rng.integers(1, 5, 3), array.shape)
+        region = tuple(slice(int(low), int(high)) for low, high in zip(start, stop, strict=True))
+        mask = rng.random(tuple(high - low for low, high in zip(start, stop, strict=True))) < 0.7
+        diff = _edit(labelmap, region, mask, int(rng.integers(0, MAX_VALUE + 1)))
+        if diff is not None:
+            statistics.update(diff)
+        _assert_same_statistics(statistics, LabelMapStatistics(labelmap, MAX_VALUE))
+
+
+def test_bounds_shrink_when_border_voxels_are_erased():
+    array = np.zeros((8, 8, 8), dtype=np.uint8)
+    array[2:6, 2:6, 2:6] = 3
+    labelmap = _create_labelmap(array)
+    statistics = LabelMapStatistics(labelmap, MAX_VALUE)
+
+    region = (slice(2, 6), slice(2, 6), slice(2, 4))
+    statistics.update(_edit(labelmap, region, np.ones((4, 4, 2), dtype=bool), 0))
+    # i from 4 to 5: x from -10 + 4 * 0.5 to -10 + 5 * 0.5
+    assert statistics.get_bounds(3) == pytest.approx([-8.0, -7.5, 7.0, 10.0, 7.0, 13.0])
+    assert statistics.get_voxel_count(3) == 32
+
+
+def test_empty_labelmap():
+    labelmap = _create_labelmap(np.zeros((5, 6, 7), dtype=np.uint8))
+    _assert_same_statistics(LabelMapStatistics(labelmap, MAX_VALUE, is_empty=True), LabelMapStatistics(labelmap))
@@ -0,0 +1,122 @@
+import numpy as np
+import pytest
+from vtkmodules.vtkCommonDataModel import vtkImageData
+
+from girdermedviewer.app.widgets.utils.vtk.segmentation_effects import (
+    EffectCancelledError,
+    EffectProgress,
+    largest_island_mask,
+    margin_mask,
+    pad_extent,
+    region_growing_mask,
+    threshold_mask,
+    world_bounds_to_extent,
+)
+
+
+def _create_volume() -> np.ndarray:
+    """(k, j, i) volume of zeros with a cube of 10 and an isolated voxel of 10"""
+    volume = np.zeros((5, 6, 7), dtype=np.float32)
+    volume[1:3, 1:3, 1:4] = 10
+    volume[4, 5, 6] = 10
+    return volume
+
+
+def _get_mask_extent(mask: np.ndarray) -> list[int]:
+    """(i, j, k) extent of the True voxels of a (k, j, i) mask"""
+    voxels = np.argwhere(mask)
+    return [int(bound) for axis in (2, 1, 0) for bound in (voxels[:, axis].min(), voxels[:, axis].max())]
+
+
+def test_threshold_mask():
+    volume = _create_volume()
+    progress = []
+    mask = threshold_mask(volume, 5, 20, EffectProgress(progress.append))
+    np.testing.assert_array_equal(mask, volume == 10)
+    assert progress == pytest.approx([(k + 1) / 5 for k in range(5)])
+    # Bounds are included
+    assert threshold_mask(volume, 0, 0).sum() == volume.size - 13
+
+
+def test_region_growing_mask():
+    volume = _create_volume()
+    expected = np.zeros(volume.shape, dtype=bool)
+    expected[1:3, 1:3, 1:4] = True
+    np.testing.assert_array_equal(region_growing_mask(volume, (2, 1, 1), 5, 20), expected)
+    assert region_growing_mask(volume, (6, 5, 4), 5, 20).sum() == 1
+
+
+@pytest.mark.parametrize("seed", [(0, 0, 0), (5, 5, 0), (10, 1, 1)])
+def test_region_growing_mask_with_seed_outside_the_region(seed):
+    """Seeds out of the threshold or out of the volume grow nothing"""
+    assert not region_growing_mask(_create_volume(), seed, 5, 20).any()
+
+
+def test_largest_island_mask():
+    mask = _create_volume() == 10
+    # Touches the cube by a corner only
+    mask[3, 3, 4] = True
+    island = largest_island_mask(mask)
+    assert island.sum() == 12
+    assert _get_mask_extent(island) == [1, 3, 1, 2, 1, 2]
+    assert not largest_island_mask(np.zeros((3, 3, 3), dtype=bool)).any()
+
+
+def test_margin_mask_grow():
+    mask = np.zeros((7, 9, 11), dtype=bool)
+    mask[3, 4, 5] = True
+    # Anisotropic radius, as from a margin in mm over an anisotropic spacing
+    margin = margin_mask(mask, (2, 1, 0), grow=True)
+    assert _get_mask_extent(margin) == [3, 7, 3, 5, 3, 3]
+    assert margin[3, 4].sum() == 5
+
+
+def test_margin_mask_shrink():
+    mask = np.zeros((7, 9, 11), dtype=bool)
+    mask[1:6, 2:7, 2:9] = True
+    expected = np.zeros(mask.shape, dtype=bool)
+    expected[2:5, 3:6, 3:8] = True
+    np.testing.assert_array_equal(margin_mask(mask, (1, 1, 1), grow=False), expected)
+    # Only eroded along i
+    assert _get_mask_extent(margin_mask(mask, (2, 0, 0), grow=False)) == [4, 6, 2, 6, 1, 5]
+
+
+def test_pad_extent():
+    limits = [0, 9, 0, 19, -5, 4]
+    assert pad_extent([3, 5, 3, 5, 0, 0], (1, 2, 3), limits) == [2, 6, 1, 7, -3, 3]
+    assert pad_extent([0, 9, 1, 18, -5, 4], (2, 2, 2), limits) == limits
+
+
+def test_world_bounds_to_extent():
+    image_data = vtkImageData()
+    image_data.SetDimensions(10, 10, 10)
+    image_data.SetSpacing(0.5, 1.0, 2.5)
+    image_data.SetOrigin(10.0, 20.0, 30.0)
+    # Voxels whose center is within the bounds, clamped to the extent of the image
+    assert world_bounds_to_extent(image_data, (10.9, 12.1, 20.0, 25.0, 29.0, 37.6)) == [2, 4, 0, 5, 0, 3]
+    assert world_bounds_to_extent(image_data, (-100, 100, -100, 100, -100, 100)) == [0, 9, 0, 9, 0, 9]
+
+
+def test_cancel_threshold_mask():
+    def _cancel_halfway(value: float) -> None:
+        if value >= 0.5:
+            progress.cancel()
+
+    progress = EffectProgress(_cancel_halfway)
+    with pytest.raises(EffectCancelledError):
+        threshold_mask(np.zeros((10, 4, 4)), 0, 1, progress)
+
+
+@pytest.mark.parametrize(
+    "compute_mask",
+    [
+        lambda volume, progress: region_growing_mask(volume, (1, 1, 1), 5, 20, progress),
+        lambda volume, progress: largest_island_mask(volume == 10, progress),
+        lambda volume, progress: margin_mask(volume == 10, (1, 1, 1), True, progress),
+    ],
+)
+def test_cancel_vtk_effects(compute_mask):
+    progress = EffectProgress()
+    progress.cancel()
+    with pytest.raises(EffectCancelledError):
+        compute_mask(_create_volume(), progress)
@@ -0,0 +1,66 @@
+import numpy as np
+import pytest
+from vtkmodules.util.numpy_support import numpy_to_vtk, vtk_to_numpy
+from vtkmodules.vtkCommonDataModel import vtkImageData
+
+from girdermedviewer.app.widgets.utils import VectorFieldGrids, get_sampling_stride
+from girdermedviewer.app.widgets.utils.vtk.vector_field import _get_sampled_slice
+
+
+@pytest.mark.parametrize(
+    ("dimension", "stride", "indices"),
+    [
+        (10, 1, list(range(10))),
+        (10, 3, [1, 4, 7]),
+        (10, 4, [1, 5, 9]),
+        (100, 10, [4, 14, 24, 34, 44, 54, 64, 74, 84, 94]),
+        (11, 10, [4]),
+        (16, 5, [2, 7, 12]),
+        # Axes thinner than the offset of the first glyph
+        (3, 10, [2]),
+        (1, 10, [0]),
+    ],
+)
+def test_sampled_slice(dimension, stride, indices):
+    assert list(range(dimension))[_get_sampled_slice(dimension, stride)] == indices
+
+
+@pytest.mark.parametrize("stride", [1, 2, 3, 5, 8, 13])
+@pytest.mark.parametrize("dimension", [1, 2, 7, 16, 33])
+def test_sampled_slice_covers_the_axis(dimension, stride):
+    """One glyph per stride voxels, as many as fit after the offset of the first one"""
+    indices = list(range(dimension))[_get_sampled_slice(dimension, stride)]
+    assert len(indices) >= 1
+    assert all(index < dimension for index in indices)
+    assert indices[-1] + stride >= dimension
+
+
+def test_sampling_stride():
+    assert get_sampling_stride(100) == 1
+    assert get_sampling_stride(25) == 4
+    assert get_sampling_stride(0) > 1000
+
+
+def test_grid():
+    dimensions = (9, 6, 3)
+    vectors = np.arange(np.prod(dimensions) * 3, dtype=np.float32).reshape(*dimensions[::-1], 3)
+    image_data = vtkImageData()
+    image_data.SetDimensions(dimensions)
+    image_data.SetSpacing(2.0, 1.0, 0.5)
+    image_data.SetOrigin(10.0, 20.0, 30.0)
+    image_data.GetPointData().SetVectors(numpy_to_vtk(vectors.reshape(-1, 3)))
+    grids = VectorFieldGrids(image_data)
+
+    grid = grids.get_grid(4)
+    # Voxels i in (1, 5), j in (1, 5) and k in (1,)
+    assert grid.GetDimensions() == (2, 2, 1)
+    assert grid.GetOrigin() == pytest.approx((12.0, 21.0, 30.5))
+    assert grid.GetSpacing() == pytest.approx((8.0, 4.0, 2.0))
+    np.testing.assert_array_equal(
+        vtk_to_numpy(grid.GetPointData().GetScalars()).reshape(1, 2, 2, 3), vectors[1:2, 1:6:4, 1:6:4]
+    )
+    assert grids.get_grid(4) is grid
+
+    # Grids are built again once the vector field is modified
+    image_data.Modified()
+    assert grids.get_grid(4) is not grid
@@ -0,0 +1,134 @@
+import gzip
+import shutil
+
+import numpy as np
+import pytest
+from vtkmodules.util.numpy_support import numpy_to_vtk, vtk_to_numpy
+from vtkmodules.vtkCommonDataModel import vtkImageData
+from vtkmodules.vtkIOImage import vtkNIFTIImageHeader, vtkNIFTIImageWriter
+
+from girdermedviewer.app.widgets.utils import (
+    FrameCache,
+    NiftiFrameStore,
+    compute_tensor_maps,
+    load_volume,
+)
+
+# (k, j, i) shape of the frames
+SHAPE = (3, 4, 5)
+NUMBER_OF_FRAMES = 6
+FRAME_DURATION = 0.05
+
+
+def _write_nifti(file_path, array: np.ndarray, time_dimension: int, header: vtkNIFTIImageHeader | None = None) -> None:
+    """Write the (k, j, i, components) array, its components being time_dimension frames of the volume"""
+    image_data = vtkImageData()
+    image_data.SetDimensions(array.shape[2::-1])
+    image_data.SetSpacing(1.5, 1.5, 4.0)
+    image_data.GetPointData().SetScalars(numpy_to_vtk(array.reshape(-1, array.shape[3])))
+    writer = vtkNIFTIImageWriter()
+    writer.SetInputData(image_data)
+    writer.SetTimeDimension(time_dimension)
+    writer.SetTimeSpacing(FRAME_DURATION)
+    if header is not None:
+        writer.SetNIFTIHeader(header)
+    writer.SetFileName(str(file_path))
+    writer.Write()
+
+
+def _create_frames() -> np.ndarray:
+    """Frames whose voxels are their flat index plus 1000 times the frame index"""
+    voxels = np.arange(np.prod(SHAPE), dtype=np.float32).reshape(SHAPE)
+    return np.stack([voxels + 1000 * frame for frame in range(NUMBER_OF_FRAMES)], axis=-1)
+
+
+def _get_scalars(frame: vtkImageData) -> np.ndarray:
+    return vtk_to_numpy(frame.GetPointData().GetScalars())
+
+
+@pytest.fixture
+def cine_path(tmp_path):
+    file_path = tmp_path / "cine.nii"
+    _write_nifti(file_path, _create_frames(), NUMBER_OF_FRAMES)
+    return file_path
+
+
+@pytest.mark.parametrize("is_compressed", [False, True])
+def test_frames(tmp_path, cine_path, is_compressed):
+    file_path = cine_path
+    if is_compressed:
+        file_path = tmp_path / "cine.nii.gz"
+        with cine_path.open("rb") as file, gzip.open(file_path, "wb") as compressed_file:
+            shutil.copyfileobj(file, compressed_file)
+
+    store = NiftiFrameStore.open(str(file_path))
+    assert store.number_of_frames == NUMBER_OF_FRAMES
+    assert store.dimensions == list(SHAPE[::-1])
+    assert not store.is_tensor
+    assert store.frame_duration == pytest.approx(FRAME_DURATION)
+
+    frames = _create_frames()
+    for index in (0, 3, NUMBER_OF_FRAMES - 1):
+        np.testing.assert_array_equal(_get_scalars(store.get_frame(index)), frames[..., index].reshape(-1))
+    store.close()
+
+
+def test_frames_have_the_geometry_of_the_volume(cine_path):
+    store = NiftiFrameStore.open(str(cine_path))
+    frame = store.get_frame(0)
+    volume = load_volume(str(cine_path))
+    assert frame.GetDimensions() == volume.GetDimensions()
+    assert frame.GetSpacing() == pytest.approx(volume.GetSpacing())
+    assert frame.GetOrigin() == pytest.approx(volume.GetOrigin())
+    np.testing.assert_array_equal(_get_scalars(frame), _get_scalars(volume))
+    store.close()
+
+
+def test_volume_without_frames(tmp_path):
+    file_path = tmp_path / "volume.nii"
+    _write_nifti(file_path, _create_frames()[..., :1], 1)
+    assert NiftiFrameStore.open(str(file_path)) is None
+
+
+def test_tensors(tmp_path):
+    # Lower triangles (xx, yx, yy, zx, zy, zz) of tensors along x, then isotropic tensors
+    tensors = np.zeros((*SHAPE, 6), dtype=np.float32)
+    tensors[..., :3, :] = [3, 0, 1, 0, 0, 1]
+    tensors[..., 3:, :] = [1, 0, 1, 0, 0, 1]
+    header = vtkNIFTIImageHeader()
+    header.SetIntentCode(1005)
+    file_path = tmp_path / "dti.nii"
+    _write_nifti(file_path, tensors, 1, header)
+
+    store = NiftiFrameStore.open(str(file_path))
+    assert store.is_tensor
+    assert store.number_of_frames == 1
+    frame = store.get_frame(0)
+    fractional_anisotropy = _get_scalars(frame).reshape(SHAPE)
+    directions = vtk_to_numpy(frame.GetPointData().GetVectors()).reshape(*SHAPE, 3)
+    expected_anisotropy, _ = compute_tensor_maps(np.array([[3, 0, 1, 0, 0, 1]], dtype=np.float32))
+    np.testing.assert_allclose(fractional_anisotropy[..., :3], expected_anisotropy[0], rtol=1e-5)
+    np.testing.assert_allclose(fractional_anisotropy[..., 3:], 0, atol=1e-5)
+    # Principal direction along x, scaled by the fractional anisotropy
+    np.testing.assert_allclose(np.abs(directions[..., :3, 0]), expected_anisotropy[0], rtol=1e-5)
+    np.testing.assert_allclose(directions[..., :3, 1:], 0, atol=1e-5)
+    store.close()
+
+
+def test_tensor_maps():
+    fractional_anisotropy, principal_direction = compute_tensor_maps(
+        np.array([[1, 0, 1, 0, 0, 1], [0, 0, 0, 0, 0, 5], [0, 0, 0, 0, 0, 0]], dtype=np.float32)
+    )
+    np.testing.assert_allclose(fractional_anisotropy, [0, 1, 0], atol=1e-6)
+    np.testing.assert_allclose(np.abs(principal_direction[1]), [0, 0, 1], atol=1e-6)
+
+
+def test_frame_cache(cine_path):
+    cache = FrameCache(NiftiFrameStore.open(str(cine_path)), read_ahead=2)
+    frames = _create_frames()
+    np.testing.assert_array_equal(_get_scalars(cache.get(4)), frames[..., 4].reshape(-1))
+
+    cache.read_ahead_from(4)
+    # The frames following 4, looping
+    np.testing.assert_array_equal(_get_scalars(cache.request(0).result()), frames[..., 0].reshape(-1))
+    cache.close()
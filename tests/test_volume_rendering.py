@@ -0,0 +1,67 @@
+import numpy as np
+from vtkmodules.util.numpy_support import numpy_to_vtk
+from vtkmodules.vtkCommonDataModel import vtkImageData, vtkPiecewiseFunction
+
+from girdermedviewer.app.widgets.utils import ScalarBlockRanges
+
+EXTENT = [10, 49, 0, 39, -5, 34]
+
+
+def _create_volume() -> vtkImageData:
+    """40³ volume of zeros with a cube of 100 in the blocks (i, j, k) = (1, 0, 1) and (1, 0, 2)"""
+    array = np.zeros((40, 40, 40), dtype=np.float32)
+    array[30:36, 5:10, 18:23] = 100
+    # NaN voxels are ignored
+    array[0, 0, 0] = np.nan
+    image_data = vtkImageData()
+    image_data.SetExtent(EXTENT)
+    image_data.GetPointData().SetScalars(numpy_to_vtk(array.reshape(-1)))
+    return image_data
+
+
+def _create_opacity_function(nodes: list[tuple[float, float]]) -> vtkPiecewiseFunction:
+    opacity_function = vtkPiecewiseFunction()
+    for x, opacity in nodes:
+        opacity_function.AddPoint(x, opacity)
+    return opacity_function
+
+
+def test_visible_extent():
+    block_ranges = ScalarBlockRanges(_create_volume())
+    opacity_function = _create_opacity_function([(0, 0), (50, 0), (60, 1), (100, 1)])
+    # The visible blocks, and one more voxel on each side within the extent
+    assert block_ranges.get_visible_extent(opacity_function) == [25, 42, 0, 16, 10, 34]
+
+
+def test_clamped_opacity_function():
+    block_ranges = ScalarBlockRanges(_create_volume())
+    # Scalars above the last node are visible
+    assert block_ranges.get_visible_extent(_create_opacity_function([(40, 0), (50, 1)])) == [25, 42, 0, 16, 10, 34]
+    # Only scalars below -5 are visible
+    assert block_ranges.get_visible_extent(_create_opacity_function([(-10, 1), (-5, 0)])) is None
+
+    # All the voxels are above the last node, only visible with clamping
+    opacity_function = _create_opacity_function([(-20, 0), (-10, 1)])
+    assert block_ranges.get_visible_extent(opacity_function) == EXTENT
+    opacity_function.ClampingOff()
+    assert block_ranges.get_visible_extent(opacity_function) is None
+
+
+def test_all_blocks_visible():
+    block_ranges = ScalarBlockRanges(_create_volume())
+    assert block_ranges.get_visible_extent(_create_opacity_function([(-1, 1), (1, 0)])) == EXTENT
+
+
+def test_invisible_volume():
+    block_ranges = ScalarBlockRanges(_create_volume())
+    assert block_ranges.get_visible_extent(_create_opacity_function([(0, 0), (200, 0)])) is None
+    assert block_ranges.get_visible_extent(vtkPiecewiseFunction()) is None
+
+
+def test_can_compute():
+    assert ScalarBlockRanges.can_compute(_create_volume())
+    assert not ScalarBlockRanges.can_compute(vtkImageData())
+    vectors = vtkImageData()
+    vectors.SetDimensions(2, 2, 2)
+    vectors.GetPointData().SetScalars(numpy_to_vtk(np.zeros((8, 3), dtype=np.float32)))
+    assert not ScalarBlockRanges.can_compute(vectors)